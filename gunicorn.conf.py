@@ -0,0 +1,20 @@
+import os
+
+# gunicorn -c gunicorn.conf.py
+wsgi_app = 'transport_optimizer.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+# Application chargée une fois dans le maître puis partagée par fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def on_starting(server):
+    """Précharge les dépendances lourdes (folium, Gemini) avant le fork des workers"""
+    if os.environ.get('WARMUP_HEAVY_IMPORTS', 'True') != 'True':
+        return
+    from routes.warmup import preload
+
+    for module, seconds in preload().items():
+        server.log.info(f"Préchargé {module} en {seconds:.2f} s")
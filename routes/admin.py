@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Location, RouteRequest, OptimizedRoute
+from django.http import StreamingHttpResponse
+from .models import Location, RouteRequest, OptimizedRoute, FleetPlan, FleetStop, Driver, DriverAssignment
+from .pagination import ApproximateCountPaginator
+from .reoptimization import reoptimize_routes
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
@@ -7,6 +10,9 @@ class LocationAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['name', 'address']
     ordering = ['-created_at']
+    # Grandes tables : total approximatif, pas de second COUNT(*) sans filtre
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Informations générales', {
@@ -21,8 +27,14 @@ class LocationAdmin(admin.ModelAdmin):
 class RouteRequestAdmin(admin.ModelAdmin):
     list_display = ['departure', 'destination', 'transport_mode', 'user', 'created_at']
     list_filter = ['transport_mode', 'created_at']
+    list_select_related = ['departure', 'destination', 'user']
     search_fields = ['departure__name', 'destination__name', 'user__username']
     ordering = ['-created_at']
+    # Lieux recherchés à la saisie plutôt que listés en entier dans le formulaire
+    autocomplete_fields = ['departure', 'destination']
+    raw_id_fields = ['user']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Itinéraire', {
@@ -35,18 +47,25 @@ class RouteRequestAdmin(admin.ModelAdmin):
 
 @admin.register(OptimizedRoute)
 class OptimizedRouteAdmin(admin.ModelAdmin):
-    list_display = ['route_request', 'distance', 'duration', 'cost_estimate', 'created_at']
-    list_filter = ['created_at', 'route_request__transport_mode']
+    list_display = ['route_request', 'distance', 'duration', 'cost_estimate', 'created_at', 'refreshed_at']
+    list_filter = ['created_at', 'route_request__transport_mode', 'is_fallback']
+    # __str__ de la demande affiche ses deux lieux : jointure plutôt qu'une requête par ligne
+    list_select_related = ['route_request__departure', 'route_request__destination']
     search_fields = ['route_request__departure__name', 'route_request__destination__name']
     ordering = ['-created_at']
-    readonly_fields = ['route_data']
+    readonly_fields = ['route_data', 'is_fallback', 'refreshed_at']
+    # Identifiant de la demande plutôt qu'une liste déroulante de toutes les demandes
+    raw_id_fields = ['route_request']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['reoptimize']
     
     fieldsets = (
         ('Demande de route', {
             'fields': ('route_request',)
         }),
         ('Résultats d\'optimisation', {
-            'fields': ('distance', 'duration', 'cost_estimate')
+            'fields': ('distance', 'duration', 'cost_estimate', 'is_fallback', 'refreshed_at')
         }),
         ('Données détaillées', {
             'fields': ('route_data',),
@@ -58,3 +77,57 @@ class OptimizedRouteAdmin(admin.ModelAdmin):
         if obj:  # Si on modifie un objet existant
             return self.readonly_fields + ['route_request']
         return self.readonly_fields
+
+    @admin.action(description="Ré-optimiser les routes sélectionnées")
+    def reoptimize(self, request, queryset):
+        """Recalcule la sélection par lots ; la progression est envoyée au fil de l'eau
+
+        Les lots terminés sont enregistrés : après une interruption, reprendre
+        avec manage.py reoptimize_routes --after-id <dernière route>.
+        """
+        def progress():
+            yield "Ré-optimisation des routes sélectionnées (trajets simples, par ordre d'identifiant)\n"
+            for state in reoptimize_routes(queryset):
+                yield (
+                    f"{state['processed']} routes traitées, {state['updated']} mises à jour, "
+                    f"{state['failed']} échecs (dernière route {state['last_id']})\n"
+                )
+            yield "Terminé\n"
+
+        response = StreamingHttpResponse(progress(), content_type='text/plain; charset=utf-8')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class FleetStopInline(admin.TabularInline):
+    model = FleetStop
+    extra = 0
+    fields = ['location', 'delivery', 'pickup', 'ready_minutes', 'due_minutes', 'service_minutes', 'vehicle', 'sequence', 'arrival_minutes']
+    readonly_fields = ['vehicle', 'sequence', 'arrival_minutes']
+    raw_id_fields = ['location']
+
+@admin.register(FleetPlan)
+class FleetPlanAdmin(admin.ModelAdmin):
+    list_display = ['name', 'depot', 'transport_mode', 'total_distance', 'total_cost', 'solve_seconds', 'created_at']
+    list_filter = ['transport_mode', 'created_at']
+    list_select_related = ['depot']
+    search_fields = ['name', 'depot__name']
+    ordering = ['-created_at']
+    readonly_fields = ['total_distance', 'total_duration', 'total_cost', 'solve_seconds']
+    inlines = [FleetStopInline]
+
+@admin.register(Driver)
+class DriverAdmin(admin.ModelAdmin):
+    list_display = ['name', 'transport_mode', 'is_available', 'latitude', 'longitude', 'updated_at']
+    list_filter = ['transport_mode', 'is_available']
+    list_editable = ['is_available']
+    search_fields = ['name']
+
+@admin.register(DriverAssignment)
+class DriverAssignmentAdmin(admin.ModelAdmin):
+    list_display = ['route_request', 'driver', 'pickup_minutes', 'pickup_distance', 'created_at']
+    list_filter = ['created_at', 'driver__transport_mode']
+    list_select_related = ['route_request__departure', 'route_request__destination', 'driver']
+    search_fields = ['driver__name', 'route_request__departure__name']
+    ordering = ['-created_at']
+    raw_id_fields = ['route_request', 'driver']
@@ -0,0 +1,269 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+# Colonnes exportées : nom -> type NumPy (NaN / -1 quand la valeur manque)
+COLUMNS = {
+    'request_id': np.int64,
+    'route_id': np.int64,
+    'user_id': np.int64,
+    'mode': np.uint8,
+    'created_at': np.int64,  # secondes depuis l'epoch (UTC)
+    'hour': np.uint8,  # heure locale (TIME_ZONE)
+    'weekday': np.uint8,  # 1 = dimanche ... 7 = samedi
+    'departure_id': np.int64,
+    'destination_id': np.int64,
+    'departure_lat': np.float32,
+    'departure_lon': np.float32,
+    'destination_lat': np.float32,
+    'destination_lon': np.float32,
+    'distance': np.float32,
+    'duration': np.float32,
+    'cost': np.float32,
+}
+
+LATEST_FILE = 'LATEST'
+
+_snapshot = None
+_snapshot_name = None
+_snapshot_lock = threading.Lock()
+
+
+def snapshot_root() -> Path:
+    return Path(getattr(settings, 'ANALYTICS_SNAPSHOT_DIR', Path(settings.BASE_DIR) / 'analytics'))
+
+
+class Snapshot:
+    """Instantané en colonnes (un fichier .npy par colonne, ouvert en mmap)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.modes: List[str] = self.meta['modes']
+        self._columns = {}
+        self._memo = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(self.path / f"{name}.npy", mmap_mode='r')
+        return self._columns[name]
+
+    def memoize(self, key: str, compute):
+        """Résultat calculé une seule fois pour cet instantané"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+
+class SnapshotWriter:
+    """Écrit un instantané par morceaux dans des fichiers .npy pré-alloués
+
+    Les lignes doivent arriver groupées par mode (codes croissants). Les
+    fichiers sont écrits dans un nouveau dossier puis publiés en remplaçant
+    le fichier LATEST : un lecteur voit toujours un instantané complet.
+    """
+
+    def __init__(self, rows: int, modes: Sequence[str], root: Optional[Path] = None):
+        self.root = Path(root or snapshot_root())
+        self.created_at = timezone.now()
+        self.name = self.created_at.strftime('%Y%m%dT%H%M%S%f')
+        self.path = self.root / self.name
+        self.path.mkdir(parents=True, exist_ok=False)
+        self.rows = rows
+        self.modes = list(modes)
+        self.offset = 0
+        self.columns = {
+            name: np.lib.format.open_memmap(self.path / f"{name}.npy", mode='w+', dtype=dtype, shape=(rows,))
+            for name, dtype in COLUMNS.items()
+        }
+
+    def append(self, chunk: Dict[str, np.ndarray]):
+        size = len(chunk['request_id'])
+        for name, column in self.columns.items():
+            column[self.offset:self.offset + size] = chunk[name]
+        self.offset += size
+
+    def publish(self, keep: int = 2):
+        for column in self.columns.values():
+            column.flush()
+
+        mode = self.columns['mode'][:self.offset]
+        if np.any(mode[1:] < mode[:-1]):
+            raise ValueError("Les lignes de l'instantané doivent être groupées par mode")
+
+        # Corridors : un seul tri global, fait ici plutôt qu'à chaque affichage
+        corridors = top_pairs(
+            self.columns['departure_id'][:self.offset],
+            self.columns['destination_id'][:self.offset],
+            top=100
+        )
+        np.save(self.path / 'corridors.npy', np.array(corridors, dtype=np.int64).reshape(-1, 3))
+        with open(self.path / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': self.created_at.isoformat(),
+                'rows': self.offset,
+                'modes': self.modes,
+                'mode_counts': np.bincount(mode, minlength=len(self.modes)).tolist(),
+                'columns': {name: np.dtype(dtype).name for name, dtype in COLUMNS.items()},
+            }, f)
+
+        latest_tmp = self.root / f"{LATEST_FILE}.tmp"
+        latest_tmp.write_text(self.name, encoding='utf-8')
+        os.replace(latest_tmp, self.root / LATEST_FILE)
+
+        # Anciens instantanés (les lecteurs en cours gardent leurs fichiers ouverts)
+        snapshots = sorted(p for p in self.root.iterdir() if p.is_dir())
+        for old in snapshots[:-keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def get_snapshot() -> Optional[Snapshot]:
+    """Dernier instantané publié, ouvert une fois par processus (None s'il n'y en a pas)"""
+    global _snapshot, _snapshot_name
+    try:
+        name = (snapshot_root() / LATEST_FILE).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    if name != _snapshot_name:
+        with _snapshot_lock:
+            if name != _snapshot_name:
+                try:
+                    _snapshot = Snapshot(snapshot_root() / name)
+                except (OSError, ValueError, KeyError):
+                    return None
+                _snapshot_name = name
+    return _snapshot
+
+
+# ----------------------------------------------------------------------------
+# Agrégations vectorisées
+# ----------------------------------------------------------------------------
+
+def group_by(keys: np.ndarray, values: Optional[np.ndarray] = None, size: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """count / sum / mean de `values` par clé entière (NaN ignorés)
+
+    Avec `size`, les clés sont des codes 0..size-1 (bincount direct) ;
+    sinon elles sont d'abord réduites par np.unique. Renvoie aussi `keys`.
+    """
+    if size is None:
+        group_keys, codes = np.unique(keys, return_inverse=True)
+        size = len(group_keys)
+    else:
+        group_keys, codes = np.arange(size), keys
+    result = {'keys': group_keys, 'count': np.bincount(codes, minlength=size)}
+    if values is not None:
+        valid = ~np.isnan(values)
+        result['valid_count'] = np.bincount(codes[valid], minlength=size)
+        result['sum'] = np.bincount(codes[valid], weights=values[valid], minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result['mean'] = result['sum'] / result['valid_count']
+    return result
+
+
+def grouped_percentiles(keys: np.ndarray, values: np.ndarray, size: int,
+                        q: Sequence[float] = (50, 90)) -> np.ndarray:
+    """Percentiles de `values` par code 0..size-1 : tableau (size, len(q)), NaN si groupe vide
+
+    Les lignes sont regroupées par un tri stable sur les codes (tri par base
+    pour des entiers courts), puis chaque groupe contigu passe par
+    np.percentile (sélection partielle, sans tri complet).
+    """
+    valid = ~np.isnan(values)
+    keys = keys[valid]
+    grouped = values[valid][np.argsort(keys, kind='stable')]
+    counts = np.bincount(keys, minlength=size)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    result = np.full((size, len(q)), np.nan)
+    for code in np.flatnonzero(counts):
+        result[code] = np.percentile(grouped[starts[code]:starts[code] + counts[code]], q)
+    return result
+
+
+def histogram(values: np.ndarray, bins=20, value_range=None) -> Dict[str, List]:
+    """Histogramme des valeurs non nulles (bornes et effectifs)"""
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+    return {'edges': edges.tolist(), 'counts': counts.tolist()}
+
+
+def top_pairs(first: np.ndarray, second: np.ndarray, top: int = 10) -> List[tuple]:
+    """Couples (first, second) les plus fréquents : [(first, second, effectif)]"""
+    combined = (first.astype(np.int64) << 32) | second.astype(np.int64)
+    pairs, counts = np.unique(combined, return_counts=True)
+    best = np.argsort(counts)[::-1][:top]
+    return [(int(pairs[i] >> 32), int(pairs[i] & 0xffffffff), int(counts[i])) for i in best]
+
+
+def top_locations(departure_ids: np.ndarray, destination_ids: np.ndarray, top: int = 10) -> List[tuple]:
+    """Lieux les plus utilisés (départs puis arrivées) : [(id, départs, arrivées)]"""
+    if not len(departure_ids):
+        return []
+    size = int(max(departure_ids.max(), destination_ids.max())) + 1
+    departures = np.bincount(departure_ids, minlength=size)
+    destinations = np.bincount(destination_ids, minlength=size)
+    best = np.lexsort((-destinations, -departures))[:top]
+    return [
+        (int(i), int(departures[i]), int(destinations[i]))
+        for i in best if departures[i] or destinations[i]
+    ]
+
+
+# ----------------------------------------------------------------------------
+# Tableaux de bord
+# ----------------------------------------------------------------------------
+
+def mode_groups(snapshot: Snapshot, column: str):
+    """(code du mode, valeurs non nulles de la colonne) pour chaque mode présent
+
+    Les lignes de l'instantané sont regroupées par mode : chaque groupe est
+    une tranche contiguë du fichier, sans masque sur toute la colonne.
+    """
+    values = snapshot[column]
+    start = 0
+    for code, count in enumerate(snapshot.meta['mode_counts']):
+        if count:
+            group = values[start:start + count]
+            yield code, group[~np.isnan(group)]
+        start += count
+
+
+def _mode_statistics(snapshot: Snapshot) -> List[Dict]:
+    counts = snapshot.meta['mode_counts']
+    stats = {code: {'transport_mode': snapshot.modes[code], 'count': count} for code, count in enumerate(counts)}
+    for name, column in (('avg_distance', 'distance'), ('avg_cost', 'cost')):
+        for code, values in mode_groups(snapshot, column):
+            stats[code][name] = float(values.mean(dtype=np.float64)) if len(values) else None
+    for code, values in mode_groups(snapshot, 'duration'):
+        p50, p90 = np.percentile(values, (50, 90)) if len(values) else (None, None)
+        stats[code]['p50_duration'] = p50 if p50 is None else float(p50)
+        stats[code]['p90_duration'] = p90 if p90 is None else float(p90)
+    return sorted((stat for stat in stats.values() if stat['count']), key=lambda stat: -stat['count'])
+
+
+def dashboard(snapshot: Snapshot, now_ts: float, recent_days: int = 30) -> Dict:
+    """Agrégats de la page statistiques calculés sur l'instantané
+
+    Un instantané ne change jamais : tout ce qui ne dépend pas de l'heure
+    courante est calculé une seule fois par processus.
+    """
+    data = snapshot.memoize('dashboard', lambda: {
+        'total_routes': int((snapshot['route_id'] >= 0).sum()),
+        'transport_stats': _mode_statistics(snapshot),
+        'hourly_counts': np.bincount(snapshot['hour'], minlength=24).tolist(),
+        'popular_locations': top_locations(snapshot['departure_id'], snapshot['destination_id'], top=10),
+        'top_corridors': [tuple(row) for row in snapshot['corridors'][:10].tolist()],
+    })
+    recent = (snapshot['created_at'] >= now_ts - recent_days * 86400) & (snapshot['route_id'] >= 0)
+    return {**data, 'recent_routes': int(recent.sum())}
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RoutesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'routes'
+
+    def ready(self):
+        # Enregistrement des récepteurs de signaux
+        from . import signals  # noqa: F401
@@ -0,0 +1,295 @@
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .estimator import moving_matrices
+from .models import Driver, DriverAssignment, RouteRequest
+from .speed_profiles import time_bucket
+
+DEFAULT_SETTINGS = {
+    # Taille (max(chauffeurs, demandes)) jusqu'à laquelle l'algorithme hongrois est utilisé
+    'HUNGARIAN_MAX_SIZE': 200,
+    # Délai d'approche maximal (min) : au-delà, le couple n'est pas proposé
+    'MAX_PICKUP_MINUTES': 30,
+    # Âge maximal d'une demande en attente (min) : plus ancienne, elle n'est plus servie
+    'REQUEST_TTL_MINUTES': 15,
+    # Durée d'une fenêtre de regroupement (secondes, manage.py assign_drivers --loop)
+    'WINDOW_SECONDS': 10,
+}
+
+ALGORITHMS = ('auto', 'hungarian', 'auction')
+
+
+def get_settings() -> Dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'DRIVER_ASSIGNMENT', {})}
+
+
+def pickup_matrices(driver_coords, driver_modes: Sequence[str], pickup_coords,
+                    bucket: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Délai d'approche (min) et distance (km) de chaque chauffeur (lignes) vers chaque départ (colonnes)
+
+    Calcul par diffusion sur tous les couples, sans attente d'embarquement (le
+    chauffeur roule déjà) ni arrondi : les coûts proches ne sont pas rendus égaux.
+    bucket : quart d'heure local (profils de vitesse de la zone du chauffeur).
+    """
+    return moving_matrices(driver_coords, driver_modes, pickup_coords, bucket)
+
+
+def hungarian(cost: np.ndarray) -> np.ndarray:
+    """Affectation de coût minimal (algorithme hongrois, chemins augmentants les plus courts)
+
+    cost : n lignes x m colonnes avec n <= m ; renvoie la colonne de chaque
+    ligne. O(n² m), la boucle interne est vectorisée sur les colonnes.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j] : ligne (1..n) affectée à la colonne j, p[0] : ligne en cours d'insertion
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    padded = np.zeros((n + 1, m + 1))
+    padded[1:, 1:] = cost
+
+    for row in range(1, n + 1):
+        p[0] = row
+        column = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current = p[column]
+            free = ~used
+            free[0] = False
+            reduced = padded[current] - u[current] - v
+            better = free & (reduced < minv)
+            minv[better] = reduced[better]
+            way[better] = column
+            candidates = np.flatnonzero(free)
+            following = candidates[np.argmin(minv[candidates])]
+            delta = minv[following]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            column = following
+            if p[column] == 0:
+                break
+        # Remontée du chemin augmentant
+        while column:
+            previous = way[column]
+            p[column] = p[previous]
+            column = previous
+
+    assignment = np.full(n, -1, dtype=np.int64)
+    for column in range(1, m + 1):
+        if p[column]:
+            assignment[p[column] - 1] = column - 1
+    return assignment
+
+
+def auction(cost: np.ndarray, min_epsilon: Optional[float] = None,
+            start_epsilon: Optional[float] = None) -> np.ndarray:
+    """Affectation de coût minimal par enchères (Bertsekas), version Jacobi vectorisée
+
+    cost : n lignes (enchérisseurs) x m colonnes (objets) avec n <= m ; renvoie
+    la colonne de chaque ligne. Toutes les lignes sans objet enchérissent en
+    même temps ; epsilon part de start_epsilon (défaut : écart des coûts / 5)
+    et est divisé par 5 à chaque phase jusqu'à min_epsilon. Le coût total est
+    à moins de n x min_epsilon de l'optimum (défaut 1 / (n + 1) : optimal pour
+    des coûts entiers).
+    """
+    n, m = cost.shape
+    benefit = -np.asarray(cost, dtype=np.float64)
+    if min_epsilon is None:
+        min_epsilon = 1.0 / (n + 1)
+    if start_epsilon is None:
+        start_epsilon = float(benefit.max() - benefit.min()) / 5 if n else 0.0
+    epsilon = max(start_epsilon, min_epsilon)
+    prices = np.zeros(m)
+    assignment = np.full(n, -1, dtype=np.int64)
+    owner = np.full(m, -1, dtype=np.int64)
+    rows = np.arange(n)
+
+    while True:
+        # Nouvelle phase : les affectations qui ne respectent plus epsilon
+        # (écart au meilleur objet) sont remises aux enchères. Plus d'objets
+        # que d'enchérisseurs : un objet libre doit rester à prix nul pour
+        # que la solution finale soit optimale
+        while True:
+            if n < m:
+                prices[owner < 0] = 0
+            assigned = np.flatnonzero(assignment >= 0)
+            if not len(assigned):
+                break
+            values = benefit[assigned] - prices
+            unhappy = values.max(axis=1) - values[rows[:len(assigned)], assignment[assigned]] > epsilon
+            if not unhappy.any():
+                break
+            released = assigned[unhappy]
+            owner[assignment[released]] = -1
+            assignment[released] = -1
+
+        while True:
+            bidders = np.flatnonzero(assignment < 0)
+            if not len(bidders):
+                break
+            values = benefit[bidders] - prices
+            positions = rows[:len(bidders)]
+            best = np.argmax(values, axis=1)
+            first = values[positions, best]
+            values[positions, best] = -np.inf
+            second = values.max(axis=1) if m > 1 else first
+            bids = prices[best] + (first - second) + epsilon
+
+            # Pour chaque objet, l'enchère la plus haute l'emporte
+            if len(bidders) == 1:
+                objects, winners = best, positions
+            else:
+                order = np.lexsort((-bids, best))
+                objects, winners = np.unique(best[order], return_index=True)
+                winners = order[winners]
+            previous = owner[objects]
+            assignment[previous[previous >= 0]] = -1
+            owner[objects] = bidders[winners]
+            assignment[bidders[winners]] = objects
+            prices[objects] = bids[winners]
+        if epsilon <= min_epsilon:
+            return assignment
+        epsilon = max(epsilon / 5, min_epsilon)
+
+
+def solve_assignment(cost: np.ndarray, feasible: Optional[np.ndarray] = None,
+                     algorithm: str = 'auto') -> List[Tuple[int, int]]:
+    """Couples (ligne, colonne) minimisant le coût total, en servant d'abord le plus de couples possible
+
+    Matrice rectangulaire quelconque ; les couples non réalisables (feasible
+    faux) ne sont jamais renvoyés.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algorithme inconnu: {algorithm}")
+    cost = np.asarray(cost, dtype=np.float64)
+    if not cost.size:
+        return []
+    if feasible is None:
+        feasible = np.ones(cost.shape, dtype=bool)
+
+    # Lignes et colonnes sans aucun couple réalisable : retirées du calcul
+    row_ids = np.flatnonzero(feasible.any(axis=1))
+    column_ids = np.flatnonzero(feasible.any(axis=0))
+    if not len(row_ids):
+        return []
+    cost = cost[np.ix_(row_ids, column_ids)]
+    feasible = feasible[np.ix_(row_ids, column_ids)]
+    # Les deux algorithmes veulent au moins autant de colonnes que de lignes
+    transposed = len(row_ids) > len(column_ids)
+    if transposed:
+        cost, feasible = cost.T, feasible.T
+
+    # Couple impossible : plus cher que n'importe quelle affectation réalisable,
+    # le nombre de couples servis passe avant le coût
+    low, high = cost[feasible].min(), cost[feasible].max()
+    matrix = np.where(feasible, cost, (abs(high) + 1) * len(cost))
+    if algorithm == 'auto':
+        algorithm = 'hungarian' if max(matrix.shape) <= get_settings()['HUNGARIAN_MAX_SIZE'] else 'auction'
+    if algorithm == 'hungarian':
+        assignment = hungarian(matrix)
+    else:
+        # Premières enchères à l'échelle des coûts réalisables, pas de la pénalité
+        assignment = auction(matrix, start_epsilon=max(high - low, 1.0))
+
+    pairs = [(row, int(column)) for row, column in enumerate(assignment) if feasible[row, column]]
+    if transposed:
+        return sorted((int(row_ids[row]), int(column_ids[column])) for column, row in pairs)
+    return [(int(row_ids[row]), int(column_ids[column])) for row, column in pairs]
+
+
+def pending_requests(now=None):
+    """Demandes en attente d'un chauffeur : récentes, sans affectation, hors tournées de flotte"""
+    now = now or timezone.now()
+    options = get_settings()
+    return RouteRequest.objects.filter(
+        created_at__gte=now - timedelta(minutes=options['REQUEST_TTL_MINUTES']),
+        driver_assignment__isnull=True,
+        optimizedroute__fleet_plan__isnull=True,
+    )
+
+
+def assign_batch(requests=None, drivers=None, algorithm: str = 'auto', dry_run: bool = False,
+                 now=None) -> Dict:
+    """Affecte en une fois les demandes en attente aux chauffeurs disponibles
+
+    Un chauffeur ne sert que les demandes de son mode de transport, et
+    seulement si son délai d'approche reste sous MAX_PICKUP_MINUTES. Les
+    demandes sans chauffeur restent en attente pour la fenêtre suivante.
+    """
+    now = now or timezone.now()
+    options = get_settings()
+    started = time.monotonic()
+    if requests is None:
+        requests = pending_requests(now)
+    if drivers is None:
+        drivers = Driver.objects.filter(is_available=True)
+    with transaction.atomic():
+        requests = requests.select_related('departure').order_by('created_at', 'id')
+        drivers = drivers.filter(is_available=True).order_by('id')
+        if not dry_run:
+            # Lots concurrents (assign_drivers --loop et l'API) : chacun saute
+            # les demandes et chauffeurs verrouillés par l'autre
+            requests = requests.select_for_update(skip_locked=True, of=('self',))
+            drivers = drivers.select_for_update(skip_locked=True)
+        requests = list(requests)
+        drivers = list(drivers.filter(transport_mode__in={request.transport_mode for request in requests}))
+
+        minutes, distance = pickup_matrices(
+            [(driver.latitude, driver.longitude) for driver in drivers],
+            [driver.transport_mode for driver in drivers],
+            [(request.departure.latitude, request.departure.longitude) for request in requests],
+            time_bucket(now)
+        )
+        feasible = (
+            np.asarray([driver.transport_mode for driver in drivers], dtype=object)[:, None]
+            == np.asarray([request.transport_mode for request in requests], dtype=object)[None, :]
+        ) & (minutes <= options['MAX_PICKUP_MINUTES'])
+        matrix_seconds = time.monotonic() - started
+        pairs = solve_assignment(minutes, feasible, algorithm)
+
+        assignments = [
+            DriverAssignment(
+                route_request=requests[column],
+                driver=drivers[row],
+                pickup_minutes=float(minutes[row, column]),
+                pickup_distance=float(distance[row, column]),
+            )
+            for row, column in pairs
+        ]
+        if assignments and not dry_run:
+            # Bases sans verrou de lignes (SQLite) : un lot concurrent a pu
+            # servir ces demandes ou occuper ces chauffeurs pendant le calcul
+            served = set(DriverAssignment.objects.filter(
+                route_request_id__in=[assignment.route_request_id for assignment in assignments]
+            ).values_list('route_request_id', flat=True))
+            busy = set(Driver.objects.filter(
+                id__in=[assignment.driver_id for assignment in assignments], is_available=False
+            ).values_list('id', flat=True))
+            assignments = [
+                assignment for assignment in assignments
+                if assignment.route_request_id not in served and assignment.driver_id not in busy
+            ]
+            DriverAssignment.objects.bulk_create(assignments)
+            Driver.objects.filter(
+                id__in=[assignment.driver_id for assignment in assignments], is_available=True
+            ).update(is_available=False)
+
+    return {
+        'assignments': assignments,
+        'requests': len(requests),
+        'drivers': len(drivers),
+        'unassigned': len(requests) - len(assignments),
+        'total_pickup_minutes': float(sum(assignment.pickup_minutes for assignment in assignments)),
+        'matrix_seconds': matrix_seconds,
+        'elapsed': time.monotonic() - started,
+    }
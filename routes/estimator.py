@@ -0,0 +1,177 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .geo import EARTH_RADIUS_KM
+from .speed_profiles import travel_factors
+
+# Tarifs (FCFA) et vitesses moyennes par mode, en ville et en interurbain.
+# base_fare : prise en charge, per_km : prix au km routier,
+# speed_kmh : vitesse moyenne porte à porte, wait_min : attente/embarquement.
+DEFAULT_FARE_TABLE = {
+    'taxi': {
+        'urban': {'base_fare': 350, 'per_km': 50, 'speed_kmh': 22, 'wait_min': 5},
+        'intercity': {'base_fare': 1000, 'per_km': 20, 'speed_kmh': 60, 'wait_min': 30},
+    },
+    'moto_taxi': {
+        'urban': {'base_fare': 200, 'per_km': 50, 'speed_kmh': 25, 'wait_min': 3},
+        'intercity': {'base_fare': 500, 'per_km': 40, 'speed_kmh': 45, 'wait_min': 10},
+    },
+    'bus': {
+        'urban': {'base_fare': 150, 'per_km': 5, 'speed_kmh': 18, 'wait_min': 15},
+        'intercity': {'base_fare': 1000, 'per_km': 15, 'speed_kmh': 55, 'wait_min': 30},
+    },
+    'car': {
+        # Voiture personnelle : carburant (~840 FCFA/L, 12 km/L)
+        'urban': {'base_fare': 0, 'per_km': 70, 'speed_kmh': 25, 'wait_min': 0},
+        'intercity': {'base_fare': 0, 'per_km': 70, 'speed_kmh': 65, 'wait_min': 0},
+    },
+    'walking': {
+        'urban': {'base_fare': 0, 'per_km': 0, 'speed_kmh': 4.5, 'wait_min': 0},
+        'intercity': {'base_fare': 0, 'per_km': 0, 'speed_kmh': 4.5, 'wait_min': 0},
+    },
+    'bike': {
+        'urban': {'base_fare': 0, 'per_km': 0, 'speed_kmh': 14, 'wait_min': 0},
+        'intercity': {'base_fare': 0, 'per_km': 0, 'speed_kmh': 16, 'wait_min': 0},
+    },
+}
+
+# Modes historiques rattachés à un profil du tableau
+MODE_ALIASES = {
+    'public': 'bus',
+}
+
+TIERS = ('urban', 'intercity')
+COLUMNS = ('base_fare', 'per_km', 'speed_kmh', 'wait_min')
+
+
+def get_fare_table() -> Dict:
+    """Tableau des tarifs, surchargeable mode par mode via settings.ROUTE_ESTIMATOR_TABLE"""
+    table = {mode: {tier: dict(values) for tier, values in tiers.items()}
+             for mode, tiers in DEFAULT_FARE_TABLE.items()}
+    for mode, tiers in getattr(settings, 'ROUTE_ESTIMATOR_TABLE', {}).items():
+        for tier, values in tiers.items():
+            table.setdefault(mode, {}).setdefault(tier, {}).update(values)
+    return table
+
+
+def resolve_mode(transport_mode: str) -> str:
+    return MODE_ALIASES.get(transport_mode, transport_mode)
+
+
+def haversine_km_array(lat1, lon1, lat2, lon2):
+    """Distance orthodromique vectorisée (km)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def table_params(modes: np.ndarray, intercity: np.ndarray) -> Dict[str, np.ndarray]:
+    """Colonnes du tableau des tarifs alignées sur chaque trajet (mode et niveau urbain/interurbain)"""
+    table = get_fare_table()
+    params = {column: np.zeros(intercity.shape) for column in COLUMNS}
+    for mode in np.unique(modes.astype(str)):
+        profile = table.get(resolve_mode(mode))
+        if profile is None:
+            raise ValueError(f"Mode de transport inconnu: {mode}")
+        mode_mask = modes == mode
+        for tier in TIERS:
+            mask = mode_mask & (intercity if tier == 'intercity' else ~intercity)
+            for column in COLUMNS:
+                params[column][mask] = profile[tier][column]
+    return params
+
+
+def estimate(dep_lat, dep_lon, dest_lat, dest_lon, transport_modes, bucket: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Estime distance, durée et coût pour des milliers de trajets en un appel
+
+    Les coordonnées sont des scalaires ou des tableaux de même taille ;
+    transport_modes est un mode unique ou un tableau de modes. bucket :
+    quart d'heure local du départ (routes.speed_profiles), le temps de
+    roulage suit alors le profil appris du mode dans la zone de départ.
+    Renvoie des tableaux distance_km, duration_min, cost_fcfa et intercity.
+    """
+    modes = np.asarray(transport_modes, dtype=object)
+    crow_km = haversine_km_array(dep_lat, dep_lon, dest_lat, dest_lon)
+    # Un trajet pour plusieurs modes, ou plusieurs trajets pour un mode
+    shape = np.broadcast_shapes(np.shape(crow_km), modes.shape, (1,))
+    crow_km = np.broadcast_to(crow_km, shape).copy()
+    modes = np.broadcast_to(modes, shape)
+
+    intercity_km = getattr(settings, 'ROUTE_ESTIMATOR_INTERCITY_KM', 25)
+    detour = getattr(settings, 'ROUTE_ESTIMATOR_DETOUR', {'urban': 1.35, 'intercity': 1.2})
+
+    road_km = crow_km * detour['urban']
+    intercity = road_km > intercity_km
+    road_km = np.where(intercity, crow_km * detour['intercity'], road_km)
+
+    params = table_params(modes, intercity)
+    travel_min = road_km / params['speed_kmh'] * 60 * travel_factors(modes, dep_lat, dep_lon, bucket)
+    duration_min = params['wait_min'] + travel_min
+    cost = params['base_fare'] + params['per_km'] * road_km
+    cost = np.where(cost > 0, np.maximum(np.round(cost / 50) * 50, 50), 0)
+
+    return {
+        'distance_km': np.round(road_km, 1),
+        'duration_min': np.round(duration_min),
+        'cost_fcfa': cost,
+        'intercity': intercity,
+    }
+
+
+def table_durations(road_km, transport_modes) -> Tuple[np.ndarray, np.ndarray]:
+    """Temps de roulage et attente (min) du tableau des tarifs pour des distances routières connues"""
+    road_km = np.asarray(road_km, dtype=np.float64)
+    modes = np.broadcast_to(np.asarray(transport_modes, dtype=object), road_km.shape)
+    params = table_params(modes, road_km > getattr(settings, 'ROUTE_ESTIMATOR_INTERCITY_KM', 25))
+    return road_km / params['speed_kmh'] * 60, params['wait_min']
+
+
+def moving_matrices(origin_coords, transport_modes, destination_coords,
+                    bucket: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Durée (min) et distance (km) de chaque origine (lignes) vers chaque destination (colonnes)
+
+    Véhicule déjà en route : mêmes détours et vitesses que estimate() (profil
+    de la zone de chaque origine si bucket est donné), sans attente
+    d'embarquement ni arrondi. transport_modes : un mode par origine.
+    """
+    origin_coords = np.asarray(origin_coords, dtype=np.float64).reshape(-1, 2)
+    destination_coords = np.asarray(destination_coords, dtype=np.float64).reshape(-1, 2)
+    crow_km = haversine_km_array(
+        origin_coords[:, 0:1], origin_coords[:, 1:2], destination_coords[None, :, 0], destination_coords[None, :, 1]
+    )
+
+    intercity_km = getattr(settings, 'ROUTE_ESTIMATOR_INTERCITY_KM', 25)
+    detour = getattr(settings, 'ROUTE_ESTIMATOR_DETOUR', {'urban': 1.35, 'intercity': 1.2})
+    road_km = crow_km * detour['urban']
+    intercity = road_km > intercity_km
+    road_km = np.where(intercity, crow_km * detour['intercity'], road_km)
+
+    table = get_fare_table()
+    speeds = np.empty_like(road_km)
+    modes = np.asarray(transport_modes, dtype=object)
+    for mode in set(transport_modes):
+        profile = table.get(resolve_mode(mode))
+        if profile is None:
+            raise ValueError(f"Mode de transport inconnu: {mode}")
+        rows = modes == mode
+        speeds[rows] = np.where(intercity[rows], profile['intercity']['speed_kmh'], profile['urban']['speed_kmh'])
+    factors = travel_factors(modes, origin_coords[:, 0], origin_coords[:, 1], bucket)
+    return road_km / speeds * 60 * np.reshape(factors, (-1, 1)), road_km
+
+
+def estimate_route(departure_coords: Tuple[float, float], destination_coords: Tuple[float, float],
+                   transport_mode: str, bucket: Optional[int] = None) -> Dict:
+    """Estimation d'un trajet au format optimal_route de l'analyse IA"""
+    result = estimate(
+        departure_coords[0], departure_coords[1],
+        destination_coords[0], destination_coords[1],
+        transport_mode, bucket
+    )
+    return {
+        'estimated_time': float(result['duration_min'][0]),
+        'estimated_distance': float(result['distance_km'][0]),
+        'cost_estimate': float(result['cost_fcfa'][0]),
+        'intercity': bool(result['intercity'][0]),
+    }
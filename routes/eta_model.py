@@ -0,0 +1,197 @@
+import math
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .estimator import estimate, estimate_route, haversine_km_array
+from .geo import haversine_km
+from .speed_profiles import bucket_for_hour
+
+# Version du jeu de variables : un modèle entraîné avec une autre version est ignoré
+FEATURE_VERSION = 1
+FEATURE_NAMES = (
+    'intercept', 'distance', 'sqrt_distance', 'log_distance', 'intercity',
+    'mid_lat', 'mid_lon', 'hour_sin', 'hour_cos',
+)
+TARGETS = ('distance', 'duration', 'cost_estimate')
+
+# Seuil (km à vol d'oiseau) de la variable interurbaine
+INTERCITY_CROW_KM = 20.0
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def build_features(dep_lat, dep_lon, dest_lat, dest_lon, hour) -> np.ndarray:
+    """Matrice des variables explicatives (une ligne par trajet)"""
+    crow_km = np.atleast_1d(haversine_km_array(dep_lat, dep_lon, dest_lat, dest_lon))
+    angle = 2 * np.pi * np.broadcast_to(np.asarray(hour, dtype=np.float64), crow_km.shape) / 24
+    return np.column_stack([
+        np.ones_like(crow_km),
+        crow_km,
+        np.sqrt(crow_km),
+        np.log1p(crow_km),
+        (crow_km > INTERCITY_CROW_KM).astype(np.float64),
+        np.broadcast_to((np.asarray(dep_lat) + np.asarray(dest_lat)) / 2, crow_km.shape),
+        np.broadcast_to((np.asarray(dep_lon) + np.asarray(dest_lon)) / 2, crow_km.shape),
+        np.sin(angle),
+        np.cos(angle),
+    ])
+
+
+def fit_ridge(features: np.ndarray, targets: np.ndarray, ridge: float = 1.0) -> np.ndarray:
+    """Moindres carrés régularisés : coefficients (variables x cibles)
+
+    Les variables sont centrées-réduites pour la régularisation, puis les
+    coefficients sont ramenés à l'échelle d'origine (l'intercept n'est pas pénalisé).
+    """
+    mean = features[:, 1:].mean(axis=0)
+    std = features[:, 1:].std(axis=0)
+    # Variable constante (ex. toutes les routes à la même heure) : non réduite
+    std[std < 1e-9] = 1.0
+    scaled = np.column_stack([features[:, 0], (features[:, 1:] - mean) / std])
+
+    penalty = np.sqrt(ridge) * np.eye(scaled.shape[1])[1:]
+    augmented_x = np.vstack([scaled, penalty])
+    augmented_y = np.vstack([targets, np.zeros((penalty.shape[0], targets.shape[1]))])
+    coef, *_ = np.linalg.lstsq(augmented_x, augmented_y, rcond=None)
+
+    unscaled = coef.copy()
+    unscaled[1:] = coef[1:] / std[:, None]
+    unscaled[0] = coef[0] - (mean / std) @ coef[1:]
+    return unscaled
+
+
+class EtaModel:
+    """Modèle linéaire par mode : distance, durée et coût à partir des coordonnées et de l'heure"""
+
+    def __init__(self, coefficients: Dict[str, np.ndarray], metadata: Optional[Dict] = None):
+        self.coefficients = coefficients
+        self.metadata = metadata or {}
+        # Coefficients en listes Python : une prédiction isolée évite le coût de NumPy
+        self._rows = {mode: coef.T.tolist() for mode, coef in coefficients.items()}
+
+    @property
+    def modes(self):
+        return set(self.coefficients)
+
+    def predict(self, departure_coords: Tuple[float, float], destination_coords: Tuple[float, float],
+                transport_mode: str, hour: float = 12) -> Optional[Dict]:
+        """Prédiction d'un trajet (quelques microsecondes), None si le mode n'est pas appris"""
+        rows = self._rows.get(transport_mode)
+        if rows is None:
+            return None
+        crow_km = haversine_km(*departure_coords, *destination_coords)
+        angle = 2 * math.pi * hour / 24
+        features = (
+            1.0, crow_km, math.sqrt(crow_km), math.log1p(crow_km),
+            1.0 if crow_km > INTERCITY_CROW_KM else 0.0,
+            (departure_coords[0] + destination_coords[0]) / 2,
+            (departure_coords[1] + destination_coords[1]) / 2,
+            math.sin(angle), math.cos(angle),
+        )
+        distance, duration, cost = (
+            max(0.0, sum(c * f for c, f in zip(row, features))) for row in rows
+        )
+        return {
+            'estimated_time': round(duration),
+            'estimated_distance': round(distance, 1),
+            'cost_estimate': round(cost / 50) * 50,
+        }
+
+    def predict_many(self, features: np.ndarray, transport_mode: str) -> Optional[np.ndarray]:
+        """Prédictions (trajets x cibles) pour une matrice de variables"""
+        coef = self.coefficients.get(transport_mode)
+        if coef is None:
+            return None
+        return np.maximum(features @ coef, 0.0)
+
+    def save(self, path):
+        modes = sorted(self.coefficients)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                feature_version=FEATURE_VERSION,
+                modes=np.array(modes),
+                coefficients=np.stack([self.coefficients[mode] for mode in modes]),
+                samples=np.array([self.metadata.get('samples', {}).get(mode, 0) for mode in modes]),
+                trained_at=np.array(self.metadata.get('trained_at', '')),
+            )
+
+    @classmethod
+    def load(cls, path) -> Optional['EtaModel']:
+        with np.load(path) as data:
+            if int(data['feature_version']) != FEATURE_VERSION:
+                return None
+            modes = [str(mode) for mode in data['modes']]
+            coefficients = dict(zip(modes, data['coefficients']))
+            metadata = {
+                'samples': dict(zip(modes, data['samples'].tolist())),
+                'trained_at': str(data['trained_at']),
+            }
+        return cls(coefficients, metadata)
+
+
+def get_eta_model(reload: bool = False) -> Optional[EtaModel]:
+    """Modèle entraîné, chargé une seule fois par processus (None s'il n'existe pas)"""
+    global _model, _model_loaded
+    if _model_loaded and not reload:
+        return _model
+    with _model_lock:
+        if not _model_loaded or reload:
+            path = Path(getattr(settings, 'ETA_MODEL_PATH', ''))
+            try:
+                _model = EtaModel.load(path) if path.is_file() else None
+            except (OSError, KeyError, ValueError):
+                _model = None
+            _model_loaded = True
+    return _model
+
+
+def quick_estimate(departure_coords: Tuple[float, float], destination_coords: Tuple[float, float],
+                   transport_mode: str, hour: float = 12) -> Dict:
+    """Estimation immédiate : modèle appris si disponible, sinon tableau des tarifs
+
+    hour : heure locale décimale du départ. Le modèle en tient compte par ses
+    variables horaires, le tableau par les profils de vitesse du quart d'heure.
+    """
+    model = get_eta_model()
+    prediction = model.predict(departure_coords, destination_coords, transport_mode, hour) if model else None
+    if prediction is not None:
+        prediction['source'] = 'model'
+        return prediction
+
+    fallback = estimate_route(departure_coords, destination_coords, transport_mode, bucket_for_hour(hour))
+    fallback['source'] = 'estimator'
+    return fallback
+
+
+def estimate_with_model(dep_lat, dep_lon, dest_lat, dest_lon, transport_modes, hour=12) -> Dict[str, np.ndarray]:
+    """Version vectorisée de quick_estimate, mêmes tableaux que estimator.estimate plus `source`"""
+    result = estimate(dep_lat, dep_lon, dest_lat, dest_lon, transport_modes, bucket_for_hour(hour))
+    shape = result['distance_km'].shape
+    result['source'] = np.full(shape, 'estimator', dtype=object)
+
+    model = get_eta_model()
+    if model is None:
+        return result
+
+    modes = np.broadcast_to(np.asarray(transport_modes, dtype=object), shape)
+    features = build_features(
+        *(np.broadcast_to(np.asarray(a, dtype=np.float64), shape) for a in (dep_lat, dep_lon, dest_lat, dest_lon)),
+        hour
+    )
+    for mode in model.modes.intersection(np.unique(modes.astype(str))):
+        mask = modes == mode
+        predictions = model.predict_many(features[mask], mode)
+        result['distance_km'][mask] = np.round(predictions[:, 0], 1)
+        result['duration_min'][mask] = np.round(predictions[:, 1])
+        result['cost_fcfa'][mask] = np.round(predictions[:, 2] / 50) * 50
+        result['source'][mask] = 'model'
+    return result
@@ -1,24 +1,111 @@
 from django import forms
+from django.conf import settings
+from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
 from .models import RouteRequest, Location
+from .speed_profiles import local_time_zone
+
+class LocalDateTimeField(forms.DateTimeField):
+    """Date et heure saisies et affichées dans le fuseau des trajets (ROUTE_LOCAL_TIME_ZONE)
+
+    Un champ datetime-local n'a pas de fuseau : sans cela, Django le lirait
+    dans TIME_ZONE et le quart d'heure de départ différerait de celui de l'API
+    (parse_departure_time) pour la même saisie.
+    """
+    
+    def to_python(self, value):
+        with timezone.override(local_time_zone()):
+            return super().to_python(value)
+    
+    def prepare_value(self, value):
+        with timezone.override(local_time_zone()):
+            return super().prepare_value(value)
+
+class LocationAutocompleteWidget(forms.Widget):
+    """Sélecteur de lieu par recherche du nom (api/search-locations/), sans liste des lieux dans la page
+
+    Seuls les identifiants choisis sont envoyés (champs cachés) : le
+    ModelChoiceField ne charge que ces lieux à la validation. La page garde
+    la même taille quel que soit le nombre de lieux.
+    """
+    search_url = reverse_lazy('routes:search_locations')
+    
+    class Media:
+        js = ['routes/location_autocomplete.js']
+    
+    def __init__(self, attrs=None, multiple=False, placeholder='Rechercher un lieu...'):
+        super().__init__(attrs)
+        self.allow_multiple_selected = multiple
+        self.placeholder = placeholder
+    
+    def value_from_datadict(self, data, files, name):
+        if self.allow_multiple_selected:
+            return data.getlist(name) if hasattr(data, 'getlist') else data.get(name)
+        return data.get(name)
+    
+    def value_omitted_from_data(self, data, files, name):
+        # Aucun lieu choisi : aucun champ envoyé, comme un SelectMultiple vide
+        return False if self.allow_multiple_selected else name not in data
+    
+    def selected(self, value):
+        """[(id, nom)] des lieux déjà choisis (formulaire renvoyé avec erreurs) : une requête au plus"""
+        values = value if isinstance(value, (list, tuple)) else [value]
+        ids = [int(pk) for pk in (getattr(v, 'pk', v) for v in values) if str(pk).isdigit()]
+        if not ids:
+            return []
+        names = dict(Location.objects.filter(id__in=ids).values_list('id', 'name'))
+        return [(pk, names[pk]) for pk in ids if pk in names]
+    
+    def id_for_label(self, id_):
+        return f"{id_}_search" if id_ else id_
+    
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        field_id = attrs.get('id') or f"id_{name}"
+        selected = self.selected(value)
+        if self.allow_multiple_selected:
+            chips = format_html_join(
+                '',
+                '<span class="badge bg-primary me-1 mb-1 location-chip">{}'
+                '<input type="hidden" name="{}" value="{}">'
+                '<button type="button" class="btn-close btn-close-white btn-sm ms-1" data-remove aria-label="Retirer"></button>'
+                '</span>',
+                ((label, name, pk) for pk, label in selected)
+            )
+            hidden, text = format_html('<div class="location-autocomplete-selected mb-1">{}</div>', chips), ''
+        else:
+            pk, text = selected[0] if selected else ('', '')
+            hidden = format_html('<input type="hidden" name="{}" id="{}" value="{}">', name, field_id, pk)
+        return format_html(
+            '<div class="location-autocomplete position-relative" data-location-autocomplete '
+            'data-url="{}" data-name="{}" data-multiple="{}">{}'
+            '<input type="text" class="form-control location-autocomplete-input" id="{}_search" value="{}" '
+            'placeholder="{}" autocomplete="off"{}>'
+            '<div class="list-group position-absolute w-100 shadow-sm location-autocomplete-menu" style="z-index: 1000;"></div>'
+            '</div>',
+            self.search_url, name, int(self.allow_multiple_selected), hidden,
+            field_id, text, self.placeholder, format_html(' required') if self.is_required and not self.allow_multiple_selected else ''
+        )
 
 class RouteRequestForm(forms.ModelForm):
     class Meta:
         model = RouteRequest
-        fields = ['departure', 'destination', 'transport_mode']
+        fields = ['departure', 'destination', 'transport_mode', 'departure_time']
         widgets = {
-            'departure': forms.Select(attrs={'class': 'form-control'}),
-            'destination': forms.Select(attrs={'class': 'form-control'}),
+            'departure': LocationAutocompleteWidget(placeholder="Choisir un point de départ"),
+            'destination': LocationAutocompleteWidget(placeholder="Choisir une destination"),
             'transport_mode': forms.Select(attrs={'class': 'form-control'}),
+            'departure_time': forms.DateTimeInput(
+                attrs={'class': 'form-control', 'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'
+            ),
+        }
+        help_texts = {
+            'departure_time': 'Vide : départ immédiat',
+        }
+        field_classes = {
+            'departure_time': LocalDateTimeField,
         }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['departure'].queryset = Location.objects.all()
-        self.fields['destination'].queryset = Location.objects.all()
-        
-        # Ajouter des options vides
-        self.fields['departure'].empty_label = "Choisir un point de départ"
-        self.fields['destination'].empty_label = "Choisir une destination"
     
     def clean(self):
         cleaned_data = super().clean()
@@ -76,6 +163,21 @@ class LocationForm(forms.ModelForm):
         if not (-180 <= longitude <= 180):
             raise forms.ValidationError("La longitude doit être comprise entre -180 et 180.")
         return longitude
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        address = cleaned_data.get('address')
+        latitude = cleaned_data.get('latitude')
+        longitude = cleaned_data.get('longitude')
+        
+        if address and latitude is not None and longitude is not None:
+            duplicate = Location.objects.find_duplicate(address, latitude, longitude, exclude_id=self.instance.pk)
+            if duplicate:
+                raise forms.ValidationError(
+                    f"Ce lieu existe déjà : « {duplicate.name} » ({duplicate.address})."
+                )
+        
+        return cleaned_data
 
 class RouteSearchForm(forms.Form):
     """Formulaire de recherche rapide d'itinéraire"""
@@ -118,21 +220,25 @@ class RouteComparisonForm(forms.Form):
     """Formulaire pour comparer différents modes de transport"""
     departure = forms.ModelChoiceField(
         queryset=Location.objects.all(),
-        widget=forms.Select(attrs={'class': 'form-control'}),
-        label='Point de départ',
-        empty_label="Choisir un point de départ"
+        widget=LocationAutocompleteWidget(placeholder="Choisir un point de départ"),
+        label='Point de départ'
     )
     destination = forms.ModelChoiceField(
         queryset=Location.objects.all(),
-        widget=forms.Select(attrs={'class': 'form-control'}),
-        label='Destination',
-        empty_label="Choisir une destination"
+        widget=LocationAutocompleteWidget(placeholder="Choisir une destination"),
+        label='Destination'
     )
     transport_modes = forms.MultipleChoiceField(
         choices=RouteRequest.TRANSPORT_CHOICES,
         widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
         label='Modes de transport à comparer'
     )
+    departure_time = LocalDateTimeField(
+        required=False,
+        widget=forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        label='Heure de départ',
+        help_text='Vide : départ immédiat'
+    )
     
     def clean_transport_modes(self):
         modes = self.cleaned_data['transport_modes']
@@ -244,4 +350,72 @@ class QuickRouteForm(forms.Form):
         choices=RouteRequest.TRANSPORT_CHOICES,
         widget=forms.Select(attrs={'class': 'form-control'}),
         label='Mode de transport'
-    )
\ No newline at end of file
+    )
+
+class FleetPlanForm(forms.Form):
+    """Formulaire de plan de flotte : arrêts à répartir entre plusieurs véhicules"""
+    name = forms.CharField(
+        max_length=100,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Tournée du matin'}),
+        label='Nom du plan'
+    )
+    depot = forms.ModelChoiceField(
+        queryset=Location.objects.all(),
+        widget=LocationAutocompleteWidget(placeholder="Choisir le dépôt"),
+        label='Dépôt'
+    )
+    stops = forms.ModelMultipleChoiceField(
+        queryset=Location.objects.all(),
+        widget=LocationAutocompleteWidget(multiple=True, placeholder="Ajouter un arrêt..."),
+        label='Arrêts'
+    )
+    transport_mode = forms.ChoiceField(
+        choices=RouteRequest.TRANSPORT_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label='Mode de transport'
+    )
+    vehicle_count = forms.IntegerField(
+        min_value=1,
+        max_value=50,
+        initial=3,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        label='Nombre de véhicules'
+    )
+    vehicle_capacity = forms.FloatField(
+        min_value=0.1,
+        initial=20,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'}),
+        label='Capacité par véhicule'
+    )
+    delivery = forms.FloatField(
+        min_value=0,
+        initial=1,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'}),
+        label='Quantité livrée par arrêt'
+    )
+    shift_minutes = forms.IntegerField(
+        min_value=30,
+        max_value=24 * 60,
+        initial=480,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        label='Durée de service (min)'
+    )
+    
+    def clean_stops(self):
+        stops = self.cleaned_data['stops']
+        max_stops = getattr(settings, 'FLEET_MAX_STOPS', 500)
+        if len(stops) > max_stops:
+            raise forms.ValidationError(f"Un plan ne peut pas dépasser {max_stops} arrêts.")
+        return stops
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        depot = cleaned_data.get('depot')
+        stops = cleaned_data.get('stops')
+        
+        if depot and stops and depot in stops:
+            raise forms.ValidationError(
+                "Le dépôt ne peut pas être aussi un arrêt du plan."
+            )
+        
+        return cleaned_data
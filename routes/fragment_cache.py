@@ -0,0 +1,62 @@
+import hashlib
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .signals import VERSION_NAMESPACES, get_versions
+
+# Fragments déclarés dans les gabarits (enregistrés à la compilation du tag)
+FRAGMENTS = set()
+
+
+def fragment_key(name: str, namespaces: Iterable[str], vary_on: Iterable) -> str:
+    """Clé d'un fragment : versions des espaces de données et valeurs de variation"""
+    versions = get_versions(*namespaces)
+    raw = '|'.join([f"{namespace}={versions[namespace]}" for namespace in namespaces]
+                   + [str(value) for value in vary_on])
+    return f"fragment:{name}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def _stat_key(name: str, outcome: str) -> str:
+    return f"fragment_stats:{name}:{outcome}"
+
+
+def record_lookup(name: str, hit: bool):
+    key = _stat_key(name, 'hits' if hit else 'misses')
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except ValueError:
+        # Clé expirée entre add() et incr()
+        cache.set(key, 1, timeout=None)
+
+
+def fragment_cache_stats(names: Iterable[str] = None) -> Dict[str, Dict[str, float]]:
+    """Hits, misses et taux de succès par fragment"""
+    names = sorted(names if names is not None else FRAGMENTS)
+    keys = [_stat_key(name, outcome) for name in names for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    stats = {}
+    for name in names:
+        hits = values.get(_stat_key(name, 'hits'), 0)
+        misses = values.get(_stat_key(name, 'misses'), 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        }
+    return stats
+
+
+def reset_fragment_cache_stats(names: Iterable[str] = None):
+    names = names if names is not None else FRAGMENTS
+    cache.delete_many([_stat_key(name, outcome) for name in names for outcome in ('hits', 'misses')])
+
+
+def valid_namespaces():
+    return set(VERSION_NAMESPACES.values())
+
+
+def fragment_timeout() -> int:
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 24 * 3600)
@@ -0,0 +1,115 @@
+import math
+import re
+import unicodedata
+from typing import Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Mots ignorés dans la clé d'adresse (articles, pays commun à tous les lieux)
+ADDRESS_STOPWORDS = frozenset({
+    'a', 'au', 'aux', 'd', 'de', 'des', 'du', 'et', 'l', 'la', 'le', 'les',
+    'cameroun', 'cameroon',
+})
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance orthodromique entre deux points (km)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 7) -> str:
+    """Geohash d'un point (précision 7 ≈ cellule de 150 m x 150 m)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """Centre de la cellule d'un geohash (latitude, longitude)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return ((lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2)
+
+
+def normalize_address(address: str) -> str:
+    """Clé d'adresse : sans accents, casse ni ponctuation, mots dédoublonnés et triés
+
+    "Marché Central, Yaoundé" et "yaounde marche central" ont la même clé.
+    """
+    text = unicodedata.normalize('NFKD', address or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(sorted(set(re.findall(r'[a-z0-9]+', text)) - ADDRESS_STOPWORDS))
+
+
+def search_key(text: str) -> str:
+    """Clé de recherche par préfixe : sans accents ni casse, mots dans l'ordre, séparés par une espace
+
+    "Marché Central (Yaoundé)" donne "marche central yaounde".
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def geohash_cells_around(latitude: float, longitude: float, radius_km: float, precision: int = 7) -> Set[str]:
+    """Cellules geohash couvrant le cercle de rayon radius_km (plus petit qu'une cellule)
+
+    La boîte englobante du cercle est plus petite qu'une cellule : les cellules
+    de son centre, du milieu de ses côtés et de ses coins suffisent.
+    """
+    dlat = radius_km / 111.32
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(latitude)), 1e-6))
+    return {
+        geohash_encode(latitude + lat_offset, longitude + lon_offset, precision)
+        for lat_offset in (-dlat, 0.0, dlat)
+        for lon_offset in (-dlon, 0.0, dlon)
+    }
@@ -0,0 +1,142 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .models import OptimizedRoute
+from .signals import get_versions
+
+
+def has_pending_messages(request):
+    """Des messages flash attendent d'être affichés : la page ne doit pas être resservie
+
+    Quel que soit le stockage (cookie ou session) ; len() ne marque pas les
+    messages comme lus.
+    """
+    return len(get_messages(request)) > 0
+
+
+def _route_modified_at(request, route_id):
+    """Date du dernier calcul de la route (création ou ré-optimisation), lue une seule fois par requête"""
+    cache_attr = '_route_modified_at'
+    if not hasattr(request, cache_attr):
+        dates = OptimizedRoute.objects.filter(
+            id=route_id
+        ).values_list('refreshed_at', 'created_at').first()
+        setattr(request, cache_attr, dates and (dates[0] or dates[1]))
+    return getattr(request, cache_attr)
+
+
+def immutable_route(private=False):
+    """Cache HTTP d'une vue de route optimisée (une route ne change qu'en cas de ré-optimisation)
+
+    ETag et Last-Modified viennent de refreshed_at, sinon created_at : un GET
+    conditionnel renvoie 304 sans recharger la route, ni recréer la carte, ni
+    resérialiser le JSON. Les pages HTML dépendent de l'utilisateur
+    (navigation) : private=True. Noms des lieux et ré-optimisations font
+    évoluer la réponse, d'où une durée longue mais sans la directive immutable.
+    """
+    def etag_func(request, route_id, *args, **kwargs):
+        if has_pending_messages(request):
+            return None
+        modified_at = _route_modified_at(request, route_id)
+        if modified_at is None:
+            return None
+        # Les noms des lieux affichés peuvent changer : version des lieux incluse
+        locations_version = get_versions('locations')['locations']
+        user_part = f"-u{request.user.pk or 0}" if private else ''
+        # Microsecondes : une ré-optimisation dans la seconde de création change aussi l'ETag
+        return f"route-{route_id}-{int(modified_at.timestamp() * 1e6)}-{locations_version}{user_part}"
+
+    def last_modified_func(request, route_id, *args, **kwargs):
+        if has_pending_messages(request):
+            return None
+        return _route_modified_at(request, route_id)
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, route_id, *args, **kwargs):
+            response = conditional_view(request, route_id, *args, **kwargs)
+            if response.status_code in (200, 304) and not has_pending_messages(request):
+                visibility = 'private' if private else 'public'
+                patch_cache_control(
+                    response,
+                    max_age=getattr(settings, 'ROUTE_RESULT_MAX_AGE', 86400),
+                    **{visibility: True}
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+def versioned_etag(*namespaces):
+    """ETag d'une liste calculé à partir des tampons de version (aucune requête SQL)
+
+    Le client revalide à chaque affichage et reçoit 304 tant que les données
+    des espaces indiqués n'ont pas changé.
+    """
+    def etag_func(request, *args, **kwargs):
+        if has_pending_messages(request):
+            return None
+        versions = get_versions(*namespaces)
+        raw = '|'.join(
+            [request.get_full_path(), str(request.user.pk or 0)]
+            + [f"{name}={versions[name]}" for name in namespaces]
+        )
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_page_for_anonymous(*namespaces, timeout=None):
+    """Cache de page complète pour les visiteurs anonymes
+
+    La clé contient les versions des espaces indiqués : tout enregistrement
+    ou suppression d'un modèle concerné (signaux) invalide la page. Les
+    en-têtes de la réponse (ETag, Cache-Control, Vary...) sont resservis avec
+    le contenu ; une réponse qui pose des cookies n'est pas mise en cache.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET' or request.user.is_authenticated
+                    or has_pending_messages(request)):
+                return view_func(request, *args, **kwargs)
+
+            versions = get_versions(*namespaces)
+            raw = '|'.join([request.get_full_path()] + [str(versions[name]) for name in namespaces])
+            key = f"page:{view_func.__name__}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+            cached = cache.get(key)
+            if cached is not None:
+                response = HttpResponse(cached['content'])
+                for header, value in cached['headers']:
+                    response[header] = value
+            else:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming and not response.cookies:
+                    cache.set(key, {
+                        'content': response.content,
+                        'headers': list(response.items()),
+                    }, timeout=timeout or getattr(settings, 'PAGE_CACHE_TIMEOUT', 3600))
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
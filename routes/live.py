@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections import deque
+from typing import Dict, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # Connexions WebSocket simultanées par processus
+    'MAX_CONNECTIONS': 10000,
+    # Abonnés simultanés d'une même route
+    'MAX_SUBSCRIBERS_PER_ROUTE': 5000,
+    # Messages en attente par abonné : au-delà, les plus anciens sont remplacés
+    'QUEUE_SIZE': 8,
+    # Messages perdus par un abonné trop lent avant fermeture de sa connexion
+    'MAX_DROPPED': 200,
+}
+
+ROUTE_PATH = re.compile(r'^/ws/routes/(?P<route_id>\d+)/?$')
+
+# Codes de fermeture WebSocket
+CLOSE_NOT_FOUND = 4404
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_TOO_SLOW = 4008
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_settings() -> Dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'LIVE_UPDATES', {})}
+
+
+class Subscription:
+    """File bornée d'un abonné : un message trop ancien est remplacé plutôt que d'attendre
+
+    Position et ETA : seul le dernier état compte, un client lent reçoit
+    moins de messages mais jamais en retard de plus de `size` messages.
+    """
+
+    def __init__(self, route_id: int, size: int):
+        self.route_id = route_id
+        self.messages = deque(maxlen=size)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def push(self, message: str):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+        self.ready.set()
+
+    async def next_messages(self):
+        await self.ready.wait()
+        self.ready.clear()
+        messages = list(self.messages)
+        self.messages.clear()
+        return messages
+
+
+class LiveChannelLayer:
+    """Diffusion en mémoire des mises à jour de routes aux abonnés du processus
+
+    Chaque message est encodé une seule fois puis déposé dans la file de
+    chaque abonné (sans attente) : un abonné lent ne ralentit ni la
+    publication ni les autres. Le dernier message de chaque route est gardé
+    pour les nouveaux abonnés. À utiliser depuis la boucle d'événements ;
+    publish_threadsafe() depuis un autre thread.
+    """
+
+    def __init__(self, options: Optional[Dict] = None):
+        self.options = options or get_settings()
+        self.groups: Dict[int, Set[Subscription]] = {}
+        # Routes suivies : destination et mode (calcul de l'ETA sans base de données)
+        self.routes: Dict[int, Dict] = {}
+        self.last_messages: Dict[int, str] = {}
+        self.connections = 0
+        self.loop = None
+
+    def subscribe(self, route_id: int, route: Dict) -> Optional[Subscription]:
+        """Nouvel abonné, ou None si les plafonds de connexions sont atteints"""
+        self.loop = asyncio.get_running_loop()
+        group = self.groups.setdefault(route_id, set())
+        if (self.connections >= self.options['MAX_CONNECTIONS']
+                or len(group) >= self.options['MAX_SUBSCRIBERS_PER_ROUTE']):
+            if not group:
+                del self.groups[route_id]
+            return None
+        subscription = Subscription(route_id, self.options['QUEUE_SIZE'])
+        group.add(subscription)
+        self.routes.setdefault(route_id, route)
+        self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        group = self.groups.get(subscription.route_id)
+        if group is None or subscription not in group:
+            return
+        group.discard(subscription)
+        self.connections -= 1
+        if not group:
+            del self.groups[subscription.route_id]
+            self.routes.pop(subscription.route_id, None)
+            self.last_messages.pop(subscription.route_id, None)
+
+    def subscribers(self, route_id: int) -> int:
+        return len(self.groups.get(route_id, ()))
+
+    def publish(self, route_id: int, data: Dict) -> int:
+        """Envoie data à tous les abonnés de la route ; renvoie leur nombre"""
+        group = self.groups.get(route_id)
+        if not group:
+            return 0
+        message = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        self.last_messages[route_id] = message
+        for subscription in group:
+            subscription.push(message)
+        return len(group)
+
+    def publish_threadsafe(self, route_id: int, data: Dict):
+        """publish() depuis un thread de travail (vue synchrone, commande)"""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.publish, route_id, data)
+
+
+def get_channel_layer() -> LiveChannelLayer:
+    global _layer
+    if _layer is None:
+        with _layer_lock:
+            if _layer is None:
+                _layer = LiveChannelLayer()
+    return _layer
+
+
+def route_snapshot(route_id: int) -> Optional[Dict]:
+    """État initial d'une route (une requête), None si elle n'existe pas"""
+    from .models import OptimizedRoute
+
+    route = OptimizedRoute.objects.filter(id=route_id).select_related(
+        'route_request__destination'
+    ).only(
+        'id', 'distance', 'duration', 'route_request__transport_mode',
+        'route_request__destination__latitude', 'route_request__destination__longitude'
+    ).first()
+    if route is None:
+        return None
+    destination = route.route_request.destination
+    return {
+        'type': 'snapshot',
+        'route_id': route.id,
+        'transport_mode': route.route_request.transport_mode,
+        'destination': [destination.latitude, destination.longitude],
+        'eta_minutes': route.duration,
+        'remaining_km': route.distance,
+    }
+
+
+async def websocket_application(scope, receive, send):
+    """Connexions WebSocket /ws/routes/<id>/ : position et ETA de la route en direct
+
+    Le client reçoit l'état initial (dernier message publié, sinon la route
+    en base), puis chaque mise à jour publiée. Les messages du client sont
+    ignorés.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    match = ROUTE_PATH.match(scope['path'])
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    route_id = int(match.group('route_id'))
+
+    layer = get_channel_layer()
+    route = layer.routes.get(route_id)
+    if route is None:
+        route = await sync_to_async(route_snapshot)(route_id)
+        if route is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+            return
+    initial = layer.last_messages.get(route_id) or json.dumps(route, ensure_ascii=False, separators=(',', ':'))
+
+    subscription = layer.subscribe(route_id, route)
+    if subscription is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_TRY_AGAIN_LATER})
+        return
+
+    try:
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': initial})
+        await _serve(subscription, receive, send, layer.options['MAX_DROPPED'])
+    except (OSError, RuntimeError) as e:
+        # Client parti pendant un envoi
+        logger.debug(f"Connexion WebSocket interrompue: {e}")
+    finally:
+        layer.unsubscribe(subscription)
+
+
+async def _serve(subscription: Subscription, receive, send, max_dropped: int):
+    """Envoie les messages de l'abonné jusqu'à la déconnexion du client"""
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+
+    disconnect = asyncio.ensure_future(wait_disconnect())
+    try:
+        while True:
+            pending = asyncio.ensure_future(subscription.next_messages())
+            done, _ = await asyncio.wait({pending, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                pending.cancel()
+                return
+            # send() attend que le serveur ait de la place : le rythme est celui du client
+            for text in pending.result():
+                await send({'type': 'websocket.send', 'text': text})
+            if subscription.dropped > max_dropped:
+                await send({'type': 'websocket.close', 'code': CLOSE_TOO_SLOW})
+                return
+    finally:
+        disconnect.cancel()
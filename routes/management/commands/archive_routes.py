@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from routes.retention import USER_TYPES, archivable, archive_batch, check_dependents, get_policies
+
+
+class Command(BaseCommand):
+    help = 'Archive par petits lots les demandes de routes anciennes selon ROUTE_RETENTION'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-type', choices=sorted(USER_TYPES), action='append',
+                            help="Limiter à ce type d'utilisateur (répétable)")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Demandes par transaction (défaut : ROUTE_RETENTION_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Pause entre deux lots (secondes) pour laisser passer les écritures')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Nombre maximal de demandes archivées par type')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Compter les demandes à archiver sans rien modifier')
+
+    def handle(self, *args, **options):
+        try:
+            policies = get_policies()
+            check_dependents()
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        batch_size = options['batch_size'] or getattr(settings, 'ROUTE_RETENTION_BATCH_SIZE', 500)
+        now = timezone.now()
+        for user_type, policy in policies.items():
+            if options['user_type'] and user_type not in options['user_type']:
+                continue
+            if policy['days'] is None:
+                self.stdout.write(f"{user_type:<10} conservé sans limite")
+                continue
+
+            queryset = archivable(user_type, policy['days'], now)
+            if options['dry_run']:
+                self.stdout.write(
+                    f"{user_type:<10} {queryset.count()} demandes de plus de {policy['days']} jours "
+                    f"({policy['storage']})"
+                )
+                continue
+
+            archive_file = f"routes-{user_type}-{now:%Y%m%d}.jsonl.gz"
+            started = time.monotonic()
+            total = 0
+            while options['limit'] is None or total < options['limit']:
+                size = batch_size if options['limit'] is None else min(batch_size, options['limit'] - total)
+                archived = archive_batch(queryset, policy['storage'], size, archive_file)
+                total += archived
+                if archived < size:
+                    break
+                time.sleep(options['pause'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{user_type:<10} {total} demandes archivées ({policy['storage']}) "
+                f"en {time.monotonic() - started:.1f} s"
+            ))
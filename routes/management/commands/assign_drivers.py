@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from routes.assignment import ALGORITHMS, assign_batch, get_settings
+
+
+class Command(BaseCommand):
+    help = 'Affecte par fenêtres successives les demandes en attente aux chauffeurs disponibles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Recommencer à chaque fenêtre (sinon un seul lot)')
+        parser.add_argument('--window', type=float, default=None,
+                            help='Durée d\'une fenêtre en secondes (défaut : DRIVER_ASSIGNMENT["WINDOW_SECONDS"])')
+        parser.add_argument('--algorithm', choices=ALGORITHMS, default='auto',
+                            help='auto : hongrois pour les petits lots, enchères au-delà')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Calculer les affectations sans les enregistrer')
+
+    def handle(self, *args, **options):
+        window = options['window'] or get_settings()['WINDOW_SECONDS']
+        if window <= 0:
+            raise CommandError('--window doit être positif')
+
+        while True:
+            started = time.monotonic()
+            result = assign_batch(algorithm=options['algorithm'], dry_run=options['dry_run'])
+            self.stdout.write(
+                f"{len(result['assignments'])} affectations / {result['requests']} demandes, "
+                f"{result['drivers']} chauffeurs, {result['unassigned']} en attente "
+                f"({result['elapsed'] * 1000:.0f} ms)"
+            )
+            if not options['loop']:
+                break
+            # Demandes arrivées pendant la fenêtre : traitées ensemble au lot suivant
+            time.sleep(max(window - (time.monotonic() - started), 0))
@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from routes.assignment import get_settings, pickup_matrices, solve_assignment
+
+
+class Command(BaseCommand):
+    help = "Mesure le calcul des délais d'approche et des affectations sur des positions aléatoires"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=1000, help='Nombre de chauffeurs')
+        parser.add_argument('--requests', type=int, default=1000, help='Nombre de demandes')
+        parser.add_argument('--radius', type=float, default=0.1,
+                            help='Demi-côté (degrés) de la zone autour de Yaoundé')
+        parser.add_argument('--transport-mode', default='taxi')
+        parser.add_argument('--repeat', type=int, default=3, help='Meilleur temps sur N essais')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        center = np.array([3.8480, 11.5021])
+        drivers = center + rng.uniform(-options['radius'], options['radius'], (options['drivers'], 2))
+        pickups = center + rng.uniform(-options['radius'], options['radius'], (options['requests'], 2))
+        modes = [options['transport_mode']] * options['drivers']
+        max_minutes = get_settings()['MAX_PICKUP_MINUTES']
+
+        def best_time(function):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = function()
+                timings.append(time.perf_counter() - started)
+            return min(timings), result
+
+        matrix_seconds, (minutes, _) = best_time(lambda: pickup_matrices(drivers, modes, pickups))
+        feasible = minutes <= max_minutes
+        self.stdout.write(
+            f"{options['drivers']} chauffeurs x {options['requests']} demandes, "
+            f"{feasible.mean():.0%} de couples sous {max_minutes} min"
+        )
+        self.stdout.write(f"{'matrice':<10} {matrix_seconds * 1000:8.0f} ms")
+
+        # L'algorithme hongrois (O(n³)) n'est mesuré que jusqu'à 1000 x 1000
+        algorithms = ['auction']
+        if max(options['drivers'], options['requests']) <= 1000:
+            algorithms.insert(0, 'hungarian')
+        for algorithm in algorithms:
+            seconds, pairs = best_time(lambda: solve_assignment(minutes, feasible, algorithm))
+            total = sum(minutes[row, column] for row, column in pairs)
+            self.stdout.write(
+                f"{algorithm:<10} {seconds * 1000:8.0f} ms  {len(pairs)} affectations, "
+                f"approche totale {total:.1f} min (total avec matrice : {(matrix_seconds + seconds) * 1000:.0f} ms)"
+            )
@@ -0,0 +1,105 @@
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.db.models.functions import Coalesce, ExtractHour, ExtractMinute
+
+from routes.estimator import table_durations
+from routes.models import OptimizedRoute
+from routes.speed_profiles import (
+    BUCKET_MINUTES, bucket_label, get_speed_profiles, learn_profiles, local_time_zone, zone_indices
+)
+
+
+class Command(BaseCommand):
+    help = "Apprend les profils de vitesse par mode, zone et quart d'heure sur les routes optimisées historiques"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.SPEED_PROFILES_PATH),
+                            help='Fichier des profils (.npz)')
+        parser.add_argument('--min-samples', type=int, default=30,
+                            help='Nombre minimal de routes pour apprendre un mode')
+        parser.add_argument('--prior-samples', type=float, default=20,
+                            help="Routes fictives ramenant chaque case vers la moyenne (prudence des cases peu observées)")
+        parser.add_argument('--smoothing', type=int, default=2,
+                            help="Quarts d'heure voisins mis en commun de chaque côté")
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Afficher les profils sans les enregistrer')
+
+    def handle(self, *args, **options):
+        rows = self.load_rows()
+        if not rows:
+            self.stdout.write(self.style.WARNING('Aucune route exploitable'))
+            return
+
+        columns = list(zip(*rows))
+        modes = np.array(columns[0])
+        latitudes, longitudes, hours, minutes, distance, duration = (
+            np.array(column, dtype=np.float64) for column in columns[1:]
+        )
+
+        # Rapport durée de roulage observée / durée du tableau, attente déduite
+        travel, wait = table_durations(distance, modes)
+        observed = duration - wait
+        valid = (observed > 0) & (travel > 0)
+        names, counts = np.unique(modes[valid], return_counts=True)
+        for mode, count in zip(names, counts):
+            if count < options['min_samples']:
+                self.stdout.write(f"{mode:<12}{count:>7}  ignoré (moins de {options['min_samples']} routes)")
+                valid &= modes != mode
+        if not valid.any():
+            self.stdout.write(self.style.WARNING('Aucun mode avec assez de routes : profils non enregistrés'))
+            return
+
+        profiles = learn_profiles(
+            modes[valid],
+            zone_indices(latitudes[valid], longitudes[valid]),
+            ((hours[valid] * 60 + minutes[valid]) // BUCKET_MINUTES).astype(np.int64),
+            observed[valid] / travel[valid],
+            options['prior_samples'], options['smoothing']
+        )
+        self.report(profiles)
+        if options['dry_run']:
+            return
+
+        profiles.save(options['output'])
+        get_speed_profiles(reload=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Profils enregistrés dans {options['output']} ({len(profiles.modes)} modes, {int(valid.sum())} routes)"
+        ))
+
+    def load_rows(self):
+        """(mode, lat/lon départ, heure et minute locales du départ, distance, durée) des routes simples"""
+        tz = local_time_zone()
+        return list(
+            OptimizedRoute.objects.exclude(
+                # Anciennes valeurs de repli fixes : aucune information
+                Q(distance=45.5, duration=120, cost_estimate=5000)
+            ).filter(
+                distance__gt=0, duration__gt=0, is_fallback=False, fleet_plan__isnull=True
+            ).annotate(
+                departed_at=Coalesce('route_request__departure_time', 'route_request__created_at')
+            ).annotate(
+                hour=ExtractHour('departed_at', tzinfo=tz), minute=ExtractMinute('departed_at', tzinfo=tz)
+            ).values_list(
+                'route_request__transport_mode',
+                'route_request__departure__latitude', 'route_request__departure__longitude',
+                'hour', 'minute', 'distance', 'duration',
+            ).iterator(chunk_size=5000)
+        )
+
+    def report(self, profiles):
+        """Quart d'heure le plus lent et le plus rapide de chaque mode et zone observés"""
+        self.stdout.write(f"{'Mode':<12}{'Zone':<10}{'Routes':>8}{'Plus lent':>20}{'Plus rapide':>20}")
+        for m, mode in enumerate(profiles.modes):
+            for z, zone in enumerate(profiles.zones):
+                samples = int(profiles.samples[m, z].sum())
+                if not samples:
+                    continue
+                factors = profiles.factors[m, z]
+                slowest, fastest = int(factors.argmax()), int(factors.argmin())
+                self.stdout.write(
+                    f"{mode:<12}{zone:<10}{samples:>8}"
+                    f"{f'x{factors[slowest]:.2f} à {bucket_label(slowest)}':>20}"
+                    f"{f'x{factors[fastest]:.2f} à {bucket_label(fastest)}':>20}"
+                )
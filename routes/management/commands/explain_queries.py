@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q, Count, Avg
+from django.utils import timezone
+
+from routes.models import Location, RouteRequest, OptimizedRoute, OptimizedRoutePayload
+
+
+class Command(BaseCommand):
+    help = 'Affiche le plan EXPLAIN des requêtes exécutées par chaque vue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view',
+            action='append',
+            help='Limiter le rapport à une ou plusieurs vues (ex: --view route_history)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Exécuter réellement les requêtes (EXPLAIN ANALYZE, PostgreSQL uniquement)',
+        )
+
+    def get_view_queries(self):
+        """Requêtes représentatives de chaque vue, dans l'ordre de routes/urls.py"""
+        location = Location.objects.order_by('-created_at').first()
+        location_id = location.id if location else 0
+        user = User.objects.order_by('id').first()
+        user_id = user.id if user else 0
+        route = OptimizedRoute.objects.order_by('-created_at').first()
+        route_id = route.id if route else 0
+        thirty_days_ago = timezone.now() - timedelta(days=30)
+        routes_with_locations = OptimizedRoute.objects.for_listing()
+
+        return {
+            'index': [
+                Location.objects.all().order_by('-created_at')[:10],
+                routes_with_locations.order_by('-created_at')[:5],
+            ],
+            'route_result': [
+                OptimizedRoute.objects.select_related(
+                    'route_request__departure',
+                    'route_request__destination',
+                    'payload'
+                ).filter(id=route_id),
+            ],
+            'location_list': [
+                Location.objects.all().order_by('-created_at')[:12],
+                Location.objects.filter(
+                    Q(name__icontains='yaoun') | Q(address__icontains='yaoun')
+                ).order_by('-created_at')[:12],
+            ],
+            'delete_location': [
+                RouteRequest.objects.filter(
+                    Q(departure_id=location_id) | Q(destination_id=location_id)
+                ),
+            ],
+            'route_history': [
+                routes_with_locations.filter(
+                    route_request__user_id=user_id
+                ).order_by('-created_at')[:10],
+            ],
+            'statistics': [
+                RouteRequest.objects.values('transport_mode').annotate(
+                    count=Count('id'),
+                    avg_distance=Avg('optimizedroute__distance'),
+                    avg_cost=Avg('optimizedroute__cost_estimate')
+                ).order_by('-count'),
+                OptimizedRoute.objects.filter(created_at__gte=thirty_days_ago),
+                Location.objects.annotate(
+                    departure_count=Count('departures'),
+                    destination_count=Count('destinations')
+                ).order_by('-departure_count', '-destination_count')[:10],
+            ],
+            'compare_routes': [
+                routes_with_locations.filter(id__in=[route_id]),
+            ],
+            'export_routes': [
+                routes_with_locations.order_by('-created_at'),
+            ],
+            'export_locations': [
+                Location.objects.all().order_by('-created_at'),
+            ],
+            'search_locations': [
+                Location.objects.filter(
+                    Q(name__icontains='yaoun') | Q(address__icontains='yaoun')
+                )[:10],
+            ],
+            'get_route_details': [
+                OptimizedRoute.objects.filter(id=route_id),
+                OptimizedRoutePayload.objects.filter(route_id=route_id),
+            ],
+        }
+
+    def handle(self, *args, **options):
+        queries = self.get_view_queries()
+        selected = options['view'] or list(queries)
+
+        unknown = [name for name in selected if name not in queries]
+        if unknown:
+            raise CommandError(f"Vue(s) inconnue(s): {', '.join(unknown)}")
+
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError("--analyze n'est disponible qu'avec PostgreSQL")
+            explain_options['analyze'] = True
+
+        self.stdout.write(f"Base de données: {connection.vendor}\n")
+
+        for view_name in selected:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {view_name} =="))
+            for queryset in queries[view_name]:
+                self.stdout.write(self.style.SQL_KEYWORD(str(queryset.query)))
+                self.stdout.write(queryset.explain(**explain_options))
+                self.stdout.write('')
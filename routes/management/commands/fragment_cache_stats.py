@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+
+from routes.fragment_cache import FRAGMENTS, fragment_cache_stats, reset_fragment_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Affiche le taux de succès du cache de chaque fragment de gabarit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Remettre à zéro les compteurs')
+
+    def handle(self, *args, **options):
+        self.discover_fragments()
+
+        if options['reset']:
+            reset_fragment_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Compteurs des fragments remis à zéro'))
+            return
+
+        stats = fragment_cache_stats()
+        if not stats:
+            self.stdout.write(self.style.WARNING('Aucun fragment déclaré'))
+            return
+
+        self.stdout.write(f"{'Fragment':<24}{'Hits':>10}{'Misses':>10}{'Taux':>8}")
+        for name, values in stats.items():
+            self.stdout.write(
+                f"{name:<24}{values['hits']:>10}{values['misses']:>10}{values['hit_ratio']:>8.1%}"
+            )
+
+    def discover_fragments(self):
+        """Compile les gabarits du projet : chaque {% cached_fragment %} s'enregistre dans FRAGMENTS"""
+        for directory in settings.TEMPLATES[0]['DIRS']:
+            for path in Path(directory).rglob('*.html'):
+                get_template(str(path.relative_to(directory)))
+        return FRAGMENTS
@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from routes.warmup import HEAVY_MODULES
+
+# Script exécuté dans un interpréteur neuf : démarrage d'un worker puis
+# chargement des URLs (fait par Django à la première requête)
+STARTUP_SCRIPT = """
+import importlib, json, sys
+import django
+django.setup()
+importlib.import_module({target!r})
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+print(json.dumps([name for name in {heavy!r} if name in sys.modules]))
+"""
+
+
+class Command(BaseCommand):
+    help = "Temps d'import au démarrage d'un worker (python -X importtime) et dépendances lourdes chargées"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', default=settings.WSGI_APPLICATION.rsplit('.', 1)[0],
+                            help='Module importé au démarrage (défaut : module WSGI)')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Nombre de modules affichés (temps cumulé)')
+        parser.add_argument('--fail-on-heavy', action='store_true',
+                            help='Code de sortie 1 si une dépendance lourde est importée au démarrage')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'transport_optimizer.settings')}
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             STARTUP_SCRIPT.format(target=options['target'], heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR
+        )
+        if process.returncode != 0:
+            raise CommandError(f"Échec de l'import de {options['target']}:\n{process.stderr[-2000:]}")
+
+        timings = self.parse(process.stderr)
+        total = sum(cumulative for name, _, cumulative, depth in timings if depth == 0)
+        self.stdout.write(f"Démarrage ({options['target']}) : {total / 1e6:.2f} s, {len(timings)} modules")
+        self.stdout.write(f"{'Cumulé (ms)':>12}{'Propre (ms)':>13}  Module")
+        for name, own, cumulative, depth in sorted(timings, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f"{cumulative / 1000:>12.1f}{own / 1000:>13.1f}  {'  ' * depth}{name}")
+
+        heavy = json.loads(process.stdout.strip().splitlines()[-1])
+        if heavy:
+            message = f"Dépendances lourdes importées au démarrage : {', '.join(heavy)}"
+            if options['fail_on_heavy']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Aucune dépendance lourde au démarrage ({', '.join(HEAVY_MODULES)} chargées à la demande)"
+            ))
+
+    def parse(self, stderr):
+        """[(module, µs propres, µs cumulés, profondeur)] depuis la sortie de -X importtime"""
+        timings = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|', 2)
+            depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+            timings.append((name.strip(), int(own), int(cumulative), depth))
+        return timings
@@ -0,0 +1,169 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+
+from routes.geo import geohash_cells_around, haversine_km
+from routes.models import LOCATION_GEOHASH_PRECISION, ArchivedRoute, Location, RouteRequest
+from routes.signals import VERSION_NAMESPACES, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Fusionne les lieux en double (même adresse normalisée à proximité ou coordonnées très proches)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--radius', type=float, default=None,
+                            help='Rayon de proximité en mètres (défaut : LOCATION_DUPLICATE_RADIUS_M, 0 : adresse seule)')
+        parser.add_argument('--address-radius', type=float, default=None,
+                            help='Rayon des adresses identiques en mètres (défaut : LOCATION_DUPLICATE_ADDRESS_RADIUS_M)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Afficher les fusions sans modifier la base')
+
+    def handle(self, *args, **options):
+        radius_m = options['radius']
+        if radius_m is None:
+            radius_m = getattr(settings, 'LOCATION_DUPLICATE_RADIUS_M', 25)
+        address_radius_m = options['address_radius']
+        if address_radius_m is None:
+            address_radius_m = getattr(settings, 'LOCATION_DUPLICATE_ADDRESS_RADIUS_M', 1000)
+
+        rows = list(Location.objects.order_by('id').values_list(
+            'id', 'normalized_address', 'geohash', 'latitude', 'longitude'
+        ).iterator(chunk_size=10000))
+        canonical = self.find_duplicates(rows, radius_m / 1000, address_radius_m / 1000)
+        if not canonical:
+            self.stdout.write(self.style.SUCCESS('Aucun doublon'))
+            return
+
+        names = dict(Location.objects.filter(
+            id__in=set(canonical) | set(canonical.values())
+        ).values_list('id', 'name'))
+        kept = self.self_loops(canonical, options['batch_size'])
+        for duplicate_id in sorted(kept):
+            canonical_id = canonical.pop(duplicate_id)
+            self.stdout.write(self.style.WARNING(
+                f"{names[duplicate_id]} (#{duplicate_id}) conservé : sa fusion dans "
+                f"{names[canonical_id]} (#{canonical_id}) donnerait un trajet dont le départ est la destination"
+            ))
+        if not canonical:
+            self.stdout.write(self.style.SUCCESS('Aucun doublon à fusionner'))
+            return
+
+        groups = defaultdict(list)
+        for duplicate_id, canonical_id in canonical.items():
+            groups[canonical_id].append(duplicate_id)
+        for canonical_id, duplicate_ids in sorted(groups.items()):
+            self.stdout.write(
+                f"{names[canonical_id]} (#{canonical_id}) <- "
+                + ', '.join(f"{names[i]} (#{i})" for i in sorted(duplicate_ids))
+            )
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(canonical)} doublons en {len(groups)} groupes (simulation)")
+            return
+
+        remapped = self.merge(canonical, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(canonical)} lieux fusionnés en {len(groups)} groupes, "
+            f"{remapped} références mises à jour"
+        ))
+
+    def find_duplicates(self, rows, radius_km, address_radius_km):
+        """{id du doublon: id canonique} ; le lieu canonique est le plus ancien de son groupe
+
+        Union-find sur les deux critères : adresse normalisée identique à moins de
+        address_radius_km, ou distance inférieure à radius_km (recherche limitée
+        aux cellules geohash voisines).
+        """
+        parent = {row[0]: row[0] for row in rows}
+
+        def find(location_id):
+            while parent[location_id] != location_id:
+                parent[location_id] = parent[parent[location_id]]
+                location_id = parent[location_id]
+            return location_id
+
+        def union(first, second):
+            first, second = find(first), find(second)
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+
+        by_address = defaultdict(list)
+        by_cell = defaultdict(list)
+        for location_id, normalized, geohash, latitude, longitude in rows:
+            if normalized:
+                for other_id, other_lat, other_lon in by_address[normalized]:
+                    if haversine_km(latitude, longitude, other_lat, other_lon) <= address_radius_km:
+                        union(other_id, location_id)
+                by_address[normalized].append((location_id, latitude, longitude))
+            if radius_km > 0:
+                for cell in geohash_cells_around(latitude, longitude, radius_km, LOCATION_GEOHASH_PRECISION):
+                    for other_id, other_lat, other_lon in by_cell.get(cell, ()):
+                        if haversine_km(latitude, longitude, other_lat, other_lon) <= radius_km:
+                            union(other_id, location_id)
+                by_cell[geohash].append((location_id, latitude, longitude))
+
+        return {location_id: find(location_id) for location_id in parent if find(location_id) != location_id}
+
+    def self_loops(self, canonical, batch_size):
+        """Doublons à conserver : leur fusion ferait d'un trajet (demande ou archive) un aller vers son départ
+
+        Conserver un doublon peut en révéler un autre (A -> B avec A et B
+        fusionnés vers C) : on recommence jusqu'à stabilité.
+        """
+        duplicate_ids = sorted(canonical)
+        pairs = set()
+        for start in range(0, len(duplicate_ids), batch_size):
+            batch = duplicate_ids[start:start + batch_size]
+            for model in (RouteRequest, ArchivedRoute):
+                pairs.update(model._base_manager.filter(
+                    models.Q(departure_id__in=batch) | models.Q(destination_id__in=batch)
+                ).values_list('departure_id', 'destination_id').distinct())
+
+        kept = set()
+
+        def target(location_id):
+            return location_id if location_id in kept else canonical.get(location_id, location_id)
+
+        changed = True
+        while changed:
+            changed = False
+            for departure_id, destination_id in sorted(pairs):
+                if departure_id != destination_id and target(departure_id) == target(destination_id):
+                    # L'une des deux extrémités au moins est encore fusionnée
+                    merged = destination_id if target(destination_id) != destination_id else departure_id
+                    kept.add(merged)
+                    changed = True
+        return kept
+
+    @transaction.atomic
+    def merge(self, canonical, batch_size):
+        """Reporte toutes les clés étrangères vers les lieux canoniques, puis supprime les doublons"""
+        relations = [
+            relation for relation in Location._meta.related_objects
+            if relation.one_to_many or relation.one_to_one
+        ]
+        duplicate_ids = sorted(canonical)
+        remapped = 0
+        for start in range(0, len(duplicate_ids), batch_size):
+            batch = duplicate_ids[start:start + batch_size]
+            for relation in relations:
+                column = relation.field.attname
+                # Une requête UPDATE par lot : CASE doublon -> lieu canonique
+                remapped += relation.related_model._base_manager.filter(**{f"{column}__in": batch}).update(**{
+                    column: Case(
+                        *[When(**{column: duplicate_id}, then=Value(canonical[duplicate_id])) for duplicate_id in batch],
+                        output_field=models.BigIntegerField()
+                    )
+                })
+            Location.objects.filter(id__in=batch).delete()
+
+        # update() n'envoie pas de signal : invalidation explicite des caches
+        for relation in relations:
+            namespace = VERSION_NAMESPACES.get(relation.related_model)
+            if namespace:
+                bump_version(namespace)
+        return remapped
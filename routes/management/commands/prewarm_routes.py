@@ -0,0 +1,146 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from routes.models import RouteRequest
+from routes.services import RouteOptimizer, RateLimiter, route_cache_stats, reset_route_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Pré-calcule les trajets les plus demandés avant expiration de leur cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=200,
+                            help='Nombre de trajets (départ, destination, mode) à pré-chauffer')
+        parser.add_argument('--days', type=int, default=30,
+                            help="Fenêtre d'historique analysée (jours)")
+        parser.add_argument('--margin', type=int, default=3600,
+                            help='Rafraîchir les entrées expirant dans moins de N secondes')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Nombre maximal d'appels IA simultanés")
+        parser.add_argument('--rate', type=float, default=2.0,
+                            help="Nombre maximal d'appels IA par seconde")
+        parser.add_argument('--ahead', type=int, default=0,
+                            help="Pré-chauffer pour un départ dans N minutes (cache par quart d'heure)")
+        parser.add_argument('--loop', type=int, default=0,
+                            help='Relancer toutes les N secondes (0 = une seule passe)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Lister les trajets à rafraîchir sans appeler l\'IA')
+        parser.add_argument('--stats', action='store_true',
+                            help='Afficher uniquement le taux de succès du cache')
+        parser.add_argument('--reset-stats', action='store_true',
+                            help='Remettre à zéro les compteurs du cache')
+
+    def handle(self, *args, **options):
+        if options['reset_stats']:
+            reset_route_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Compteurs du cache remis à zéro'))
+
+        if options['stats']:
+            self.report_stats()
+            return
+
+        while True:
+            self.prewarm(options)
+            self.report_stats()
+            if not options['loop']:
+                break
+            self.stdout.write(f"Prochaine passe dans {options['loop']} s")
+            time.sleep(options['loop'])
+
+    def get_popular_pairs(self, top, days):
+        """Trajets les plus demandés sur la période, avec leur part du trafic"""
+        since = timezone.now() - timedelta(days=days)
+        requests = RouteRequest.objects.filter(created_at__gte=since)
+        total = requests.count()
+        pairs = list(
+            requests.values(
+                'departure__address', 'destination__address', 'transport_mode',
+                'departure__latitude', 'departure__longitude',
+                'destination__latitude', 'destination__longitude',
+            ).annotate(
+                requests_count=Count('id')
+            ).order_by('-requests_count')[:top]
+        )
+        return pairs, total
+
+    def prewarm(self, options):
+        pairs, total = self.get_popular_pairs(options['top'], options['days'])
+        covered = sum(pair['requests_count'] for pair in pairs)
+        coverage = covered / total if total else 0.0
+        self.stdout.write(
+            f"{len(pairs)} trajets populaires couvrent {covered}/{total} demandes "
+            f"({coverage:.1%}) sur {options['days']} jours"
+        )
+
+        optimizer = RouteOptimizer()
+        # Les entrées du cache sont propres à un quart d'heure de départ
+        departure_time = timezone.now() + timedelta(minutes=options['ahead'])
+        to_refresh = []
+        for pair in pairs:
+            time_left = optimizer.cache_time_left(
+                pair['departure__address'], pair['destination__address'], pair['transport_mode'],
+                departure_time
+            )
+            if time_left is None or time_left < options['margin']:
+                to_refresh.append(pair)
+
+        self.stdout.write(f"{len(to_refresh)} trajets à rafraîchir, {len(pairs) - len(to_refresh)} encore frais")
+        if options['dry_run']:
+            for pair in to_refresh:
+                self.stdout.write(
+                    f"  {pair['departure__address']} -> {pair['destination__address']} "
+                    f"({pair['transport_mode']}, {pair['requests_count']} demandes)"
+                )
+            return
+
+        rate_limiter = RateLimiter(options['rate'])
+        refreshed = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as executor:
+            futures = {
+                executor.submit(
+                    optimizer.refresh_route,
+                    pair['departure__address'],
+                    pair['destination__address'],
+                    pair['transport_mode'],
+                    rate_limiter,
+                    (pair['departure__latitude'], pair['departure__longitude']),
+                    (pair['destination__latitude'], pair['destination__longitude']),
+                    departure_time
+                ): pair
+                for pair in to_refresh
+            }
+            for future in as_completed(futures):
+                pair = futures[future]
+                try:
+                    result = future.result()
+                    if result.get('ai_analysis', {}).get('is_fallback'):
+                        failed += 1
+                    else:
+                        refreshed += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(
+                        f"Échec pour {pair['departure__address']} -> {pair['destination__address']}: {e}"
+                    )
+                done = refreshed + failed
+                if done % 10 == 0 or done == len(futures):
+                    self.stdout.write(f"  {done}/{len(futures)} traités")
+
+        self.stdout.write(self.style.SUCCESS(f"{refreshed} trajets pré-chauffés, {failed} échecs"))
+
+    def report_stats(self):
+        stats = route_cache_stats()
+        self.stdout.write(
+            f"Cache des routes: {stats['hits']} hits ({stats['warm_hits']} pré-chauffés), "
+            f"{stats['misses']} misses, taux de succès {stats['hit_ratio']:.1%}, "
+            f"dont pré-chauffage {stats['warm_hit_ratio']:.1%}"
+        )
+        self.stdout.write(
+            f"Réutilisations: {stats['reverse_hits']} trajets inverses, "
+            f"{stats['nearby_hits']} trajets voisins (geohash)"
+        )
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from routes.models import OptimizedRoute
+from routes.reoptimization import reoptimizable, reoptimize_routes
+
+
+class Command(BaseCommand):
+    help = 'Recalcule par lots les routes optimisées sélectionnées (pool de workers, reprise après interruption)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=int, nargs='+',
+                            help='Identifiants des routes à recalculer')
+        parser.add_argument('--stale-days', type=int, default=None,
+                            help='Seulement les routes calculées il y a plus de N jours')
+        parser.add_argument('--transport-mode', action='append',
+                            help='Limiter à ce mode de transport (répétable)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Routes enregistrées par lot (défaut : ROUTE_REOPTIMIZE_BATCH_SIZE)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Appels IA simultanés (défaut : ROUTE_REOPTIMIZE_CONCURRENCY)")
+        parser.add_argument('--rate', type=float, default=None,
+                            help="Appels IA par seconde (défaut : ROUTE_REOPTIMIZE_RATE)")
+        parser.add_argument('--after-id', type=int, default=0,
+                            help='Reprendre après cette route (identifiant)')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Fichier de reprise (défaut : ROUTE_REOPTIMIZE_CHECKPOINT)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Reprendre la passe interrompue enregistrée dans le fichier de reprise')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Compter les routes à recalculer sans appeler l\'IA')
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options['checkpoint'] or getattr(
+            settings, 'ROUTE_REOPTIMIZE_CHECKPOINT', Path(settings.BASE_DIR) / 'reoptimize_checkpoint.json'
+        ))
+
+        if options['resume']:
+            if not checkpoint.exists():
+                raise CommandError(f"Aucune passe interrompue ({checkpoint})")
+            state = json.loads(checkpoint.read_text(encoding='utf-8'))
+            self.stdout.write(
+                f"Reprise après la route {state['last_id']} ({state['processed']} routes déjà traitées)"
+            )
+        else:
+            # Date limite figée au lancement : une reprise traite la même sélection
+            stale_before = None
+            if options['stale_days'] is not None:
+                stale_before = (timezone.now() - timedelta(days=options['stale_days'])).isoformat()
+            state = {
+                'filters': {
+                    'ids': options['ids'],
+                    'transport_modes': options['transport_mode'],
+                    'stale_before': stale_before,
+                },
+                'last_id': options['after_id'],
+                'processed': 0,
+                'updated': 0,
+                'failed': 0,
+            }
+
+        queryset = self.get_queryset(state['filters'])
+        if options['dry_run']:
+            remaining = queryset.filter(id__gt=state['last_id']).count()
+            self.stdout.write(f"{remaining} routes à recalculer")
+            return
+
+        started = time.monotonic()
+        done = {key: state[key] for key in ('processed', 'updated', 'failed')}
+        for progress in reoptimize_routes(
+            queryset, options['batch_size'], options['concurrency'], options['rate'], after_id=state['last_id']
+        ):
+            state['last_id'] = progress['last_id']
+            for key in done:
+                state[key] = done[key] + progress[key]
+            self.save_checkpoint(checkpoint, state)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  {state['processed']} traitées, {state['updated']} mises à jour, {state['failed']} échecs "
+                f"(route {state['last_id']}, {progress['processed'] / elapsed:.1f} routes/s)"
+            )
+
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"{state['updated']} routes recalculées, {state['failed']} échecs "
+            f"en {time.monotonic() - started:.1f} s"
+        ))
+
+    def get_queryset(self, filters):
+        stale_before = filters['stale_before'] and datetime.fromisoformat(filters['stale_before'])
+        queryset = reoptimizable(OptimizedRoute.objects.all(), stale_before)
+        if filters['ids']:
+            queryset = queryset.filter(id__in=filters['ids'])
+        if filters['transport_modes']:
+            queryset = queryset.filter(route_request__transport_mode__in=filters['transport_modes'])
+        return queryset
+
+    def save_checkpoint(self, path, state):
+        """Écriture atomique : un arrêt brutal laisse l'ancien ou le nouvel état, jamais un fichier tronqué"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + '.tmp')
+        temporary.write_text(json.dumps(state), encoding='utf-8')
+        os.replace(temporary, path)
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from routes.models import ArchivedRoute
+from routes.retention import restore_routes
+
+
+class Command(BaseCommand):
+    help = "Restaure l'historique archivé d'un utilisateur dans les tables principales"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="Nom d'utilisateur")
+        parser.add_argument('--since', default=None,
+                            help='Restaurer seulement les demandes depuis cette date (AAAA-MM-JJ)')
+        parser.add_argument('--retain-days', type=int, default=None,
+                            help='Jours sans réarchivage (défaut : ROUTE_RESTORE_RETAIN_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu: {options['username']}")
+
+        queryset = ArchivedRoute.objects.filter(user=user)
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('Date invalide, format attendu : AAAA-MM-JJ')
+            queryset = queryset.filter(requested_at__gte=timezone.make_aware(since))
+
+        restored = restore_routes(queryset, options['retain_days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{restored} demandes restaurées pour {user.username}"))
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Coalesce, ExtractHour, ExtractWeekDay
+
+from routes.analytics import COLUMNS, SnapshotWriter, snapshot_root
+from routes.models import ArchivedRoute, RouteRequest
+from routes.speed_profiles import local_time_zone
+
+# Champs lus en base, dans l'ordre de COLUMNS
+FIELDS = (
+    'id', 'optimizedroute__id', 'user_id', 'transport_mode', 'created_at', 'hour', 'weekday',
+    'departure_id', 'destination_id',
+    'departure__latitude', 'departure__longitude',
+    'destination__latitude', 'destination__longitude',
+    'optimizedroute__distance', 'optimizedroute__duration', 'optimizedroute__cost_estimate',
+)
+
+# Mêmes colonnes pour les demandes archivées (routes.retention)
+ARCHIVE_FIELDS = (
+    'original_request_id', 'original_route_id', 'user_id', 'transport_mode', 'requested_at', 'hour', 'weekday',
+    'departure_id', 'destination_id',
+    'departure__latitude', 'departure__longitude',
+    'destination__latitude', 'destination__longitude',
+    'distance', 'duration', 'cost_estimate',
+)
+
+
+class Command(BaseCommand):
+    help = "Exporte les colonnes analytiques des demandes et routes en fichiers NumPy (mmap)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='Dossier des instantanés (défaut : ANALYTICS_SNAPSHOT_DIR)')
+        parser.add_argument('--chunk-size', type=int, default=20000,
+                            help='Lignes lues par requête')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='Nombre d\'instantanés conservés')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # Bornée à l'id maximal au départ : les insertions concurrentes n'entrent pas
+        max_id = RouteRequest.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        requests = RouteRequest.objects.filter(id__lte=max_id)
+        max_archive_id = ArchivedRoute.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        archived = ArchivedRoute.objects.filter(id__lte=max_archive_id)
+        modes = sorted(
+            {code for code, _ in RouteRequest.TRANSPORT_CHOICES}
+            | set(requests.values_list('transport_mode', flat=True).distinct().order_by())
+            | set(archived.values_list('transport_mode', flat=True).distinct().order_by())
+        )
+        mode_codes = {mode: code for code, mode in enumerate(modes)}
+        writer = SnapshotWriter(requests.count() + archived.count(), modes, root=options['output'] or snapshot_root())
+
+        # Heure et jour du trajet (départ prévu, sinon demande) dans le fuseau des trajets
+        zone = local_time_zone()
+        request_moment = Coalesce('departure_time', 'created_at')
+        archive_moment = Coalesce('departure_time', 'requested_at')
+
+        # Un mode après l'autre : chaque mode occupe une tranche contiguë des colonnes
+        for mode in modes:
+            sources = (
+                requests.filter(transport_mode=mode).order_by('id').annotate(
+                    hour=ExtractHour(request_moment, tzinfo=zone),
+                    weekday=ExtractWeekDay(request_moment, tzinfo=zone),
+                ).values_list(*FIELDS),
+                archived.filter(transport_mode=mode).order_by('id').annotate(
+                    hour=ExtractHour(archive_moment, tzinfo=zone),
+                    weekday=ExtractWeekDay(archive_moment, tzinfo=zone),
+                ).values_list(*ARCHIVE_FIELDS),
+            )
+            for rows in sources:
+                chunk = []
+                for row in rows.iterator(chunk_size=options['chunk_size']):
+                    chunk.append(row)
+                    if len(chunk) >= options['chunk_size']:
+                        writer.append(self.to_columns(chunk, mode_codes))
+                        chunk = []
+                if chunk:
+                    writer.append(self.to_columns(chunk, mode_codes))
+
+        writer.publish(keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Instantané {writer.name} : {writer.offset} lignes en {time.monotonic() - started:.1f} s"
+        ))
+
+    def to_columns(self, chunk, mode_codes):
+        """Lignes (tuples) -> tableaux typés ; valeurs manquantes à -1 ou NaN"""
+        columns = dict(zip(COLUMNS, zip(*chunk)))
+        columns['mode'] = [mode_codes[mode] for mode in columns['mode']]
+        columns['created_at'] = [int(value.timestamp()) for value in columns['created_at']]
+        for name in ('route_id', 'user_id'):
+            columns[name] = [-1 if value is None else value for value in columns[name]]
+        return {
+            name: np.array(
+                [np.nan if value is None else value for value in columns[name]]
+                if np.issubdtype(dtype, np.floating) else columns[name],
+                dtype=dtype
+            )
+            for name, dtype in COLUMNS.items()
+        }
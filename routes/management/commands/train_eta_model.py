@@ -0,0 +1,124 @@
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.db.models.functions import Coalesce, ExtractHour
+from django.utils import timezone
+
+from routes.estimator import estimate
+from routes.eta_model import EtaModel, TARGETS, build_features, fit_ridge, get_eta_model
+from routes.models import OptimizedRoute
+from routes.speed_profiles import local_time_zone
+
+
+class Command(BaseCommand):
+    help = 'Entraîne le modèle ETA/coût par mode sur les routes optimisées historiques'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.ETA_MODEL_PATH),
+                            help='Fichier du modèle (.npz)')
+        parser.add_argument('--holdout', type=float, default=0.2,
+                            help="Part des routes réservée à l'évaluation")
+        parser.add_argument('--min-samples', type=int, default=30,
+                            help='Nombre minimal de routes pour apprendre un mode')
+        parser.add_argument('--ridge', type=float, default=1.0,
+                            help='Régularisation des moindres carrés')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Évaluer sans enregistrer le modèle")
+
+    def handle(self, *args, **options):
+        rows = self.load_rows()
+        if not rows:
+            self.stdout.write(self.style.WARNING('Aucune route exploitable'))
+            return
+
+        columns = list(zip(*rows))
+        modes = np.array(columns[0])
+        coords = np.array(columns[1:5], dtype=np.float64)
+        hours = np.array(columns[5], dtype=np.float64)
+        targets = np.array(columns[6:9], dtype=np.float64).T
+        features = build_features(*coords, hours)
+
+        rng = np.random.default_rng(options['seed'])
+        is_test = rng.random(len(rows)) < options['holdout']
+
+        coefficients = {}
+        samples = {}
+        self.stdout.write(f"{len(rows)} routes, {int(is_test.sum())} réservées à l'évaluation")
+        self.stdout.write(f"{'Mode':<12}{'Appr.':>7}{'Éval.':>7}  "
+                          + ''.join(f"{'MAE ' + target:>22}" for target in TARGETS)
+                          + f"{'MAPE durée':>12}{'MAPE coût':>11}")
+
+        for mode in sorted(set(modes.tolist())):
+            mode_mask = modes == mode
+            train = mode_mask & ~is_test
+            test = mode_mask & is_test
+            if train.sum() < options['min_samples']:
+                self.stdout.write(f"{mode:<12}{int(train.sum()):>7}  ignoré (moins de {options['min_samples']} routes)")
+                continue
+
+            coef = fit_ridge(features[train], targets[train], options['ridge'])
+            if test.any():
+                self.report(mode, int(train.sum()), features[test], targets[test], coords[:, test], coef)
+
+            # Le modèle enregistré est ré-entraîné sur toutes les routes du mode
+            coefficients[mode] = fit_ridge(features[mode_mask], targets[mode_mask], options['ridge'])
+            samples[mode] = int(mode_mask.sum())
+
+        if not coefficients:
+            self.stdout.write(self.style.WARNING('Aucun mode avec assez de routes : modèle non enregistré'))
+            return
+        if options['dry_run']:
+            return
+
+        model = EtaModel(coefficients, {'samples': samples, 'trained_at': timezone.now().isoformat()})
+        model.save(options['output'])
+        get_eta_model(reload=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Modèle enregistré dans {options['output']} ({len(coefficients)} modes)"
+        ))
+
+    def load_rows(self):
+        """(mode, lat/lon départ, lat/lon arrivée, heure locale du départ, distance, durée, coût) des routes simples
+
+        Heure de départ demandée, sinon heure de la demande : celle que reçoit
+        le modèle à la prévision (local_hour). Les tournées de flotte
+        (dépôt -> arrêts -> dépôt) ne sont pas des trajets départ -> destination :
+        exclues.
+        """
+        return list(
+            OptimizedRoute.objects.exclude(
+                # Anciennes valeurs de repli fixes : aucune information
+                Q(distance=45.5, duration=120, cost_estimate=5000)
+            ).filter(
+                distance__gt=0, duration__gt=0, is_fallback=False, fleet_plan__isnull=True
+            ).annotate(
+                departed_at=Coalesce('route_request__departure_time', 'route_request__created_at')
+            ).annotate(
+                hour=ExtractHour('departed_at', tzinfo=local_time_zone())
+            ).values_list(
+                'route_request__transport_mode',
+                'route_request__departure__latitude', 'route_request__departure__longitude',
+                'route_request__destination__latitude', 'route_request__destination__longitude',
+                'hour', 'distance', 'duration', 'cost_estimate',
+            ).iterator(chunk_size=5000)
+        )
+
+    def report(self, mode, n_train, features, targets, coords, coef):
+        """Erreurs sur les routes réservées, comparées au tableau des tarifs"""
+        predictions = np.maximum(features @ coef, 0.0)
+        baseline = estimate(*coords, mode)
+        baseline = np.column_stack([baseline['distance_km'], baseline['duration_min'], baseline['cost_fcfa']])
+
+        mae = np.abs(predictions - targets).mean(axis=0)
+        baseline_mae = np.abs(baseline - targets).mean(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mape = np.nanmean(np.where(targets > 0, np.abs(predictions - targets) / targets, np.nan), axis=0)
+
+        cells = ''.join(
+            f"{f'{mae[i]:.1f} (tableau {baseline_mae[i]:.1f})':>22}" for i in range(len(TARGETS))
+        )
+        self.stdout.write(
+            f"{mode:<12}{n_train:>7}{len(targets):>7}  {cells}{mape[1] * 100:>11.1f}%{mape[2] * 100:>10.1f}%"
+        )
@@ -0,0 +1,186 @@
+# folium (~0,5 s d'import) n'est chargé qu'au premier rendu d'une carte, pas
+# au démarrage des workers (voir routes.warmup pour le préchargement)
+from . import polyline
+
+
+def create_main_map(locations):
+    """Crée la carte principale avec tous les lieux"""
+    import folium
+    
+    # Centre par défaut: Yaoundé, Cameroun
+    center_lat, center_lon = 3.8480, 11.5021
+    
+    if locations:
+        # Centrer sur la moyenne des coordonnées
+        center_lat = sum(loc.latitude for loc in locations) / len(locations)
+        center_lon = sum(loc.longitude for loc in locations) / len(locations)
+    
+    # Création de la carte
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=10,
+        tiles='OpenStreetMap'
+    )
+    
+    # Ajout des marqueurs pour chaque lieu
+    for location in locations:
+        folium.Marker(
+            [location.latitude, location.longitude],
+            popup=f"""
+                <b>{location.name}</b><br>
+                {location.address}<br>
+                <small>Lat: {location.latitude}, Lon: {location.longitude}</small>
+            """,
+            tooltip=location.name,
+            icon=folium.Icon(color='blue', icon='info-sign')
+        ).add_to(m)
+    
+    # Ajout du contrôle de couches
+    folium.LayerControl().add_to(m)
+    
+    return m._repr_html_()
+
+def create_route_map(optimized_route):
+    """Crée une carte pour un itinéraire spécifique"""
+    import folium
+    
+    departure = optimized_route.route_request.departure
+    destination = optimized_route.route_request.destination
+    
+    # Centre entre départ et destination
+    center_lat = (departure.latitude + destination.latitude) / 2
+    center_lon = (departure.longitude + destination.longitude) / 2
+    
+    # Création de la carte
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=12
+    )
+    
+    # Marqueur de départ
+    folium.Marker(
+        [departure.latitude, departure.longitude],
+        popup=f"<b>Départ:</b> {departure.name}",
+        tooltip="Point de départ",
+        icon=folium.Icon(color='green', icon='play')
+    ).add_to(m)
+    
+    # Marqueur de destination
+    folium.Marker(
+        [destination.latitude, destination.longitude],
+        popup=f"<b>Destination:</b> {destination.name}",
+        tooltip="Point d'arrivée",
+        icon=folium.Icon(color='red', icon='stop')
+    ).add_to(m)
+    
+    # Tracé de l'itinéraire, sinon ligne directe. La carte montre l'itinéraire
+    # entier : le niveau simplifié le plus détaillé suffit (quelques centaines de points)
+    points = [
+        [departure.latitude, departure.longitude],
+        [destination.latitude, destination.longitude]
+    ]
+    _, geometry = optimized_route.geometry_for_zoom(max(polyline.GEOMETRY_ZOOM_LEVELS))
+    if geometry:
+        points = [list(point) for point in polyline.decode(geometry)]
+    folium.PolyLine(
+        locations=points,
+        weight=4,
+        color='blue',
+        opacity=0.8
+    ).add_to(m)
+    
+    # Ajustement du zoom pour inclure tous les points
+    latitudes = [point[0] for point in points]
+    longitudes = [point[1] for point in points]
+    m.fit_bounds([
+        [min(latitudes), min(longitudes)],
+        [max(latitudes), max(longitudes)]
+    ])
+    
+    return m._repr_html_()
+
+# Couleurs des tournées (folium.Icon n'accepte que ces noms)
+FLEET_COLORS = [
+    'blue', 'red', 'green', 'purple', 'orange', 'darkred', 'cadetblue',
+    'darkgreen', 'darkblue', 'pink', 'darkpurple', 'lightred', 'gray', 'black',
+]
+
+def create_fleet_map(plan, stops):
+    """Crée la carte d'un plan de flotte : une couleur par véhicule"""
+    import folium
+    
+    depot = plan.depot
+    m = folium.Map(
+        location=[depot.latitude, depot.longitude],
+        zoom_start=12
+    )
+    
+    # Marqueur du dépôt
+    folium.Marker(
+        [depot.latitude, depot.longitude],
+        popup=f"<b>Dépôt:</b> {depot.name}",
+        tooltip="Dépôt",
+        icon=folium.Icon(color='black', icon='home')
+    ).add_to(m)
+    
+    # Arrêts triés par véhicule puis par rang (ordre du modèle)
+    tours = {}
+    points = [[depot.latitude, depot.longitude]]
+    for stop in stops:
+        location = stop.location
+        points.append([location.latitude, location.longitude])
+        if stop.vehicle is None:
+            color, label = 'lightgray', "Non desservi"
+        else:
+            color = FLEET_COLORS[stop.vehicle % len(FLEET_COLORS)]
+            label = f"Véhicule {stop.vehicle + 1}, arrêt {stop.sequence + 1}"
+            tours.setdefault(stop.vehicle, []).append([location.latitude, location.longitude])
+        folium.CircleMarker(
+            [location.latitude, location.longitude],
+            radius=6,
+            color=color,
+            fill=True,
+            fill_opacity=0.9,
+            popup=f"<b>{location.name}</b><br>{label}",
+            tooltip=location.name
+        ).add_to(m)
+    
+    # Tournées : dépôt -> arrêts -> dépôt
+    for vehicle, tour in tours.items():
+        folium.PolyLine(
+            locations=[points[0]] + tour + [points[0]],
+            weight=4,
+            color=FLEET_COLORS[vehicle % len(FLEET_COLORS)],
+            opacity=0.8,
+            tooltip=f"Véhicule {vehicle + 1}"
+        ).add_to(m)
+    
+    # Ajustement du zoom pour inclure tous les points
+    latitudes = [point[0] for point in points]
+    longitudes = [point[1] for point in points]
+    m.fit_bounds([
+        [min(latitudes), min(longitudes)],
+        [max(latitudes), max(longitudes)]
+    ])
+    
+    return m._repr_html_()
+
+def create_default_map():
+    """Crée une carte par défaut centrée sur le Cameroun"""
+    import folium
+    
+    m = folium.Map(
+        location=[3.8480, 11.5021],  # Yaoundé
+        zoom_start=7,
+        tiles='OpenStreetMap'
+    )
+    
+    # Marqueur pour Yaoundé
+    folium.Marker(
+        [3.8480, 11.5021],
+        popup="Yaoundé - Capitale du Cameroun",
+        tooltip="Yaoundé",
+        icon=folium.Icon(color='red', icon='star')
+    ).add_to(m)
+    
+    return m._repr_html_()
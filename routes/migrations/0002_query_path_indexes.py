@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(fields=["-created_at"], name="location_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="optimizedroute",
+            index=models.Index(fields=["-created_at"], name="optroute_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="routerequest",
+            index=models.Index(
+                fields=["user", "-created_at"], name="routereq_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="routerequest",
+            index=models.Index(
+                fields=["departure", "destination", "transport_mode"],
+                name="routereq_pair_mode_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="routerequest",
+            index=models.Index(
+                fields=["transport_mode", "-created_at"],
+                name="routereq_mode_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,102 @@
+import json
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def encode(route_data):
+    raw = json.dumps(route_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    min_size = getattr(settings, "ROUTE_DATA_COMPRESSION_MIN_SIZE", 512)
+    if getattr(settings, "ROUTE_DATA_COMPRESSION", True) and len(raw) >= min_size:
+        return {"encoding": "zlib", "data": zlib.compress(raw), "size": len(raw)}
+    return {"encoding": "json", "data": raw, "size": len(raw)}
+
+
+def copy_route_data_to_payload(apps, schema_editor):
+    OptimizedRoute = apps.get_model("routes", "OptimizedRoute")
+    OptimizedRoutePayload = apps.get_model("routes", "OptimizedRoutePayload")
+
+    batch = []
+    rows = OptimizedRoute.objects.order_by("id").values_list("id", "route_data")
+    for route_id, route_data in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(OptimizedRoutePayload(route_id=route_id, **encode(route_data or {})))
+        if len(batch) >= BATCH_SIZE:
+            OptimizedRoutePayload.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        OptimizedRoutePayload.objects.bulk_create(batch)
+
+
+def copy_payload_to_route_data(apps, schema_editor):
+    OptimizedRoute = apps.get_model("routes", "OptimizedRoute")
+    OptimizedRoutePayload = apps.get_model("routes", "OptimizedRoutePayload")
+
+    payloads = OptimizedRoutePayload.objects.order_by("route_id")
+    for payload in payloads.iterator(chunk_size=BATCH_SIZE):
+        raw = bytes(payload.data)
+        if payload.encoding == "zlib":
+            raw = zlib.decompress(raw)
+        OptimizedRoute.objects.filter(id=payload.route_id).update(
+            route_data=json.loads(raw.decode("utf-8"))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0002_query_path_indexes"),
+    ]
+
+    operations = [
+        # Nullable le temps de la migration pour rester réversible
+        migrations.AlterField(
+            model_name="optimizedroute",
+            name="route_data",
+            field=models.JSONField(null=True, verbose_name="Données de route"),
+        ),
+        migrations.CreateModel(
+            name="OptimizedRoutePayload",
+            fields=[
+                (
+                    "route",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="payload",
+                        serialize=False,
+                        to="routes.optimizedroute",
+                        verbose_name="Route optimisée",
+                    ),
+                ),
+                (
+                    "encoding",
+                    models.CharField(
+                        choices=[("json", "JSON"), ("zlib", "JSON compressé (zlib)")],
+                        default="json",
+                        max_length=10,
+                        verbose_name="Encodage",
+                    ),
+                ),
+                ("data", models.BinaryField(verbose_name="Données")),
+                (
+                    "size",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Taille JSON (octets)"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Données de route",
+                "verbose_name_plural": "Données de routes",
+            },
+        ),
+        migrations.RunPython(copy_route_data_to_payload, copy_payload_to_route_data),
+        migrations.RemoveField(
+            model_name="optimizedroute",
+            name="route_data",
+        ),
+    ]
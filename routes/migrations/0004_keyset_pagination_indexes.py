@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0003_split_route_payload"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="location",
+            name="location_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="optimizedroute",
+            name="optroute_created_idx",
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="location_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="optimizedroute",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="optroute_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="routerequest",
+            name="transport_mode",
+            field=models.CharField(
+                choices=[
+                    ("car", "Voiture"),
+                    ("public", "Transport Public"),
+                    ("taxi", "Taxi"),
+                    ("moto_taxi", "Moto-taxi"),
+                    ("bus", "Bus / Agence de voyage"),
+                    ("walking", "Marche"),
+                    ("bike", "Vélo"),
+                ],
+                default="car",
+                max_length=20,
+                verbose_name="Mode de transport",
+            ),
+        ),
+    ]
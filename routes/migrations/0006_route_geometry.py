@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0005_transport_mode_taxi_bus"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="optimizedroute",
+            name="geometry",
+            field=models.TextField(blank=True, default="", verbose_name="Tracé"),
+        ),
+        migrations.AddField(
+            model_name="optimizedroute",
+            name="geometry_levels",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="Tracés simplifiés"
+            ),
+        ),
+    ]
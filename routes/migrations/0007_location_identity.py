@@ -0,0 +1,100 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:11
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+# Copies figées de routes.geo au moment de la migration : une évolution
+# ultérieure de ces fonctions ne doit pas changer ce que cette migration calcule
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+ADDRESS_STOPWORDS = frozenset({
+    "a", "au", "aux", "d", "de", "des", "du", "et", "l", "la", "le", "les",
+    "cameroun", "cameroon",
+})
+
+
+def normalize_address(address):
+    text = unicodedata.normalize("NFKD", address or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(sorted(set(re.findall(r"[a-z0-9]+", text)) - ADDRESS_STOPWORDS))
+
+
+def geohash_encode(latitude, longitude, precision):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, target = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (target[0] + target[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            target[0] = mid
+        else:
+            bits <<= 1
+            target[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def fill_location_identity(apps, schema_editor):
+    Location = apps.get_model("routes", "Location")
+
+    batch = []
+    for location in Location.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        location.normalized_address = normalize_address(location.address)
+        location.geohash = geohash_encode(location.latitude, location.longitude, 7)
+        batch.append(location)
+        if len(batch) >= BATCH_SIZE:
+            Location.objects.bulk_update(batch, ["normalized_address", "geohash"])
+            batch = []
+    if batch:
+        Location.objects.bulk_update(batch, ["normalized_address", "geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0006_route_geometry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="location",
+            name="geohash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=12, verbose_name="Geohash"
+            ),
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="normalized_address",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=500,
+                verbose_name="Adresse normalisée",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["normalized_address"], name="location_norm_address_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(fields=["geohash"], name="location_geohash_idx"),
+        ),
+        migrations.RunPython(fill_location_identity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,175 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0007_location_identity"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedRoute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "original_request_id",
+                    models.BigIntegerField(
+                        unique=True, verbose_name="Demande d'origine"
+                    ),
+                ),
+                (
+                    "original_route_id",
+                    models.BigIntegerField(
+                        blank=True, null=True, verbose_name="Route d'origine"
+                    ),
+                ),
+                (
+                    "transport_mode",
+                    models.CharField(
+                        choices=[
+                            ("car", "Voiture"),
+                            ("public", "Transport Public"),
+                            ("taxi", "Taxi"),
+                            ("moto_taxi", "Moto-taxi"),
+                            ("bus", "Bus / Agence de voyage"),
+                            ("walking", "Marche"),
+                            ("bike", "Vélo"),
+                        ],
+                        max_length=20,
+                        verbose_name="Mode de transport",
+                    ),
+                ),
+                ("requested_at", models.DateTimeField(verbose_name="Demandée le")),
+                (
+                    "distance",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Distance (km)"
+                    ),
+                ),
+                (
+                    "duration",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Durée (min)"
+                    ),
+                ),
+                (
+                    "cost_estimate",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Coût estimé (FCFA)"
+                    ),
+                ),
+                (
+                    "route_created_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Route créée le"
+                    ),
+                ),
+                (
+                    "storage",
+                    models.CharField(
+                        choices=[
+                            ("table", "Table d'archive"),
+                            ("jsonl", "Fichier JSONL compressé"),
+                        ],
+                        default="table",
+                        max_length=10,
+                        verbose_name="Stockage",
+                    ),
+                ),
+                (
+                    "data",
+                    models.BinaryField(
+                        blank=True, default=b"", verbose_name="Données (JSON zlib)"
+                    ),
+                ),
+                (
+                    "archive_file",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=255,
+                        verbose_name="Fichier d'archive",
+                    ),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Archivée le"),
+                ),
+            ],
+            options={
+                "verbose_name": "Route archivée",
+                "verbose_name_plural": "Routes archivées",
+                "ordering": ["-requested_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="routerequest",
+            name="retain_until",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Conservée jusqu'au"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="routerequest",
+            index=models.Index(fields=["created_at"], name="routereq_created_idx"),
+        ),
+        migrations.AddField(
+            model_name="archivedroute",
+            name="departure",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_departures",
+                to="routes.location",
+                verbose_name="Départ",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedroute",
+            name="destination",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_destinations",
+                to="routes.location",
+                verbose_name="Destination",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedroute",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_routes",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Utilisateur",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedroute",
+            index=models.Index(
+                fields=["user", "-requested_at"], name="archroute_user_requested_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedroute",
+            index=models.Index(
+                fields=["transport_mode", "requested_at"],
+                name="archroute_mode_requested_idx",
+            ),
+        ),
+    ]
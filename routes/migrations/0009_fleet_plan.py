@@ -0,0 +1,214 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0008_route_archive"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="optimizedroute",
+            name="vehicle",
+            field=models.PositiveSmallIntegerField(
+                blank=True, null=True, verbose_name="Véhicule"
+            ),
+        ),
+        migrations.CreateModel(
+            name="FleetPlan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="Nom")),
+                (
+                    "transport_mode",
+                    models.CharField(
+                        choices=[
+                            ("car", "Voiture"),
+                            ("public", "Transport Public"),
+                            ("taxi", "Taxi"),
+                            ("moto_taxi", "Moto-taxi"),
+                            ("bus", "Bus / Agence de voyage"),
+                            ("walking", "Marche"),
+                            ("bike", "Vélo"),
+                        ],
+                        default="car",
+                        max_length=20,
+                        verbose_name="Mode de transport",
+                    ),
+                ),
+                (
+                    "vehicle_capacities",
+                    models.JSONField(
+                        default=list, verbose_name="Capacités des véhicules"
+                    ),
+                ),
+                ("shift_start", models.DateTimeField(verbose_name="Début de service")),
+                (
+                    "shift_minutes",
+                    models.PositiveIntegerField(
+                        default=480, verbose_name="Durée de service (min)"
+                    ),
+                ),
+                (
+                    "total_distance",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Distance totale (km)"
+                    ),
+                ),
+                (
+                    "total_duration",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Durée totale (min)"
+                    ),
+                ),
+                (
+                    "total_cost",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Coût total (FCFA)"
+                    ),
+                ),
+                (
+                    "solve_seconds",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Temps de calcul (s)"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Créé le"),
+                ),
+                (
+                    "depot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fleet_plans",
+                        to="routes.location",
+                        verbose_name="Dépôt",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fleet_plans",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Utilisateur",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Plan de flotte",
+                "verbose_name_plural": "Plans de flotte",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="optimizedroute",
+            name="fleet_plan",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="vehicle_routes",
+                to="routes.fleetplan",
+                verbose_name="Plan de flotte",
+            ),
+        ),
+        migrations.CreateModel(
+            name="FleetStop",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "delivery",
+                    models.FloatField(default=0, verbose_name="Quantité livrée"),
+                ),
+                (
+                    "pickup",
+                    models.FloatField(default=0, verbose_name="Quantité collectée"),
+                ),
+                (
+                    "ready_minutes",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Début du créneau (min)"
+                    ),
+                ),
+                (
+                    "due_minutes",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Fin du créneau (min)"
+                    ),
+                ),
+                (
+                    "service_minutes",
+                    models.PositiveIntegerField(
+                        default=5, verbose_name="Durée d'arrêt (min)"
+                    ),
+                ),
+                (
+                    "vehicle",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="Véhicule"
+                    ),
+                ),
+                (
+                    "sequence",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="Rang"
+                    ),
+                ),
+                (
+                    "arrival_minutes",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Arrivée (min)"
+                    ),
+                ),
+                (
+                    "location",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fleet_stops",
+                        to="routes.location",
+                        verbose_name="Lieu",
+                    ),
+                ),
+                (
+                    "plan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stops",
+                        to="routes.fleetplan",
+                        verbose_name="Plan de flotte",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Arrêt de flotte",
+                "verbose_name_plural": "Arrêts de flotte",
+                "ordering": ["plan", "vehicle", "sequence", "id"],
+            },
+        ),
+    ]
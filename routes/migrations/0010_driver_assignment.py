@@ -0,0 +1,112 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0009_fleet_plan"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Driver",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="Nom")),
+                (
+                    "transport_mode",
+                    models.CharField(
+                        choices=[
+                            ("car", "Voiture"),
+                            ("public", "Transport Public"),
+                            ("taxi", "Taxi"),
+                            ("moto_taxi", "Moto-taxi"),
+                            ("bus", "Bus / Agence de voyage"),
+                            ("walking", "Marche"),
+                            ("bike", "Vélo"),
+                        ],
+                        default="taxi",
+                        max_length=20,
+                        verbose_name="Mode de transport",
+                    ),
+                ),
+                ("latitude", models.FloatField(verbose_name="Latitude")),
+                ("longitude", models.FloatField(verbose_name="Longitude")),
+                (
+                    "is_available",
+                    models.BooleanField(
+                        db_index=True, default=True, verbose_name="Disponible"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Mis à jour le"),
+                ),
+            ],
+            options={
+                "verbose_name": "Chauffeur",
+                "verbose_name_plural": "Chauffeurs",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DriverAssignment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "pickup_minutes",
+                    models.FloatField(verbose_name="Délai d'approche (min)"),
+                ),
+                (
+                    "pickup_distance",
+                    models.FloatField(verbose_name="Distance d'approche (km)"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Affecté le"),
+                ),
+                (
+                    "driver",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="routes.driver",
+                        verbose_name="Chauffeur",
+                    ),
+                ),
+                (
+                    "route_request",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="driver_assignment",
+                        to="routes.routerequest",
+                        verbose_name="Demande",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Affectation de chauffeur",
+                "verbose_name_plural": "Affectations de chauffeurs",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
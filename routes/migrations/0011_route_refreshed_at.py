@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0010_driver_assignment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="optimizedroute",
+            name="refreshed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Recalculée le"
+            ),
+        ),
+    ]
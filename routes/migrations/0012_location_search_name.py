@@ -0,0 +1,58 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:56
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def search_key(text):
+    # Copie figée de routes.geo.search_key au moment de la migration
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def fill_search_name(apps, schema_editor):
+    Location = apps.get_model("routes", "Location")
+
+    batch = []
+    for location in Location.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        location.search_name = search_key(location.name)[:200]
+        batch.append(location)
+        if len(batch) >= BATCH_SIZE:
+            Location.objects.bulk_update(batch, ["search_name"])
+            batch = []
+    if batch:
+        Location.objects.bulk_update(batch, ["search_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0011_route_refreshed_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="location",
+            name="search_name",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=200,
+                verbose_name="Nom de recherche",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["search_name"],
+                name="location_search_name_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+    ]
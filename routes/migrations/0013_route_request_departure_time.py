@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0012_location_search_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="routerequest",
+            name="departure_time",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Heure de départ"
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:16
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def fill_is_fallback(apps, schema_editor):
+    OptimizedRoute = apps.get_model("routes", "OptimizedRoute")
+    OptimizedRoutePayload = apps.get_model("routes", "OptimizedRoutePayload")
+
+    batch = []
+    payloads = OptimizedRoutePayload.objects.order_by("route_id").values_list("route_id", "encoding", "data")
+    for route_id, encoding, data in payloads.iterator(chunk_size=BATCH_SIZE):
+        raw = bytes(data)
+        if encoding == "zlib":
+            raw = zlib.decompress(raw)
+        try:
+            route_data = json.loads(raw.decode("utf-8"))
+        except ValueError:
+            continue
+        if isinstance(route_data, dict) and (route_data.get("ai_analysis") or {}).get("is_fallback"):
+            batch.append(route_id)
+        if len(batch) >= BATCH_SIZE:
+            OptimizedRoute.objects.filter(id__in=batch).update(is_fallback=True)
+            batch = []
+    if batch:
+        OptimizedRoute.objects.filter(id__in=batch).update(is_fallback=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0013_route_request_departure_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="optimizedroute",
+            name="is_fallback",
+            field=models.BooleanField(
+                default=False, verbose_name="Estimation de repli"
+            ),
+        ),
+        migrations.RunPython(fill_is_fallback, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0014_route_is_fallback"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedroute",
+            name="departure_time",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Heure de départ"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0015_archived_route_departure_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedroute",
+            name="route_refreshed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Route recalculée le"
+            ),
+        ),
+    ]
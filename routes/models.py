@@ -1,25 +1,108 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
+import json
+import zlib
+from . import polyline
+from .geo import geohash_cells_around, geohash_encode, haversine_km, normalize_address, search_key
+
+# Précision du geohash stocké sur chaque lieu (7 ≈ cellule de 150 m)
+LOCATION_GEOHASH_PRECISION = 7
+
+class LocationQuerySet(models.QuerySet):
+    def find_duplicate(self, address, latitude, longitude, exclude_id=None):
+        """Lieu existant à moins de LOCATION_DUPLICATE_RADIUS_M mètres, ou de même adresse
+        normalisée à moins de LOCATION_DUPLICATE_ADDRESS_RADIUS_M mètres
+
+        Une seule requête, sur les deux index (adresse normalisée, geohash) ;
+        l'adresse identique l'emporte, sinon le lieu le plus proche. Une même
+        adresse loin d'ici (homonyme dans une autre ville) n'est pas un doublon.
+        """
+        radius_km = getattr(settings, 'LOCATION_DUPLICATE_RADIUS_M', 25) / 1000
+        address_radius_km = getattr(settings, 'LOCATION_DUPLICATE_ADDRESS_RADIUS_M', 1000) / 1000
+        normalized = normalize_address(address)
+        condition = models.Q(geohash__in=geohash_cells_around(
+            latitude, longitude, radius_km, LOCATION_GEOHASH_PRECISION
+        ))
+        if normalized:
+            condition |= models.Q(normalized_address=normalized)
+        candidates = self.filter(condition)
+        if exclude_id is not None:
+            candidates = candidates.exclude(id=exclude_id)
+
+        best = best_distance = None
+        for candidate in candidates.order_by('id'):
+            distance = haversine_km(latitude, longitude, candidate.latitude, candidate.longitude)
+            if normalized and candidate.normalized_address == normalized and distance <= address_radius_km:
+                return candidate
+            if distance <= radius_km and (best is None or distance < best_distance):
+                best, best_distance = candidate, distance
+        return best
+
+    def autocomplete(self, query, limit=10):
+        """Lieux dont le nom commence par query (accents et casse ignorés), par ordre alphabétique
+
+        LIKE 'préfixe%' sur search_name : index location_search_name_idx
+        (varchar_pattern_ops sous PostgreSQL), quel que soit le nombre de lieux.
+        """
+        key = search_key(query)
+        if not key:
+            return self.none()
+        return self.filter(search_name__startswith=key).order_by('search_name', 'id').only(
+            'id', 'name', 'address', 'latitude', 'longitude'
+        )[:limit]
 
 class Location(models.Model):
     name = models.CharField(max_length=200, verbose_name="Nom du lieu")
     address = models.CharField(max_length=500, verbose_name="Adresse")
     latitude = models.FloatField(verbose_name="Latitude")
     longitude = models.FloatField(verbose_name="Longitude")
+    # Identité du lieu, calculée à l'enregistrement (voir LocationQuerySet.find_duplicate)
+    normalized_address = models.CharField(max_length=500, blank=True, editable=False, verbose_name="Adresse normalisée")
+    geohash = models.CharField(max_length=12, blank=True, editable=False, verbose_name="Geohash")
+    # Nom sans accents ni casse pour la recherche par préfixe (voir LocationQuerySet.autocomplete)
+    search_name = models.CharField(max_length=200, blank=True, editable=False, verbose_name="Nom de recherche")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
 
+    objects = LocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Lieu"
         verbose_name_plural = "Lieux"
         ordering = ['-created_at']
+        indexes = [
+            # Listes, carte d'accueil, export et pagination par curseur (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='location_created_idx'),
+            # Détection des doublons
+            models.Index(fields=['normalized_address'], name='location_norm_address_idx'),
+            models.Index(fields=['geohash'], name='location_geohash_idx'),
+            # Sélecteurs de lieux : LIKE 'préfixe%' (opclasses ignorées hors PostgreSQL)
+            models.Index(fields=['search_name'], name='location_search_name_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def normalize(self):
+        """Met à jour l'adresse normalisée, le geohash et le nom de recherche (appelé par save())"""
+        self.normalized_address = normalize_address(self.address)
+        self.geohash = geohash_encode(float(self.latitude), float(self.longitude), LOCATION_GEOHASH_PRECISION)
+        self.search_name = search_key(self.name)[:200]
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_address', 'geohash', 'search_name'}
+        super().save(*args, **kwargs)
+
 class RouteRequest(models.Model):
     TRANSPORT_CHOICES = [
         ('car', 'Voiture'),
         ('public', 'Transport Public'),
+        ('taxi', 'Taxi'),
+        ('moto_taxi', 'Moto-taxi'),
+        ('bus', 'Bus / Agence de voyage'),
         ('walking', 'Marche'),
         ('bike', 'Vélo'),
     ]
@@ -28,28 +111,315 @@ class RouteRequest(models.Model):
     departure = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='departures', verbose_name="Départ")
     destination = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='destinations', verbose_name="Destination")
     transport_mode = models.CharField(max_length=20, choices=TRANSPORT_CHOICES, default='car', verbose_name="Mode de transport")
+    # Départ prévu (profils de vitesse par quart d'heure) ; vide : départ à la création
+    departure_time = models.DateTimeField(null=True, blank=True, verbose_name="Heure de départ")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    # Demande restaurée depuis l'archive : pas de nouvel archivage avant cette date
+    retain_until = models.DateTimeField(null=True, blank=True, verbose_name="Conservée jusqu'au")
     
     class Meta:
         verbose_name = "Demande de route"
         verbose_name_plural = "Demandes de routes"
         ordering = ['-created_at']
+        indexes = [
+            # Historique d'un utilisateur
+            models.Index(fields=['user', '-created_at'], name='routereq_user_created_idx'),
+            # Recherche d'un trajet (départ, destination, mode)
+            models.Index(fields=['departure', 'destination', 'transport_mode'], name='routereq_pair_mode_idx'),
+            # Statistiques par mode de transport
+            models.Index(fields=['transport_mode', '-created_at'], name='routereq_mode_created_idx'),
+            # Rétention : demandes les plus anciennes d'abord
+            models.Index(fields=['created_at'], name='routereq_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.departure} -> {self.destination}"
 
+class OptimizedRouteQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Colonnes utiles aux listes (historique, accueil, comparaison, export)"""
+        return self.select_related(
+            'route_request__departure',
+            'route_request__destination'
+        ).only(
+            'distance', 'duration', 'cost_estimate', 'created_at',
+            'route_request__transport_mode',
+            'route_request__departure__name',
+            'route_request__destination__name',
+        )
+
+    def bulk_create_with_payload(self, routes, batch_size=500):
+        """bulk_create des routes puis de leurs OptimizedRoutePayload (save() n'est pas appelé)"""
+        routes = self.bulk_create(routes, batch_size=batch_size)
+        OptimizedRoutePayload.objects.bulk_create([
+            OptimizedRoutePayload(route=route, **OptimizedRoutePayload.encode(route.route_data))
+            for route in routes
+        ], batch_size=batch_size)
+        for route in routes:
+            route._route_data_changed = False
+        return routes
+
+    def build(self, route_request, route_data):
+        """Instance non sauvegardée construite à partir du résultat de RouteOptimizer
+
+        Le tracé encodé (clé geometry) est stocké dans les colonnes dédiées
+        plutôt que dans les données de l'IA.
+        """
+        route_data = dict(route_data)
+        geometry = route_data.pop('geometry', '')
+        optimal_route = route_data.get('ai_analysis', {}).get('optimal_route', {})
+        route = self.model(
+            route_request=route_request,
+            route_data=route_data,
+            distance=optimal_route.get('estimated_distance', 0),
+            duration=optimal_route.get('estimated_time', 0),
+            cost_estimate=optimal_route.get('cost_estimate', 0),
+            is_fallback=bool(route_data.get('ai_analysis', {}).get('is_fallback'))
+        )
+        if geometry:
+            route.set_geometry(polyline.decode(geometry))
+        return route
+
 class OptimizedRoute(models.Model):
     route_request = models.OneToOneField(RouteRequest, on_delete=models.CASCADE, verbose_name="Demande de route")
-    route_data = models.JSONField(verbose_name="Données de route")  # Stocke les données de l'itinéraire optimisé
+    # Les données complètes de l'IA sont dans OptimizedRoutePayload (voir route_data)
     distance = models.FloatField(null=True, blank=True, verbose_name="Distance (km)")  # Distance en km
     duration = models.IntegerField(null=True, blank=True, verbose_name="Durée (min)")  # Durée en minutes
     cost_estimate = models.FloatField(null=True, blank=True, verbose_name="Coût estimé (FCFA)")  # Coût estimé
+    # Estimation de repli (IA indisponible) : exclue de l'apprentissage (profils de vitesse, modèle ETA)
+    is_fallback = models.BooleanField(default=False, verbose_name="Estimation de repli")
+    # Tracé au format Google encoded polyline, complet et simplifié par niveau de zoom
+    geometry = models.TextField(blank=True, default='', verbose_name="Tracé")
+    geometry_levels = models.JSONField(blank=True, default=dict, verbose_name="Tracés simplifiés")
+    # Tournée d'un véhicule d'un plan de flotte (routes.vrp)
+    fleet_plan = models.ForeignKey('FleetPlan', on_delete=models.CASCADE, null=True, blank=True, related_name='vehicle_routes', verbose_name="Plan de flotte")
+    vehicle = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Véhicule")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    # Dernier recalcul (routes.reoptimization), None si jamais recalculée
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name="Recalculée le")
+
+    objects = OptimizedRouteQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Route optimisée"
         verbose_name_plural = "Routes optimisées"
         ordering = ['-created_at']
+        indexes = [
+            # Routes récentes, historique, export, filtre des 30 derniers jours
+            # et pagination par curseur (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='optroute_created_idx'),
+        ]
 
     def __str__(self):
         return f"Route optimisée pour {self.route_request}"
+
+    @property
+    def route_data(self):
+        """Données complètes de l'itinéraire, chargées à la demande"""
+        if not hasattr(self, '_route_data'):
+            try:
+                self._route_data = self.payload.decode()
+            except OptimizedRoutePayload.DoesNotExist:
+                self._route_data = {}
+        return self._route_data
+
+    @route_data.setter
+    def route_data(self, value):
+        self._route_data = value
+        self._route_data_changed = True
+
+    def set_geometry(self, points):
+        """Enregistre le tracé complet et ses versions simplifiées (Douglas–Peucker)"""
+        self.geometry = polyline.encode(points)
+        self.geometry_levels = polyline.build_levels(points)
+
+    def geometry_for_zoom(self, zoom=None):
+        """(niveau, polyline encodée) du tracé adapté au zoom ; niveau None = tracé complet"""
+        if zoom is not None:
+            level = polyline.level_for_zoom(zoom)
+            # Niveau absent : la simplification n'avait rien retiré, on passe au suivant
+            for candidate in polyline.GEOMETRY_ZOOM_LEVELS:
+                if level is not None and candidate >= level and str(candidate) in self.geometry_levels:
+                    return candidate, self.geometry_levels[str(candidate)]
+        return None, self.geometry
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if getattr(self, '_route_data_changed', False):
+            OptimizedRoutePayload.objects.update_or_create(
+                route=self,
+                defaults=OptimizedRoutePayload.encode(self._route_data)
+            )
+            self._route_data_changed = False
+
+class OptimizedRoutePayload(models.Model):
+    """Réponse complète de l'IA, séparée de OptimizedRoute pour alléger les listes"""
+    ENCODING_CHOICES = [
+        ('json', 'JSON'),
+        ('zlib', 'JSON compressé (zlib)'),
+    ]
+
+    route = models.OneToOneField(OptimizedRoute, on_delete=models.CASCADE, primary_key=True, related_name='payload', verbose_name="Route optimisée")
+    encoding = models.CharField(max_length=10, choices=ENCODING_CHOICES, default='json', verbose_name="Encodage")
+    data = models.BinaryField(verbose_name="Données")
+    size = models.PositiveIntegerField(default=0, verbose_name="Taille JSON (octets)")
+
+    class Meta:
+        verbose_name = "Données de route"
+        verbose_name_plural = "Données de routes"
+
+    def __str__(self):
+        return f"Données de la route {self.route_id} ({self.encoding})"
+
+    @staticmethod
+    def encode(route_data):
+        """Sérialise les données, compressées si activé et assez volumineuses"""
+        raw = json.dumps(route_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        min_size = getattr(settings, 'ROUTE_DATA_COMPRESSION_MIN_SIZE', 512)
+        if getattr(settings, 'ROUTE_DATA_COMPRESSION', True) and len(raw) >= min_size:
+            return {'encoding': 'zlib', 'data': zlib.compress(raw), 'size': len(raw)}
+        return {'encoding': 'json', 'data': raw, 'size': len(raw)}
+
+    def decode(self):
+        raw = bytes(self.data)
+        if self.encoding == 'zlib':
+            raw = zlib.decompress(raw)
+        return json.loads(raw.decode('utf-8'))
+
+class ArchivedRoute(models.Model):
+    """Demande de route et son résultat, sortis des tables principales par la rétention
+
+    Les colonnes des statistiques restent en base ; les données de l'IA et les
+    tracés sont compressés ici (stockage 'table') ou dans un fichier JSONL
+    compressé (stockage 'jsonl', voir routes.retention).
+    """
+    STORAGE_CHOICES = [
+        ('table', "Table d'archive"),
+        ('jsonl', 'Fichier JSONL compressé'),
+    ]
+
+    original_request_id = models.BigIntegerField(unique=True, verbose_name="Demande d'origine")
+    original_route_id = models.BigIntegerField(null=True, blank=True, verbose_name="Route d'origine")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_routes', verbose_name="Utilisateur")
+    departure = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='archived_departures', verbose_name="Départ")
+    destination = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='archived_destinations', verbose_name="Destination")
+    transport_mode = models.CharField(max_length=20, choices=RouteRequest.TRANSPORT_CHOICES, verbose_name="Mode de transport")
+    requested_at = models.DateTimeField(verbose_name="Demandée le")
+    departure_time = models.DateTimeField(null=True, blank=True, verbose_name="Heure de départ")
+    distance = models.FloatField(null=True, blank=True, verbose_name="Distance (km)")
+    duration = models.IntegerField(null=True, blank=True, verbose_name="Durée (min)")
+    cost_estimate = models.FloatField(null=True, blank=True, verbose_name="Coût estimé (FCFA)")
+    route_created_at = models.DateTimeField(null=True, blank=True, verbose_name="Route créée le")
+    route_refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name="Route recalculée le")
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES, default='table', verbose_name="Stockage")
+    data = models.BinaryField(blank=True, default=b'', verbose_name="Données (JSON zlib)")
+    archive_file = models.CharField(max_length=255, blank=True, default='', verbose_name="Fichier d'archive")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Archivée le")
+
+    class Meta:
+        verbose_name = "Route archivée"
+        verbose_name_plural = "Routes archivées"
+        ordering = ['-requested_at']
+        indexes = [
+            # Historique archivé d'un utilisateur (restauration)
+            models.Index(fields=['user', '-requested_at'], name='archroute_user_requested_idx'),
+            # Statistiques par mode de transport
+            models.Index(fields=['transport_mode', 'requested_at'], name='archroute_mode_requested_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archive de la demande {self.original_request_id}"
+
+    @staticmethod
+    def encode_data(data):
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def decode_data(self):
+        return json.loads(zlib.decompress(bytes(self.data)).decode('utf-8')) if self.data else {}
+
+class FleetPlan(models.Model):
+    """Répartition d'arrêts entre plusieurs véhicules (capacités, créneaux horaires)
+
+    Chaque tournée planifiée est une OptimizedRoute (dépôt -> arrêts -> dépôt)
+    rattachée au plan ; les arrêts et leur affectation sont des FleetStop.
+    """
+    name = models.CharField(max_length=100, verbose_name="Nom")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='fleet_plans', verbose_name="Utilisateur")
+    depot = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='fleet_plans', verbose_name="Dépôt")
+    transport_mode = models.CharField(max_length=20, choices=RouteRequest.TRANSPORT_CHOICES, default='car', verbose_name="Mode de transport")
+    # Capacité de chaque véhicule (même unité que les quantités des arrêts)
+    vehicle_capacities = models.JSONField(default=list, verbose_name="Capacités des véhicules")
+    shift_start = models.DateTimeField(verbose_name="Début de service")
+    shift_minutes = models.PositiveIntegerField(default=480, verbose_name="Durée de service (min)")
+    total_distance = models.FloatField(null=True, blank=True, verbose_name="Distance totale (km)")
+    total_duration = models.IntegerField(null=True, blank=True, verbose_name="Durée totale (min)")
+    total_cost = models.FloatField(null=True, blank=True, verbose_name="Coût total (FCFA)")
+    solve_seconds = models.FloatField(null=True, blank=True, verbose_name="Temps de calcul (s)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+
+    class Meta:
+        verbose_name = "Plan de flotte"
+        verbose_name_plural = "Plans de flotte"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({len(self.vehicle_capacities)} véhicules)"
+
+class FleetStop(models.Model):
+    """Arrêt d'un plan de flotte : quantités, créneau et affectation calculée
+
+    Les créneaux sont en minutes depuis le début de service ; due_minutes
+    vide : jusqu'à la fin du service.
+    """
+    plan = models.ForeignKey(FleetPlan, on_delete=models.CASCADE, related_name='stops', verbose_name="Plan de flotte")
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='fleet_stops', verbose_name="Lieu")
+    delivery = models.FloatField(default=0, verbose_name="Quantité livrée")
+    pickup = models.FloatField(default=0, verbose_name="Quantité collectée")
+    ready_minutes = models.PositiveIntegerField(default=0, verbose_name="Début du créneau (min)")
+    due_minutes = models.PositiveIntegerField(null=True, blank=True, verbose_name="Fin du créneau (min)")
+    service_minutes = models.PositiveIntegerField(default=5, verbose_name="Durée d'arrêt (min)")
+    # Résultat : véhicule, rang dans sa tournée et heure d'arrivée (vides : non desservi)
+    vehicle = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Véhicule")
+    sequence = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Rang")
+    arrival_minutes = models.FloatField(null=True, blank=True, verbose_name="Arrivée (min)")
+
+    class Meta:
+        verbose_name = "Arrêt de flotte"
+        verbose_name_plural = "Arrêts de flotte"
+        ordering = ['plan', 'vehicle', 'sequence', 'id']
+
+    def __str__(self):
+        return f"{self.location} (plan {self.plan_id})"
+
+class Driver(models.Model):
+    """Chauffeur : position courante et disponibilité pour les affectations groupées"""
+    name = models.CharField(max_length=100, verbose_name="Nom")
+    transport_mode = models.CharField(max_length=20, choices=RouteRequest.TRANSPORT_CHOICES, default='taxi', verbose_name="Mode de transport")
+    latitude = models.FloatField(verbose_name="Latitude")
+    longitude = models.FloatField(verbose_name="Longitude")
+    is_available = models.BooleanField(default=True, db_index=True, verbose_name="Disponible")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Mis à jour le")
+
+    class Meta:
+        verbose_name = "Chauffeur"
+        verbose_name_plural = "Chauffeurs"
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.get_transport_mode_display()})"
+
+class DriverAssignment(models.Model):
+    """Chauffeur affecté à une demande de route (routes.assignment)"""
+    route_request = models.OneToOneField(RouteRequest, on_delete=models.CASCADE, related_name='driver_assignment', verbose_name="Demande")
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='assignments', verbose_name="Chauffeur")
+    pickup_minutes = models.FloatField(verbose_name="Délai d'approche (min)")
+    pickup_distance = models.FloatField(verbose_name="Distance d'approche (km)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Affecté le")
+
+    class Meta:
+        verbose_name = "Affectation de chauffeur"
+        verbose_name_plural = "Affectations de chauffeurs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Chauffeur {self.driver_id} -> demande {self.route_request_id}"
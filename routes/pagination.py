@@ -0,0 +1,93 @@
+import base64
+import hashlib
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor(f"Curseur invalide: {cursor}") from e
+
+
+class KeysetPaginator:
+    """Pagination par curseur sur (created_at, id) décroissants
+
+    Chaque page est une requête « WHERE (created_at, id) < curseur LIMIT n »
+    servie par l'index (created_at, id) : la page N coûte autant que la
+    première, sans OFFSET ni COUNT(*).
+    """
+
+    def __init__(self, queryset, page_size=20):
+        self.queryset = queryset.order_by('-created_at', '-id')
+        self.page_size = page_size
+
+    def get_page(self, cursor=None):
+        """Renvoie (objets, curseur suivant ou None)"""
+        queryset = self.queryset
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+        # Un élément de plus pour savoir s'il reste une page
+        items = list(queryset[:self.page_size + 1])
+        next_cursor = None
+        if len(items) > self.page_size:
+            items = items[:self.page_size]
+            last = items[-1]
+            next_cursor = encode_cursor(last.created_at, last.pk)
+        return items, next_cursor
+
+
+def approximate_count(queryset, timeout=300):
+    """Nombre approximatif de lignes, sans COUNT(*) sur la table à chaque appel
+
+    Sans filtre sous PostgreSQL : estimation du planificateur (pg_class).
+    Sinon : COUNT(*) mis en cache pendant `timeout` secondes.
+    """
+    model = queryset.model
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.sha1(f"{sql}|{params}".encode('utf-8')).hexdigest()
+    key = f"approx_count:{model._meta.label_lower}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=timeout)
+    return count
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator dont le total vient de approximate_count (listes de l'admin sur de grandes tables)"""
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Niveaux de zoom pour lesquels un tracé simplifié est stocké ; au-delà, tracé complet
+GEOMETRY_ZOOM_LEVELS = (5, 8, 11)
+
+
+def encode(points: Sequence[Tuple[float, float]], precision: int = 5) -> str:
+    """Encode une liste de (lat, lon) au format Google encoded polyline"""
+    factor = 10 ** precision
+    output = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        lat_i = int(round(lat * factor))
+        lon_i = int(round(lon * factor))
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            # Zigzag puis groupes de 5 bits, du poids faible au poids fort
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                output.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            output.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return ''.join(output)
+
+
+def decode(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """Décode une polyline Google en liste de (lat, lon)"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+def simplify(points: Sequence[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    """Douglas–Peucker : supprime les sommets à moins de `tolerance` degrés du tracé simplifié"""
+    if len(points) < 3:
+        return list(points)
+    coords = np.asarray(points, dtype=np.float64)
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    # Pile de segments à examiner (itératif : pas de limite de récursion)
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = coords[end] - coords[start]
+        inner = coords[start + 1:end] - coords[start]
+        norm = np.hypot(*segment)
+        if norm == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / norm
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return [tuple(point) for point in coords[keep].tolist()]
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Taille d'un pixel (degrés) au niveau de zoom donné, tuiles de 256 px"""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def build_levels(points: Sequence[Tuple[float, float]]) -> Dict[str, str]:
+    """Tracés simplifiés encodés, un par niveau de GEOMETRY_ZOOM_LEVELS"""
+    levels = {}
+    for zoom in GEOMETRY_ZOOM_LEVELS:
+        simplified = simplify(points, zoom_tolerance(zoom))
+        if len(simplified) < len(points):
+            levels[str(zoom)] = encode(simplified)
+    return levels
+
+
+def level_for_zoom(zoom: int) -> Optional[int]:
+    """Niveau simplifié adapté à ce zoom (None : tracé complet)"""
+    suitable = [level for level in GEOMETRY_ZOOM_LEVELS if level >= zoom]
+    return min(suitable) if suitable else None
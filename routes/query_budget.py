@@ -0,0 +1,179 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'ENABLED': False,
+    # 'warn' : avertissement dans le journal ; 'raise' : QueryBudgetExceeded
+    'ACTION': 'warn',
+    # Budget des vues sans @query_budget (None : pas de limite)
+    'DEFAULT_MAX_QUERIES': None,
+    # Exécutions maximales d'une même requête (empreinte) : au-delà, N+1 probable
+    'MAX_REPEATS': 2,
+    # En-têtes X-Query-Count / X-Query-Repeats sur chaque réponse
+    'HEADERS': False,
+}
+
+# Contrôle de transaction : jamais compté comme doublon
+TRANSACTION_SQL = re.compile(r'^\s*(SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b', re.IGNORECASE)
+
+_FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE), 'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_settings() -> Dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def fingerprint(sql: str) -> str:
+    """Forme de la requête : littéraux et listes IN remplacés, espaces normalisés"""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryRecorder:
+    """Requêtes SQL exécutées dans le bloc, sur toutes les connexions (sans DEBUG)
+
+    S'appuie sur connection.execute_wrapper : seul le thread courant est suivi.
+    """
+
+    def __init__(self, using: Optional[str] = None):
+        self.aliases = [using] if using else list(connections)
+        self.queries: List[str] = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def repeats(self, minimum: int = 2) -> List[Tuple[str, int]]:
+        """[(empreinte, exécutions)] des requêtes répétées au moins `minimum` fois, les plus fréquentes d'abord"""
+        counts = Counter(fingerprint(sql) for sql in self.queries if not TRANSACTION_SQL.match(sql))
+        return [(sql, count) for sql, count in counts.most_common() if count >= minimum]
+
+    def max_repeats(self) -> int:
+        repeated = self.repeats(minimum=1)
+        return repeated[0][1] if repeated else 0
+
+    def report(self, limit: int = 5) -> str:
+        lines = [f"{self.count} requêtes"]
+        for sql, count in self.repeats()[:limit]:
+            lines.append(f"  {count} x {sql[:300]}")
+        return '\n'.join(lines)
+
+
+def query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """Budget SQL d'une vue : nombre de requêtes et répétitions d'une même requête
+
+    Le budget est porté par la fonction (copié par functools.wraps) : aucun
+    coût à l'exécution, il est lu par QueryBudgetMiddleware et par les tests.
+    """
+    def decorator(view_func):
+        view_func.query_budget = {'max_queries': max_queries, 'max_repeats': max_repeats}
+        return view_func
+    return decorator
+
+
+def check_budget(recorder: QueryRecorder, budget: Optional[Dict], options: Optional[Dict] = None) -> List[str]:
+    """Dépassements du budget (liste vide si respecté)"""
+    options = options or get_settings()
+    budget = budget or {}
+    max_queries = budget.get('max_queries', options['DEFAULT_MAX_QUERIES'])
+    max_repeats = budget.get('max_repeats')
+    if max_repeats is None:
+        max_repeats = options['MAX_REPEATS']
+
+    violations = []
+    if max_queries is not None and recorder.count > max_queries:
+        violations.append(f"{recorder.count} requêtes pour un budget de {max_queries}")
+    if max_repeats is not None and recorder.max_repeats() > max_repeats:
+        violations.append(f"requête exécutée {recorder.max_repeats()} fois (maximum {max_repeats})")
+    return violations
+
+
+class QueryBudgetMiddleware:
+    """Compte les requêtes SQL de chaque requête HTTP et vérifie le budget de la vue
+
+    Désactivé (retiré de la chaîne) si QUERY_BUDGET['ENABLED'] est faux. Les
+    requêtes faites pendant l'envoi d'une réponse en flux ne sont pas comptées.
+    """
+
+    def __init__(self, get_response):
+        self.options = get_settings()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if self.options['HEADERS']:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Repeats'] = str(recorder.max_repeats())
+
+        violations = check_budget(recorder, getattr(request, '_query_budget', None), self.options)
+        if violations:
+            message = f"Budget SQL dépassé ({request.method} {request.path}) : {', '.join(violations)}\n{recorder.report()}"
+            if self.options['ACTION'] == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = getattr(view_func, 'query_budget', None)
+
+
+class QueryBudgetTestMixin:
+    """Assertions de budget SQL pour les TestCase (bornes, pas un compte exact)"""
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries: Optional[int], max_repeats: Optional[int] = None):
+        with QueryRecorder() as recorder:
+            yield recorder
+        violations = check_budget(recorder, {'max_queries': max_queries, 'max_repeats': max_repeats})
+        if violations:
+            self.fail(f"{', '.join(violations)}\n{recorder.report()}")
+
+    def assertViewWithinBudget(self, method: str, path: str, data=None, **extra):
+        """Appelle la vue avec self.client et vérifie le budget qu'elle déclare (@query_budget)"""
+        budget = getattr(resolve(path).func, 'query_budget', None)
+        if budget is None:
+            self.fail(f"Aucun budget déclaré pour {path} (@query_budget)")
+        with self.assertQueryBudget(**budget):
+            response = getattr(self.client, method.lower())(path, data, **extra)
+            if response.streaming:
+                # Flux consommé dans le bloc : ses requêtes comptent aussi
+                response.streamed_content = b''.join(response.streaming_content)
+        return response
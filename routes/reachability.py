@@ -0,0 +1,134 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .estimator import estimate, get_fare_table, resolve_mode
+from .models import Location
+from .signals import get_versions
+from .speed_profiles import travel_factors
+
+KM_PER_DEGREE_LAT = 111.32
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+class LocationIndex:
+    """Coordonnées de tous les lieux en tableaux NumPy triés par latitude
+
+    Une recherche ne considère que la bande de latitude utile (searchsorted)
+    puis la boîte englobante en longitude : seuls les candidats proches
+    passent par le calcul de durée.
+    """
+
+    def __init__(self, ids, latitudes, longitudes):
+        order = np.argsort(latitudes, kind='stable')
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)[order]
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_database(cls):
+        rows = list(Location.objects.values_list('id', 'latitude', 'longitude').iterator(chunk_size=10000))
+        if not rows:
+            return cls([], [], [])
+        ids, latitudes, longitudes = zip(*rows)
+        return cls(ids, latitudes, longitudes)
+
+    def candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Positions des lieux dans la boîte englobante du cercle de rayon radius_km"""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        start, stop = np.searchsorted(self.latitudes, [latitude - dlat, latitude + dlat + 1e-12])
+        cos_lat = max(math.cos(math.radians(min(abs(latitude) + dlat, 89.9))), 1e-6)
+        dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+        band = np.abs(self.longitudes[start:stop] - longitude) <= dlon
+        return np.flatnonzero(band) + start
+
+
+def get_location_index() -> LocationIndex:
+    """Index des lieux du processus, reconstruit quand la version 'locations' change"""
+    global _index, _index_version
+    version = get_versions('locations')['locations']
+    if _index is not None and _index_version == version:
+        return _index
+    with _index_lock:
+        if _index is None or _index_version != version:
+            _index = LocationIndex.from_database()
+            _index_version = version
+    return _index
+
+
+def max_reach_km(transport_mode: str, minutes: float, factor: float = 1.0) -> float:
+    """Rayon à vol d'oiseau au-delà duquel aucun lieu n'est atteignable
+
+    factor : facteur de durée du profil de vitesse (moins de 1 : plus rapide que le tableau).
+    """
+    profile = get_fare_table().get(resolve_mode(transport_mode))
+    if profile is None:
+        raise ValueError(f"Mode de transport inconnu: {transport_mode}")
+    speed = max(tier['speed_kmh'] for tier in profile.values())
+    wait = min(tier['wait_min'] for tier in profile.values())
+    detour = min(getattr(settings, 'ROUTE_ESTIMATOR_DETOUR', {'urban': 1.35, 'intercity': 1.2}).values())
+    return max(minutes - wait, 0) / 60 * speed / detour / factor
+
+
+def reachable_locations(origin: Tuple[float, float], transport_mode: str, minutes: float,
+                        index: Optional[LocationIndex] = None,
+                        exclude_id: Optional[int] = None,
+                        bucket: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Lieux atteignables en `minutes` depuis origin, triés par durée croissante
+
+    bucket : quart d'heure local du départ (profils de vitesse de la zone d'origine).
+    """
+    index = index if index is not None else get_location_index()
+    factor = float(np.ravel(travel_factors([transport_mode], [origin[0]], [origin[1]], bucket))[0])
+    positions = index.candidates(origin[0], origin[1], max_reach_km(transport_mode, minutes, factor))
+    if exclude_id is not None:
+        positions = positions[index.ids[positions] != exclude_id]
+
+    latitudes = index.latitudes[positions]
+    longitudes = index.longitudes[positions]
+    result = estimate(origin[0], origin[1], latitudes, longitudes, transport_mode, bucket)
+
+    reachable = np.flatnonzero(result['duration_min'] <= minutes)
+    order = reachable[np.argsort(result['duration_min'][reachable], kind='stable')]
+    return {
+        'ids': index.ids[positions][order],
+        'latitudes': latitudes[order],
+        'longitudes': longitudes[order],
+        'duration_min': result['duration_min'][order],
+        'distance_km': result['distance_km'][order],
+        'cost_fcfa': result['cost_fcfa'][order],
+    }
+
+
+def isochrone_polygon(origin: Tuple[float, float], latitudes: np.ndarray, longitudes: np.ndarray,
+                      sectors: int = 36) -> List[List[float]]:
+    """Contour de la zone atteignable : lieu atteignable le plus éloigné de chaque secteur angulaire
+
+    Polygone fermé de [lat, lon], étoilé autour de l'origine (plus fidèle qu'une
+    enveloppe convexe quand le réseau est irrégulier).
+    """
+    if len(latitudes) == 0:
+        return []
+    dy = latitudes - origin[0]
+    dx = (longitudes - origin[1]) * math.cos(math.radians(origin[0]))
+    angles = np.arctan2(dy, dx)
+    sector = ((angles + np.pi) / (2 * np.pi) * sectors).astype(np.int64) % sectors
+    radius = dy ** 2 + dx ** 2
+
+    # Pour chaque secteur, le point de rayon maximal (tri par secteur puis rayon)
+    order = np.lexsort((radius, sector))
+    last = np.flatnonzero(np.diff(sector[order], append=sectors))
+    farthest = order[last]
+    farthest = farthest[np.argsort(angles[farthest])]
+
+    polygon = [[float(latitudes[i]), float(longitudes[i])] for i in farthest]
+    return polygon + polygon[:1]
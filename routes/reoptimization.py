@@ -0,0 +1,113 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OptimizedRoute, OptimizedRoutePayload
+from .services import RateLimiter, RouteOptimizer
+from .signals import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Colonnes remplacées par un nouveau calcul (les données de l'IA vont dans OptimizedRoutePayload)
+UPDATED_FIELDS = ['distance', 'duration', 'cost_estimate', 'is_fallback', 'geometry', 'geometry_levels', 'refreshed_at']
+
+
+def reoptimizable(queryset=None, stale_before: Optional[datetime] = None):
+    """Routes simples à recalculer, calculées (ou recalculées) avant stale_before si donné
+
+    Les tournées de plans de flotte ne sont pas des trajets départ → destination :
+    elles sont recalculées avec leur plan (routes.vrp).
+    """
+    queryset = OptimizedRoute.objects.all() if queryset is None else queryset
+    queryset = queryset.filter(fleet_plan__isnull=True)
+    if stale_before is not None:
+        queryset = queryset.filter(
+            Q(refreshed_at__lt=stale_before) | Q(refreshed_at__isnull=True, created_at__lt=stale_before)
+        )
+    return queryset
+
+
+def _refresh(optimizer: RouteOptimizer, route: OptimizedRoute, rate_limiter: RateLimiter) -> Optional[Dict]:
+    route_request = route.route_request
+    departure, destination = route_request.departure, route_request.destination
+    try:
+        # Même heure de départ que la demande d'origine (profils de vitesse, clé de cache)
+        return optimizer.refresh_route(
+            departure.address, destination.address, route_request.transport_mode, rate_limiter,
+            (departure.latitude, departure.longitude), (destination.latitude, destination.longitude),
+            route_request.departure_time or route_request.created_at
+        )
+    except Exception as e:
+        logger.error(f"Erreur de ré-optimisation de la route {route.id}: {e}")
+        return None
+
+
+def reoptimize_batch(routes: List[OptimizedRoute], executor: ThreadPoolExecutor,
+                     optimizer: RouteOptimizer, rate_limiter: RateLimiter) -> int:
+    """Recalcule un lot de routes en parallèle puis l'enregistre en deux requêtes ; renvoie les routes mises à jour
+
+    Un résultat de repli (Gemini indisponible) ne remplace pas l'analyse existante.
+    """
+    results = list(executor.map(lambda route: _refresh(optimizer, route, rate_limiter), routes))
+    now = timezone.now()
+    updated = []
+    for route, result in zip(routes, results):
+        if result is None or result.get('ai_analysis', {}).get('is_fallback'):
+            continue
+        fresh = OptimizedRoute.objects.build(route.route_request, result)
+        for field in UPDATED_FIELDS[:-1]:
+            setattr(route, field, getattr(fresh, field))
+        route.refreshed_at = now
+        route.route_data = fresh.route_data
+        updated.append(route)
+    if not updated:
+        return 0
+
+    with transaction.atomic():
+        OptimizedRoute.objects.bulk_update(updated, UPDATED_FIELDS)
+        OptimizedRoutePayload.objects.bulk_create(
+            [OptimizedRoutePayload(route=route, **OptimizedRoutePayload.encode(route.route_data)) for route in updated],
+            update_conflicts=True, unique_fields=['route'], update_fields=['encoding', 'data', 'size']
+        )
+    for route in updated:
+        route._route_data_changed = False
+    return len(updated)
+
+
+def reoptimize_routes(queryset, batch_size: Optional[int] = None, concurrency: Optional[int] = None,
+                      rate: Optional[float] = None, after_id: int = 0) -> Iterator[Dict]:
+    """Recalcule les routes de queryset par lots, dans l'ordre des identifiants ; un état de progression par lot
+
+    Chaque lot est enregistré avant le suivant : une passe interrompue reprend
+    avec after_id = last_id du dernier état reçu. Les appels à l'IA passent par
+    un pool de `concurrency` threads, au plus `rate` par seconde.
+    """
+    batch_size = batch_size or getattr(settings, 'ROUTE_REOPTIMIZE_BATCH_SIZE', 50)
+    concurrency = concurrency or getattr(settings, 'ROUTE_REOPTIMIZE_CONCURRENCY', 4)
+    rate = rate or getattr(settings, 'ROUTE_REOPTIMIZE_RATE', 2.0)
+
+    queryset = reoptimizable(queryset).select_related(
+        'route_request__departure', 'route_request__destination'
+    ).order_by('id')
+    optimizer = RouteOptimizer()
+    rate_limiter = RateLimiter(rate)
+    progress = {'last_id': after_id, 'processed': 0, 'updated': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        while True:
+            routes = list(queryset.filter(id__gt=progress['last_id'])[:batch_size])
+            if not routes:
+                break
+            updated = reoptimize_batch(routes, executor, optimizer, rate_limiter)
+            progress['last_id'] = routes[-1].id
+            progress['processed'] += len(routes)
+            progress['updated'] += updated
+            progress['failed'] += len(routes) - updated
+            if updated:
+                bump_version('routes')
+            yield dict(progress)
@@ -0,0 +1,231 @@
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedRoute, DriverAssignment, OptimizedRoute, OptimizedRoutePayload, RouteRequest
+from .signals import bump_version
+
+# Types d'utilisateurs des politiques de ROUTE_RETENTION
+USER_TYPES = {
+    'anonymous': Q(user__isnull=True),
+    'staff': Q(user__is_staff=True),
+    'user': Q(user__isnull=False, user__is_staff=False),
+}
+
+STORAGES = ('table', 'jsonl')
+
+
+def get_policies() -> Dict[str, Dict]:
+    """Politiques de ROUTE_RETENTION validées : {type d'utilisateur: {'days', 'storage'}}"""
+    policies = {}
+    for user_type, policy in getattr(settings, 'ROUTE_RETENTION', {}).items():
+        if user_type not in USER_TYPES:
+            raise ValueError(f"Type d'utilisateur inconnu: {user_type}")
+        storage = policy.get('storage', 'table')
+        if storage not in STORAGES:
+            raise ValueError(f"Stockage d'archive inconnu: {storage}")
+        policies[user_type] = {'days': policy.get('days'), 'storage': storage}
+    return policies
+
+
+def archive_root() -> Path:
+    return Path(getattr(settings, 'ROUTE_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive'))
+
+
+def archivable(user_type: str, days: int, now=None):
+    """Demandes du type d'utilisateur plus anciennes que `days` jours, hors historiques restaurés
+    et tournées de plans de flotte (supprimées avec leur plan)
+    """
+    now = now or timezone.now()
+    return RouteRequest.objects.filter(
+        USER_TYPES[user_type],
+        created_at__lt=now - timedelta(days=days)
+    ).filter(
+        Q(retain_until__isnull=True) | Q(retain_until__lt=now)
+    ).filter(optimizedroute__fleet_plan__isnull=True)
+
+
+def check_dependents():
+    """Les suppressions directes ne suivent pas les cascades : refuser si un autre modèle en dépend"""
+    for model, expected in ((RouteRequest, {OptimizedRoute, DriverAssignment}), (OptimizedRoute, {OptimizedRoutePayload})):
+        unexpected = {relation.related_model for relation in model._meta.related_objects} - expected
+        if unexpected:
+            names = ', '.join(sorted(other.__name__ for other in unexpected))
+            raise RuntimeError(f"Archivage impossible : {names} dépend de {model.__name__}")
+
+
+def append_jsonl(path: Path, lines: List[Dict]):
+    """Ajoute un membre gzip au fichier, écrit sur disque avant le retour"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_batch(queryset, storage: str, batch_size: int, archive_file: str = '') -> int:
+    """Archive les `batch_size` demandes les plus anciennes de queryset, dans une transaction courte
+
+    Les données sont écrites (table d'archive ou fichier JSONL) avant la
+    suppression des lignes principales ; un échec annule tout le lot.
+    """
+    with transaction.atomic():
+        requests = list(queryset.select_related('optimizedroute__payload').order_by('created_at', 'id')[:batch_size])
+        if not requests:
+            return 0
+
+        entries, lines, route_ids = [], [], []
+        for route_request in requests:
+            try:
+                route = route_request.optimizedroute
+            except OptimizedRoute.DoesNotExist:
+                route = None
+            data = {}
+            if route is not None:
+                route_ids.append(route.id)
+                data = {
+                    'route_data': route.route_data,
+                    'geometry': route.geometry,
+                    'geometry_levels': route.geometry_levels,
+                }
+            entry = ArchivedRoute(
+                original_request_id=route_request.id,
+                original_route_id=route.id if route else None,
+                user_id=route_request.user_id,
+                departure_id=route_request.departure_id,
+                destination_id=route_request.destination_id,
+                transport_mode=route_request.transport_mode,
+                requested_at=route_request.created_at,
+                departure_time=route_request.departure_time,
+                distance=route.distance if route else None,
+                duration=route.duration if route else None,
+                cost_estimate=route.cost_estimate if route else None,
+                route_created_at=route.created_at if route else None,
+                route_refreshed_at=route.refreshed_at if route else None,
+                storage=storage,
+            )
+            if storage == 'jsonl':
+                entry.archive_file = archive_file
+                lines.append({'request_id': route_request.id, **data})
+            else:
+                entry.data = ArchivedRoute.encode_data(data)
+            entries.append(entry)
+
+        if lines:
+            append_jsonl(archive_root() / archive_file, lines)
+        ArchivedRoute.objects.bulk_create(entries)
+
+        # Suppressions directes (sans chargement ni signal par ligne), dépendances d'abord ;
+        # les affectations de chauffeurs ne sont pas archivées
+        request_ids = [route_request.id for route_request in requests]
+        for model, lookup, ids in (
+            (DriverAssignment, 'route_request_id__in', request_ids),
+            (OptimizedRoutePayload, 'route_id__in', route_ids),
+            (OptimizedRoute, 'id__in', route_ids),
+            (RouteRequest, 'id__in', request_ids),
+        ):
+            if ids:
+                model.objects.filter(**{lookup: ids})._raw_delete(model.objects.db)
+
+    bump_version('route_requests')
+    bump_version('routes')
+    return len(requests)
+
+
+def load_payloads(entries: List[ArchivedRoute]) -> Dict[int, Dict]:
+    """Données de l'IA et tracés des archives : {id de demande d'origine: données}"""
+    payloads = {}
+    by_file = defaultdict(set)
+    for entry in entries:
+        if entry.storage == 'jsonl':
+            by_file[entry.archive_file].add(entry.original_request_id)
+        else:
+            payloads[entry.original_request_id] = entry.decode_data()
+
+    # Un seul passage par fichier pour toutes les demandes du lot
+    for archive_file, request_ids in by_file.items():
+        with gzip.open(archive_root() / archive_file, 'rt', encoding='utf-8') as f:
+            for line in f:
+                data = json.loads(line)
+                if data['request_id'] in request_ids:
+                    payloads[data.pop('request_id')] = data
+    return payloads
+
+
+def restore_routes(queryset, retain_days: Optional[int] = None, batch_size: int = 500) -> int:
+    """Remet les archives de queryset dans les tables principales (mêmes identifiants)
+
+    Les demandes restaurées ne sont pas réarchivées pendant retain_days jours.
+    """
+    if retain_days is None:
+        retain_days = getattr(settings, 'ROUTE_RESTORE_RETAIN_DAYS', 30)
+    retain_until = timezone.now() + timedelta(days=retain_days)
+
+    restored = 0
+    while True:
+        with transaction.atomic():
+            entries = list(queryset.order_by('id')[:batch_size])
+            if not entries:
+                break
+            payloads = load_payloads(entries)
+
+            requests = RouteRequest.objects.bulk_create([
+                RouteRequest(
+                    id=entry.original_request_id,
+                    user_id=entry.user_id,
+                    departure_id=entry.departure_id,
+                    destination_id=entry.destination_id,
+                    transport_mode=entry.transport_mode,
+                    departure_time=entry.departure_time,
+                    retain_until=retain_until,
+                )
+                for entry in entries
+            ])
+            # auto_now_add a remplacé les dates d'origine
+            for route_request, entry in zip(requests, entries):
+                route_request.created_at = entry.requested_at
+            RouteRequest.objects.bulk_update(requests, ['created_at'])
+
+            routes, created_at = [], []
+            for entry in entries:
+                if entry.original_route_id is None:
+                    continue
+                data = payloads.get(entry.original_request_id, {})
+                route = OptimizedRoute(
+                    id=entry.original_route_id,
+                    route_request_id=entry.original_request_id,
+                    distance=entry.distance,
+                    duration=entry.duration,
+                    cost_estimate=entry.cost_estimate,
+                    is_fallback=bool((data.get('route_data') or {}).get('ai_analysis', {}).get('is_fallback')),
+                    geometry=data.get('geometry', ''),
+                    geometry_levels=data.get('geometry_levels') or {},
+                    refreshed_at=entry.route_refreshed_at,
+                )
+                route.route_data = data.get('route_data', {})
+                routes.append(route)
+                created_at.append(entry.route_created_at)
+            if routes:
+                OptimizedRoute.objects.bulk_create_with_payload(routes)
+                for route, value in zip(routes, created_at):
+                    route.created_at = value
+                OptimizedRoute.objects.bulk_update(routes, ['created_at'])
+
+            ArchivedRoute.objects.filter(id__in=[entry.id for entry in entries])._raw_delete(ArchivedRoute.objects.db)
+        restored += len(entries)
+
+    if restored:
+        bump_version('route_requests')
+        bump_version('routes')
+    return restored
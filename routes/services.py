@@ -1,16 +1,131 @@
-import google.generativeai as genai
 from django.conf import settings
+from django.core.cache import cache
+import hashlib
 import json
-import requests
 import random
-from typing import Dict, List, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
+from django.utils import timezone
+from .eta_model import quick_estimate
+from .geo import geohash_encode, haversine_km, normalize_address
+from . import polyline
+from .speed_profiles import bucket_label, local_hour, time_bucket
+from .streaming import IncrementalJSONParser
+from .tiered_cache import MISSING, get_tiered_cache
 
 logger = logging.getLogger(__name__)
 
+# Compteurs du cache des résultats d'optimisation
+ROUTE_CACHE_STATS_KEYS = {
+    'hits': 'route_cache:stats:hits',
+    'warm_hits': 'route_cache:stats:warm_hits',
+    'reverse_hits': 'route_cache:stats:reverse_hits',
+    'nearby_hits': 'route_cache:stats:nearby_hits',
+    'misses': 'route_cache:stats:misses',
+}
+
+# Coordonnées par défaut (centre de Yaoundé) quand le géocodage échoue : un
+# résultat construit dessus n'est ni mis en cache ni indexé par geohash
+DEFAULT_COORDINATES = (3.8480, 11.5021)
+
+# Profils OSRM utilisés pour le tracé de chaque mode
+OSRM_PROFILES = {
+    'walking': 'foot',
+    'bike': 'bike',
+}
+
+def route_cache_key(departure_address: str, destination_address: str, transport_mode: str, bucket: int) -> str:
+    """Clé de cache d'un résultat d'optimisation (départ, destination, mode, quart d'heure de départ)
+
+    Les adresses sont normalisées : les variantes d'écriture d'un même lieu
+    partagent la même entrée. Un même trajet à l'heure de pointe et la nuit
+    n'a pas la même durée : une entrée par quart d'heure (routes.speed_profiles).
+    """
+    raw = f"{normalize_address(departure_address)}|{normalize_address(destination_address)}"
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f"route:v3:{transport_mode}:{bucket}:{digest}"
+
+def route_geohash_key(departure_coords: Tuple[float, float], destination_coords: Tuple[float, float],
+                      transport_mode: str, bucket: int) -> str:
+    """Clé d'index geohash pointant vers la clé exacte d'un trajet en cache"""
+    precision = getattr(settings, 'ROUTE_REUSE_GEOHASH_PRECISION', 7)
+    return (
+        f"route:gh:v2:{transport_mode}:{bucket}:"
+        f"{geohash_encode(*departure_coords, precision=precision)}:"
+        f"{geohash_encode(*destination_coords, precision=precision)}"
+    )
+
+def reverse_result(result: Dict) -> Dict:
+    """Résultat du trajet inverse (B→A) : étapes inversées, distance/durée/coût conservés"""
+    reversed_result = dict(result)
+    reversed_result['departure'] = result['destination']
+    reversed_result['destination'] = result['departure']
+    
+    ai_analysis = dict(result.get('ai_analysis', {}))
+    optimal_route = dict(ai_analysis.get('optimal_route', {}))
+    optimal_route['steps'] = list(reversed(optimal_route.get('steps', [])))
+    ai_analysis['optimal_route'] = optimal_route
+    reversed_result['ai_analysis'] = ai_analysis
+    
+    if result.get('geometry'):
+        reversed_result['geometry'] = polyline.encode(list(reversed(polyline.decode(result['geometry']))))
+    return reversed_result
+
+def is_within_tolerance(result: Dict, departure_coords: Tuple[float, float],
+                        destination_coords: Tuple[float, float]) -> bool:
+    """Vérifie que les extrémités en cache sont à moins de ROUTE_REUSE_MAX_DISTANCE_M des extrémités demandées"""
+    max_distance_km = getattr(settings, 'ROUTE_REUSE_MAX_DISTANCE_M', 150) / 1000
+    cached_dep = result['departure']['coordinates']
+    cached_dest = result['destination']['coordinates']
+    return (
+        haversine_km(*cached_dep, *departure_coords) <= max_distance_km
+        and haversine_km(*cached_dest, *destination_coords) <= max_distance_km
+    )
+
+def _incr_stat(name: str):
+    key = ROUTE_CACHE_STATS_KEYS[name]
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except ValueError:
+        # Clé expirée entre add() et incr()
+        cache.set(key, 1, timeout=None)
+
+def route_cache_stats() -> Dict[str, float]:
+    """Compteurs de hits/misses et taux de succès du cache des routes"""
+    stats = {name: cache.get(key, 0) for name, key in ROUTE_CACHE_STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats['warm_hit_ratio'] = stats['warm_hits'] / lookups if lookups else 0.0
+    return stats
+
+def reset_route_cache_stats():
+    cache.delete_many(list(ROUTE_CACHE_STATS_KEYS.values()))
+
+class RateLimiter:
+    """Limite le nombre d'appels par seconde, partagé entre threads"""
+    def __init__(self, calls_per_second: float):
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+    
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
 class RouteOptimizer:
     def __init__(self):
         try:
+            # Import différé (~1 s) : seules les vues qui appellent l'IA le paient
+            import google.generativeai as genai
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.model = genai.GenerativeModel('gemini-2.0-flash')
             self.EUR_TO_FCFA = 656
@@ -19,88 +134,200 @@ class RouteOptimizer:
             raise
     
     def get_coordinates(self, address: str) -> Tuple[float, float]:
-        """Obtenir les coordonnées d'une adresse au Cameroun"""
+        """Obtenir les coordonnées d'une adresse au Cameroun (cache à deux niveaux)"""
+        key = hashlib.sha1((normalize_address(address) or address.strip()).encode('utf-8')).hexdigest()
         try:
-            prompt = f"""
-            Donnez-moi les coordonnées GPS précises (latitude, longitude) pour cette adresse au Cameroun:
-            {address}
-            
-            Répondez uniquement avec les coordonnées au format JSON:
-            {{
-                "latitude": 0.0,
-                "longitude": 0.0
-            }}
-            """
-            
-            response = self.model.generate_content(prompt)
-            response_text = str(response.text).strip()
+            lat, lon = get_tiered_cache().get_or_set('geocode', key, lambda: self.geocode_with_ai(address))
+            return (lat, lon)
+        except Exception as e:
+            logger.warning(f"Erreur get_coordinates pour {address}: {e}")
+            # Coordonnées par défaut sécurisées pour le Cameroun (jamais mises en cache)
+            return DEFAULT_COORDINATES
+    
+    def geocode_with_ai(self, address: str) -> Tuple[float, float]:
+        """Géocodage d'une adresse par Gemini (lève une exception en cas d'échec)"""
+        prompt = f"""
+        Donnez-moi les coordonnées GPS précises (latitude, longitude) pour cette adresse au Cameroun:
+        {address}
+        
+        Répondez uniquement avec les coordonnées au format JSON:
+        {{
+            "latitude": 0.0,
+            "longitude": 0.0
+        }}
+        """
+        
+        response = self.model.generate_content(prompt)
+        response_text = str(response.text).strip()
+        
+        # Nettoyage et validation du JSON
+        if not response_text.startswith('{'): 
+            response_text = response_text.split('{', 1)[1]
+            response_text = '{' + response_text
+        if not response_text.endswith('}'):
+            response_text = response_text.rsplit('}', 1)[0] + '}'
             
-            # Nettoyage et validation du JSON
-            if not response_text.startswith('{'): 
-                response_text = response_text.split('{', 1)[1]
-                response_text = '{' + response_text
-            if not response_text.endswith('}'):
-                response_text = response_text.rsplit('}', 1)[0] + '}'
-                
-            coords = json.loads(response_text)
+        coords = json.loads(response_text)
+        
+        # Validation des coordonnées
+        lat = float(coords["latitude"])
+        lon = float(coords["longitude"])
+        
+        if not (2.0 <= lat <= 13.0 and 8.0 <= lon <= 16.0):
+            raise ValueError("Coordonnées hors limites du Cameroun")
             
-            # Validation des coordonnées
-            lat = float(coords["latitude"])
-            lon = float(coords["longitude"])
+        return (lat, lon)
+    
+    def get_route_geometry(self, departure_coords: Tuple[float, float],
+                           destination_coords: Tuple[float, float], transport_mode: str) -> str:
+        """Tracé routier (polyline encodée) via OSRM, ou segment direct si indisponible"""
+        profile = OSRM_PROFILES.get(transport_mode, 'driving')
+        raw = f"{profile}|{departure_coords[0]:.5f},{departure_coords[1]:.5f}|{destination_coords[0]:.5f},{destination_coords[1]:.5f}"
+        key = f"v1:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+        
+        def fetch():
+            import requests
             
-            if not (2.0 <= lat <= 13.0 and 8.0 <= lon <= 16.0):
-                raise ValueError("Coordonnées hors limites du Cameroun")
-                
-            return (lat, lon)
+            # OSRM attend lon,lat
+            url = (
+                f"{osrm_url.rstrip('/')}/route/v1/{profile}/"
+                f"{departure_coords[1]},{departure_coords[0]};{destination_coords[1]},{destination_coords[0]}"
+            )
+            response = requests.get(
+                url,
+                params={'overview': 'full', 'geometries': 'polyline'},
+                timeout=getattr(settings, 'OSRM_TIMEOUT', 5)
+            )
+            response.raise_for_status()
+            return response.json()['routes'][0]['geometry']
+        
+        osrm_url = getattr(settings, 'OSRM_URL', '')
+        if osrm_url:
+            try:
+                return get_tiered_cache().get_or_set('geometry', key, fetch)
+            except Exception as e:
+                logger.warning(f"Erreur get_route_geometry: {e}")
+        
+        # Segment direct, non mis en cache pour réessayer OSRM plus tard
+        return polyline.encode([departure_coords, destination_coords])
+    
+    def build_route_prompt(self, departure: str, destination: str, transport_mode: str,
+                           departure_time: Optional[datetime] = None) -> str:
+        """Prompt Gemini d'analyse d'itinéraire (réponse JSON attendue)"""
+        return f"""
+        Je veux une analyse détaillée d'un itinéraire au Cameroun.
+        
+        DONNÉES:
+        - Départ: {departure}
+        - Destination: {destination}
+        - Mode de transport: {transport_mode}
+        - Heure de départ: {bucket_label(time_bucket(departure_time))} (heure locale, à prendre en compte pour la circulation)
+        
+        CONTEXTE LOCAL:
+        - Pays: Cameroun
+        - Monnaie: Franc CFA (FCFA)
+        - Conditions routières variables selon les régions
+        - Impact saisonnier sur les trajets
+        - Options de transport: bus, taxi-brousse, moto-taxi
+        
+        RÉPONDEZ STRICTEMENT AU FORMAT JSON SUIVANT:
+        {{
+            "optimal_route": {{
+                "steps": ["étape 1", "étape 2"],
+                "estimated_time": 120,
+                "estimated_distance": 45.5,
+                "cost_estimate": 5000
+            }},
+            "alternatives": [
+                {{
+                    "route": "description alternative",
+                    "time": 150,
+                    "distance": 50.0,
+                    "cost": 6000
+                }}
+            ],
+            "recommendations": ["conseil 1", "conseil 2"],
+            "points_of_interest": ["point 1", "point 2"],
+            "local_info": {{
+                "weather_considerations": "Considérations météo",
+                "road_conditions": "État des routes",
+                "safety_tips": "Conseils de sécurité"
+            }}
+        }}
+        """
+    
+    def normalize_route_analysis(self, route_data: Dict) -> Dict:
+        """Validation et conversion des données numériques de la réponse IA"""
+        try:
+            route_data["optimal_route"]["estimated_time"] = float(route_data["optimal_route"]["estimated_time"])
+            route_data["optimal_route"]["estimated_distance"] = float(route_data["optimal_route"]["estimated_distance"])
+            route_data["optimal_route"]["cost_estimate"] = float(route_data["optimal_route"]["cost_estimate"])
             
-        except Exception as e:
-            logger.warning(f"Erreur get_coordinates pour {address}: {e}")
-            # Coordonnées par défaut sécurisées pour le Cameroun
-            return (3.8480, 11.5021)  # Yaoundé
+            for alt in route_data["alternatives"]:
+                alt["time"] = float(alt["time"])
+                alt["distance"] = float(alt["distance"])
+                alt["cost"] = float(alt["cost"])
+        except (ValueError, KeyError) as e:
+            logger.error(f"Erreur de conversion des données: {e}")
+            raise
+        
+        return route_data
     
-    def calculate_route_with_ai(self, departure: str, destination: str, transport_mode: str) -> Dict:
+    def fallback_analysis(self, transport_mode: Optional[str] = None,
+                          departure_coords: Optional[Tuple[float, float]] = None,
+                          destination_coords: Optional[Tuple[float, float]] = None,
+                          departure_time: Optional[datetime] = None) -> Dict:
+        """Données par défaut sécurisées (jamais mises en cache)
+
+        Si le mode et les coordonnées sont connus, durée, distance et coût
+        viennent du modèle appris (ou du tableau des tarifs et des profils de
+        vitesse à l'heure de départ) plutôt que de valeurs fixes.
+        """
+        optimal_route = {
+            "steps": ["Départ", "Arrivée"],
+            "estimated_time": 120.0,
+            "estimated_distance": 45.5,
+            "cost_estimate": 5000.0
+        }
+        if transport_mode and departure_coords and destination_coords:
+            try:
+                estimate = quick_estimate(
+                    departure_coords, destination_coords, transport_mode, local_hour(departure_time)
+                )
+                optimal_route.update(
+                    estimated_time=float(estimate['estimated_time']),
+                    estimated_distance=float(estimate['estimated_distance']),
+                    cost_estimate=float(estimate['cost_estimate']),
+                    source=estimate['source']
+                )
+            except ValueError as e:
+                logger.error(f"Erreur estimation locale: {e}")
+        
+        return {
+            "is_fallback": True,
+            "optimal_route": optimal_route,
+            "alternatives": [
+                {
+                    "route": "Route alternative",
+                    "time": round(optimal_route["estimated_time"] * 1.25),
+                    "distance": round(optimal_route["estimated_distance"] * 1.1, 1),
+                    "cost": optimal_route["cost_estimate"] * 1.2
+                }
+            ],
+            "recommendations": ["Vérifiez la météo avant le départ", "Prévoyez de l'eau"],
+            "points_of_interest": ["Station-service", "Marché local"],
+            "local_info": {
+                "weather_considerations": "Vérifiez la météo locale",
+                "road_conditions": "État des routes variable",
+                "safety_tips": "Voyagez de préférence le jour"
+            }
+        }
+    
+    def calculate_route_with_ai(self, departure: str, destination: str, transport_mode: str,
+                                departure_time: Optional[datetime] = None) -> Dict:
         """Utilise Gemini pour analyser et optimiser l'itinéraire au Cameroun"""
         try:
-            prompt = f"""
-            Je veux une analyse détaillée d'un itinéraire au Cameroun.
-            
-            DONNÉES:
-            - Départ: {departure}
-            - Destination: {destination}
-            - Mode de transport: {transport_mode}
-            
-            CONTEXTE LOCAL:
-            - Pays: Cameroun
-            - Monnaie: Franc CFA (FCFA)
-            - Conditions routières variables selon les régions
-            - Impact saisonnier sur les trajets
-            - Options de transport: bus, taxi-brousse, moto-taxi
-            
-            RÉPONDEZ STRICTEMENT AU FORMAT JSON SUIVANT:
-            {{
-                "optimal_route": {{
-                    "steps": ["étape 1", "étape 2"],
-                    "estimated_time": 120,
-                    "estimated_distance": 45.5,
-                    "cost_estimate": 5000
-                }},
-                "alternatives": [
-                    {{
-                        "route": "description alternative",
-                        "time": 150,
-                        "distance": 50.0,
-                        "cost": 6000
-                    }}
-                ],
-                "recommendations": ["conseil 1", "conseil 2"],
-                "points_of_interest": ["point 1", "point 2"],
-                "local_info": {{
-                    "weather_considerations": "Considérations météo",
-                    "road_conditions": "État des routes",
-                    "safety_tips": "Conseils de sécurité"
-                }}
-            }}
-            """
+            prompt = self.build_route_prompt(departure, destination, transport_mode, departure_time)
             
             response = self.model.generate_content(prompt)
             response_text = str(response.text).strip()
@@ -114,80 +341,213 @@ class RouteOptimizer:
                 
             route_data = json.loads(response_text)
             
-            # Validation et conversion des données numériques
-            try:
-                route_data["optimal_route"]["estimated_time"] = float(route_data["optimal_route"]["estimated_time"])
-                route_data["optimal_route"]["estimated_distance"] = float(route_data["optimal_route"]["estimated_distance"])
-                route_data["optimal_route"]["cost_estimate"] = float(route_data["optimal_route"]["cost_estimate"])
-                
-                for alt in route_data["alternatives"]:
-                    alt["time"] = float(alt["time"])
-                    alt["distance"] = float(alt["distance"])
-                    alt["cost"] = float(alt["cost"])
-            except (ValueError, KeyError) as e:
-                logger.error(f"Erreur de conversion des données: {e}")
-                raise
-                
-            return route_data
+            return self.normalize_route_analysis(route_data)
             
         except Exception as e:
             logger.error(f"Erreur calculate_route_with_ai: {e}")
-            # Données par défaut sécurisées
-            return {
-                "optimal_route": {
-                    "steps": ["Départ", "Arrivée"],
-                    "estimated_time": 120.0,
-                    "estimated_distance": 45.5,
-                    "cost_estimate": 5000.0
-                },
-                "alternatives": [
-                    {
-                        "route": "Route alternative",
-                        "time": 150.0,
-                        "distance": 50.0,
-                        "cost": 6000.0
-                    }
-                ],
-                "recommendations": ["Vérifiez la météo avant le départ", "Prévoyez de l'eau"],
-                "points_of_interest": ["Station-service", "Marché local"],
-                "local_info": {
-                    "weather_considerations": "Vérifiez la météo locale",
-                    "road_conditions": "État des routes variable",
-                    "safety_tips": "Voyagez de préférence le jour"
-                }
+            return self.fallback_analysis()
+    
+    def stream_route_with_ai(self, departure: str, destination: str, transport_mode: str,
+                             departure_time: Optional[datetime] = None) -> Iterator[Tuple[Tuple, object]]:
+        """Version en flux de calculate_route_with_ai
+        
+        Produit (chemin, valeur) pour chaque champ de la réponse dès qu'il est
+        complet, puis (('ai_analysis',), analyse complète) en dernier.
+        """
+        parser = IncrementalJSONParser(max_depth=2)
+        try:
+            prompt = self.build_route_prompt(departure, destination, transport_mode, departure_time)
+            for chunk in self.model.generate_content(prompt, stream=True):
+                for path, value in parser.feed(chunk.text):
+                    yield path, value
+            
+            analysis = self.normalize_route_analysis(parser.result)
+        except Exception as e:
+            logger.error(f"Erreur stream_route_with_ai: {e}")
+            analysis = self.fallback_analysis()
+        
+        yield ('ai_analysis',), analysis
+    
+    def get_cached_route(self, departure_address: str, destination_address: str, transport_mode: str,
+                         departure_coords: Optional[Tuple[float, float]] = None,
+                         destination_coords: Optional[Tuple[float, float]] = None,
+                         departure_time: Optional[datetime] = None) -> Optional[Dict]:
+        """Résultat en cache pour ce trajet au même quart d'heure de départ, ou None (met à jour les compteurs)
+        
+        Réutilise aussi le trajet inverse (B→A servi depuis A→B) et, si les
+        coordonnées sont connues, un trajet dont les extrémités tombent dans
+        les mêmes cellules geohash. Sans heure de départ : maintenant.
+        """
+        bucket = time_bucket(departure_time)
+        exact_key = route_cache_key(departure_address, destination_address, transport_mode, bucket)
+        reverse_key = route_cache_key(destination_address, departure_address, transport_mode, bucket)
+        keys = [exact_key, reverse_key]
+        
+        nearby_key = nearby_reverse_key = None
+        if departure_coords and destination_coords:
+            nearby_key = route_geohash_key(departure_coords, destination_coords, transport_mode, bucket)
+            nearby_reverse_key = route_geohash_key(destination_coords, departure_coords, transport_mode, bucket)
+            keys += [nearby_key, nearby_reverse_key]
+        
+        tiered_cache = get_tiered_cache()
+        found = tiered_cache.get_many('route', keys)
+        result = reuse = entry = None
+        
+        if exact_key in found:
+            entry = found[exact_key]
+            result = entry['result']
+        elif reverse_key in found:
+            entry = found[reverse_key]
+            result, reuse = reverse_result(entry['result']), 'reverse'
+        else:
+            for pointer_key, reversed_pair in ((nearby_key, False), (nearby_reverse_key, True)):
+                if pointer_key not in found:
+                    continue
+                entry = tiered_cache.get('route', found[pointer_key])
+                if entry is None:
+                    continue
+                candidate = reverse_result(entry['result']) if reversed_pair else entry['result']
+                if is_within_tolerance(candidate, departure_coords, destination_coords):
+                    result, reuse = candidate, 'nearby'
+                    break
+        
+        if result is None:
+            _incr_stat('misses')
+            return None
+        
+        _incr_stat('hits')
+        if entry.get('warmed'):
+            _incr_stat('warm_hits')
+        if reuse:
+            _incr_stat(f'{reuse}_hits')
+            # Le résultat réutilisé porte les extrémités demandées
+            result = dict(result)
+            result['departure'] = {
+                'address': departure_address,
+                'coordinates': departure_coords or result['departure']['coordinates']
+            }
+            result['destination'] = {
+                'address': destination_address,
+                'coordinates': destination_coords or result['destination']['coordinates']
             }
+            result['reused_from'] = reuse
+        return result
+    
+    def cache_route(self, result: Dict, warmed: bool = False):
+        """Met en cache un résultat d'optimisation, sauf repli par défaut ou coordonnées par défaut"""
+        if (result.get('ai_analysis', {}).get('is_fallback') or result.get('reused_from')
+                or result.get('approximate_coordinates')):
+            return
+        tiered_cache = get_tiered_cache()
+        ttl = tiered_cache.ttl('route')
+        key = route_cache_key(
+            result['departure']['address'],
+            result['destination']['address'],
+            result['transport_mode'],
+            result['time_bucket']
+        )
+        entries = {
+            key: {
+                'result': result,
+                'expires_at': time.time() + ttl,
+                'warmed': warmed,
+            },
+            # Index geohash -> clé exacte, pour les trajets voisins
+            route_geohash_key(
+                result['departure']['coordinates'],
+                result['destination']['coordinates'],
+                result['transport_mode'],
+                result['time_bucket']
+            ): key,
+        }
+        tiered_cache.set_many('route', entries, ttl)
+    
+    def cache_time_left(self, departure_address: str, destination_address: str, transport_mode: str,
+                        departure_time: Optional[datetime] = None) -> Optional[float]:
+        """Secondes avant expiration de l'entrée en cache (quart d'heure de départ), None si absente"""
+        key = route_cache_key(departure_address, destination_address, transport_mode, time_bucket(departure_time))
+        entry = get_tiered_cache().get('route', key)
+        if entry is None:
+            return None
+        return entry['expires_at'] - time.time()
     
-    def optimize_route(self, departure_address: str, destination_address: str, transport_mode: str) -> Dict:
-        """Méthode principale d'optimisation pour le Cameroun"""
+    def refresh_route(self, departure_address: str, destination_address: str, transport_mode: str,
+                      rate_limiter: Optional[RateLimiter] = None,
+                      departure_coords: Optional[Tuple[float, float]] = None,
+                      destination_coords: Optional[Tuple[float, float]] = None,
+                      departure_time: Optional[datetime] = None) -> Dict:
+        """Recalcule un trajet sans lire le cache et le met en cache (pré-chauffage)"""
+        if rate_limiter:
+            rate_limiter.wait()
+        result = self.compute_route(
+            departure_address, destination_address, transport_mode,
+            departure_coords, destination_coords, departure_time or timezone.now()
+        )
+        self.cache_route(result, warmed=True)
+        return result
+    
+    def optimize_route(self, departure_address: str, destination_address: str, transport_mode: str,
+                       departure_coords: Optional[Tuple[float, float]] = None,
+                       destination_coords: Optional[Tuple[float, float]] = None,
+                       departure_time: Optional[datetime] = None) -> Dict:
+        """Méthode principale d'optimisation pour le Cameroun (avec cache)
+        
+        Les coordonnées, si elles sont connues (Location), évitent le géocodage
+        par l'IA et permettent la réutilisation des trajets voisins. Sans heure
+        de départ, le trajet part maintenant.
+        """
+        # Heure fixée une fois : lecture et écriture du cache sur le même quart d'heure
+        departure_time = departure_time or timezone.now()
+        if all([departure_address, destination_address, transport_mode]):
+            cached = self.get_cached_route(
+                departure_address, destination_address, transport_mode,
+                departure_coords, destination_coords, departure_time
+            )
+            if cached is not None:
+                return cached
+            
+            # Une seule requête IA pour ce trajet, même si plusieurs workers le demandent
+            key = route_cache_key(departure_address, destination_address, transport_mode, time_bucket(departure_time))
+            with get_tiered_cache().single_flight('route', key) as entry:
+                if entry is not MISSING:
+                    return entry['result']
+                result = self.compute_route(
+                    departure_address, destination_address, transport_mode,
+                    departure_coords, destination_coords, departure_time
+                )
+                self.cache_route(result)
+                return result
+        
+        result = self.compute_route(
+            departure_address, destination_address, transport_mode,
+            departure_coords, destination_coords, departure_time
+        )
+        self.cache_route(result)
+        return result
+    
+    def compute_route(self, departure_address: str, destination_address: str, transport_mode: str,
+                      departure_coords: Optional[Tuple[float, float]] = None,
+                      destination_coords: Optional[Tuple[float, float]] = None,
+                      departure_time: Optional[datetime] = None) -> Dict:
+        """Calcul complet (géocodage + analyse Gemini), sans cache"""
         try:
             # Validation des entrées
             if not all([departure_address, destination_address, transport_mode]):
                 raise ValueError("Tous les paramètres sont requis")
             
             # Obtenir les coordonnées
-            dep_coords = self.get_coordinates(departure_address)
-            dest_coords = self.get_coordinates(destination_address)
+            dep_coords = departure_coords or self.get_coordinates(departure_address)
+            dest_coords = destination_coords or self.get_coordinates(destination_address)
             
             # Analyser avec Gemini
-            ai_analysis = self.calculate_route_with_ai(departure_address, destination_address, transport_mode)
+            ai_analysis = self.calculate_route_with_ai(
+                departure_address, destination_address, transport_mode, departure_time
+            )
             
-            # Construction du résultat
-            result = {
-                "departure": {
-                    "address": departure_address,
-                    "coordinates": dep_coords
-                },
-                "destination": {
-                    "address": destination_address,
-                    "coordinates": dest_coords
-                },
-                "transport_mode": transport_mode,
-                "ai_analysis": ai_analysis,
-                "currency": "FCFA",
-                "country": "Cameroun"
-            }
-            
-            return result
+            return self.build_result(
+                departure_address, destination_address, transport_mode,
+                dep_coords, dest_coords, ai_analysis, departure_time
+            )
             
         except Exception as e:
             logger.error(f"Erreur optimize_route: {e}")
@@ -195,14 +555,95 @@ class RouteOptimizer:
             return {
                 "departure": {
                     "address": departure_address,
-                    "coordinates": (3.8480, 11.5021)  # Yaoundé
+                    "coordinates": DEFAULT_COORDINATES
                 },
                 "destination": {
                     "address": destination_address,
                     "coordinates": (4.0511, 9.7679)  # Douala
                 },
+                "approximate_coordinates": True,
                 "transport_mode": transport_mode,
-                "ai_analysis": self.calculate_route_with_ai(departure_address, destination_address, transport_mode),
+                "time_bucket": time_bucket(departure_time),
+                "ai_analysis": self.calculate_route_with_ai(
+                    departure_address, destination_address, transport_mode, departure_time
+                ),
                 "currency": "FCFA",
                 "country": "Cameroun"
-            }
\ No newline at end of file
+            }
+    
+    def optimize_routes(self, departure_address: str, destination_address: str, transport_modes: List[str],
+                        departure_coords: Optional[Tuple[float, float]] = None,
+                        destination_coords: Optional[Tuple[float, float]] = None,
+                        departure_time: Optional[datetime] = None) -> Dict[str, Dict]:
+        """Optimise plusieurs modes de transport en une passe (géocodage partagé, analyses en parallèle)"""
+        if not all([departure_address, destination_address, transport_modes]):
+            raise ValueError("Tous les paramètres sont requis")
+        departure_time = departure_time or timezone.now()
+        
+        # Les modes déjà en cache ne sont pas recalculés
+        results = {}
+        for mode in transport_modes:
+            cached = self.get_cached_route(
+                departure_address, destination_address, mode,
+                departure_coords, destination_coords, departure_time
+            )
+            if cached is not None:
+                results[mode] = cached
+        transport_modes = [mode for mode in transport_modes if mode not in results]
+        if not transport_modes:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=len(transport_modes) + 2) as executor:
+            # Géocodage unique des deux extrémités, en parallèle des analyses
+            dep_future = None if departure_coords else executor.submit(self.get_coordinates, departure_address)
+            dest_future = None if destination_coords else executor.submit(self.get_coordinates, destination_address)
+            analysis_futures = {
+                mode: executor.submit(
+                    self.calculate_route_with_ai, departure_address, destination_address, mode, departure_time
+                )
+                for mode in transport_modes
+            }
+            
+            dep_coords = dep_future.result() if dep_future else departure_coords
+            dest_coords = dest_future.result() if dest_future else destination_coords
+            
+            for mode, future in analysis_futures.items():
+                results[mode] = self.build_result(
+                    departure_address, destination_address, mode,
+                    dep_coords, dest_coords, future.result(), departure_time
+                )
+                self.cache_route(results[mode])
+        
+        return results
+    
+    def build_result(self, departure_address: str, destination_address: str, transport_mode: str,
+                     dep_coords: Tuple[float, float], dest_coords: Tuple[float, float], ai_analysis: Dict,
+                     departure_time: Optional[datetime] = None) -> Dict:
+        """Construction du résultat stocké dans OptimizedRoute.route_data
+
+        time_bucket : quart d'heure local du départ, qui fait partie de la clé de cache.
+        approximate_coordinates : une extrémité n'a pas pu être géocodée
+        (DEFAULT_COORDINATES), le résultat n'est pas mis en cache.
+        """
+        if ai_analysis.get("is_fallback"):
+            # Gemini indisponible : estimation locale à partir des coordonnées
+            ai_analysis = self.fallback_analysis(transport_mode, dep_coords, dest_coords, departure_time)
+        result = {
+            "departure": {
+                "address": departure_address,
+                "coordinates": dep_coords
+            },
+            "destination": {
+                "address": destination_address,
+                "coordinates": dest_coords
+            },
+            "transport_mode": transport_mode,
+            "time_bucket": time_bucket(departure_time),
+            "ai_analysis": ai_analysis,
+            "geometry": self.get_route_geometry(dep_coords, dest_coords, transport_mode),
+            "currency": "FCFA",
+            "country": "Cameroun"
+        }
+        if dep_coords is DEFAULT_COORDINATES or dest_coords is DEFAULT_COORDINATES:
+            result["approximate_coordinates"] = True
+        return result
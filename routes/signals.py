@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import FleetPlan, Location, RouteRequest, OptimizedRoute
+
+# Tampons de version par espace de données, changés à chaque écriture
+VERSION_NAMESPACES = {
+    Location: 'locations',
+    RouteRequest: 'route_requests',
+    OptimizedRoute: 'routes',
+}
+
+
+def _version_key(namespace):
+    return f"data_version:{namespace}"
+
+
+def get_versions(*namespaces):
+    """Versions courantes des espaces demandés (une seule lecture du cache)"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    versions = {}
+    missing = {}
+    for namespace, key in zip(namespaces, keys):
+        if key in found:
+            versions[namespace] = found[key]
+        else:
+            # Cache vidé : nouvelle version pour ne jamais resservir d'anciennes entrées
+            versions[namespace] = missing[key] = time.time_ns()
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return versions
+
+
+def bump_version(namespace):
+    cache.set(_version_key(namespace), time.time_ns(), timeout=None)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, **kwargs):
+    """Invalide les caches (HTTP, pages) dépendant du modèle modifié"""
+    namespace = VERSION_NAMESPACES.get(sender)
+    if namespace:
+        bump_version(namespace)
+
+
+@receiver(pre_delete, sender=FleetPlan)
+def delete_fleet_route_requests(sender, instance, **kwargs):
+    """Les tournées du plan partent avec lui (cascade) : leurs demandes aussi"""
+    RouteRequest.objects.filter(optimizedroute__fleet_plan=instance).delete()
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Applique les PRAGMA SQLite (WAL, cache, mmap...) à chaque nouvelle connexion"""
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,237 @@
+import math
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_time
+
+# Version du format de fichier : des profils enregistrés dans un autre format sont ignorés
+FORMAT_VERSION = 1
+
+BUCKET_MINUTES = 15
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+
+# Zones de trafic : centre (lat, lon) et rayon (km) ; un trajet prend la zone de son
+# point de départ, OTHER_ZONE hors de toutes les zones.
+# Surchargeable (ajout ou remplacement) via settings.SPEED_PROFILE_ZONES
+DEFAULT_ZONES = {
+    'douala': {'center': (4.0511, 9.7679), 'radius_km': 20},
+    'yaounde': {'center': (3.8480, 11.5021), 'radius_km': 20},
+}
+OTHER_ZONE = 'other'
+
+# Bornes des rapports durée observée / durée du tableau retenus à l'apprentissage
+MIN_FACTOR = 0.25
+MAX_FACTOR = 4.0
+
+_profiles = None
+_profiles_loaded = False
+_profiles_lock = threading.Lock()
+
+
+def get_zones() -> Dict:
+    return {**DEFAULT_ZONES, **getattr(settings, 'SPEED_PROFILE_ZONES', {})}
+
+
+def zone_names() -> Tuple[str, ...]:
+    return tuple(get_zones()) + (OTHER_ZONE,)
+
+
+def zone_indices(latitudes, longitudes) -> np.ndarray:
+    """Indice dans zone_names() de la zone de chaque point (vectorisé)
+
+    Distance équirectangulaire au centre : précise à mieux que 0,1 % sur
+    quelques dizaines de km. Zones qui se chevauchent : la plus proche.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    zones = list(get_zones().values())
+    indices = np.full(np.broadcast_shapes(latitudes.shape, longitudes.shape), len(zones), dtype=np.int64)
+    nearest = np.full(indices.shape, np.inf)
+    for index, zone in enumerate(zones):
+        lat, lon = zone['center']
+        distance = np.hypot(
+            (latitudes - lat) * 110.57,
+            (longitudes - lon) * 111.32 * math.cos(math.radians(lat))
+        )
+        closer = (distance <= zone['radius_km']) & (distance < nearest)
+        indices[closer] = index
+        nearest[closer] = distance[closer]
+    return indices
+
+
+def local_time_zone() -> ZoneInfo:
+    """Fuseau des trajets (settings.ROUTE_LOCAL_TIME_ZONE), à l'apprentissage comme à la prévision"""
+    return ZoneInfo(getattr(settings, 'ROUTE_LOCAL_TIME_ZONE', settings.TIME_ZONE))
+
+
+def local_hour(when: Optional[datetime] = None) -> float:
+    """Heure locale (fuseau des trajets) en heures décimales, maintenant si when est None"""
+    when = timezone.localtime(when, local_time_zone())
+    return when.hour + when.minute / 60
+
+
+def bucket_for_hour(hour: float) -> int:
+    """Quart d'heure (0 à 95) d'une heure locale décimale"""
+    return int(float(hour) * 60 // BUCKET_MINUTES) % BUCKETS_PER_DAY
+
+
+def time_bucket(when: Optional[datetime] = None) -> int:
+    """Quart d'heure local d'un départ, maintenant si when est None"""
+    return bucket_for_hour(local_hour(when))
+
+
+def bucket_label(bucket: int) -> str:
+    minutes = bucket * BUCKET_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_departure_time(value) -> Optional[datetime]:
+    """Heure de départ d'une requête : date ISO 8601 ou heure seule (aujourd'hui), None si vide
+
+    Une date sans fuseau est dans le fuseau des trajets. ValueError si invalide.
+    """
+    if value in (None, ''):
+        return None
+    value = str(value).strip()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        time_of_day = parse_time(value)
+        if time_of_day is None:
+            raise ValueError(f"Heure de départ invalide: {value}")
+        parsed = datetime.combine(timezone.localdate(timezone=local_time_zone()), time_of_day)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, local_time_zone())
+    return parsed
+
+
+class SpeedProfiles:
+    """Facteurs de durée de trajet par mode, zone et quart d'heure
+
+    factors[mode, zone, quart d'heure] multiplie le temps de roulage du
+    tableau des tarifs (1.0 : vitesse du tableau, 1.5 : 50 % plus lent) ;
+    samples compte les routes observées par case. Tableaux float32/int32 :
+    quelques Ko pour tous les modes, lus directement par indice.
+    """
+
+    def __init__(self, modes: Sequence[str], zones: Sequence[str], factors: np.ndarray,
+                 samples: Optional[np.ndarray] = None, metadata: Optional[Dict] = None):
+        self.modes = [str(mode) for mode in modes]
+        self.zones = [str(zone) for zone in zones]
+        self.factors = np.asarray(factors, dtype=np.float32)
+        self.samples = (np.zeros(self.factors.shape, dtype=np.int32) if samples is None
+                        else np.asarray(samples, dtype=np.int32))
+        self.metadata = metadata or {}
+        self._mode_index = {mode: index for index, mode in enumerate(self.modes)}
+
+    def lookup(self, transport_modes, zones: np.ndarray, bucket: int) -> np.ndarray:
+        """Facteur de chaque trajet (1.0 pour un mode ou une zone non appris)
+
+        transport_modes et zones (indices dans zone_names()) ont la même forme.
+        """
+        modes = np.asarray(transport_modes, dtype=object)
+        factors = np.ones(modes.shape)
+        if not modes.size:
+            return factors
+        names, inverse = np.unique(modes.astype(str), return_inverse=True)
+        mode_rows = np.array([self._mode_index.get(name, -1) for name in names])[inverse].reshape(modes.shape)
+        # Zones courantes -> zones des profils (les réglages ont pu changer depuis l'apprentissage)
+        zone_rows = np.array([
+            self.zones.index(name) if name in self.zones else -1 for name in zone_names()
+        ])[zones]
+        known = (mode_rows >= 0) & (zone_rows >= 0)
+        factors[known] = self.factors[mode_rows[known], zone_rows[known], bucket % BUCKETS_PER_DAY]
+        return factors
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format_version=FORMAT_VERSION,
+                bucket_minutes=BUCKET_MINUTES,
+                modes=np.array(self.modes),
+                zones=np.array(self.zones),
+                factors=self.factors,
+                samples=self.samples,
+                built_at=np.array(self.metadata.get('built_at', '')),
+            )
+
+    @classmethod
+    def load(cls, path) -> Optional['SpeedProfiles']:
+        with np.load(path) as data:
+            if int(data['format_version']) != FORMAT_VERSION or int(data['bucket_minutes']) != BUCKET_MINUTES:
+                return None
+            return cls(
+                data['modes'].tolist(), data['zones'].tolist(), data['factors'], data['samples'],
+                {'built_at': str(data['built_at'])}
+            )
+
+
+def learn_profiles(transport_modes, zones, buckets, ratios, prior_samples: float = 20,
+                   smoothing: int = 2) -> SpeedProfiles:
+    """Profils appris des rapports durée observée / durée du tableau des routes historiques
+
+    Moyenne géométrique des rapports de chaque case (mode, zone, quart
+    d'heure), lissée sur les `smoothing` quarts d'heure voisins de chaque
+    côté (la journée est circulaire), puis ramenée vers la moyenne du mode
+    dans la zone, elle-même ramenée vers 1.0 : prior_samples routes fictives
+    à chaque niveau. Une case peu observée garde une valeur prudente.
+    """
+    names, mode_rows = np.unique(np.asarray(transport_modes).astype(str), return_inverse=True)
+    shape = (len(names), len(zone_names()), BUCKETS_PER_DAY)
+    cells = np.ravel_multi_index((mode_rows, np.asarray(zones), np.asarray(buckets)), shape)
+    logs = np.log(np.clip(np.asarray(ratios, dtype=np.float64), MIN_FACTOR, MAX_FACTOR))
+    size = int(np.prod(shape))
+    sums = np.bincount(cells, weights=logs, minlength=size).reshape(shape)
+    counts = np.bincount(cells, minlength=size).reshape(shape).astype(np.float64)
+
+    smoothed_sums, smoothed_counts = sums.copy(), counts.copy()
+    for offset in range(1, smoothing + 1):
+        weight = 0.5 ** offset
+        for shift in (offset, -offset):
+            smoothed_sums += weight * np.roll(sums, shift, axis=2)
+            smoothed_counts += weight * np.roll(counts, shift, axis=2)
+
+    zone_means = sums.sum(axis=2) / (counts.sum(axis=2) + prior_samples)
+    logs = (smoothed_sums + prior_samples * zone_means[..., None]) / (smoothed_counts + prior_samples)
+    return SpeedProfiles(
+        names.tolist(), zone_names(), np.exp(logs), counts,
+        {'built_at': timezone.now().isoformat()}
+    )
+
+
+def get_speed_profiles(reload: bool = False) -> Optional[SpeedProfiles]:
+    """Profils appris, chargés une seule fois par processus (None s'ils n'existent pas)"""
+    global _profiles, _profiles_loaded
+    if _profiles_loaded and not reload:
+        return _profiles
+    with _profiles_lock:
+        if not _profiles_loaded or reload:
+            path = Path(getattr(settings, 'SPEED_PROFILES_PATH', ''))
+            try:
+                _profiles = SpeedProfiles.load(path) if path.is_file() else None
+            except (OSError, KeyError, ValueError):
+                _profiles = None
+            _profiles_loaded = True
+    return _profiles
+
+
+def travel_factors(transport_modes, latitudes, longitudes, bucket: Optional[int]):
+    """Facteur de durée de chaque trajet partant de (latitudes, longitudes) au quart d'heure bucket
+
+    1.0 sans quart d'heure ou sans profils appris : le tableau des tarifs seul.
+    """
+    profiles = get_speed_profiles()
+    if profiles is None or bucket is None:
+        return 1.0
+    modes = np.asarray(transport_modes, dtype=object)
+    shape = np.broadcast_shapes(modes.shape, np.shape(latitudes), np.shape(longitudes))
+    zones = zone_indices(np.broadcast_to(latitudes, shape), np.broadcast_to(longitudes, shape))
+    return profiles.lookup(np.broadcast_to(modes, shape), zones, bucket)
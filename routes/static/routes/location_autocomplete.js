@@ -0,0 +1,120 @@
+// Sélecteurs de lieux (LocationAutocompleteWidget) : suggestions par préfixe du nom,
+// seuls les identifiants choisis sont envoyés avec le formulaire
+(function () {
+    const DELAY_MS = 200;
+    const MIN_LENGTH = 2;
+
+    function setup(container) {
+        const input = container.querySelector('.location-autocomplete-input');
+        const menu = container.querySelector('.location-autocomplete-menu');
+        const chips = container.querySelector('.location-autocomplete-selected');
+        const name = container.dataset.name;
+        const multiple = container.dataset.multiple === '1';
+        const hidden = multiple ? null : container.querySelector(`input[type="hidden"][name="${name}"]`);
+        let timer = null;
+        let controller = null;
+        let suggestions = [];
+
+        const close = () => {
+            menu.innerHTML = '';
+            suggestions = [];
+        };
+
+        const addChip = (location) => {
+            if (chips.querySelector(`input[value="${location.id}"]`)) return;
+            const chip = document.createElement('span');
+            chip.className = 'badge bg-primary me-1 mb-1 location-chip';
+            chip.textContent = location.name;
+            const value = document.createElement('input');
+            value.type = 'hidden';
+            value.name = name;
+            value.value = location.id;
+            const remove = document.createElement('button');
+            remove.type = 'button';
+            remove.className = 'btn-close btn-close-white btn-sm ms-1';
+            remove.dataset.remove = '';
+            remove.setAttribute('aria-label', 'Retirer');
+            chip.append(value, remove);
+            chips.appendChild(chip);
+        };
+
+        const choose = (location) => {
+            if (multiple) {
+                addChip(location);
+                input.value = '';
+            } else {
+                hidden.value = location.id;
+                input.value = location.name;
+                hidden.dispatchEvent(new Event('change', {bubbles: true}));
+            }
+            close();
+        };
+
+        const show = (locations) => {
+            close();
+            suggestions = locations;
+            locations.forEach((location) => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action';
+                const title = document.createElement('div');
+                title.textContent = location.name;
+                const address = document.createElement('small');
+                address.className = 'text-muted';
+                address.textContent = location.address;
+                item.append(title, address);
+                // mousedown : avant la perte du focus qui ferme le menu
+                item.addEventListener('mousedown', (event) => {
+                    event.preventDefault();
+                    choose(location);
+                });
+                menu.appendChild(item);
+            });
+        };
+
+        input.addEventListener('input', () => {
+            // Texte modifié : le lieu doit être choisi à nouveau dans la liste
+            if (hidden) hidden.value = '';
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < MIN_LENGTH) {
+                close();
+                return;
+            }
+            timer = setTimeout(() => {
+                // Une seule recherche en cours : la réponse d'une saisie dépassée est abandonnée
+                if (controller) controller.abort();
+                controller = new AbortController();
+                fetch(`${container.dataset.url}?q=${encodeURIComponent(query)}`, {signal: controller.signal})
+                    .then((response) => response.json())
+                    .then((data) => show(data.locations))
+                    .catch((error) => {
+                        if (error.name !== 'AbortError') console.error('Erreur de recherche:', error);
+                    });
+            }, DELAY_MS);
+        });
+
+        input.addEventListener('keydown', (event) => {
+            if (event.key === 'Enter' && suggestions.length) {
+                event.preventDefault();
+                choose(suggestions[0]);
+            } else if (event.key === 'Escape') {
+                close();
+            }
+        });
+        input.addEventListener('blur', close);
+
+        if (chips) {
+            chips.addEventListener('click', (event) => {
+                if (event.target.matches('[data-remove]')) event.target.closest('.location-chip').remove();
+            });
+        }
+    }
+
+    const init = () => document.querySelectorAll('[data-location-autocomplete]').forEach(setup);
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', init);
+    } else {
+        init();
+    }
+})();
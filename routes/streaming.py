@@ -0,0 +1,118 @@
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalJSONParser:
+    """Analyse un objet JSON reçu par morceaux et signale chaque valeur dès qu'elle est complète
+
+    feed() renvoie la liste des (chemin, valeur) terminés dans le morceau reçu,
+    jusqu'à la profondeur max_depth. Le chemin est un tuple de clés (objets)
+    et d'indices (tableaux), par exemple ('optimal_route', 'estimated_time')
+    ou ('recommendations', 0). Le texte avant la première accolade (```json...)
+    est ignoré.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.buffer = ''
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.result = {}
+        # Pile des conteneurs ouverts : dict(kind, key, index, expecting_key, value_start)
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._scalar_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple[Any, ...], Any]]:
+        self.buffer += chunk
+        events = []
+
+        while self.pos < len(self.buffer) and not self.done:
+            i = self.pos
+            c = self.buffer[i]
+            self.pos += 1
+
+            if not self.started:
+                if c == '{':
+                    self.started = True
+                    self._push('obj')
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame['kind'] == 'obj' and frame['expecting_key']:
+                        frame['key'] = json.loads(self.buffer[self._string_start:i + 1])
+                    else:
+                        self._complete(events, self._string_start, i + 1)
+                continue
+
+            if self._scalar_start is not None and (c in ',}]' or c.isspace()):
+                self._complete(events, self._scalar_start, i)
+                self._scalar_start = None
+
+            frame = self._stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in '{[':
+                frame['value_start'] = i
+                self._push('obj' if c == '{' else 'arr')
+            elif c in '}]':
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                else:
+                    self._complete(events, self._stack[-1]['value_start'], i + 1)
+            elif c == ':':
+                frame['expecting_key'] = False
+            elif c == ',':
+                if frame['kind'] == 'obj':
+                    frame['expecting_key'] = True
+                else:
+                    frame['index'] += 1
+            elif not c.isspace() and self._scalar_start is None:
+                # Nombre, true, false ou null
+                self._scalar_start = i
+
+        return events
+
+    def _push(self, kind: str):
+        self._stack.append({
+            'kind': kind,
+            'key': None,
+            'index': 0,
+            'expecting_key': kind == 'obj',
+            'value_start': None,
+        })
+
+    def _path(self) -> Tuple[Any, ...]:
+        return tuple(
+            frame['key'] if frame['kind'] == 'obj' else frame['index']
+            for frame in self._stack
+        )
+
+    def _complete(self, events, start: int, end: int):
+        """Une valeur du conteneur au sommet de la pile vient de se terminer"""
+        depth = len(self._stack)
+        if depth > self.max_depth:
+            return
+        value = json.loads(self.buffer[start:end])
+        path = self._path()
+        if depth == 1:
+            self.result[path[0]] = value
+        events.append((path, value))
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formate un événement Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
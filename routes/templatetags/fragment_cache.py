@@ -0,0 +1,51 @@
+from django import template
+from django.core.cache import cache
+
+from routes.fragment_cache import (
+    FRAGMENTS, fragment_key, fragment_timeout, record_lookup, valid_namespaces,
+)
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, namespaces, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.namespaces = namespaces
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = fragment_key(self.name, self.namespaces, [value.resolve(context) for value in self.vary_on])
+        content = cache.get(key)
+        record_lookup(self.name, hit=content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, timeout=fragment_timeout())
+        return content
+
+
+@register.tag('cached_fragment')
+def do_cached_fragment(parser, token):
+    """Met en cache un fragment jusqu'à la prochaine écriture des données dont il dépend
+
+    {% cached_fragment "nom" "locations,routes" [variation ...] %} ... {% endcached_fragment %}
+
+    Le deuxième argument liste les espaces de données (voir signals.VERSION_NAMESPACES) ;
+    les arguments suivants (utilisateur, page, recherche...) distinguent les variantes.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' attend un nom de fragment et une liste d'espaces de données"
+        )
+    name = bits[1].strip('"\'')
+    namespaces = [namespace for namespace in bits[2].strip('"\'').split(',') if namespace]
+    unknown = set(namespaces) - valid_namespaces()
+    if unknown:
+        raise template.TemplateSyntaxError(f"Espaces de données inconnus: {', '.join(sorted(unknown))}")
+
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    FRAGMENTS.add(name)
+    return CachedFragmentNode(nodelist, name, namespaces, [parser.compile_filter(bit) for bit in bits[3:]])
@@ -1,3 +1,1924 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from time import sleep
 
-# Create your tests here.
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage import default_storage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from unittest import mock
+
+import numpy as np
+
+from . import polyline, urls
+from .analytics import dashboard, get_snapshot, group_by, grouped_percentiles, top_pairs
+from .assignment import assign_batch, auction, hungarian, pending_requests, pickup_matrices, solve_assignment
+from .estimator import estimate, estimate_route, moving_matrices
+from .eta_model import EtaModel, build_features, fit_ridge, get_eta_model, quick_estimate
+from .forms import LocationForm, RouteComparisonForm, RouteRequestForm
+from .fragment_cache import fragment_cache_stats, reset_fragment_cache_stats
+from .geo import geohash_encode, normalize_address
+from .http_cache import cache_page_for_anonymous
+from .live import (
+    CLOSE_NOT_FOUND, CLOSE_TOO_SLOW, CLOSE_TRY_AGAIN_LATER, LiveChannelLayer, Subscription, websocket_application
+)
+from .management.commands.import_report import Command as ImportReportCommand
+from .management.commands.train_eta_model import Command as TrainEtaModelCommand
+from .maps import create_default_map
+from .models import (
+    LOCATION_GEOHASH_PRECISION, ArchivedRoute, Driver, DriverAssignment, FleetPlan, FleetStop, Location,
+    OptimizedRoute, OptimizedRoutePayload, RouteRequest,
+)
+from .pagination import InvalidCursor, KeysetPaginator, approximate_count, decode_cursor
+from .query_budget import (
+    QueryBudgetExceeded, QueryBudgetMiddleware, QueryBudgetTestMixin, fingerprint, query_budget
+)
+from . import reoptimization
+from .reachability import LocationIndex, get_location_index, isochrone_polygon, reachable_locations
+from .reoptimization import reoptimize_routes
+from .retention import archivable, archive_batch, check_dependents
+from .services import DEFAULT_COORDINATES, RouteOptimizer, reverse_result, route_cache_stats
+from .signals import get_versions
+from .speed_profiles import (
+    SpeedProfiles, get_speed_profiles, learn_profiles, local_time_zone, parse_departure_time, time_bucket, zone_names
+)
+from .streaming import IncrementalJSONParser
+from .tiered_cache import MISSING, LocalLRU, TieredCache, dumps, get_tiered_cache, loads
+from .vrp import VrpProblem, create_fleet_plan, solve, solve_fleet_plan
+from .warmup import preload
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def offline_init(self):
+    """RouteOptimizer sans Gemini : l'analyse passe par fallback_analysis"""
+    self.model = None
+    self.EUR_TO_FCFA = 656
+
+
+def n_plus_one_view(request):
+    for location_id in range(4):
+        Location.objects.filter(id=location_id).first()
+    return HttpResponse()
+
+
+def fresh_analysis(self, departure, destination, transport_mode, departure_time=None):
+    """Analyse de l'IA simulée (pas de repli)"""
+    return {'optimal_route': {
+        'description': 'Nouvel itinéraire', 'estimated_distance': 9.5, 'estimated_time': 21, 'cost_estimate': 1800,
+    }}
+
+
+class BudgetTestCase(QueryBudgetTestMixin, TestCase):
+    """Données communes : lieux, demandes et routes optimisées d'un utilisateur"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', password='budget')
+        cls.staff = User.objects.create_superuser('admin', password='admin')
+        cls.locations = [
+            Location.objects.create(
+                name=f"Lieu {i}",
+                address=f"{i} rue du Marché, Yaoundé",
+                latitude=3.85 + i * 0.01,
+                longitude=11.50 + i * 0.01
+            )
+            for i in range(6)
+        ]
+        cls.routes = [cls.create_route(cls.locations[i], cls.locations[i + 1]) for i in range(5)]
+
+    @classmethod
+    def create_route(cls, departure, destination, transport_mode='car'):
+        route_request = RouteRequest.objects.create(
+            user=cls.user, departure=departure, destination=destination, transport_mode=transport_mode
+        )
+        route = OptimizedRoute(
+            route_request=route_request,
+            route_data={'ai_analysis': {'optimal_route': {'description': 'Route directe'}}},
+            distance=12.5, duration=30, cost_estimate=1500
+        )
+        route.set_geometry([(departure.latitude, departure.longitude), (destination.latitude, destination.longitude)])
+        route.save()
+        return route
+
+    def setUp(self):
+        get_tiered_cache().local.clear()
+        patcher = mock.patch.object(RouteOptimizer, '__init__', offline_init)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class DatabaseSetupTests(BudgetTestCase):
+    """PRAGMA SQLite et index des chemins de requête des vues"""
+
+    def test_sqlite_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            for name, expected in (('synchronous', 1), ('foreign_keys', 1), ('busy_timeout', 20000), ('temp_store', 2)):
+                cursor.execute(f"PRAGMA {name}")
+                with self.subTest(pragma=name):
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_views_use_query_path_indexes(self):
+        out = io.StringIO()
+        call_command('explain_queries', view=['index', 'route_history'], stdout=out)
+        for index in ('location_created_idx', 'optroute_created_idx', 'routereq_user_created_idx'):
+            self.assertIn(index, out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'inconnue'):
+            call_command('explain_queries', view=['inconnue'], stdout=io.StringIO())
+
+
+class RoutePayloadTests(BudgetTestCase):
+    """Données de l'IA : table séparée, compressées au-delà du seuil, chargées à la demande"""
+
+    def test_payload_round_trip_and_compression(self):
+        small = self.routes[0]
+        self.assertEqual(small.payload.encoding, 'json')
+        large = {'ai_analysis': {'optimal_route': {'description': 'Route directe ' * 100}}}
+        small.route_data = large
+        small.save()
+        payload = OptimizedRoutePayload.objects.get(route=small)
+        self.assertEqual(payload.encoding, 'zlib')
+        self.assertLess(len(bytes(payload.data)), payload.size)
+        self.assertEqual(OptimizedRoute.objects.get(id=small.id).route_data, large)
+
+        with override_settings(ROUTE_DATA_COMPRESSION=False):
+            self.assertEqual(OptimizedRoutePayload.encode(large)['encoding'], 'json')
+
+    def test_listing_defers_payload(self):
+        with self.assertNumQueries(1):
+            routes = list(OptimizedRoute.objects.for_listing().order_by('id'))
+            self.assertEqual(routes[0].route_request.departure.name, 'Lieu 0')
+        with self.assertNumQueries(1):
+            self.assertEqual(routes[0].route_data['ai_analysis']['optimal_route']['description'], 'Route directe')
+            routes[0].route_data
+        # Sans données enregistrées : dictionnaire vide
+        OptimizedRoutePayload.objects.filter(route=routes[1]).delete()
+        self.assertEqual(OptimizedRoute.objects.get(id=routes[1].id).route_data, {})
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class ModeComparisonTests(BudgetTestCase):
+    """Comparaison de modes : géocodage partagé, une analyse par mode, modes en cache non recalculés"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_optimize_routes_single_pass(self):
+        optimizer = RouteOptimizer()
+        with (
+            mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', autospec=True, side_effect=fresh_analysis) as ai,
+            mock.patch.object(RouteOptimizer, 'get_coordinates', return_value=(3.86, 11.51)) as geocode,
+        ):
+            results = optimizer.optimize_routes('Poste centrale', 'Gare', ['car', 'taxi', 'walking'])
+            self.assertEqual(sorted(results), ['car', 'taxi', 'walking'])
+            self.assertEqual(geocode.call_count, 2)
+            self.assertEqual(sorted(call.args[3] for call in ai.call_args_list), ['car', 'taxi', 'walking'])
+            self.assertEqual(results['taxi']['departure']['coordinates'], (3.86, 11.51))
+
+            # Seul le mode absent du cache est analysé
+            ai.reset_mock()
+            results = optimizer.optimize_routes('Poste centrale', 'Gare', ['car', 'bus'])
+            self.assertEqual([call.args[3] for call in ai.call_args_list], ['bus'])
+            self.assertEqual(results['bus']['transport_mode'], 'bus')
+
+    def test_compare_modes_creates_one_route_per_mode(self):
+        self.client.force_login(self.user)
+        data = {'departure': self.locations[0].id, 'destination': self.locations[1].id, 'transport_modes': ['car', 'moto_taxi']}
+        with mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', fresh_analysis):
+            response = self.client.post(reverse('routes:compare_modes'), data)
+        routes = OptimizedRoute.objects.exclude(id__in=[route.id for route in self.routes]).select_related('route_request')
+        self.assertEqual(sorted(route.route_request.transport_mode for route in routes), ['car', 'moto_taxi'])
+        self.assertRedirects(response, f"{reverse('routes:compare_routes')}?" + '&'.join(
+            f"routes={route.id}" for route in sorted(routes, key=lambda route: route.id)
+        ), fetch_redirect_response=False)
+        self.assertEqual({route.distance for route in routes}, {9.5})
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class RoutePrewarmTests(BudgetTestCase):
+    """Cache des résultats : une analyse par trajet, compteurs, pré-chauffage des trajets populaires"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_results_cached_per_normalized_pair(self):
+        optimizer = RouteOptimizer()
+        with mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', autospec=True, side_effect=fresh_analysis) as ai:
+            first = optimizer.optimize_route('Poste Centrale, Yaoundé', 'Gare', 'taxi', (3.86, 11.51), (3.88, 11.52))
+            again = optimizer.optimize_route('poste  centrale, yaounde', 'Gare', 'taxi', (3.86, 11.51), (3.88, 11.52))
+        self.assertEqual(ai.call_count, 1)
+        self.assertEqual(again['ai_analysis'], first['ai_analysis'])
+        stats = route_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+        # Repli (IA indisponible) : jamais mis en cache
+        optimizer.optimize_route('Poste centrale', 'Marché', 'bus', (3.86, 11.51), (3.89, 11.53))
+        self.assertIsNone(optimizer.cache_time_left('Poste centrale', 'Marché', 'bus'))
+
+    def test_prewarm_refreshes_popular_pairs(self):
+        out = io.StringIO()
+        call_command('prewarm_routes', top=2, dry_run=True, stdout=out)
+        self.assertIn('2 trajets populaires couvrent 2/5 demandes', out.getvalue())
+        self.assertIn('2 trajets à rafraîchir', out.getvalue())
+
+        with mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', fresh_analysis):
+            call_command('prewarm_routes', top=5, rate=1000, stdout=io.StringIO())
+            out = io.StringIO()
+            call_command('prewarm_routes', top=5, rate=1000, stdout=out)
+        self.assertIn('0 trajets à rafraîchir, 5 encore frais', out.getvalue())
+
+        departure, destination = self.locations[0], self.locations[1]
+        self.assertIsNotNone(RouteOptimizer().get_cached_route(departure.address, destination.address, 'car'))
+        self.assertEqual(route_cache_stats()['warm_hits'], 1)
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class RouteCacheReuseTests(BudgetTestCase):
+    """Cache des résultats d'optimisation : trajet exact, inverse, voisin, jamais sur coordonnées par défaut"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        patcher = mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', fresh_analysis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_coordinates_never_cached(self):
+        optimizer = RouteOptimizer()
+        with mock.patch.object(RouteOptimizer, 'geocode_with_ai', side_effect=ValueError('inconnue')):
+            result = optimizer.optimize_route('Lieu-dit introuvable', 'Autre lieu-dit', 'taxi')
+        self.assertIs(result['departure']['coordinates'], DEFAULT_COORDINATES)
+        self.assertTrue(result['approximate_coordinates'])
+        self.assertIsNone(optimizer.get_cached_route('Lieu-dit introuvable', 'Autre lieu-dit', 'taxi'))
+        # Un trajet voisin du centre de Yaoundé ne réutilise pas ce résultat
+        self.assertIsNone(optimizer.get_cached_route(
+            'Poste centrale', 'Autre lieu-dit', 'taxi', DEFAULT_COORDINATES, DEFAULT_COORDINATES
+        ))
+
+    def test_reverse_and_nearby_reuse(self):
+        optimizer = RouteOptimizer()
+        dep, dest = (3.8600, 11.5100), (3.8800, 11.5200)
+        optimizer.optimize_route('Poste centrale', 'Gare', 'taxi', dep, dest)
+
+        reverse = optimizer.get_cached_route('Gare', 'Poste centrale', 'taxi')
+        self.assertEqual(reverse['reused_from'], 'reverse')
+        self.assertEqual(reverse['departure']['address'], 'Gare')
+        self.assertEqual(tuple(reverse['destination']['coordinates']), dep)
+
+        # Extrémités voisines (même cellule geohash, à moins de 150 m), autres adresses
+        nearby = optimizer.get_cached_route('Carrefour Warda', 'Gare routière', 'taxi', (3.8601, 11.5101), dest)
+        self.assertEqual(nearby['reused_from'], 'nearby')
+        self.assertEqual(nearby['departure'], {'address': 'Carrefour Warda', 'coordinates': (3.8601, 11.5101)})
+        nearby_reverse = optimizer.get_cached_route('Gare routière', 'Carrefour Warda', 'taxi', dest, (3.8601, 11.5101))
+        self.assertEqual(nearby_reverse['reused_from'], 'nearby')
+        self.assertIsNone(optimizer.get_cached_route('Carrefour Warda', 'Gare routière', 'taxi', (3.8620, 11.5100), dest))
+        self.assertIsNone(optimizer.get_cached_route('Carrefour Warda', 'Gare routière', 'bus', (3.8601, 11.5101), dest))
+        stats = route_cache_stats()
+        self.assertEqual((stats['reverse_hits'], stats['nearby_hits']), (1, 2))
+
+        # Un résultat réutilisé n'est pas remis en cache sous les nouvelles adresses
+        optimizer.cache_route(nearby)
+        self.assertIsNone(optimizer.cache_time_left('Carrefour Warda', 'Gare routière', 'taxi'))
+
+    def test_reverse_result_flips_steps_and_geometry(self):
+        result = {
+            'departure': {'address': 'A', 'coordinates': (3.86, 11.51)},
+            'destination': {'address': 'B', 'coordinates': (3.88, 11.52)},
+            'ai_analysis': {'optimal_route': {'steps': ['Prendre un taxi', 'Descendre au marché']}},
+            'geometry': polyline.encode([(3.86, 11.51), (3.87, 11.515), (3.88, 11.52)]),
+        }
+        reversed_result = reverse_result(result)
+        self.assertEqual(reversed_result['departure']['address'], 'B')
+        self.assertEqual(reversed_result['ai_analysis']['optimal_route']['steps'], ['Descendre au marché', 'Prendre un taxi'])
+        self.assertEqual(polyline.decode(reversed_result['geometry'])[0], (3.88, 11.52))
+        self.assertEqual(result['ai_analysis']['optimal_route']['steps'][0], 'Prendre un taxi')
+
+
+GEMINI_RESPONSE = """```json
+{
+  "optimal_route": {"description": "Par l'avenue \\"Kennedy\\" {centre}", "estimated_time": "21",
+                    "estimated_distance": 9.5, "cost_estimate": 1800, "steps": ["Départ", "Arrivée"]},
+  "alternatives": [{"description": "Par Mvog-Mbi", "time": 25, "distance": 11, "cost": 2000}],
+  "recommendations": ["Éviter 17h-19h", null, true]
+}
+```"""
+
+
+class FakeGemini:
+    """Modèle Gemini simulé : la réponse est envoyée par morceaux de chunk_size caractères"""
+
+    def __init__(self, text, chunk_size):
+        self.text = text
+        self.chunk_size = chunk_size
+
+    def generate_content(self, prompt, stream=False):
+        return [
+            mock.Mock(text=self.text[i:i + self.chunk_size])
+            for i in range(0, len(self.text), self.chunk_size)
+        ]
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class StreamingTests(BudgetTestCase):
+    """Réponse de l'IA analysée par morceaux et relayée en Server-Sent Events"""
+
+    def test_parser_independent_of_chunk_boundaries(self):
+        expected = json.loads(GEMINI_RESPONSE.strip('`').removeprefix('json'))
+        reference = None
+        for size in (1, 2, 3, 7, 64, len(GEMINI_RESPONSE)):
+            with self.subTest(chunk_size=size):
+                parser = IncrementalJSONParser(max_depth=2)
+                events = []
+                for i in range(0, len(GEMINI_RESPONSE), size):
+                    events += parser.feed(GEMINI_RESPONSE[i:i + size])
+                self.assertTrue(parser.done)
+                self.assertEqual(parser.result, expected)
+                reference = reference or events
+                self.assertEqual(events, reference)
+        self.assertIn((('optimal_route', 'description'), 'Par l\'avenue "Kennedy" {centre}'), reference)
+        self.assertIn((('recommendations', 1), None), reference)
+        # Profondeur 3 non signalée, mais incluse dans la valeur de profondeur 2
+        self.assertNotIn(('alternatives', 0, 'time'), [path for path, _ in reference])
+        self.assertEqual(reference[-1], (('recommendations',), ['Éviter 17h-19h', None, True]))
+
+    def test_stream_view_emits_fields_then_done(self):
+        def streaming_init(optimizer):
+            offline_init(optimizer)
+            optimizer.model = FakeGemini(GEMINI_RESPONSE, 16)
+
+        url = reverse('routes:optimize_route_stream')
+        params = {'departure_id': self.locations[0].id, 'destination_id': self.locations[1].id, 'transport_mode': 'taxi'}
+        with mock.patch.object(RouteOptimizer, '__init__', streaming_init):
+            response = self.client.get(url, params)
+            body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        names = [line.removeprefix('event: ') for line in body.splitlines() if line.startswith('event: ')]
+        self.assertEqual(names[:2], ['geocoded', 'estimate'])
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(names.count('optimal_route'), 5)
+        done = json.loads(body.rstrip().splitlines()[-1].removeprefix('data: '))
+        route = OptimizedRoute.objects.get(id=done['route_id'])
+        self.assertEqual((route.distance, route.duration, route.cost_estimate), (9.5, 21, 1800))
+
+        self.assertEqual(self.client.get(url, {'departure_id': self.locations[0].id}).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class HttpCacheTests(BudgetTestCase):
+    """GET conditionnels (304) et pages anonymes en cache, invalidés par les signaux"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_route_details_answer_304_until_route_or_locations_change(self):
+        route = self.routes[0]
+        url = reverse('routes:get_route_details', args=[route.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # Nom d'un lieu modifié : la réponse affichée change
+        departure = route.route_request.departure
+        departure.name = 'Poste centrale'
+        departure.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # Ré-optimisation dans la même seconde : nouvel ETag
+        OptimizedRoute.objects.filter(id=route.id).update(refreshed_at=route.created_at + timedelta(microseconds=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_list_etag_from_version_stamps(self):
+        url = reverse('routes:api_routes')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.create_route(self.locations[2], self.locations[0])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_pages_cached_until_data_changes(self):
+        url = reverse('routes:index')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertNotContains(self.client.get(url), 'Marché Mokolo')
+        Location.objects.create(name='Marché Mokolo', address='Mokolo, Yaoundé', latitude=3.88, longitude=11.50)
+        self.assertContains(self.client.get(url), 'Marché Mokolo')
+
+    def test_anonymous_page_cache_replays_headers(self):
+        calls = []
+
+        @cache_page_for_anonymous('locations')
+        def page(request):
+            calls.append(request)
+            response = HttpResponse('Carte', content_type='text/plain; charset=utf-8')
+            response['ETag'] = '"carte-1"'
+            response['Content-Language'] = 'fr'
+            patch_cache_control(response, public=True, max_age=60)
+            return response
+
+        def get(message=None):
+            request = RequestFactory().get('/carte')
+            request.user = AnonymousUser()
+            request.session = SessionStore()
+            request._messages = default_storage(request)
+            if message:
+                messages.info(request, message)
+            return page(request)
+
+        first = get()
+        second = get()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second.content, first.content)
+        for header in ('Content-Type', 'ETag', 'Content-Language', 'Cache-Control', 'Vary'):
+            self.assertEqual(second[header], first[header], header)
+
+        # Message en attente sans cookie 'messages' : page calculée, jamais resservie
+        get('Lieu ajouté')
+        self.assertEqual(len(calls), 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(BudgetTestCase):
+    """Pagination par curseur (created_at, id) : pages complètes et disjointes, curseurs invalides refusés"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_pages_cover_ties_on_created_at(self):
+        # Même date pour trois routes : l'id départage
+        OptimizedRoute.objects.filter(id__in=[route.id for route in self.routes[1:4]]).update(
+            created_at=self.routes[1].created_at
+        )
+        paginator = KeysetPaginator(OptimizedRoute.objects.all(), page_size=2)
+        seen, cursor, pages = [], None, 0
+        while True:
+            with self.assertNumQueries(1):
+                items, cursor = paginator.get_page(cursor)
+            seen += [item.id for item in items]
+            pages += 1
+            if cursor is None:
+                break
+        expected = list(OptimizedRoute.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual((seen, pages), (expected, 3))
+        self.assertEqual(decode_cursor(KeysetPaginator(OptimizedRoute.objects.all(), 2).get_page()[1])[1], expected[1])
+
+    def test_invalid_cursor_and_limit(self):
+        for cursor in ('pas-un-curseur', 'MjAyNi0xMC0xOQ', '!!'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    KeysetPaginator(Location.objects.all()).get_page(cursor)
+                response = self.client.get(reverse('routes:api_locations'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(self.client.get(reverse('routes:api_locations'), {'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('routes:api_route_history')).status_code, 401)
+
+    def test_api_follows_next_cursor(self):
+        url = reverse('routes:api_routes')
+        page = self.client.get(url, {'limit': 3, 'with_total': 1}).json()
+        self.assertEqual(page['approximate_total'], 5)
+        rest = self.client.get(url, {'limit': 3, 'cursor': page['next_cursor']}).json()
+        self.assertIsNone(rest['next_cursor'])
+        ids = [route['id'] for route in page['results'] + rest['results']]
+        self.assertEqual(sorted(ids), sorted(route.id for route in self.routes))
+
+        # Total mis en cache : pas de COUNT(*) à chaque page
+        self.create_route(self.locations[0], self.locations[2])
+        self.assertEqual(approximate_count(OptimizedRoute.objects.for_listing()), 5)
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class EstimatorTests(BudgetTestCase):
+    """Estimateur local : tarifs et vitesses du tableau, calcul vectorisé, repli sans valeurs fixes"""
+
+    def test_vectorized_matches_single_trips(self):
+        rng = np.random.default_rng(2)
+        dep_lat, dest_lat = rng.uniform(3.7, 4.2, 50), rng.uniform(3.7, 4.2, 50)
+        dep_lon, dest_lon = rng.uniform(9.6, 11.6, 50), rng.uniform(9.6, 11.6, 50)
+        modes = rng.choice(['taxi', 'moto_taxi', 'bus', 'car', 'walking', 'bike', 'public'], 50)
+        batch = estimate(dep_lat, dep_lon, dest_lat, dest_lon, modes)
+        for i in range(50):
+            single = estimate(dep_lat[i], dep_lon[i], dest_lat[i], dest_lon[i], modes[i])
+            for key in ('distance_km', 'duration_min', 'cost_fcfa', 'intercity'):
+                self.assertEqual(batch[key][i], single[key][0])
+        self.assertTrue((batch['cost_fcfa'] % 50 == 0).all())
+
+    def test_tiers_modes_and_overrides(self):
+        yaounde, douala = (3.8480, 11.5021), (4.0511, 9.7679)
+        city = estimate_route(yaounde, (3.88, 11.52), 'taxi')
+        trip = estimate_route(yaounde, douala, 'bus')
+        self.assertFalse(city['intercity'])
+        self.assertTrue(trip['intercity'])
+        # Interurbain : attente de 30 min et 55 km/h
+        self.assertAlmostEqual(trip['estimated_time'], 30 + trip['estimated_distance'] / 55 * 60, delta=1)
+        self.assertEqual(estimate_route(yaounde, douala, 'walking')['cost_estimate'], 0)
+        self.assertEqual(estimate_route(yaounde, douala, 'public'), trip)
+        with self.assertRaisesMessage(ValueError, 'Mode de transport inconnu: avion'):
+            estimate(*yaounde, *douala, 'avion')
+        with override_settings(ROUTE_ESTIMATOR_TABLE={'bus': {'intercity': {'base_fare': 5000}}}):
+            self.assertGreater(estimate_route(yaounde, douala, 'bus')['cost_estimate'], trip['cost_estimate'] + 3900)
+
+    def test_fallback_and_batch_api(self):
+        optimizer = RouteOptimizer()
+        departure, destination = self.locations[0], self.locations[5]
+        dep, dest = (departure.latitude, departure.longitude), (destination.latitude, destination.longitude)
+        fallback = optimizer.fallback_analysis('taxi', dep, dest)['optimal_route']
+        self.assertNotEqual(fallback['cost_estimate'], 5000)
+        self.assertEqual(fallback['estimated_distance'], estimate_route(dep, dest, 'taxi')['estimated_distance'])
+
+        url = reverse('routes:api_quote_batch')
+        response = self.client.post(url, json.dumps({'pairs': [[*dep, *dest]] * 3, 'transport_mode': 'moto_taxi'}),
+                                    content_type='application/json')
+        self.assertEqual(len(response.json()['quotes']), 3)
+        for data in ({'pairs': []}, {'pairs': [[3.85, 11.5]]}, {'pairs': [[*dep, *dest]], 'transport_modes': ['car', 'bus']},
+                     {'pairs': [[*dep, *dest]], 'hour': float('inf')}, {'pairs': [[*dep, *dest]], 'hour': 'nan'}):
+            with self.subTest(data=data):
+                response = self.client.post(url, json.dumps(data), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_quote_rejects_invalid_hour(self):
+        url = reverse('routes:api_quote')
+        params = {'departure_id': self.locations[0].id, 'destination_id': self.locations[5].id}
+        self.assertEqual(self.client.get(url, {**params, 'hour': '23.5'}).status_code, 200)
+        for hour in ('inf', 'nan', '-1', '24', 'midi'):
+            with self.subTest(hour=hour):
+                response = self.client.get(url, {**params, 'hour': hour})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class EtaModelTests(BudgetTestCase):
+    """Modèle ETA/coût : moindres carrés régularisés, prédiction isolée ou groupée, entraînement"""
+
+    def setUp(self):
+        super().setUp()
+        self.path = Path(tempfile.mkdtemp()) / 'eta_model.npz'
+        override = override_settings(ETA_MODEL_PATH=self.path)
+        override.enable()
+        # Ordre inverse : réglages d'origine rétablis avant le rechargement
+        self.addCleanup(get_eta_model, reload=True)
+        self.addCleanup(override.disable)
+
+    def test_ridge_recovers_linear_targets(self):
+        rng = np.random.default_rng(3)
+        features = build_features(rng.uniform(3.7, 4.1, 300), rng.uniform(9.7, 11.6, 300),
+                                  rng.uniform(3.7, 4.1, 300), rng.uniform(9.7, 11.6, 300), rng.uniform(0, 24, 300))
+        true = rng.normal(size=(features.shape[1], 3))
+        coef = fit_ridge(features, features @ true, ridge=1e-9)
+        np.testing.assert_allclose(features @ coef, features @ true, atol=1e-4)
+
+    def test_single_prediction_matches_batch_and_round_trip(self):
+        coef = np.random.default_rng(4).uniform(0, 5, size=(9, 3))
+        EtaModel({'taxi': coef}, {'samples': {'taxi': 50}}).save(self.path)
+        model = get_eta_model(reload=True)
+        self.assertEqual(model.metadata['samples'], {'taxi': 50})
+        dep, dest = (3.85, 11.50), (3.90, 11.55)
+        single = model.predict(dep, dest, 'taxi', hour=7.5)
+        distance, duration, cost = model.predict_many(build_features(*dep, *dest, 7.5), 'taxi')[0]
+        self.assertEqual(single, {'estimated_time': round(duration), 'estimated_distance': round(distance, 1),
+                                  'cost_estimate': round(cost / 50) * 50})
+        self.assertIsNone(model.predict(dep, dest, 'bus'))
+        self.assertEqual(quick_estimate(dep, dest, 'bus')['source'], 'estimator')
+        self.assertEqual(quick_estimate(dep, dest, 'taxi')['source'], 'model')
+
+    def test_command_trains_modes_with_enough_routes(self):
+        rng = np.random.default_rng(5)
+        departure = self.locations[0]
+        destinations = Location.objects.bulk_create([
+            Location(name=f"Arrêt {i}", address=f"Arrêt {i}, Yaoundé",
+                     latitude=3.85 + rng.uniform(-0.1, 0.1), longitude=11.50 + rng.uniform(-0.1, 0.1))
+            for i in range(40)
+        ])
+        requests = RouteRequest.objects.bulk_create([
+            RouteRequest(departure=departure, destination=destination, transport_mode='taxi')
+            for destination in destinations
+        ])
+        OptimizedRoute.objects.bulk_create_with_payload([
+            OptimizedRoute.objects.build(request, {'ai_analysis': {'optimal_route': estimate_route(
+                (departure.latitude, departure.longitude), (request.destination.latitude, request.destination.longitude), 'taxi'
+            )}})
+            for request in requests
+        ])
+
+        out = io.StringIO()
+        call_command('train_eta_model', output=str(self.path), min_samples=10, holdout=0, stdout=out)
+        self.assertIn('car', out.getvalue())
+        self.assertIn('ignoré', out.getvalue())
+        model = get_eta_model()
+        self.assertEqual(model.modes, {'taxi'})
+        prediction = model.predict((departure.latitude, departure.longitude), (3.9, 11.55), 'taxi')
+        expected = estimate_route((departure.latitude, departure.longitude), (3.9, 11.55), 'taxi')
+        self.assertAlmostEqual(prediction['estimated_distance'], expected['estimated_distance'], delta=0.5)
+
+
+class SpeedProfilesMixin:
+    """Profils de vitesse écrits dans un fichier temporaire, rechargés à la fin du test"""
+
+    def setUp(self):
+        super().setUp()
+        self.path = Path(tempfile.mkdtemp()) / 'speed_profiles.npz'
+        override = override_settings(SPEED_PROFILES_PATH=self.path)
+        override.enable()
+        # Ordre inverse : réglages d'origine rétablis avant le rechargement
+        self.addCleanup(get_speed_profiles, reload=True)
+        self.addCleanup(override.disable)
+
+    def install_profiles(self, transport_mode, zone, bucket, factor):
+        """Profils où seul (mode, zone, quart d'heure) s'écarte du tableau des tarifs"""
+        factors = np.ones((1, len(zone_names()), 96))
+        factors[0, zone_names().index(zone), bucket] = factor
+        SpeedProfiles([transport_mode], zone_names(), factors).save(self.path)
+        get_speed_profiles(reload=True)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReachabilityTests(SpeedProfilesMixin, BudgetTestCase):
+    """Lieux atteignables : index vectorisé, API triée par durée, limite validée, heure de départ prise en compte"""
+
+    def test_index_matches_brute_force(self):
+        rng = np.random.default_rng(6)
+        latitudes, longitudes = rng.uniform(3.6, 4.1, 2000), rng.uniform(11.2, 11.8, 2000)
+        index = LocationIndex(range(2000), latitudes, longitudes)
+        origin = (3.85, 11.50)
+        for mode, minutes in (('walking', 30), ('moto_taxi', 20), ('car', 60)):
+            with self.subTest(mode=mode):
+                result = reachable_locations(origin, mode, minutes, index)
+                brute = estimate(*origin, latitudes, longitudes, mode)['duration_min']
+                self.assertEqual(set(result['ids'].tolist()), set(np.flatnonzero(brute <= minutes).tolist()))
+                self.assertTrue((np.diff(result['duration_min']) >= 0).all())
+
+        polygon = isochrone_polygon(origin, latitudes[:50], longitudes[:50])
+        self.assertEqual(polygon[0], polygon[-1])
+        self.assertEqual(isochrone_polygon(origin, np.array([]), np.array([])), [])
+
+    def test_location_index_rebuilt_on_change(self):
+        size = len(get_location_index())
+        self.assertIs(get_location_index(), get_location_index())
+        Location.objects.create(name='Poste centrale', address='Avenue Kennedy, Yaoundé', latitude=3.8667, longitude=11.5167)
+        self.assertEqual(len(get_location_index()), size + 1)
+
+    def test_api_sorted_by_duration(self):
+        url = reverse('routes:api_reachability')
+        params = {'location_id': self.locations[0].id, 'minutes': 30, 'transport_mode': 'moto_taxi', 'polygon': 1}
+        data = self.client.get(url, params).json()
+        self.assertEqual([result['name'] for result in data['results']], [f"Lieu {i}" for i in range(1, 6)])
+        self.assertEqual(data['polygon'][0], data['polygon'][-1])
+        self.assertEqual(self.client.get(url, {**params, 'minutes': 0}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 3.85}).status_code, 400)
+
+    def test_departure_time_and_limit(self):
+        url = reverse('routes:api_reachability')
+        params = {'location_id': self.locations[0].id, 'minutes': 15, 'transport_mode': 'moto_taxi'}
+        self.assertEqual(self.client.get(url, {**params, 'limit': -1}).status_code, 400)
+
+        self.install_profiles('moto_taxi', 'yaounde', 30, 2.0)
+        rush = self.client.get(url, {**params, 'departure_time': '07:30'}).json()
+        night = self.client.get(url, {**params, 'departure_time': '02:00'}).json()
+        self.assertEqual((rush['total'], night['total']), (1, 2))
+        self.assertGreater(rush['results'][0]['duration'], night['results'][0]['duration'])
+
+
+class GeometryTests(BudgetTestCase):
+    """Tracés encodés (polyline) et versions simplifiées par niveau de zoom"""
+
+    def winding_road(self, n=400):
+        t = np.linspace(0, 1, n)
+        # Coordonnées à 5 décimales : exactes après encodage
+        return list(zip(np.round(3.85 + 0.2 * t + 0.002 * np.sin(t * 60), 5).tolist(), np.round(11.50 + 0.3 * t, 5).tolist()))
+
+    def test_polyline_round_trip(self):
+        # Exemple de la documentation Google
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        self.assertEqual(polyline.encode(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), points)
+        road = self.winding_road()
+        for precision in (5, 6):
+            with self.subTest(precision=precision):
+                decoded = polyline.decode(polyline.encode(road, precision), precision)
+                np.testing.assert_allclose(decoded, road, atol=0.5 * 10 ** -precision)
+        self.assertEqual(polyline.decode(polyline.encode([])), [])
+
+    def test_levels_shrink_with_zoom(self):
+        road = self.winding_road()
+        self.assertEqual(polyline.simplify(road[:2], 1.0), road[:2])
+        levels = polyline.build_levels(road)
+        sizes = []
+        for zoom in polyline.GEOMETRY_ZOOM_LEVELS:
+            simplified = polyline.decode(levels[str(zoom)])
+            self.assertEqual((simplified[0], simplified[-1]), (road[0], road[-1]))
+            sizes.append(len(simplified))
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertLess(sizes[0], len(road) // 10)
+        # Rien à retirer (angle net) : pas de version simplifiée, le tracé complet sert à tous les zooms
+        self.assertEqual(polyline.build_levels([(3.85, 11.5), (3.95, 11.5), (3.95, 11.6)]), {})
+
+    def test_api_returns_level_for_zoom(self):
+        route = self.routes[0]
+        route.set_geometry(self.winding_road())
+        route.save()
+        url = reverse('routes:api_route_geometry', args=[route.id])
+        self.assertEqual(self.client.get(url, {'zoom': 4}).json()['level'], 5)
+        self.assertEqual(self.client.get(url, {'zoom': 10}).json()['level'], 11)
+        full = self.client.get(url, {'zoom': 15}).json()
+        self.assertEqual((full['level'], full['geometry']), (None, route.geometry))
+        self.assertEqual(self.client.get(url, {'zoom': 'loin'}).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AnalyticsSnapshotTests(BudgetTestCase):
+    """Instantané en colonnes : mêmes agrégats que l'ORM, publication atomique, agrégations vectorisées"""
+
+    def setUp(self):
+        super().setUp()
+        self.root = Path(tempfile.mkdtemp())
+        override = override_settings(ANALYTICS_SNAPSHOT_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_snapshot_matches_orm(self):
+        self.create_route(self.locations[0], self.locations[3], transport_mode='taxi')
+        # Demande sans route : comptée par mode, sans distance
+        RouteRequest.objects.create(departure=self.locations[1], destination=self.locations[2], transport_mode='taxi')
+        for _ in range(3):
+            call_command('snapshot_analytics', stdout=io.StringIO())
+        self.assertEqual(len([path for path in self.root.iterdir() if path.is_dir()]), 2)
+
+        snapshot = get_snapshot()
+        self.assertEqual(len(snapshot), RouteRequest.objects.count())
+        data = dashboard(snapshot, timezone.now().timestamp())
+        self.assertEqual((data['total_routes'], data['recent_routes']), (6, 6))
+        stats = {stat['transport_mode']: stat for stat in data['transport_stats']}
+        self.assertEqual({mode: stat['count'] for mode, stat in stats.items()}, {'car': 5, 'taxi': 2})
+        self.assertEqual(stats['taxi']['avg_distance'], 12.5)
+        self.assertEqual(sum(data['hourly_counts']), 7)
+        self.assertEqual(data['top_corridors'][0], (self.locations[1].id, self.locations[2].id, 2))
+
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('routes:statistics')), 'taxi')
+
+    def test_hour_and_weekday_in_route_time_zone(self):
+        # Départ prévu le mercredi 1er juillet 2026 à 7 h 30 (Douala) : créée
+        # maintenant, la demande est comptée à l'heure et au jour du départ
+        RouteRequest.objects.all().delete()
+        RouteRequest.objects.create(departure=self.locations[1], destination=self.locations[2],
+                                    departure_time=datetime(2026, 7, 1, 7, 30, tzinfo=local_time_zone()))
+        # Sans départ prévu : heure locale de la demande (23 h 30 à Douala, 0 h 30 à Paris)
+        request = RouteRequest.objects.create(departure=self.locations[2], destination=self.locations[3])
+        RouteRequest.objects.filter(id=request.id).update(
+            created_at=datetime(2026, 6, 30, 23, 30, tzinfo=local_time_zone())
+        )
+        call_command('snapshot_analytics', stdout=io.StringIO())
+
+        snapshot = get_snapshot()
+        self.assertEqual(sorted(zip(snapshot['hour'].tolist(), snapshot['weekday'].tolist())), [(7, 4), (23, 3)])
+
+    def test_vectorized_aggregations(self):
+        rng = np.random.default_rng(7)
+        keys = rng.integers(0, 5, 1000)
+        values = rng.normal(30, 10, 1000)
+        values[::17] = np.nan
+        grouped = group_by(keys, values, size=6)
+        percentiles = grouped_percentiles(keys, values, 6)
+        for key in range(5):
+            selected = values[(keys == key) & ~np.isnan(values)]
+            self.assertAlmostEqual(grouped['mean'][key], selected.mean())
+            np.testing.assert_allclose(percentiles[key], np.percentile(selected, (50, 90)))
+        self.assertEqual(grouped['count'][5], 0)
+        self.assertTrue(np.isnan(percentiles[5]).all())
+        self.assertEqual(top_pairs(np.array([1, 2, 1, 1]), np.array([2, 1, 2, 3]), top=1), [(1, 2, 2)])
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class FragmentCacheTests(BudgetTestCase):
+    """Fragments de gabarits : resservis du cache jusqu'à l'écriture des données dont ils dépendent"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def render_index(self):
+        response = self.client.get(reverse('routes:index'))
+        self.assertEqual(response.status_code, 200)
+        return fragment_cache_stats(['index_stats', 'index_locations'])
+
+    def test_second_render_hits_cache(self):
+        stats = self.render_index()
+        self.assertEqual({name: stat['misses'] for name, stat in stats.items()},
+                         {'index_stats': 1, 'index_locations': 1})
+        with self.assertNumQueries(2):
+            # Session et utilisateur seulement : aucun lieu ni aucune route relus
+            response = self.client.get(reverse('routes:index'))
+        self.assertContains(response, 'Lieu 5')
+        stats = fragment_cache_stats(['index_stats', 'index_locations'])
+        self.assertEqual({name: stat['hits'] for name, stat in stats.items()},
+                         {'index_stats': 1, 'index_locations': 1})
+        self.assertEqual(stats['index_stats']['hit_ratio'], 0.5)
+
+    def test_write_invalidates_dependent_fragments(self):
+        self.render_index()
+        Location.objects.create(name='Marché Mokolo', address='Mokolo, Yaoundé', latitude=3.88, longitude=11.49)
+        response = self.client.get(reverse('routes:index'))
+        self.assertContains(response, 'Marché Mokolo')
+        stats = fragment_cache_stats(['index_stats', 'index_locations'])
+        self.assertEqual(stats['index_locations']['misses'], 2)
+        self.assertEqual(stats['index_stats']['misses'], 2)
+
+        # Suppression : même invalidation (post_delete)
+        Location.objects.get(name='Marché Mokolo').delete()
+        self.assertNotContains(self.client.get(reverse('routes:index')), 'Marché Mokolo')
+
+    def test_variants_are_cached_separately(self):
+        url = reverse('routes:location_list')
+        self.assertContains(self.client.get(url, {'search': 'Lieu 1'}), 'Lieu 1')
+        response = self.client.get(url, {'search': 'Lieu 2'})
+        self.assertContains(response, 'Lieu 2')
+        self.assertNotContains(response, 'Lieu 1')
+        self.client.get(url, {'search': 'Lieu 1'})
+        self.assertEqual(fragment_cache_stats(['location_cards'])['location_cards']['misses'], 2)
+        self.assertEqual(fragment_cache_stats(['location_cards'])['location_cards']['hits'], 1)
+
+        context = {'user': self.user}
+        template = Template('{% load fragment_cache %}{% cached_fragment "probe" "routes" user.pk %}'
+                            '{{ user.username }}{% endcached_fragment %}')
+        self.assertEqual(template.render(Context(context)), 'budget')
+        self.assertEqual(template.render(Context({'user': self.staff})), 'admin')
+        self.assertEqual(template.render(Context(context)), 'budget')
+        self.assertEqual(fragment_cache_stats(['probe'])['probe'], {'hits': 1, 'misses': 2, 'hit_ratio': 1 / 3})
+        reset_fragment_cache_stats(['probe'])
+        self.assertEqual(fragment_cache_stats(['probe'])['probe']['misses'], 0)
+
+    def test_tag_rejects_unknown_namespaces(self):
+        with self.assertRaisesMessage(TemplateSyntaxError, 'nope'):
+            Template('{% load fragment_cache %}{% cached_fragment "x" "locations,nope" %}{% endcached_fragment %}')
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load fragment_cache %}{% cached_fragment "x" %}{% endcached_fragment %}')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TieredCacheTests(TestCase):
+    """Cache à deux niveaux : LRU borné du processus, L2 partagé, un seul calcul par clé"""
+
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredCache({'LOCK_TIMEOUT': 2, 'LOCK_POLL_INTERVAL': 0.01, 'COMPRESSION_MIN_SIZE': 64})
+
+    def test_serialization_and_local_bounds(self):
+        small, large = {'a': 1}, {'points': [[3.85, 11.5]] * 50}
+        self.assertEqual(dumps(small)[:1], b'j')
+        self.assertEqual(dumps(large, 64)[:1], b'z')
+        self.assertEqual((loads(dumps(small)), loads(dumps(large, 64))), (small, large))
+
+        lru = LocalLRU(max_entries=2, max_bytes=10)
+        lru.set('a', b'1234', 60)
+        lru.set('b', b'1234', 60)
+        lru.get('a')
+        lru.set('c', b'1234', 60)
+        # Le moins récemment lu part en premier
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (b'1234', None, b'1234'))
+        lru.set('d', b'12345678', 60)
+        self.assertEqual((len(lru), lru.size), (1, 8))
+        lru.set('e', b'x' * 11, 60)
+        self.assertIsNone(lru.get('e'))
+        lru.set('f', b'1', 0)
+        self.assertIsNone(lru.get('f'))
+
+    def test_levels(self):
+        self.tiered.set('route', 'a', {'distance': 12.5})
+        value = self.tiered.get('route', 'a')
+        value['distance'] = 0
+        # Copie à chaque lecture : le cache n'est pas modifié par l'appelant
+        self.assertEqual(self.tiered.get('route', 'a'), {'distance': 12.5})
+
+        # Autre processus : L1 vide, valeur relue (et promue) depuis le L2
+        other = TieredCache()
+        self.assertEqual(other.get_many('route', ['a', 'b']), {'a': {'distance': 12.5}})
+        self.assertEqual(len(other.local), 1)
+        self.tiered.set('route', 'none', None)
+        self.assertIsNone(other.get('route', 'none', MISSING))
+        self.tiered.delete('route', 'a')
+        self.assertEqual(self.tiered.get('route', 'a', 'absent'), 'absent')
+        with self.assertRaises(ValueError):
+            self.tiered.get('inconnu', 'a')
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+        started = threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            sleep(0.05)
+            return {'calls': len(calls)}
+
+        def worker():
+            started.wait()
+            return self.tiered.get_or_set('matrix', 'k', compute)
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: worker(), range(8)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'calls': 1}] * 8)
+
+        def failing():
+            raise RuntimeError('OSRM indisponible')
+
+        with self.assertRaises(RuntimeError):
+            self.tiered.get_or_set('matrix', 'erreur', failing)
+        # Échec non mis en cache et verrou libéré : le calcul suivant a lieu
+        self.assertEqual(self.tiered.get_or_set('matrix', 'erreur', lambda: 3), 3)
+        self.assertIsNone(cache.get(self.tiered.make_key('matrix', 'erreur') + ':lock'))
+
+    def test_single_flight_waits_for_other_worker(self):
+        lock_key = self.tiered.make_key('geocode', 'k') + ':lock'
+        cache.add(lock_key, 'autre worker', timeout=10)
+
+        def other_worker():
+            sleep(0.05)
+            TieredCache().set('geocode', 'k', [3.85, 11.5])
+            cache.delete(lock_key)
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        with self.tiered.single_flight('geocode', 'k') as value:
+            self.assertEqual(value, [3.85, 11.5])
+        thread.join()
+
+        # Verrou rendu sans résultat (échec de l'autre worker) : calcul local
+        self.tiered.delete('geocode', 'k')
+        cache.add(lock_key, 'autre worker', timeout=10)
+        timer = threading.Timer(0.05, cache.delete, [lock_key])
+        timer.start()
+        with self.tiered.single_flight('geocode', 'k') as value:
+            self.assertIs(value, MISSING)
+        timer.join()
+
+
+@override_settings(CACHES=TEST_CACHES, LOCATION_DUPLICATE_RADIUS_M=25)
+class LocationDeduplicationTests(BudgetTestCase):
+    """Doublons de lieux : même adresse normalisée à moins de 1 km ou coordonnées à moins de 25 m"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create_duplicates(self):
+        # Même adresse que Lieu 1 à l'orthographe près, à 800 m ; à 10 m de Lieu 3, autre adresse
+        same_address = Location.objects.create(
+            name='Lieu 1 bis', address='YAOUNDE - 1, rue du marche (Cameroun)', latitude=3.865, longitude=11.515
+        )
+        nearby = Location.objects.create(
+            name='Carrefour Warda', address='Carrefour Warda', latitude=3.88009, longitude=11.53
+        )
+        return same_address, nearby
+
+    def test_address_normalization(self):
+        self.assertEqual(normalize_address('Marché Central, Yaoundé'), normalize_address('yaounde  MARCHE central'))
+        self.assertEqual(normalize_address('Rue de la Paix, Cameroun'), 'paix rue')
+        self.assertEqual(normalize_address(None), '')
+        self.assertEqual(self.locations[1].normalized_address, '1 marche rue yaounde')
+        self.assertEqual(self.locations[1].geohash, geohash_encode(3.86, 11.51, LOCATION_GEOHASH_PRECISION))
+
+    def test_find_duplicate(self):
+        find = Location.objects.find_duplicate
+        self.assertEqual(find('1 Rue du Marche, yaounde', 3.865, 11.515), self.locations[1])
+        # Même adresse à 30 km : homonyme, pas un doublon
+        self.assertIsNone(find('1 Rue du Marche, yaounde', 3.70, 11.30))
+        self.assertEqual(find('Carrefour Warda', 3.88009, 11.53), self.locations[3])
+        # 50 m : au-delà du rayon
+        self.assertIsNone(find('Carrefour Warda', 3.88045, 11.53))
+        self.assertIsNone(find('1 rue du Marché, Yaoundé', 3.86, 11.51, exclude_id=self.locations[1].id))
+
+        form = LocationForm(data={'name': 'Copie', 'address': '1 rue du marché yaoundé',
+                                  'latitude': 3.865, 'longitude': 11.515})
+        self.assertFalse(form.is_valid())
+        self.assertIn('Lieu 1', str(form.errors))
+        form = LocationForm(data={'name': 'Copie', 'address': '1 rue du marché yaoundé',
+                                  'latitude': 4.0, 'longitude': 9.7})
+        self.assertTrue(form.is_valid(), form.errors)
+        # Modification du lieu lui-même : pas un doublon
+        form = LocationForm(instance=self.locations[1], data={
+            'name': 'Lieu 1', 'address': '1 rue du Marché, Yaoundé', 'latitude': 3.86, 'longitude': 11.51
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+        url = reverse('routes:add_location_ajax')
+        payload = {'name': 'Copie', 'address': 'Carrefour Warda', 'latitude': 3.88009, 'longitude': 11.53}
+        response = self.client.post(url, json.dumps(payload), content_type='application/json').json()
+        self.assertTrue(response['duplicate'])
+        self.assertEqual(response['location']['id'], self.locations[3].id)
+        self.assertEqual(Location.objects.count(), 6)
+
+    def test_merge_remaps_foreign_keys(self):
+        same_address, nearby = self.create_duplicates()
+        route_request = RouteRequest.objects.create(user=self.user, departure=same_address, destination=nearby)
+        plan = FleetPlan.objects.create(name='Tournée', depot=nearby, shift_start=timezone.now())
+        stop = FleetStop.objects.create(plan=plan, location=same_address)
+
+        output = io.StringIO()
+        call_command('merge_duplicate_locations', '--dry-run', stdout=output)
+        self.assertIn('2 doublons en 2 groupes (simulation)', output.getvalue())
+        self.assertEqual(Location.objects.count(), 8)
+
+        versions = get_versions('route_requests')
+        output = io.StringIO()
+        call_command('merge_duplicate_locations', stdout=output)
+        self.assertIn('2 lieux fusionnés en 2 groupes, 4 références mises à jour', output.getvalue())
+        self.assertFalse(Location.objects.filter(id__in=[same_address.id, nearby.id]).exists())
+        route_request.refresh_from_db()
+        plan.refresh_from_db()
+        stop.refresh_from_db()
+        self.assertEqual((route_request.departure, route_request.destination), (self.locations[1], self.locations[3]))
+        self.assertEqual((plan.depot, stop.location), (self.locations[3], self.locations[1]))
+        self.assertNotEqual(get_versions('route_requests'), versions)
+
+        output = io.StringIO()
+        call_command('merge_duplicate_locations', stdout=output)
+        self.assertIn('Aucun doublon', output.getvalue())
+
+    def test_merge_by_address_only(self):
+        same_address, nearby = self.create_duplicates()
+        far = Location.objects.create(
+            name='Lieu 1 ter', address='1 rue du Marché, Yaoundé', latitude=3.70, longitude=11.30
+        )
+        call_command('merge_duplicate_locations', '--radius', '0', stdout=io.StringIO())
+        self.assertFalse(Location.objects.filter(id=same_address.id).exists())
+        self.assertEqual(Location.objects.filter(id__in=[nearby.id, far.id]).count(), 2)
+
+    def test_merge_skips_self_loops(self):
+        same_address, nearby = self.create_duplicates()
+        # Lieu 1 -> Lieu 1 bis : fusionner les deux ferait un trajet de Lieu 1 vers lui-même
+        route_request = RouteRequest.objects.create(
+            user=self.user, departure=self.locations[1], destination=same_address
+        )
+
+        output = io.StringIO()
+        call_command('merge_duplicate_locations', stdout=output)
+        self.assertIn(f'Lieu 1 bis (#{same_address.id}) conservé', output.getvalue())
+        self.assertIn('1 lieux fusionnés en 1 groupes', output.getvalue())
+        self.assertTrue(Location.objects.filter(id=same_address.id).exists())
+        self.assertFalse(Location.objects.filter(id=nearby.id).exists())
+        route_request.refresh_from_db()
+        self.assertEqual((route_request.departure, route_request.destination), (self.locations[1], same_address))
+        self.assertFalse(RouteRequest.objects.filter(departure=F('destination')).exists())
+
+
+class ImportReportTests(TestCase):
+    """Démarrage d'un worker : folium, Gemini et requests ne sont importés qu'au premier usage"""
+
+    def test_worker_startup_skips_heavy_modules(self):
+        output = io.StringIO()
+        call_command('import_report', '--top', '2', '--fail-on-heavy', stdout=output)
+        self.assertIn('Aucune dépendance lourde au démarrage', output.getvalue())
+
+        # Module qui importe folium au chargement : signalé, et refusé avec --fail-on-heavy
+        output = io.StringIO()
+        call_command('import_report', '--target', 'folium', '--top', '1', stdout=output)
+        self.assertIn('Dépendances lourdes importées au démarrage : folium', output.getvalue())
+        with self.assertRaisesMessage(CommandError, 'folium'):
+            call_command('import_report', '--target', 'folium', '--fail-on-heavy', stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, "Échec de l'import de module_inexistant"):
+            call_command('import_report', '--target', 'module_inexistant', stdout=io.StringIO())
+
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     _io\n'
+            'import time:      2000 |       5000 |   routes.maps\n'
+            'Traceback (bruit hors rapport)\n'
+        )
+        self.assertEqual(ImportReportCommand().parse(stderr), [('_io', 120, 120, 2), ('routes.maps', 2000, 5000, 1)])
+
+    def test_preload_and_lazy_maps(self):
+        with self.assertLogs('routes.warmup', 'WARNING'):
+            timings = preload(('json', 'module_inexistant'))
+        self.assertEqual(list(timings), ['json'])
+        self.assertIn('Yaoundé', create_default_map())
+
+
+@override_settings(CACHES=TEST_CACHES, ROUTE_RESTORE_RETAIN_DAYS=30)
+class RetentionTests(BudgetTestCase):
+    """Archivage par type d'utilisateur et restauration à l'identique, en table comme en JSONL"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.root = Path(tempfile.mkdtemp())
+        override = override_settings(ROUTE_ARCHIVE_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        route = self.routes[0]
+        route.route_data = {'ai_analysis': {'is_fallback': True, 'optimal_route': {'description': 'Repli'}}}
+        route.set_geometry([(3.85 + i * 0.001, 11.5 + (i % 7) * 0.0007) for i in range(200)])
+        route.is_fallback = True
+        route.refreshed_at = timezone.now() - timedelta(days=90)
+        route.save()
+        RouteRequest.objects.update(created_at=timezone.now() - timedelta(days=100))
+        RouteRequest.objects.filter(id=route.route_request_id).update(departure_time=local_departure(7, 30))
+
+    def retention(self, storage):
+        return override_settings(ROUTE_RETENTION={
+            'anonymous': {'days': 7, 'storage': 'jsonl'},
+            'user': {'days': 30, 'storage': storage},
+            'staff': {'days': None},
+        })
+
+    def snapshot(self):
+        return [
+            (route.route_request_id, route.route_request.created_at, route.route_request.departure_time,
+             route.id, route.created_at, route.refreshed_at, route.distance, route.is_fallback, route.route_data, route.geometry, route.geometry_levels)
+            for route in OptimizedRoute.objects.filter(route_request__user=self.user)
+            .select_related('route_request', 'payload').order_by('id')
+        ]
+
+    def round_trip(self, storage):
+        before = self.snapshot()
+        with self.retention(storage):
+            call_command('archive_routes', '--user-type', 'user', '--batch-size', '2', '--pause', '0',
+                         stdout=io.StringIO())
+        self.assertFalse(RouteRequest.objects.filter(user=self.user).exists())
+        self.assertEqual(ArchivedRoute.objects.filter(user=self.user, storage=storage).count(), 5)
+        self.assertEqual(OptimizedRoutePayload.objects.count(), 0)
+
+        output = io.StringIO()
+        call_command('restore_routes', 'budget', stdout=output)
+        self.assertIn('5 demandes restaurées pour budget', output.getvalue())
+        self.assertFalse(ArchivedRoute.objects.exists())
+        self.assertEqual(self.snapshot(), before)
+        # Historique restauré : pas réarchivé avant ROUTE_RESTORE_RETAIN_DAYS
+        self.assertFalse(archivable('user', 30).exists())
+        self.assertTrue(archivable('user', 30, now=timezone.now() + timedelta(days=31)).exists())
+
+    def test_round_trip_table(self):
+        self.round_trip('table')
+
+    def test_round_trip_jsonl(self):
+        self.round_trip('jsonl')
+        self.assertEqual([path.name for path in self.root.iterdir()],
+                         [f"routes-user-{timezone.now():%Y%m%d}.jsonl.gz"])
+
+    def test_policies_by_user_type(self):
+        recent = RouteRequest.objects.create(departure=self.locations[0], destination=self.locations[1])
+        anonymous = RouteRequest.objects.create(departure=self.locations[0], destination=self.locations[2])
+        staff = RouteRequest.objects.create(user=self.staff, departure=self.locations[0], destination=self.locations[3])
+        RouteRequest.objects.filter(id__in=[anonymous.id, staff.id]).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        with self.retention('table'):
+            output = io.StringIO()
+            call_command('archive_routes', '--dry-run', stdout=output)
+            self.assertIn('anonymous  1 demandes de plus de 7 jours (jsonl)', output.getvalue())
+            self.assertIn('staff      conservé sans limite', output.getvalue())
+            self.assertTrue(RouteRequest.objects.filter(id=anonymous.id).exists())
+
+            call_command('archive_routes', '--user-type', 'anonymous', '--pause', '0', stdout=io.StringIO())
+            self.assertEqual(list(ArchivedRoute.objects.values_list('original_request_id', flat=True)), [anonymous.id])
+            self.assertEqual(RouteRequest.objects.filter(id__in=[recent.id, staff.id]).count(), 2)
+            self.assertEqual(RouteRequest.objects.filter(user=self.user).count(), 5)
+
+        with (
+            override_settings(ROUTE_RETENTION={'robots': {'days': 1}}),
+            self.assertRaisesMessage(CommandError, "Type d'utilisateur inconnu: robots"),
+        ):
+            call_command('archive_routes', stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, 'Utilisateur inconnu: personne'):
+            call_command('restore_routes', 'personne', stdout=io.StringIO())
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    OSRM_URL='',
+    ANALYTICS_SNAPSHOT_DIR=tempfile.mkdtemp(),
+    ROUTE_ARCHIVE_DIR=tempfile.mkdtemp(),
+)
+class ViewQueryBudgetTests(BudgetTestCase):
+    """Chaque URL de routes/urls.py déclare un budget SQL et le respecte"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.plan = create_fleet_plan(
+            'Tournée', cls.locations[0], 'moto_taxi', [3, 3],
+            [{'location': location, 'delivery': 1} for location in cls.locations[1:5]], user=cls.user
+        )
+        solve_fleet_plan(cls.plan, time_limit=0.05)
+        Driver.objects.bulk_create([
+            Driver(name=f"Chauffeur {i}", transport_mode='car', latitude=3.86 + i * 0.01, longitude=11.51)
+            for i in range(3)
+        ])
+
+    def cases(self):
+        """(nom de l'URL, méthode, arguments, données, anonyme) ; les cas destructeurs en dernier"""
+        first, second, spare = self.locations[0], self.locations[1], self.locations[5]
+        route = self.routes[0]
+        return [
+            ('index', 'GET', [], None, False),
+            ('index', 'GET', [], None, True),
+            ('plan_route', 'GET', [], None, False),
+            ('plan_route', 'POST', [], {'departure': first.id, 'destination': second.id, 'transport_mode': 'car'}, False),
+            ('route_result', 'GET', [route.id], None, False),
+            ('location_list', 'GET', [], {'search': 'Lieu'}, False),
+            ('add_location', 'GET', [], None, False),
+            ('add_location', 'POST', [], {'name': 'Poste centrale', 'address': 'Avenue Kennedy, Yaoundé',
+                                          'latitude': 3.8667, 'longitude': 11.5167}, False),
+            ('add_location_ajax', 'POST', [], json.dumps({'name': 'Gare', 'address': 'Gare de Bessengué, Douala',
+                                                          'latitude': 4.0511, 'longitude': 9.7679}), False),
+            ('edit_location', 'GET', [first.id], None, False),
+            ('edit_location', 'POST', [first.id], {'name': 'Lieu 0', 'address': first.address,
+                                                   'latitude': first.latitude, 'longitude': first.longitude}, False),
+            ('route_history', 'GET', [], None, False),
+            ('statistics', 'GET', [], None, False),
+            ('statistics', 'GET', [], None, True),
+            ('compare_routes', 'GET', [], {'routes': [r.id for r in self.routes]}, False),
+            ('compare_modes', 'GET', [], None, False),
+            ('compare_modes', 'POST', [], {'departure': first.id, 'destination': second.id,
+                                           'transport_modes': ['car', 'taxi', 'walking']}, False),
+            ('export_routes', 'GET', [], None, False),
+            ('export_locations', 'GET', [], None, False),
+            ('search_locations', 'GET', [], {'q': 'Lieu'}, False),
+            ('optimize_route_ajax', 'POST', [], json.dumps({'departure_id': first.id, 'destination_id': second.id,
+                                                            'transport_mode': 'moto_taxi', 'departure_time': '07:30'}), False),
+            ('optimize_route_stream', 'GET', [], {'departure_id': first.id, 'destination_id': second.id}, False),
+            ('get_route_details', 'GET', [route.id], None, False),
+            ('api_route_geometry', 'GET', [route.id], {'zoom': 12}, False),
+            ('api_route_position', 'POST', [route.id], json.dumps({'lat': 3.86, 'lon': 11.51}), False),
+            ('api_locations', 'GET', [], {'limit': 3, 'with_total': 1}, False),
+            ('api_routes', 'GET', [], {'limit': 3}, False),
+            ('api_route_history', 'GET', [], {'limit': 3}, False),
+            ('api_quote', 'GET', [], {'departure_id': first.id, 'destination_id': second.id}, False),
+            ('api_quote_batch', 'POST', [], json.dumps({'pairs': [[3.85, 11.5, 4.05, 9.77]] * 20}), False),
+            ('api_reachability', 'GET', [], {'location_id': first.id, 'minutes': 60}, False),
+            ('fleet_plan', 'GET', [], None, False),
+            ('fleet_plan', 'POST', [], {'name': 'Livraisons', 'depot': first.id, 'stops': [l.id for l in self.locations[1:]],
+                                        'transport_mode': 'car', 'vehicle_count': 2, 'vehicle_capacity': 3,
+                                        'delivery': 1, 'shift_minutes': 480}, False),
+            ('fleet_plan_result', 'GET', [self.plan.id], None, False),
+            ('api_fleet_plans', 'POST', [], json.dumps({
+                'depot_id': first.id, 'vehicle_capacities': [2, 4], 'time_limit': 0.05,
+                'stops': [{'location_id': l.id, 'delivery': 1, 'due': 240} for l in self.locations[1:]],
+            }), False),
+            ('api_fleet_plan', 'GET', [self.plan.id], None, False),
+            ('api_assign_drivers', 'POST', [], json.dumps({'algorithm': 'auction'}), False),
+            ('restore_route_history', 'POST', [], None, False),
+            ('delete_location', 'GET', [spare.id], None, False),
+            ('delete_location', 'POST', [spare.id], None, False),
+        ]
+
+    def test_every_url_declares_a_budget(self):
+        for pattern in urls.urlpatterns:
+            with self.subTest(url=pattern.name):
+                self.assertTrue(
+                    hasattr(pattern.callback, 'query_budget'),
+                    f"{pattern.name} : @query_budget manquant"
+                )
+
+    def test_every_url_is_exercised(self):
+        exercised = {case[0] for case in self.cases()}
+        self.assertEqual(exercised, {pattern.name for pattern in urls.urlpatterns})
+
+    def test_views_within_budget(self):
+        for name, method, args, data, anonymous in self.cases():
+            if anonymous:
+                self.client.logout()
+            else:
+                self.client.force_login(self.user)
+            extra = {'content_type': 'application/json'} if isinstance(data, str) else {}
+            with self.subTest(url=name, method=method, anonymous=anonymous):
+                response = self.assertViewWithinBudget(method, reverse(f'routes:{name}', args=args), data, **extra)
+                self.assertLess(response.status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class NPlusOneTests(BudgetTestCase):
+    """Le nombre de requêtes des listes ne dépend pas du nombre de lignes"""
+
+    def count_queries(self, path, **params):
+        # Caches vides : toutes les données de la page sont relues
+        cache.clear()
+        get_tiered_cache().local.clear()
+        with self.assertQueryBudget(None) as recorder:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return recorder.count
+
+    def assertConstantQueries(self, path, **params):
+        # Premier appel : caches du processus (ContentType, etc.) remplis
+        self.count_queries(path, **params)
+        before = self.count_queries(path, **params)
+        for i in range(5):
+            self.create_route(self.locations[i], self.locations[(i + 2) % 6], transport_mode='bus')
+        self.assertEqual(self.count_queries(path, **params), before)
+
+    def test_route_history(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries(reverse('routes:route_history'))
+
+    def test_api_routes(self):
+        self.assertConstantQueries(reverse('routes:api_routes'))
+
+    def test_export_routes(self):
+        self.assertConstantQueries(reverse('routes:export_routes'))
+
+    def test_statistics(self):
+        self.assertConstantQueries(reverse('routes:statistics'))
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.staff)
+        for model in ('optimizedroute', 'routerequest', 'location'):
+            with self.subTest(model=model):
+                self.assertConstantQueries(reverse(f'admin:routes_{model}_changelist'))
+
+    def test_admin_route_add_form(self):
+        self.client.force_login(self.staff)
+        self.assertConstantQueries(reverse('admin:routes_optimizedroute_add'))
+
+    def test_route_details_joins_locations_and_payload(self):
+        # Date de la route (ETag), puis la route avec ses lieux et ses données
+        route = self.routes[0]
+        with self.assertQueryBudget(2, max_repeats=1):
+            response = self.client.get(reverse('routes:get_route_details', args=[route.id]))
+        self.assertEqual(response.json()['route']['departure'], route.route_request.departure.name)
+
+    def test_delete_location_counts_routes_once(self):
+        # Échec de la suppression : la page de confirmation est réaffichée
+        self.client.force_login(self.user)
+        with mock.patch.object(Location, 'delete', side_effect=RuntimeError('verrou')):
+            with self.assertQueryBudget(None) as recorder:
+                response = self.client.post(reverse('routes:delete_location', args=[self.locations[0].id]))
+        self.assertEqual(response.status_code, 200)
+        counts = [sql for sql in recorder.queries if 'COUNT(' in sql and 'routes_routerequest' in sql]
+        self.assertEqual(len(counts), 1)
+
+
+class FleetPlanTests(BudgetTestCase):
+    """Tournées de véhicules : contraintes respectées et enregistrement des tournées"""
+
+    def problem(self, capacities, delivery, ready=None, due=None):
+        # Dépôt puis arrêts alignés, à 10 minutes les uns des autres
+        size = len(delivery) + 1
+        positions = list(range(size))
+        duration = [[abs(a - b) * 10 for b in positions] for a in positions]
+        return VrpProblem(
+            duration, duration, capacities, delivery, [0] * len(delivery),
+            ready or [0] * len(delivery), due or [None] * len(delivery), [0] * len(delivery), 480
+        )
+
+    def test_capacity_splits_stops_between_vehicles(self):
+        result = solve(self.problem([4, 4], [2, 2, 2, 2]), time_limit=0.1)
+        self.assertEqual(result['unassigned'], [])
+        self.assertEqual(sorted(len(route['stops']) for route in result['routes']), [2, 2])
+        self.assertTrue(all(route['load'] <= 4 for route in result['routes']))
+
+    def test_time_windows_are_respected(self):
+        # L'arrêt 4 (à 40 min du dépôt) doit être servi avant 45 min, l'arrêt 1 pas avant 100 min
+        problem = self.problem([10], [1, 1, 1, 1], ready=[100, 0, 0, 0], due=[None, None, None, 45])
+        result = solve(problem, time_limit=0.1)
+        route = result['routes'][0]
+        arrivals = dict(zip(route['stops'], route['arrivals']))
+        self.assertLessEqual(arrivals[4], 45)
+        self.assertGreaterEqual(arrivals[1], 100)
+
+    def test_stops_over_capacity_are_unassigned(self):
+        result = solve(self.problem([3], [2, 2, 5]), time_limit=0.1)
+        self.assertEqual(len(result['unassigned']), 2)
+        self.assertIn(3, result['unassigned'])
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_plan_routes_are_saved_and_deleted_with_plan(self):
+        plan = create_fleet_plan(
+            'Tournée', self.locations[0], 'car', [2, 2],
+            [{'location': location, 'delivery': 1} for location in self.locations[1:5]]
+        )
+        solve_fleet_plan(plan, time_limit=0.05)
+        solve_fleet_plan(plan, time_limit=0.05)
+        routes = list(plan.vehicle_routes.select_related('route_request'))
+        self.assertEqual(len(routes), 2)
+        self.assertFalse(plan.stops.filter(vehicle__isnull=True).exists())
+        self.assertEqual(routes[0].route_request.departure_id, self.locations[0].id)
+        self.assertEqual(len(routes[0].route_data['ai_analysis']['optimal_route']['steps']), 4)
+        self.assertFalse(archivable('anonymous', -1).filter(optimizedroute__fleet_plan=plan).exists())
+
+        request_ids = [route.route_request_id for route in routes]
+        plan.delete()
+        self.assertFalse(RouteRequest.objects.filter(id__in=request_ids).exists())
+        self.assertFalse(FleetPlan.objects.filter(id=plan.id).exists())
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_api_local_shift_start_and_failed_solve(self):
+        url = reverse('routes:api_fleet_plans')
+        data = {
+            'depot_id': self.locations[0].id, 'vehicle_capacities': [4], 'time_limit': 0.05,
+            'stops': [{'location_id': location.id, 'delivery': 1} for location in self.locations[1:3]],
+            'shift_start': '2026-10-19T08:00',
+        }
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        plan = FleetPlan.objects.get()
+        self.assertEqual(timezone.localtime(plan.shift_start, local_time_zone()).hour, 8)
+
+        # Plan jamais calculé : supprimé avec ses arrêts et ses tournées
+        with mock.patch('routes.vrp.solve', side_effect=RuntimeError('solveur indisponible')):
+            response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(FleetPlan.objects.values_list('id', flat=True)), [plan.id])
+        self.assertFalse(FleetStop.objects.exclude(plan=plan).exists())
+
+        # Les tournées (dépôt -> arrêts -> dépôt) n'entraînent pas le modèle ETA
+        rows = TrainEtaModelCommand().load_rows()
+        self.assertEqual(len(rows), len(self.routes))
+
+
+class AssignmentTests(BudgetTestCase):
+    """Affectation groupée : optimum (hongrois et enchères) et lots de demandes"""
+
+    def brute_force(self, cost, feasible):
+        # (couples servis, coût) de la meilleure affectation, par énumération
+        if cost.shape[0] > cost.shape[1]:
+            cost, feasible = cost.T, feasible.T
+        best = (0, 0.0)
+        for columns in itertools.permutations(range(cost.shape[1]), cost.shape[0]):
+            pairs = [(row, column) for row, column in enumerate(columns) if feasible[row, column]]
+            candidate = (len(pairs), sum(cost[row, column] for row, column in pairs))
+            if candidate[0] > best[0] or (candidate[0] == best[0] and candidate[1] < best[1]):
+                best = candidate
+        return best
+
+    def test_solvers_match_brute_force(self):
+        rng = np.random.default_rng(0)
+        for _ in range(60):
+            shape = tuple(rng.integers(1, 6, size=2))
+            cost = rng.integers(0, 20, size=shape).astype(float)
+            feasible = rng.random(shape) < 0.6
+            expected = self.brute_force(cost, feasible)
+            for algorithm in ('hungarian', 'auction'):
+                with self.subTest(shape=shape, algorithm=algorithm):
+                    pairs = solve_assignment(cost, feasible, algorithm)
+                    self.assertEqual(len({row for row, _ in pairs}), len({column for _, column in pairs}))
+                    self.assertEqual((len(pairs), sum(cost[row, column] for row, column in pairs)), expected)
+
+    def test_auction_matches_hungarian(self):
+        cost = np.random.default_rng(1).integers(0, 100, size=(120, 150)).astype(float)
+        rows = np.arange(120)
+        self.assertEqual(cost[rows, auction(cost)].sum(), cost[rows, hungarian(cost)].sum())
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_batch_respects_mode_and_pickup_limit(self):
+        near, far = self.locations[0], self.locations[5]
+        taxi = Driver.objects.create(name='Taxi', transport_mode='taxi', latitude=near.latitude, longitude=near.longitude)
+        Driver.objects.create(name='Loin', transport_mode='taxi', latitude=near.latitude + 1, longitude=near.longitude)
+        Driver.objects.create(name='Moto', transport_mode='moto_taxi', latitude=far.latitude, longitude=far.longitude)
+        first = RouteRequest.objects.create(departure=near, destination=far, transport_mode='taxi')
+        second = RouteRequest.objects.create(departure=far, destination=near, transport_mode='taxi')
+
+        result = assign_batch()
+        self.assertEqual([(a.route_request, a.driver) for a in result['assignments']], [(first, taxi)])
+        self.assertEqual(result['unassigned'], 1 + len(self.routes))
+        self.assertFalse(Driver.objects.get(id=taxi.id).is_available)
+        # Demande restante : reprise au lot suivant, le chauffeur affecté n'est plus proposé
+        self.assertEqual(assign_batch()['assignments'], [])
+        self.assertIn(second, pending_requests())
+
+        check_dependents()
+        archive_batch(RouteRequest.objects.filter(id=first.id), 'table', 10)
+        self.assertFalse(DriverAssignment.objects.exists())
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_overlapping_batches_never_double_book(self):
+        near, far = self.locations[0], self.locations[5]
+        taxi = Driver.objects.create(name='Taxi', transport_mode='taxi', latitude=near.latitude, longitude=near.longitude)
+        request = RouteRequest.objects.create(departure=near, destination=far, transport_mode='taxi')
+        overlapping = []
+
+        def concurrent(*args):
+            # Un second lot s'exécute pendant le calcul du premier
+            if not overlapping:
+                overlapping.append(None)
+                overlapping[0] = assign_batch()
+            return pickup_matrices(*args)
+
+        with mock.patch('routes.assignment.pickup_matrices', side_effect=concurrent):
+            result = assign_batch()
+        self.assertEqual([(a.route_request, a.driver) for a in overlapping[0]['assignments']], [(request, taxi)])
+        self.assertEqual(result['assignments'], [])
+        self.assertEqual(DriverAssignment.objects.count(), 1)
+        self.assertFalse(Driver.objects.get(id=taxi.id).is_available)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LocationPickerTests(BudgetTestCase):
+    """Sélecteurs de lieux : recherche par préfixe, page et validation indépendantes du nombre de lieux"""
+
+    def test_prefix_search_ignores_accents_and_case(self):
+        market = Location.objects.create(name='Marché Central', address='Centre-ville, Yaoundé', latitude=3.87, longitude=11.52)
+        Location.objects.create(name='Grand Marché', address='Mokolo, Yaoundé', latitude=3.88, longitude=11.50)
+        self.assertEqual(list(Location.objects.autocomplete('MARCHE c')), [market])
+        self.assertEqual(list(Location.objects.autocomplete('central')), [])
+
+        response = self.client.get(reverse('routes:search_locations'), {'q': 'lieu', 'limit': 2})
+        self.assertEqual([location['name'] for location in response.json()['locations']], ['Lieu 0', 'Lieu 1'])
+
+    def test_plan_page_does_not_list_locations(self):
+        Location.objects.bulk_create([
+            Location(name=f"Quartier {i}", address=f"{i} avenue Kennedy, Yaoundé", latitude=3.8, longitude=11.5)
+            for i in range(300)
+        ])
+        self.client.force_login(self.user)
+        with self.assertQueryBudget(3):
+            response = self.client.get(reverse('routes:plan_route'))
+        self.assertNotContains(response, 'Quartier')
+        self.assertContains(response, 'routes/location_autocomplete.js')
+
+        # Validation : seuls les lieux choisis sont chargés (puis vérifiés par le modèle)
+        departure, destination = self.locations[0], self.locations[1]
+        with self.assertQueryBudget(4):
+            form = RouteRequestForm({'departure': departure.id, 'destination': destination.id, 'transport_mode': 'car'})
+            self.assertTrue(form.is_valid())
+        self.assertEqual((form.cleaned_data['departure'], form.cleaned_data['destination']), (departure, destination))
+
+    def test_invalid_form_shows_chosen_location(self):
+        departure = self.locations[0]
+        form = RouteRequestForm({'departure': departure.id, 'destination': departure.id, 'transport_mode': 'car'})
+        self.assertFalse(form.is_valid())
+        html = str(form['departure'])
+        self.assertIn(f'value="{departure.id}"', html)
+        self.assertIn(f'value="{departure.name}"', html)
+        self.assertFalse(RouteRequestForm({'departure': 'abc', 'destination': 999999, 'transport_mode': 'car'}).is_valid())
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='', ROUTE_REOPTIMIZE_RATE=1000)
+class ReoptimizationTests(BudgetTestCase):
+    """Ré-optimisation par lots : écritures groupées, reprise, repli ignoré, action d'administration"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', fresh_analysis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Tournée de flotte : recalculée avec son plan, jamais seule
+        plan = create_fleet_plan('Tournée', self.locations[0], 'car', [5], [{'location': self.locations[1], 'delivery': 1}])
+        OptimizedRoute.objects.filter(id=self.routes[4].id).update(fleet_plan=plan)
+
+    def assertRefreshed(self, routes, refreshed=True):
+        for route in OptimizedRoute.objects.filter(id__in=[route.id for route in routes]):
+            self.assertEqual(route.refreshed_at is not None, refreshed)
+            self.assertEqual(route.distance == 9.5, refreshed)
+            description = route.route_data['ai_analysis']['optimal_route']['description']
+            self.assertEqual(description == 'Nouvel itinéraire', refreshed)
+
+    def test_batches_written_in_bulk_and_resumable(self):
+        passes = reoptimize_routes(OptimizedRoute.objects.all(), batch_size=2)
+        first = next(passes)
+        passes.close()
+        self.assertEqual((first['processed'], first['updated'], first['last_id']), (2, 2, self.routes[1].id))
+        self.assertRefreshed(self.routes[:2])
+        self.assertRefreshed(self.routes[2:], refreshed=False)
+
+        # Lecture du lot, mise à jour des routes et des données de l'IA : une requête chacune
+        with self.assertQueryBudget(6):
+            states = list(reoptimize_routes(OptimizedRoute.objects.all(), batch_size=10, after_id=first['last_id']))
+        self.assertEqual([state['updated'] for state in states], [2])
+        self.assertRefreshed(self.routes[:4])
+        self.assertRefreshed(self.routes[4:], refreshed=False)
+
+    def test_fallback_result_keeps_previous_analysis(self):
+        with mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', return_value={'is_fallback': True}):
+            state, = reoptimize_routes(OptimizedRoute.objects.all())
+        self.assertEqual((state['processed'], state['updated'], state['failed']), (4, 0, 4))
+        self.assertRefreshed(self.routes, refreshed=False)
+
+    def test_command_resumes_from_checkpoint(self):
+        checkpoint = Path(tempfile.mkdtemp()) / 'reprise.json'
+        batch = reoptimization.reoptimize_batch
+        calls = []
+
+        def interrupted(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return batch(*args)
+
+        with mock.patch('routes.reoptimization.reoptimize_batch', interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('reoptimize_routes', '--batch-size', '2', '--checkpoint', str(checkpoint), stdout=io.StringIO())
+        self.assertEqual(json.loads(checkpoint.read_text())['last_id'], self.routes[1].id)
+
+        call_command('reoptimize_routes', '--resume', '--checkpoint', str(checkpoint), stdout=io.StringIO())
+        self.assertFalse(checkpoint.exists())
+        self.assertRefreshed(self.routes[:4])
+
+    def test_admin_action_streams_progress(self):
+        self.client.force_login(self.user)
+        result_url = reverse('routes:route_result', args=[self.routes[0].id])
+        etag = self.client.get(result_url)['ETag']
+
+        self.client.force_login(self.staff)
+        url = reverse('admin:routes_optimizedroute_changelist')
+        with self.assertQueryBudget(10):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(url, {
+            'action': 'reoptimize', '_selected_action': [route.id for route in self.routes[:3]],
+        })
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertIn('3 routes traitées, 3 mises à jour', lines[-2])
+        self.assertEqual(lines[-1], 'Terminé')
+        self.assertRefreshed(self.routes[:3])
+
+        # Route recalculée : nouvel ETag, l'ancienne page n'est plus resservie
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(result_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class WebSocketClient:
+    """Client ASGI en mémoire pour routes.live.websocket_application"""
+
+    def __init__(self, path):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = asyncio.ensure_future(websocket_application(
+            {'type': 'websocket', 'path': path}, self.incoming.get, self.outgoing.put
+        ))
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), timeout=5)
+
+    async def receive_json(self):
+        message = await self.receive()
+        self.assert_type(message, 'websocket.send')
+        return json.loads(message['text'])
+
+    async def connect(self):
+        message = await self.receive()
+        self.assert_type(message, 'websocket.accept')
+        return await self.receive_json()
+
+    async def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+    @staticmethod
+    def assert_type(message, expected):
+        if message['type'] != expected:
+            raise AssertionError(f"{message} au lieu de {expected}")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LiveUpdateTests(BudgetTestCase):
+    """Suivi en direct : diffusion, plafonds de connexions et clients lents"""
+
+    def setUp(self):
+        super().setUp()
+        self.layer = LiveChannelLayer({
+            'MAX_CONNECTIONS': 3, 'MAX_SUBSCRIBERS_PER_ROUTE': 2, 'QUEUE_SIZE': 2, 'MAX_DROPPED': 3,
+        })
+        patcher = mock.patch('routes.live._layer', self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_position_fanned_out_to_subscribers(self):
+        route = self.routes[0]
+        path = f'/ws/routes/{route.id}/'
+        clients = [WebSocketClient(path), WebSocketClient(path)]
+        for client in clients:
+            snapshot = await client.connect()
+            self.assertEqual((snapshot['type'], snapshot['eta_minutes']), ('snapshot', route.duration))
+
+        url = reverse('routes:api_route_position', args=[route.id])
+        destination = self.locations[1]
+        response = await self.async_client.post(
+            url, json.dumps({'lat': destination.latitude, 'lon': destination.longitude - 0.05}),
+            content_type='application/json'
+        )
+        self.assertEqual(json.loads(response.content), {'success': True, 'subscribers': 2})
+        for client in clients:
+            update = await client.receive_json()
+            self.assertEqual(update['type'], 'position')
+            self.assertGreater(update['eta_minutes'], 0)
+            self.assertLess(update['remaining_km'], route.distance)
+
+        # Nouvel abonné : dernier état publié, sans requête en base
+        await clients[0].disconnect()
+        late = WebSocketClient(path)
+        self.assertEqual((await late.connect())['type'], 'position')
+        for client in (clients[1], late):
+            await client.disconnect()
+        self.assertEqual((self.layer.connections, self.layer.groups, self.layer.routes), (0, {}, {}))
+
+        response = await self.async_client.post(url, json.dumps({'lat': 'nord'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_connection_caps_and_unknown_route(self):
+        path = f'/ws/routes/{self.routes[0].id}/'
+        clients = [WebSocketClient(path), WebSocketClient(path)]
+        for client in clients:
+            await client.connect()
+        self.assertEqual((await WebSocketClient(path).receive())['code'], CLOSE_TRY_AGAIN_LATER)
+        for unknown in ('/ws/routes/999999/', '/ws/autre/'):
+            self.assertEqual((await WebSocketClient(unknown).receive())['code'], CLOSE_NOT_FOUND)
+
+        # Plafond par processus : une autre route est refusée aussi
+        await WebSocketClient(f'/ws/routes/{self.routes[1].id}/').connect()
+        self.assertEqual((await WebSocketClient(f'/ws/routes/{self.routes[2].id}/').receive())['code'],
+                         CLOSE_TRY_AGAIN_LATER)
+        for client in clients:
+            await client.disconnect()
+
+    async def test_slow_subscriber_keeps_latest_then_is_closed(self):
+        subscription = Subscription(1, size=2)
+        for i in range(5):
+            subscription.push(str(i))
+        self.assertEqual((await subscription.next_messages(), subscription.dropped), (['3', '4'], 3))
+
+        route = self.routes[0]
+        client = WebSocketClient(f'/ws/routes/{route.id}/')
+        await client.connect()
+        # Publications sans rendre la main à la boucle : le client ne lit rien entre-temps
+        for i in range(10):
+            self.layer.publish(route.id, {'type': 'position', 'sequence': i})
+        received = [(await client.receive_json())['sequence'] for _ in range(2)]
+        self.assertEqual(received, [8, 9])
+        self.assertEqual((await client.receive())['code'], CLOSE_TOO_SLOW)
+        await asyncio.wait_for(client.task, timeout=5)
+        self.assertEqual(self.layer.connections, 0)
+
+
+def local_departure(hour, minute=0):
+    tz = local_time_zone()
+    return timezone.make_aware(datetime.combine(timezone.localdate(timezone=tz), time(hour, minute)), tz)
+
+
+@override_settings(CACHES=TEST_CACHES, OSRM_URL='')
+class SpeedProfileTests(SpeedProfilesMixin, BudgetTestCase):
+    """Profils de vitesse : apprentissage, estimation et cache selon le quart d'heure de départ"""
+
+    def test_estimates_follow_learned_bucket(self):
+        # Taxi à Yaoundé : deux fois plus lent à 07:30 (quart d'heure 30), normal à 02:00 (8)
+        yaounde = zone_names().index('yaounde')
+        profiles = learn_profiles(['taxi'] * 200, [yaounde] * 200, [30] * 100 + [8] * 100, [2.0] * 100 + [1.0] * 100)
+        profiles.save(self.path)
+        self.assertEqual(SpeedProfiles.load(self.path).factors.dtype, np.float32)
+        get_speed_profiles(reload=True)
+
+        departure, destination = self.locations[0], self.locations[5]
+        args = (departure.latitude, departure.longitude, destination.latitude, destination.longitude)
+        table = estimate(*args, 'taxi')['duration_min'][0]
+        rush, night = (estimate(*args, 'taxi', bucket)['duration_min'][0] for bucket in (30, 8))
+        self.assertGreater(rush, table * 1.5)
+        self.assertAlmostEqual(night, table, delta=1)
+        # Autre mode ou autre zone : tableau seul
+        self.assertEqual(estimate(*args, 'car', 30)['duration_min'][0], estimate(*args, 'car')['duration_min'][0])
+        self.assertEqual(estimate(4.05, 9.77, 4.1, 9.8, 'taxi', 30)['duration_min'][0],
+                         estimate(4.05, 9.77, 4.1, 9.8, 'taxi')['duration_min'][0])
+
+        minutes, _ = moving_matrices([args[:2], (4.05, 9.77)], ['taxi', 'taxi'], [args[2:]], 30)
+        plain, _ = moving_matrices([args[:2], (4.05, 9.77)], ['taxi', 'taxi'], [args[2:]])
+        self.assertGreater(minutes[0, 0], plain[0, 0] * 1.5)
+        self.assertEqual(minutes[1, 0], plain[1, 0])
+
+    def test_buckets_use_route_time_zone(self):
+        # Juillet : Paris en UTC+2, Douala toujours en UTC+1
+        self.assertEqual(time_bucket(parse_departure_time('2026-07-01T06:30:00Z')), 30)
+        self.assertEqual(time_bucket(parse_departure_time('2026-07-01T07:30')), 30)
+        self.assertEqual(parse_departure_time('2026-07-01T07:30').utcoffset().total_seconds(), 3600)
+        with override_settings(ROUTE_LOCAL_TIME_ZONE='Europe/Paris'):
+            self.assertEqual(time_bucket(parse_departure_time('2026-07-01T06:30:00Z')), 34)
+
+    def test_forms_and_api_share_time_bucket(self):
+        # Même saisie sans fuseau : même quart d'heure par le formulaire et par l'API
+        self.client.force_login(self.user)
+        departure, destination = self.locations[0], self.locations[1]
+        data = {'departure': departure.id, 'destination': destination.id, 'transport_mode': 'car',
+                'departure_time': '2026-07-01T07:30'}
+        self.client.post(reverse('routes:plan_route'), data)
+        self.client.post(reverse('routes:optimize_route_ajax'), json.dumps({
+            'departure_id': departure.id, 'destination_id': destination.id, 'transport_mode': 'car',
+            'departure_time': '2026-07-01T07:30',
+        }), content_type='application/json')
+        from_form, from_api = RouteRequest.objects.exclude(departure_time=None).order_by('id')
+        self.assertEqual(from_form.departure_time, from_api.departure_time)
+        self.assertEqual(time_bucket(from_form.departure_time), 30)
+
+        form = RouteComparisonForm({**data, 'transport_modes': ['car', 'taxi']})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['departure_time'], from_api.departure_time)
+        # Valeur initiale réaffichée dans le même fuseau
+        self.assertIn('value="2026-07-01T07:30"', str(RouteRequestForm(instance=from_api)['departure_time']))
+
+    def test_command_learns_from_departure_times(self):
+        departure, destination = self.locations[0], self.locations[1]
+        requests = RouteRequest.objects.bulk_create([
+            RouteRequest(departure=departure, destination=destination, transport_mode='moto_taxi',
+                         departure_time=local_departure(7, 35) if i % 2 else local_departure(2, 5))
+            for i in range(40)
+        ])
+        # Tableau : 10 km à 25 km/h = 24 min de roulage, plus 3 min d'attente
+        OptimizedRoute.objects.bulk_create_with_payload([
+            OptimizedRoute.objects.build(request, {'ai_analysis': {'optimal_route': {
+                'estimated_distance': 10, 'estimated_time': 3 + (48 if timezone.localtime(request.departure_time, local_time_zone()).hour == 7 else 24),
+                'cost_estimate': 700,
+            }}})
+            for request in requests
+        ])
+        # Estimations de repli (tableau seul) : jamais apprises, sinon le tableau s'apprendrait lui-même
+        fallback = RouteRequest.objects.create(departure=departure, destination=destination, transport_mode='moto_taxi',
+                                               departure_time=local_departure(7, 35))
+        route = OptimizedRoute.objects.build(fallback, {'ai_analysis': {'is_fallback': True, 'optimal_route': {
+            'estimated_distance': 10, 'estimated_time': 27, 'cost_estimate': 700,
+        }}})
+        route.save()
+        self.assertTrue(OptimizedRoute.objects.get(id=route.id).is_fallback)
+
+        # Le modèle ETA apprend la même heure de départ que celle qu'il reçoit à la prévision
+        hours = [row[5] for row in TrainEtaModelCommand().load_rows() if row[0] == 'moto_taxi']
+        self.assertEqual(len(hours), 40)
+        self.assertEqual(sorted(set(hours)), [2, 7])
+
+        call_command('build_speed_profiles', output=str(self.path), min_samples=10, stdout=io.StringIO())
+        profiles = get_speed_profiles()
+        factors = profiles.factors[profiles.modes.index('moto_taxi'), profiles.zones.index('yaounde')]
+        self.assertGreater(factors[30], 1.5)
+        # Cases ramenées vers la moyenne du mode dans la zone (prior_samples)
+        self.assertLess(factors[8], 1.25)
+        self.assertEqual(int(profiles.samples.sum()), 40)
+
+    def test_cache_and_prompt_keyed_on_departure_bucket(self):
+        departure, destination = self.locations[0], self.locations[1]
+        optimizer = RouteOptimizer()
+        ends = (departure.address, destination.address, 'taxi',
+                (departure.latitude, departure.longitude), (destination.latitude, destination.longitude))
+        with mock.patch.object(RouteOptimizer, 'calculate_route_with_ai', fresh_analysis):
+            result = optimizer.optimize_route(*ends, departure_time=local_departure(7, 30))
+        self.assertEqual(result['time_bucket'], 30)
+        self.assertIsNotNone(optimizer.get_cached_route(*ends, departure_time=local_departure(7, 44)))
+        self.assertIsNone(optimizer.get_cached_route(*ends, departure_time=local_departure(18)))
+        self.assertIn('Heure de départ: 07:45', optimizer.build_route_prompt(*ends[:3], local_departure(7, 50)))
+
+        url = reverse('routes:optimize_route_ajax')
+        data = {'departure_id': departure.id, 'destination_id': destination.id, 'transport_mode': 'bus'}
+        response = self.client.post(url, json.dumps({**data, 'departure_time': '2026-03-02T17:20'}),
+                                    content_type='application/json')
+        route = OptimizedRoute.objects.select_related('route_request').get(id=response.json()['route_id'])
+        self.assertEqual(timezone.localtime(route.route_request.departure_time, local_time_zone()).hour, 17)
+        self.assertEqual(route.route_data['time_bucket'], 69)
+        response = self.client.post(url, json.dumps({**data, 'departure_time': 'bientôt'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryBudgetTests(TestCase):
+    """Empreintes des requêtes et middleware"""
+
+    def test_fingerprint_ignores_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\'  AND n > 10'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s) AND name = \'y\' AND n > 2'),
+        )
+
+    def budget_middleware(self, view):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = QueryBudgetMiddleware(get_response)
+        return middleware
+
+    @override_settings(QUERY_BUDGET={'ENABLED': True, 'ACTION': 'raise', 'HEADERS': True})
+    def test_middleware_raises_over_budget(self):
+        view = query_budget(10)(lambda request: n_plus_one_view(request))
+        middleware = self.budget_middleware(view)
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'exécutée 4 fois'):
+            middleware(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGET={'ENABLED': True, 'ACTION': 'warn', 'HEADERS': True, 'MAX_REPEATS': None})
+    def test_middleware_warns_and_sets_headers(self):
+        view = query_budget(2)(lambda request: n_plus_one_view(request))
+        middleware = self.budget_middleware(view)
+        with self.assertLogs('routes.query_budget', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '4')
+        self.assertIn('4 requêtes pour un budget de 2', logs.output[0])
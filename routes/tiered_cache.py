@@ -0,0 +1,274 @@
+import json
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+# Valeur absente (None est une valeur valide en cache)
+MISSING = object()
+
+DEFAULT_SETTINGS = {
+    'ALIAS': 'default',
+    'L1_MAX_ENTRIES': 2048,
+    'L1_MAX_BYTES': 32 * 1024 * 1024,
+    # Borne la durée pendant laquelle un processus peut servir une valeur
+    # remplacée ou supprimée par un autre worker
+    'L1_TTL': 60,
+    'LOCK_TIMEOUT': 30,
+    'LOCK_POLL_INTERVAL': 0.05,
+    'COMPRESSION_MIN_SIZE': 1024,
+    # Durée de vie (secondes) par espace de noms
+    'NAMESPACES': {
+        'route': 6 * 3600,
+        'geometry': 7 * 86400,
+        'geocode': 30 * 86400,
+        'map': 24 * 3600,
+        'matrix': 24 * 3600,
+    },
+}
+
+_tiered_cache = None
+_tiered_cache_lock = threading.Lock()
+
+
+def dumps(value: Any, compression_min_size: int = 1024) -> bytes:
+    """JSON compact, compressé (zlib) au-delà du seuil ; préfixe d'un octet pour le format"""
+    data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(data) >= compression_min_size:
+        return b'z' + zlib.compress(data, 6)
+    return b'j' + data
+
+
+def loads(data: bytes) -> Any:
+    if data[:1] == b'z':
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class LocalLRU:
+    """Cache LRU du processus, borné en entrées et en octets, sûr entre threads
+
+    Les valeurs sont gardées sérialisées : chaque lecture renvoie une copie
+    que l'appelant peut modifier sans altérer le cache.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, key: str, data: bytes, ttl: float):
+        if ttl <= 0 or len(data) > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (data, time.monotonic() + ttl)
+            self.size += len(data)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+class TieredCache:
+    """Cache à deux niveaux : LRU du processus (L1) devant le cache Django partagé (L2)
+
+    Le L2 est l'alias ALIAS de CACHES (fichiers par défaut, base de données ou
+    Redis selon la configuration). Les valeurs doivent être sérialisables en
+    JSON : le L2 ne reçoit que des octets, jamais de gros objets picklés.
+    """
+
+    def __init__(self, options: Optional[Dict] = None):
+        options = {**DEFAULT_SETTINGS, **(options or {})}
+        self.alias = options['ALIAS']
+        self.l1_ttl = options['L1_TTL']
+        self.lock_timeout = options['LOCK_TIMEOUT']
+        self.lock_poll_interval = options['LOCK_POLL_INTERVAL']
+        self.compression_min_size = options['COMPRESSION_MIN_SIZE']
+        self.ttls = {**DEFAULT_SETTINGS['NAMESPACES'], **options.get('NAMESPACES', {})}
+        self.local = LocalLRU(options['L1_MAX_ENTRIES'], options['L1_MAX_BYTES'])
+        # Verrous par clé (avec compteur d'utilisateurs) : un seul calcul par clé dans le processus
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def ttl(self, namespace: str) -> int:
+        try:
+            return self.ttls[namespace]
+        except KeyError:
+            raise ValueError(f"Espace de cache inconnu: {namespace}")
+
+    def make_key(self, namespace: str, key: str) -> str:
+        self.ttl(namespace)
+        return f"tiered:{namespace}:{key}"
+
+    def _promote(self, namespace: str, full_key: str, data: bytes):
+        self.local.set(full_key, data, min(self.l1_ttl, self.ttl(namespace)))
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        full_key = self.make_key(namespace, key)
+        data = self.local.get(full_key)
+        if data is None:
+            data = self.backend.get(full_key)
+            if data is None:
+                return default
+            self._promote(namespace, full_key, data)
+        return loads(data)
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Valeurs présentes parmi `keys` (une seule lecture L2 pour les absentes du L1)"""
+        found = {}
+        missing = {}
+        for key in keys:
+            full_key = self.make_key(namespace, key)
+            data = self.local.get(full_key)
+            if data is None:
+                missing[full_key] = key
+            else:
+                found[key] = loads(data)
+        if missing:
+            for full_key, data in self.backend.get_many(list(missing)).items():
+                self._promote(namespace, full_key, data)
+                found[missing[full_key]] = loads(data)
+        return found
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None):
+        self.set_many(namespace, {key: value}, ttl)
+
+    def set_many(self, namespace: str, mapping: Dict[str, Any], ttl: Optional[int] = None):
+        ttl = self.ttl(namespace) if ttl is None else ttl
+        entries = {}
+        for key, value in mapping.items():
+            full_key = self.make_key(namespace, key)
+            entries[full_key] = dumps(value, self.compression_min_size)
+            self.local.set(full_key, entries[full_key], min(self.l1_ttl, ttl))
+        self.backend.set_many(entries, timeout=ttl)
+
+    def delete(self, namespace: str, key: str):
+        full_key = self.make_key(namespace, key)
+        self.local.delete(full_key)
+        self.backend.delete(full_key)
+
+    @contextmanager
+    def _local_lock(self, full_key: str):
+        with self._key_locks_guard:
+            entry = self._key_locks.setdefault(full_key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[full_key]
+
+    @contextmanager
+    def single_flight(self, namespace: str, key: str):
+        """Protection contre la ruée : un seul calcul par clé, tous workers confondus
+
+        Produit la valeur si elle est (ou devient) disponible, sinon MISSING :
+        l'appelant calcule alors la valeur et la met en cache avant de sortir
+        du bloc. Un verrou add() dans le L2 désigne le worker qui calcule ;
+        les autres attendent son résultat au plus LOCK_TIMEOUT secondes.
+        """
+        full_key = self.make_key(namespace, key)
+        with self._local_lock(full_key):
+            value = self.get(namespace, key, MISSING)
+            if value is not MISSING:
+                yield value
+                return
+
+            backend = self.backend
+            lock_key = f"{full_key}:lock"
+            token = uuid.uuid4().hex
+            owner = backend.add(lock_key, token, timeout=self.lock_timeout)
+            if owner and isinstance(backend, FileBasedCache):
+                # add() du cache fichiers n'est pas atomique entre processus : après
+                # un court délai, seul le dernier jeton écrit garde le verrou
+                time.sleep(self.lock_poll_interval)
+                owner = backend.get(lock_key) == token
+            if not owner:
+                value = self._wait_for(namespace, key, lock_key)
+                if value is not MISSING:
+                    yield value
+                    return
+                # Verrou libéré sans résultat (échec, valeur non mise en cache) : calcul local
+            try:
+                yield MISSING
+            finally:
+                if owner and backend.get(lock_key) == token:
+                    backend.delete(lock_key)
+
+    def _wait_for(self, namespace: str, key: str, lock_key: str) -> Any:
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            value = self.get(namespace, key, MISSING)
+            if value is not MISSING or self.backend.get(lock_key) is None:
+                return value
+        return MISSING
+
+    def get_or_set(self, namespace: str, key: str, compute: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """Valeur en cache, sinon calculée une seule fois puis mise en cache
+
+        Une exception levée par `compute` n'est pas mise en cache.
+        """
+        value = self.get(namespace, key, MISSING)
+        if value is not MISSING:
+            return value
+        with self.single_flight(namespace, key) as value:
+            if value is MISSING:
+                value = compute()
+                self.set(namespace, key, value, ttl)
+            return value
+
+
+def get_tiered_cache() -> TieredCache:
+    """Cache à deux niveaux du processus, configuré par settings.TIERED_CACHE"""
+    global _tiered_cache
+    if _tiered_cache is None:
+        with _tiered_cache_lock:
+            if _tiered_cache is None:
+                _tiered_cache = TieredCache(getattr(settings, 'TIERED_CACHE', None))
+    return _tiered_cache
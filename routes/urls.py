@@ -20,15 +20,41 @@ urlpatterns = [
     
     # Historique des routes (nécessite une authentification)
     path('history/', views.route_history, name='route_history'),
+    path('history/restore/', views.restore_route_history, name='restore_route_history'),
     
     # Nouvelles routes pour les statistiques et comparaisons
     path('statistics/', views.statistics, name='statistics'),
     path('compare/', views.compare_routes, name='compare_routes'),
+    path('compare/modes/', views.compare_modes, name='compare_modes'),
+    
+    # Plans de flotte (tournées de plusieurs véhicules)
+    path('fleet/', views.fleet_plan, name='fleet_plan'),
+    path('fleet/<int:plan_id>/', views.fleet_plan_result, name='fleet_plan_result'),
     path('export/routes/', views.export_routes, name='export_routes'),
     path('export/locations/', views.export_locations, name='export_locations'),
     
     # API AJAX
     path('api/search-locations/', views.search_locations, name='search_locations'),
     path('api/optimize-route/', views.optimize_route_ajax, name='optimize_route_ajax'),
+    path('api/optimize-route/stream/', views.optimize_route_stream, name='optimize_route_stream'),
     path('api/route-details/<int:route_id>/', views.get_route_details, name='get_route_details'),
+    path('api/routes/<int:route_id>/geometry/', views.api_route_geometry, name='api_route_geometry'),
+    path('api/routes/<int:route_id>/position/', views.api_route_position, name='api_route_position'),
+    
+    # API JSON paginées par curseur
+    path('api/locations/', views.api_locations, name='api_locations'),
+    path('api/routes/', views.api_routes, name='api_routes'),
+    path('api/history/', views.api_route_history, name='api_route_history'),
+    
+    # Devis instantanés (estimateur local)
+    path('api/quote/', views.api_quote, name='api_quote'),
+    path('api/quote/batch/', views.api_quote_batch, name='api_quote_batch'),
+    path('api/reachability/', views.api_reachability, name='api_reachability'),
+    
+    # Plans de flotte
+    path('api/fleet-plans/', views.api_fleet_plans, name='api_fleet_plans'),
+    path('api/fleet-plans/<int:plan_id>/', views.api_fleet_plan, name='api_fleet_plan'),
+    
+    # Affectation groupée des chauffeurs
+    path('api/assignments/', views.api_assign_drivers, name='api_assign_drivers'),
 ]
\ No newline at end of file
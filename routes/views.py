@@ -1,20 +1,41 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Sum
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from collections import defaultdict
 from datetime import datetime, timedelta
 import json
 import csv
-import folium
-from folium import plugins
-from .models import Location, RouteRequest, OptimizedRoute
-from .forms import LocationForm, RouteRequestForm
+import math
+from .models import Location, RouteRequest, OptimizedRoute, ArchivedRoute, FleetPlan, Driver
+from .forms import LocationForm, RouteRequestForm, RouteComparisonForm, FleetPlanForm
 from .services import RouteOptimizer
+from .streaming import sse_event
+from .http_cache import immutable_route, versioned_etag, cache_page_for_anonymous
+from .signals import bump_version, get_versions
+from .pagination import KeysetPaginator, InvalidCursor, approximate_count
+from .eta_model import estimate_with_model, quick_estimate
+from .reachability import reachable_locations, isochrone_polygon
+from .analytics import get_snapshot, dashboard
+from .tiered_cache import get_tiered_cache
+from .maps import create_main_map, create_route_map, create_default_map, create_fleet_map
+from .retention import restore_routes
+from .query_budget import query_budget
+from .vrp import create_fleet_plan, solve_new_fleet_plan
+from .assignment import ALGORITHMS, assign_batch, pending_requests
+from .estimator import moving_matrices
+from .speed_profiles import local_hour, parse_departure_time, time_bucket
+from .live import get_channel_layer
+from asgiref.sync import sync_to_async
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,32 +44,27 @@ logger = logging.getLogger(__name__)
 # VUES PRINCIPALES
 # ============================================================================
 
+@query_budget(8)
+@cache_page_for_anonymous('locations', 'routes')
 def index(request):
     """Page d'accueil avec carte interactive et statistiques"""
     try:
-        # Récupération des données
+        # Données paresseuses : évaluées par le gabarit seulement si le
+        # fragment correspondant n'est pas en cache (querysets et callables)
         locations = Location.objects.all().order_by('-created_at')[:10]
-        total_locations = Location.objects.count()
-        total_routes = OptimizedRoute.objects.count()
-        recent_routes = OptimizedRoute.objects.select_related(
-            'route_request__departure', 
-            'route_request__destination'
-        ).order_by('-created_at')[:5]
         
         # Statistiques
         stats = {
-            'total_locations': total_locations,
-            'total_routes': total_routes,
-            'recent_routes': recent_routes,
+            'total_locations': Location.objects.count,
+            'total_routes': OptimizedRoute.objects.count,
+            'recent_routes': OptimizedRoute.objects.for_listing().order_by('-created_at')[:5],
         }
         
-        # Création de la carte
-        map_html = create_main_map(locations)
-        
         context = {
             'locations': locations,
             'stats': stats,
-            'map_html': map_html,
+            # Création de la carte
+            'map_html': lambda: create_main_map(locations),
         }
         
         return render(request, 'routes/index.html', context)
@@ -62,6 +78,7 @@ def index(request):
             'map_html': create_default_map(),
         })
 
+@query_budget(16)
 def plan_route(request):
     """Planification d'itinéraire avec IA"""
     if request.method == 'POST':
@@ -79,21 +96,15 @@ def plan_route(request):
                 route_data = optimizer.optimize_route(
                     departure_address=route_request.departure.address,
                     destination_address=route_request.destination.address,
-                    transport_mode=route_request.transport_mode
+                    transport_mode=route_request.transport_mode,
+                    departure_coords=(route_request.departure.latitude, route_request.departure.longitude),
+                    destination_coords=(route_request.destination.latitude, route_request.destination.longitude),
+                    departure_time=route_request.departure_time or route_request.created_at
                 )
                 
-                # Extraction des données pour sauvegarde
-                ai_analysis = route_data.get('ai_analysis', {})
-                optimal_route = ai_analysis.get('optimal_route', {})
-                
-                # Création de la route optimisée
-                optimized_route = OptimizedRoute.objects.create(
-                    route_request=route_request,
-                    route_data=route_data,
-                    distance=optimal_route.get('estimated_distance', 0),
-                    duration=optimal_route.get('estimated_time', 0),
-                    cost_estimate=optimal_route.get('cost_estimate', 0)
-                )
+                # Création de la route optimisée (chiffres clés et tracé extraits du résultat)
+                optimized_route = OptimizedRoute.objects.build(route_request, route_data)
+                optimized_route.save()
                 
                 messages.success(request, f"Itinéraire optimisé avec succès! Distance: {optimized_route.distance} km, Durée: {optimized_route.duration} min")
                 return redirect('routes:route_result', route_id=optimized_route.id)
@@ -108,19 +119,25 @@ def plan_route(request):
     
     return render(request, 'routes/plan_route.html', {'form': form})
 
+@query_budget(5)
+@immutable_route(private=True)
 def route_result(request, route_id):
     """Affichage du résultat d'optimisation"""
     try:
         optimized_route = get_object_or_404(
             OptimizedRoute.objects.select_related(
                 'route_request__departure',
-                'route_request__destination'
+                'route_request__destination',
+                'payload'
             ),
             id=route_id
         )
         
-        # Création de la carte pour cet itinéraire
-        map_html = create_route_map(optimized_route)
+        # Carte de l'itinéraire, partagée entre les workers (noms des lieux : version 'locations',
+        # tracé : date de ré-optimisation)
+        refreshed = int(optimized_route.refreshed_at.timestamp() * 1e6) if optimized_route.refreshed_at else 0
+        map_key = f"route:{optimized_route.id}:{refreshed}:{get_versions('locations')['locations']}"
+        map_html = get_tiered_cache().get_or_set('map', map_key, lambda: create_route_map(optimized_route))
         
         context = {
             'optimized_route': optimized_route,
@@ -139,6 +156,8 @@ def route_result(request, route_id):
 # GESTION DES LIEUX
 # ============================================================================
 
+@query_budget(6)
+@versioned_etag('locations')
 def location_list(request):
     """Liste paginée des lieux"""
     search_query = request.GET.get('search', '')
@@ -152,16 +171,18 @@ def location_list(request):
     
     paginator = Paginator(locations, 12)  # 12 lieux par page
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     
+    # Page calculée seulement si le fragment des cartes n'est pas en cache
     context = {
-        'locations': page_obj,
+        'locations': SimpleLazyObject(lambda: paginator.get_page(page_number)),
         'search_query': search_query,
-        'total_count': locations.count(),
+        'page_number': page_number,
+        'total_count': lambda: paginator.count,
     }
     
     return render(request, 'routes/location_list.html', context)
 
+@query_budget(4)
 def add_location(request):
     """Ajout d'un nouveau lieu"""
     if request.method == 'POST':
@@ -181,6 +202,7 @@ def add_location(request):
     
     return render(request, 'routes/add_location.html', {'form': form})
 
+@query_budget(5)
 def edit_location(request, location_id):
     """Modification d'un lieu existant"""
     location = get_object_or_404(Location, id=location_id)
@@ -207,17 +229,17 @@ def edit_location(request, location_id):
     
     return render(request, 'routes/edit_location.html', context)
 
+@query_budget(16)
 def delete_location(request, location_id):
     """Suppression d'un lieu"""
     location = get_object_or_404(Location, id=location_id)
+    # Routes associées, comptées une seule fois (avertissement et page de confirmation)
+    routes_count = RouteRequest.objects.filter(
+        Q(departure=location) | Q(destination=location)
+    ).count()
     
     if request.method == 'POST':
         try:
-            # Vérifier s'il y a des routes associées
-            routes_count = RouteRequest.objects.filter(
-                Q(departure=location) | Q(destination=location)
-            ).count()
-            
             if routes_count > 0:
                 messages.warning(
                     request, 
@@ -236,9 +258,7 @@ def delete_location(request, location_id):
     
     context = {
         'location': location,
-        'routes_count': RouteRequest.objects.filter(
-            Q(departure=location) | Q(destination=location)
-        ).count(),
+        'routes_count': routes_count,
     }
     
     return render(request, 'routes/delete_location.html', context)
@@ -247,61 +267,122 @@ def delete_location(request, location_id):
 # HISTORIQUE ET STATISTIQUES
 # ============================================================================
 
+@query_budget(9)
 @login_required
+@versioned_etag('locations', 'route_requests', 'routes')
 def route_history(request):
     """Historique des routes de l'utilisateur"""
     routes = OptimizedRoute.objects.filter(
         route_request__user=request.user
-    ).select_related(
-        'route_request__departure',
-        'route_request__destination'
-    ).order_by('-created_at')
+    ).for_listing().order_by('-created_at')
     
     paginator = Paginator(routes, 10)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     
-    # Statistiques personnelles
-    total_distance = sum(route.distance or 0 for route in routes)
-    total_cost = sum(route.cost_estimate or 0 for route in routes)
-    avg_distance = routes.aggregate(Avg('distance'))['distance__avg'] or 0
+    archived = ArchivedRoute.objects.filter(user=request.user)
     
-    context = {
-        'routes': page_obj,
-        'stats': {
-            'total_routes': routes.count(),
+    def personal_stats():
+        """Statistiques personnelles, routes archivées comprises (une agrégation SQL par table)"""
+        aggregates = {
+            'total_routes': Count('id'),
+            'total_distance': Sum('distance'),
+            'distance_count': Count('distance'),
+            'total_cost': Sum('cost_estimate'),
+        }
+        totals = routes.aggregate(**aggregates)
+        archived_totals = archived.filter(original_route_id__isnull=False).aggregate(**aggregates)
+        total_distance = (totals['total_distance'] or 0) + (archived_totals['total_distance'] or 0)
+        distance_count = totals['distance_count'] + archived_totals['distance_count']
+        return {
+            'total_routes': totals['total_routes'] + archived_totals['total_routes'],
             'total_distance': total_distance,
-            'total_cost': total_cost,
-            'avg_distance': round(avg_distance, 2),
+            'total_cost': (totals['total_cost'] or 0) + (archived_totals['total_cost'] or 0),
+            'avg_distance': round(total_distance / distance_count, 2) if distance_count else 0,
         }
+    
+    # Évalués seulement si les fragments correspondants ne sont pas en cache
+    context = {
+        'routes': SimpleLazyObject(lambda: paginator.get_page(page_number)),
+        'page_number': page_number,
+        'stats': SimpleLazyObject(personal_stats),
+        # Hors fragment (formulaire avec jeton CSRF) : un comptage sur index
+        'archived_count': archived.count,
     }
     
     return render(request, 'routes/route_history.html', context)
 
+@query_budget(7)
+@login_required
+@require_http_methods(["POST"])
+def restore_route_history(request):
+    """Remet l'historique archivé de l'utilisateur dans les tables principales"""
+    try:
+        restored = restore_routes(ArchivedRoute.objects.filter(user=request.user))
+        if restored:
+            messages.success(request, f"{restored} trajets restaurés dans votre historique")
+        else:
+            messages.info(request, "Aucun trajet archivé à restaurer")
+    except Exception as e:
+        logger.error(f"Erreur lors de la restauration de l'historique: {e}")
+        messages.error(request, "Erreur lors de la restauration de l'historique")
+    return redirect('routes:route_history')
+
+@query_budget(16)
+@cache_page_for_anonymous('locations', 'route_requests', 'routes')
 def statistics(request):
     """Page de statistiques générales"""
-    # Statistiques générales
     total_locations = Location.objects.count()
-    total_routes = OptimizedRoute.objects.count()
     
-    # Statistiques par mode de transport
-    transport_stats = RouteRequest.objects.values('transport_mode').annotate(
-        count=Count('id'),
-        avg_distance=Avg('optimizedroute__distance'),
-        avg_cost=Avg('optimizedroute__cost_estimate')
-    ).order_by('-count')
+    # Instantané en colonnes (manage.py snapshot_analytics) : aucune agrégation SQL
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return render(request, 'routes/statistics.html', {
+            'total_locations': total_locations,
+            **snapshot_statistics(snapshot),
+        })
+    
+    # Les routes archivées (routes.retention) comptent dans toutes les statistiques
+    archived = ArchivedRoute.objects.all()
+    
+    # Statistiques générales
+    total_routes = OptimizedRoute.objects.count() + archived.filter(original_route_id__isnull=False).count()
+    
+    # Statistiques par mode de transport : sommes et effectifs, moyennes fusionnées ensuite
+    transport_stats = merge_transport_stats(
+        RouteRequest.objects.values('transport_mode').annotate(
+            count=Count('id'),
+            distance_sum=Sum('optimizedroute__distance'),
+            distance_count=Count('optimizedroute__distance'),
+            cost_sum=Sum('optimizedroute__cost_estimate'),
+            cost_count=Count('optimizedroute__cost_estimate'),
+        ).order_by(),
+        archived.values('transport_mode').annotate(
+            count=Count('id'),
+            distance_sum=Sum('distance'),
+            distance_count=Count('distance'),
+            cost_sum=Sum('cost_estimate'),
+            cost_count=Count('cost_estimate'),
+        ).order_by()
+    )
     
     # Routes récentes (30 derniers jours)
     thirty_days_ago = timezone.now() - timedelta(days=30)
     recent_routes = OptimizedRoute.objects.filter(
         created_at__gte=thirty_days_ago
-    ).count()
+    ).count() + archived.filter(route_created_at__gte=thirty_days_ago).count()
     
     # Lieux les plus utilisés
-    popular_locations = Location.objects.annotate(
-        departure_count=Count('departures'),
-        destination_count=Count('destinations')
-    ).order_by('-departure_count', '-destination_count')[:10]
+    usage = defaultdict(lambda: [0, 0])
+    for queryset in (RouteRequest.objects, archived):
+        for position, field in enumerate(('departure', 'destination')):
+            for location_id, count in queryset.values_list(field).annotate(count=Count('id')).order_by():
+                usage[location_id][position] += count
+    top_usage = sorted(usage.items(), key=lambda item: (-item[1][0], -item[1][1]))[:10]
+    names = dict(Location.objects.filter(id__in=[location_id for location_id, _ in top_usage]).values_list('id', 'name'))
+    popular_locations = [
+        {'name': names.get(location_id, '?'), 'departure_count': departures, 'destination_count': destinations}
+        for location_id, (departures, destinations) in top_usage
+    ]
     
     context = {
         'total_locations': total_locations,
@@ -313,25 +394,81 @@ def statistics(request):
     
     return render(request, 'routes/statistics.html', context)
 
+def merge_transport_stats(*groups):
+    """Fusionne des agrégats par mode (effectifs, sommes) en moyennes, triés par effectif"""
+    merged = {}
+    for rows in groups:
+        for row in rows:
+            stat = merged.setdefault(row['transport_mode'], defaultdict(float, transport_mode=row['transport_mode']))
+            for name in ('count', 'distance_sum', 'distance_count', 'cost_sum', 'cost_count'):
+                stat[name] += row[name] or 0
+    return sorted((
+        {
+            'transport_mode': stat['transport_mode'],
+            'count': int(stat['count']),
+            'avg_distance': stat['distance_sum'] / stat['distance_count'] if stat['distance_count'] else None,
+            'avg_cost': stat['cost_sum'] / stat['cost_count'] if stat['cost_count'] else None,
+        }
+        for stat in merged.values()
+    ), key=lambda stat: -stat['count'])
+
+def snapshot_statistics(snapshot):
+    """Contexte de la page statistiques calculé sur l'instantané analytique"""
+    data = dashboard(snapshot, timezone.now().timestamp())
+    
+    # Seuls les noms des lieux affichés sont lus en base
+    location_ids = {location_id for location_id, _, _ in data['popular_locations']}
+    for departure_id, destination_id, _ in data['top_corridors']:
+        location_ids.update((departure_id, destination_id))
+    names = dict(Location.objects.filter(id__in=location_ids).values_list('id', 'name'))
+    
+    max_hourly = max(data['hourly_counts']) or 1
+    return {
+        'total_routes': data['total_routes'],
+        'recent_routes': data['recent_routes'],
+        'transport_stats': data['transport_stats'],
+        'popular_locations': [
+            {'name': names.get(location_id, '?'), 'departure_count': departures, 'destination_count': destinations}
+            for location_id, departures, destinations in data['popular_locations']
+        ],
+        'top_corridors': [
+            {'departure': names.get(departure_id, '?'), 'destination': names.get(destination_id, '?'), 'count': count}
+            for departure_id, destination_id, count in data['top_corridors']
+        ],
+        'hourly_counts': [
+            {'hour': hour, 'count': count, 'percent': round(count * 100 / max_hourly)}
+            for hour, count in enumerate(data['hourly_counts'])
+        ],
+        'snapshot_created_at': datetime.fromisoformat(snapshot.meta['created_at']),
+    }
+
 # ============================================================================
 # VUES AJAX ET API
 # ============================================================================
 
+@query_budget(4)
 @require_http_methods(["POST"])
 def add_location_ajax(request):
     """Ajout de lieu via AJAX"""
     try:
         data = json.loads(request.body)
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
         
-        location = Location.objects.create(
-            name=data['name'],
-            address=data['address'],
-            latitude=data['latitude'],
-            longitude=data['longitude']
-        )
+        # Lieu déjà connu (même adresse normalisée ou tout proche) : renvoyé tel quel
+        location = Location.objects.find_duplicate(data['address'], latitude, longitude)
+        duplicate = location is not None
+        if not duplicate:
+            location = Location.objects.create(
+                name=data['name'],
+                address=data['address'],
+                latitude=latitude,
+                longitude=longitude
+            )
         
         return JsonResponse({
             'success': True,
+            'duplicate': duplicate,
             'location': {
                 'id': location.id,
                 'name': location.name,
@@ -347,17 +484,20 @@ def add_location_ajax(request):
             'error': str(e)
         }, status=400)
 
+@query_budget(5)
+@versioned_etag('locations')
 def search_locations(request):
-    """Recherche de lieux via AJAX"""
+    """Recherche de lieux via AJAX (sélecteurs de lieux) : début du nom, sur index"""
     query = request.GET.get('q', '').strip()
     
     if len(query) < 2:
         return JsonResponse({'locations': []})
     
-    locations = Location.objects.filter(
-        Q(name__icontains=query) | 
-        Q(address__icontains=query)
-    )[:10]
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    locations = Location.objects.autocomplete(query, limit)
     
     locations_data = [{
         'id': loc.id,
@@ -368,6 +508,7 @@ def search_locations(request):
     
     return JsonResponse({'locations': locations_data})
 
+@query_budget(14)
 @require_http_methods(["POST"])
 def optimize_route_ajax(request):
     """Optimisation de route via AJAX"""
@@ -377,12 +518,14 @@ def optimize_route_ajax(request):
         departure = get_object_or_404(Location, id=data['departure_id'])
         destination = get_object_or_404(Location, id=data['destination_id'])
         transport_mode = data['transport_mode']
+        departure_time = parse_departure_time(data.get('departure_time'))
         
         # Création de la demande
         route_request = RouteRequest.objects.create(
             departure=departure,
             destination=destination,
             transport_mode=transport_mode,
+            departure_time=departure_time,
             user=request.user if request.user.is_authenticated else None
         )
         
@@ -391,20 +534,15 @@ def optimize_route_ajax(request):
         route_data = optimizer.optimize_route(
             departure_address=departure.address,
             destination_address=destination.address,
-            transport_mode=transport_mode
+            transport_mode=transport_mode,
+            departure_coords=(departure.latitude, departure.longitude),
+            destination_coords=(destination.latitude, destination.longitude),
+            departure_time=departure_time or route_request.created_at
         )
         
         # Sauvegarde
-        ai_analysis = route_data.get('ai_analysis', {})
-        optimal_route = ai_analysis.get('optimal_route', {})
-        
-        optimized_route = OptimizedRoute.objects.create(
-            route_request=route_request,
-            route_data=route_data,
-            distance=optimal_route.get('estimated_distance', 0),
-            duration=optimal_route.get('estimated_time', 0),
-            cost_estimate=optimal_route.get('cost_estimate', 0)
-        )
+        optimized_route = OptimizedRoute.objects.build(route_request, route_data)
+        optimized_route.save()
         
         return JsonResponse({
             'success': True,
@@ -419,10 +557,138 @@ def optimize_route_ajax(request):
             'error': str(e)
         }, status=400)
 
+@query_budget(14)
+@require_http_methods(["GET"])
+def optimize_route_stream(request):
+    """Optimisation de route en flux (Server-Sent Events)
+    
+    Événements envoyés : geocoded, puis optimal_route, alternatives,
+    recommendations, points_of_interest, local_info (un par champ dès qu'il
+    est reçu de l'IA), puis done avec l'identifiant de la route sauvegardée.
+    """
+    try:
+        departure = get_object_or_404(Location, id=int(request.GET['departure_id']))
+        destination = get_object_or_404(Location, id=int(request.GET['destination_id']))
+        transport_mode = request.GET.get('transport_mode', 'car')
+        if transport_mode not in dict(RouteRequest.TRANSPORT_CHOICES):
+            raise ValueError(f"Mode de transport inconnu: {transport_mode}")
+        departure_time = parse_departure_time(request.GET.get('departure_time'))
+    except (KeyError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    route_request = RouteRequest.objects.create(
+        departure=departure,
+        destination=destination,
+        transport_mode=transport_mode,
+        departure_time=departure_time,
+        user=request.user if request.user.is_authenticated else None
+    )
+    
+    events = route_stream_events(RouteOptimizer(), route_request)
+    if isinstance(request, ASGIRequest):
+        # Sous ASGI, un itérateur asynchrone évite la mise en mémoire de toute la réponse
+        events = iterate_in_thread(events)
+    
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def route_stream_events(optimizer, route_request):
+    """Génère les événements SSE d'une optimisation, du géocodage à la sauvegarde"""
+    departure = route_request.departure
+    destination = route_request.destination
+    departure_coords = (departure.latitude, departure.longitude)
+    destination_coords = (destination.latitude, destination.longitude)
+    departure_time = route_request.departure_time or route_request.created_at
+    
+    try:
+        # Les coordonnées des lieux sont connues : premier événement immédiat
+        yield sse_event('geocoded', {
+            'departure': {'name': departure.name, 'address': departure.address, 'coordinates': departure_coords},
+            'destination': {'name': destination.name, 'address': destination.address, 'coordinates': destination_coords},
+        })
+        
+        # Estimation locale immédiate, affichée en attendant l'analyse IA
+        yield sse_event('estimate', quick_estimate(
+            departure_coords, destination_coords, route_request.transport_mode,
+            local_hour(departure_time)
+        ))
+        
+        route_data = optimizer.get_cached_route(
+            departure.address, destination.address, route_request.transport_mode,
+            departure_coords, destination_coords, departure_time
+        )
+        if route_data is not None:
+            for path, value in iter_analysis_fields(route_data['ai_analysis']):
+                yield sse_event(path[0], {'field': path[1], 'value': value})
+        else:
+            ai_analysis = {}
+            for path, value in optimizer.stream_route_with_ai(
+                departure.address, destination.address, route_request.transport_mode, departure_time
+            ):
+                if path == ('ai_analysis',):
+                    ai_analysis = value
+                elif len(path) == 2:
+                    yield sse_event(path[0], {'field': path[1], 'value': value})
+            
+            route_data = optimizer.build_result(
+                departure.address, destination.address, route_request.transport_mode,
+                departure_coords, destination_coords, ai_analysis, departure_time
+            )
+            optimizer.cache_route(route_data)
+        
+        optimized_route = OptimizedRoute.objects.build(route_request, route_data)
+        optimized_route.save()
+        
+        yield sse_event('done', {
+            'route_id': optimized_route.id,
+            'url': reverse('routes:route_result', args=[optimized_route.id]),
+            'distance': optimized_route.distance,
+            'duration': optimized_route.duration,
+            'cost_estimate': optimized_route.cost_estimate,
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur optimize_route_stream: {e}")
+        yield sse_event('failure', {'error': str(e)})
+
+def iter_analysis_fields(ai_analysis):
+    """(chemin, valeur) des champs d'une analyse complète, dans l'ordre du flux"""
+    for section, content in ai_analysis.items():
+        if isinstance(content, dict):
+            items = content.items()
+        elif isinstance(content, list):
+            items = enumerate(content)
+        else:
+            continue
+        for field, value in items:
+            yield (section, field), value
+
+async def iterate_in_thread(iterator):
+    """Expose un générateur synchrone (IA, ORM) comme itérateur asynchrone"""
+    sentinel = object()
+    while True:
+        chunk = await sync_to_async(next)(iterator, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+@query_budget(3)
+@immutable_route()
 def get_route_details(request, route_id):
     """Récupération des détails d'une route via AJAX"""
     try:
-        route = get_object_or_404(OptimizedRoute, id=route_id)
+        # Lieux et données de l'IA dans la même requête
+        route = get_object_or_404(
+            OptimizedRoute.objects.select_related(
+                'route_request__departure', 'route_request__destination', 'payload'
+            ),
+            id=route_id
+        )
         
         return JsonResponse({
             'success': True,
@@ -446,10 +712,535 @@ def get_route_details(request, route_id):
             'error': str(e)
         }, status=400)
 
+@query_budget(0)
+@require_http_methods(["POST"])
+async def api_route_position(request, route_id):
+    """Publie la position d'un véhicule sur une route et l'ETA restante aux abonnés WebSocket
+    
+    Aucune requête en base : destination et mode viennent des abonnés
+    (/ws/routes/<id>/). Sans abonné, la position n'est pas diffusée.
+    """
+    try:
+        data = json.loads(request.body)
+        position = (float(data['lat']), float(data['lon']))
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': f"Paramètres invalides: {e}"
+        }, status=400)
+    
+    layer = get_channel_layer()
+    route = layer.routes.get(route_id)
+    if route is None:
+        return JsonResponse({'success': True, 'subscribers': 0})
+    
+    minutes, distance = moving_matrices([position], [route['transport_mode']], [route['destination']], time_bucket())
+    subscribers = layer.publish(route_id, {
+        'type': 'position',
+        'route_id': route_id,
+        'position': list(position),
+        'destination': route['destination'],
+        'eta_minutes': round(float(minutes[0, 0]), 1),
+        'remaining_km': round(float(distance[0, 0]), 2),
+        'timestamp': timezone.now().isoformat(),
+    })
+    return JsonResponse({'success': True, 'subscribers': subscribers})
+
+@query_budget(4)
+@immutable_route()
+def api_route_geometry(request, route_id):
+    """Tracé encodé d'une route, simplifié selon le zoom demandé (?zoom=10)"""
+    route = get_object_or_404(OptimizedRoute.objects.only('id', 'geometry', 'geometry_levels'), id=route_id)
+    try:
+        zoom = int(request.GET['zoom']) if request.GET.get('zoom') else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'zoom doit être un entier'
+        }, status=400)
+    
+    level, geometry = route.geometry_for_zoom(zoom)
+    return JsonResponse({
+        'success': True,
+        'route_id': route.id,
+        'zoom': zoom,
+        'level': level,
+        'encoding': 'polyline5',
+        'geometry': geometry,
+    })
+
+# ============================================================================
+# API JSON PAGINÉES PAR CURSEUR
+# ============================================================================
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+def keyset_page_response(request, queryset, serialize):
+    """Réponse JSON d'une page (curseur, limite et total approximatif optionnel)"""
+    try:
+        limit = min(int(request.GET.get('limit', API_PAGE_SIZE)), API_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit doit être positif")
+        items, next_cursor = KeysetPaginator(queryset, limit).get_page(request.GET.get('cursor'))
+    except (ValueError, InvalidCursor) as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    data = {
+        'success': True,
+        'results': [serialize(item) for item in items],
+        'next_cursor': next_cursor,
+    }
+    if request.GET.get('with_total'):
+        data['approximate_total'] = approximate_count(queryset)
+    return JsonResponse(data)
+
+def serialize_location(location):
+    return {
+        'id': location.id,
+        'name': location.name,
+        'address': location.address,
+        'coordinates': [location.latitude, location.longitude],
+        'created_at': location.created_at.isoformat(),
+    }
+
+def serialize_route(route):
+    return {
+        'id': route.id,
+        'departure': route.route_request.departure.name,
+        'destination': route.route_request.destination.name,
+        'transport_mode': route.route_request.transport_mode,
+        'distance': route.distance,
+        'duration': route.duration,
+        'cost_estimate': route.cost_estimate,
+        'created_at': route.created_at.isoformat(),
+    }
+
+@query_budget(6)
+@versioned_etag('locations')
+def api_locations(request):
+    """Lieux paginés par curseur (défilement infini)"""
+    locations = Location.objects.all()
+    query = request.GET.get('q', '').strip()
+    if query:
+        locations = locations.filter(
+            Q(name__icontains=query) |
+            Q(address__icontains=query)
+        )
+    return keyset_page_response(request, locations, serialize_location)
+
+@query_budget(5)
+@versioned_etag('locations', 'route_requests', 'routes')
+def api_routes(request):
+    """Routes optimisées paginées par curseur"""
+    routes = OptimizedRoute.objects.for_listing()
+    transport_mode = request.GET.get('transport_mode')
+    if transport_mode:
+        routes = routes.filter(route_request__transport_mode=transport_mode)
+    return keyset_page_response(request, routes, serialize_route)
+
+@query_budget(5)
+@versioned_etag('locations', 'route_requests', 'routes')
+def api_route_history(request):
+    """Historique de l'utilisateur connecté, paginé par curseur"""
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'error': 'Authentification requise'
+        }, status=401)
+    routes = OptimizedRoute.objects.filter(
+        route_request__user=request.user
+    ).for_listing()
+    return keyset_page_response(request, routes, serialize_route)
+
+# ============================================================================
+# DEVIS INSTANTANÉS (ESTIMATEUR LOCAL, SANS IA)
+# ============================================================================
+
+QUOTE_BATCH_MAX_PAIRS = 10000
+
+def quote_hour(value):
+    """Heure de départ d'un devis (heures décimales locales), maintenant par défaut ; ValueError hors de [0, 24["""
+    hour = local_hour() if value is None else float(value)
+    if not (math.isfinite(hour) and 0 <= hour < 24):
+        raise ValueError("hour doit être compris entre 0 et 24")
+    return hour
+
+def quote_entries(result, transport_modes):
+    """Convertit les tableaux de l'estimateur en liste de devis JSON"""
+    return [
+        {
+            'transport_mode': mode,
+            'distance': float(result['distance_km'][i]),
+            'duration': float(result['duration_min'][i]),
+            'cost_estimate': float(result['cost_fcfa'][i]),
+            'intercity': bool(result['intercity'][i]),
+            'source': result['source'][i],
+        }
+        for i, mode in enumerate(transport_modes)
+    ]
+
+@query_budget(4)
+@require_http_methods(["GET"])
+def api_quote(request):
+    """Devis instantané entre deux lieux (ou coordonnées), pour un ou tous les modes"""
+    try:
+        if request.GET.get('departure_id') and request.GET.get('destination_id'):
+            departure = get_object_or_404(Location, id=request.GET['departure_id'])
+            destination = get_object_or_404(Location, id=request.GET['destination_id'])
+            dep = (departure.latitude, departure.longitude)
+            dest = (destination.latitude, destination.longitude)
+        else:
+            dep = (float(request.GET['dep_lat']), float(request.GET['dep_lon']))
+            dest = (float(request.GET['dest_lat']), float(request.GET['dest_lon']))
+        
+        transport_mode = request.GET.get('transport_mode')
+        transport_modes = [transport_mode] if transport_mode else [
+            code for code, _ in RouteRequest.TRANSPORT_CHOICES
+        ]
+        hour = quote_hour(request.GET.get('hour'))
+        result = estimate_with_model(dep[0], dep[1], dest[0], dest[1], transport_modes, hour)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': f"Paramètres invalides: {e}"
+        }, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'currency': 'FCFA',
+        'quotes': quote_entries(result, transport_modes),
+    })
+
+@query_budget(2)
+@require_http_methods(["POST"])
+def api_quote_batch(request):
+    """Tarification groupée : des milliers de trajets estimés en un seul calcul vectorisé"""
+    try:
+        data = json.loads(request.body)
+        pairs = data['pairs']
+        if not pairs or len(pairs) > QUOTE_BATCH_MAX_PAIRS:
+            raise ValueError(f"Entre 1 et {QUOTE_BATCH_MAX_PAIRS} trajets par requête")
+        
+        # Chaque trajet : [lat départ, lon départ, lat arrivée, lon arrivée]
+        coords = [[float(value) for value in pair] for pair in pairs]
+        if any(len(pair) != 4 for pair in coords):
+            raise ValueError("Chaque trajet doit contenir 4 coordonnées")
+        transport_modes = data.get('transport_modes') or [data.get('transport_mode', 'car')] * len(coords)
+        if len(transport_modes) != len(coords):
+            raise ValueError("transport_modes doit avoir la même taille que pairs")
+        
+        dep_lat, dep_lon, dest_lat, dest_lon = zip(*coords)
+        hour = quote_hour(data.get('hour'))
+        result = estimate_with_model(dep_lat, dep_lon, dest_lat, dest_lon, transport_modes, hour)
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'currency': 'FCFA',
+        'quotes': quote_entries(result, transport_modes),
+    })
+
+REACHABILITY_MAX_MINUTES = 240
+REACHABILITY_MAX_RESULTS = 500
+
+@query_budget(7)
+@require_http_methods(["GET"])
+@versioned_etag('locations')
+def api_reachability(request):
+    """Lieux atteignables en N minutes depuis un point (départ maintenant ou à departure_time), triés par durée estimée"""
+    try:
+        if request.GET.get('location_id'):
+            origin_location = get_object_or_404(Location, id=request.GET['location_id'])
+            origin = (origin_location.latitude, origin_location.longitude)
+            exclude_id = origin_location.id
+        else:
+            origin = (float(request.GET['lat']), float(request.GET['lon']))
+            exclude_id = None
+        minutes = float(request.GET.get('minutes', 30))
+        if not 0 < minutes <= REACHABILITY_MAX_MINUTES:
+            raise ValueError(f"minutes doit être compris entre 0 et {REACHABILITY_MAX_MINUTES}")
+        limit = min(int(request.GET.get('limit', 100)), REACHABILITY_MAX_RESULTS)
+        if limit < 1:
+            raise ValueError("limit doit être positif")
+        transport_mode = request.GET.get('transport_mode', 'moto_taxi')
+        departure_time = parse_departure_time(request.GET.get('departure_time'))
+        
+        reachable = reachable_locations(
+            origin, transport_mode, minutes, exclude_id=exclude_id, bucket=time_bucket(departure_time)
+        )
+    except (KeyError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': f"Paramètres invalides: {e}"
+        }, status=400)
+    
+    # Seuls les lieux renvoyés sont lus en base (noms)
+    ids = reachable['ids'][:limit].tolist()
+    names = dict(Location.objects.filter(id__in=ids).values_list('id', 'name'))
+    data = {
+        'success': True,
+        'origin': list(origin),
+        'transport_mode': transport_mode,
+        'minutes': minutes,
+        'total': len(reachable['ids']),
+        'results': [
+            {
+                'id': location_id,
+                'name': names.get(location_id),
+                'coordinates': [float(reachable['latitudes'][i]), float(reachable['longitudes'][i])],
+                'duration': float(reachable['duration_min'][i]),
+                'distance': float(reachable['distance_km'][i]),
+                'cost_estimate': float(reachable['cost_fcfa'][i]),
+            }
+            for i, location_id in enumerate(ids)
+        ],
+    }
+    if request.GET.get('polygon'):
+        data['polygon'] = isochrone_polygon(origin, reachable['latitudes'], reachable['longitudes'])
+    return JsonResponse(data)
+
+# ============================================================================
+# PLANS DE FLOTTE (TOURNÉES DE VÉHICULES)
+# ============================================================================
+
+FLEET_API_MAX_TIME_LIMIT = 30
+
+def load_fleet_plan(plan_id):
+    """Plan avec son dépôt, ses arrêts (lieux joints) et ses tournées"""
+    plan = get_object_or_404(FleetPlan.objects.select_related('depot'), id=plan_id)
+    stops = list(plan.stops.select_related('location'))
+    vehicle_routes = list(plan.vehicle_routes.order_by('vehicle'))
+    return plan, stops, vehicle_routes
+
+def serialize_fleet_plan(plan, stops, vehicle_routes):
+    tours = defaultdict(list)
+    unassigned = []
+    for stop in stops:
+        entry = {
+            'location_id': stop.location_id,
+            'name': stop.location.name,
+            'delivery': stop.delivery,
+            'pickup': stop.pickup,
+            'arrival_minutes': stop.arrival_minutes,
+        }
+        if stop.vehicle is None:
+            unassigned.append(entry)
+        else:
+            tours[stop.vehicle].append(entry)
+    return {
+        'id': plan.id,
+        'name': plan.name,
+        'depot': {'id': plan.depot_id, 'name': plan.depot.name},
+        'transport_mode': plan.transport_mode,
+        'vehicle_capacities': plan.vehicle_capacities,
+        'shift_start': plan.shift_start.isoformat(),
+        'shift_minutes': plan.shift_minutes,
+        'total_distance': plan.total_distance,
+        'total_duration': plan.total_duration,
+        'total_cost': plan.total_cost,
+        'solve_seconds': plan.solve_seconds,
+        'routes': [
+            {
+                'route_id': route.id,
+                'vehicle': route.vehicle,
+                'distance': route.distance,
+                'duration': route.duration,
+                'cost_estimate': route.cost_estimate,
+                'stops': tours[route.vehicle],
+            }
+            for route in vehicle_routes
+        ],
+        'unassigned': unassigned,
+    }
+
+@query_budget(18)
+def fleet_plan(request):
+    """Répartition d'arrêts entre plusieurs véhicules (capacités, durée de service)"""
+    if request.method == 'POST':
+        form = FleetPlanForm(request.POST)
+        if form.is_valid():
+            try:
+                data = form.cleaned_data
+                plan = create_fleet_plan(
+                    name=data['name'],
+                    depot=data['depot'],
+                    transport_mode=data['transport_mode'],
+                    vehicle_capacities=[data['vehicle_capacity']] * data['vehicle_count'],
+                    stops=[{'location': location, 'delivery': data['delivery']} for location in data['stops']],
+                    user=request.user if request.user.is_authenticated else None,
+                    shift_minutes=data['shift_minutes'],
+                )
+                result = solve_new_fleet_plan(plan)
+                
+                if result['unassigned']:
+                    messages.warning(request, f"{len(result['unassigned'])} arrêt(s) non desservi(s) : capacité ou durée de service insuffisante")
+                else:
+                    messages.success(request, f"Plan calculé : {len(result['routes'])} tournée(s), {plan.total_distance} km au total")
+                return redirect('routes:fleet_plan_result', plan_id=plan.id)
+                
+            except Exception as e:
+                logger.error(f"Erreur lors du calcul du plan de flotte: {e}")
+                messages.error(request, f"Erreur lors du calcul des tournées: {str(e)}")
+        else:
+            messages.error(request, "Veuillez corriger les erreurs du formulaire")
+    else:
+        form = FleetPlanForm()
+    
+    return render(request, 'routes/fleet_plan.html', {'form': form})
+
+@query_budget(5)
+def fleet_plan_result(request, plan_id):
+    """Tournées d'un plan de flotte : carte et détail par véhicule"""
+    plan, stops, vehicle_routes = load_fleet_plan(plan_id)
+    
+    # Carte partagée entre les workers, refaite si le plan est recalculé (version 'routes')
+    versions = get_versions('locations', 'routes')
+    map_key = f"fleet:{plan.id}:{versions['locations']}:{versions['routes']}"
+    map_html = get_tiered_cache().get_or_set('map', map_key, lambda: create_fleet_map(plan, stops))
+    
+    context = {
+        'plan': plan,
+        'plan_data': serialize_fleet_plan(plan, stops, vehicle_routes),
+        'map_html': map_html,
+    }
+    return render(request, 'routes/fleet_plan_result.html', context)
+
+@query_budget(20)
+@require_http_methods(["POST"])
+def api_fleet_plans(request):
+    """Crée et calcule un plan de flotte (arrêts avec quantités et créneaux horaires)"""
+    try:
+        data = json.loads(request.body)
+        depot = get_object_or_404(Location, id=data['depot_id'])
+        capacities = data.get('vehicle_capacities') or [data['vehicle_capacity']] * int(data.get('vehicle_count', 1))
+        capacities = [float(capacity) for capacity in capacities]
+        if not capacities or min(capacities) <= 0:
+            raise ValueError("Au moins un véhicule de capacité positive")
+        
+        entries = data['stops']
+        max_stops = getattr(settings, 'FLEET_MAX_STOPS', 500)
+        if not entries or len(entries) > max_stops:
+            raise ValueError(f"Entre 1 et {max_stops} arrêts par plan")
+        locations = Location.objects.in_bulk([entry['location_id'] for entry in entries])
+        stops = []
+        for entry in entries:
+            location = locations.get(entry['location_id'])
+            if location is None or location.id == depot.id:
+                raise ValueError(f"Arrêt invalide: {entry['location_id']}")
+            stops.append({
+                'location': location,
+                'delivery': float(entry.get('delivery', 0)),
+                'pickup': float(entry.get('pickup', 0)),
+                'ready_minutes': int(entry.get('ready', 0)),
+                'due_minutes': None if entry.get('due') is None else int(entry['due']),
+                'service_minutes': int(entry.get('service', 5)),
+            })
+        
+        transport_mode = data.get('transport_mode', 'car')
+        if transport_mode not in dict(RouteRequest.TRANSPORT_CHOICES):
+            raise ValueError(f"Mode de transport inconnu: {transport_mode}")
+        # Sans fuseau : heure locale du projet
+        shift_start = parse_departure_time(data.get('shift_start'))
+        shift_minutes = int(data.get('shift_minutes', 480))
+        time_limit = data.get('time_limit')
+        if time_limit is not None:
+            time_limit = min(float(time_limit), FLEET_API_MAX_TIME_LIMIT)
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    plan = create_fleet_plan(
+        name=data.get('name') or f"Plan {depot.name}",
+        depot=depot,
+        transport_mode=transport_mode,
+        vehicle_capacities=capacities,
+        stops=stops,
+        user=request.user if request.user.is_authenticated else None,
+        shift_start=shift_start,
+        shift_minutes=shift_minutes,
+    )
+    try:
+        solve_new_fleet_plan(plan, time_limit=time_limit)
+    except Exception as e:
+        logger.error(f"Erreur api_fleet_plans: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    return JsonResponse({
+        'success': True,
+        'plan': serialize_fleet_plan(*load_fleet_plan(plan.id)),
+    }, status=201)
+
+@query_budget(3)
+@require_http_methods(["GET"])
+def api_fleet_plan(request, plan_id):
+    """Détail d'un plan de flotte calculé"""
+    return JsonResponse({
+        'success': True,
+        'plan': serialize_fleet_plan(*load_fleet_plan(plan_id)),
+    })
+
+# ============================================================================
+# AFFECTATION GROUPÉE DES CHAUFFEURS
+# ============================================================================
+
+@query_budget(8)
+@require_http_methods(["POST"])
+def api_assign_drivers(request):
+    """Affecte en un lot les demandes en attente aux chauffeurs disponibles"""
+    try:
+        data = json.loads(request.body or '{}')
+        algorithm = data.get('algorithm', 'auto')
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algorithme inconnu: {algorithm}")
+        requests = pending_requests()
+        if data.get('request_ids'):
+            requests = requests.filter(id__in=[int(value) for value in data['request_ids']])
+        drivers = Driver.objects.filter(is_available=True)
+        if data.get('driver_ids'):
+            drivers = drivers.filter(id__in=[int(value) for value in data['driver_ids']])
+    except (TypeError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    result = assign_batch(requests, drivers, algorithm=algorithm, dry_run=bool(data.get('dry_run')))
+    return JsonResponse({
+        'success': True,
+        'requests': result['requests'],
+        'drivers': result['drivers'],
+        'unassigned': result['unassigned'],
+        'total_pickup_minutes': round(result['total_pickup_minutes'], 1),
+        'elapsed_ms': round(result['elapsed'] * 1000, 1),
+        'assignments': [
+            {
+                'request_id': assignment.route_request_id,
+                'driver_id': assignment.driver_id,
+                'driver': assignment.driver.name,
+                'pickup_minutes': round(assignment.pickup_minutes, 1),
+                'pickup_distance': round(assignment.pickup_distance, 2),
+            }
+            for assignment in result['assignments']
+        ],
+    })
+
 # ============================================================================
 # COMPARAISON ET EXPORT
 # ============================================================================
 
+@query_budget(5)
 def compare_routes(request):
     """Comparaison de routes"""
     route_ids = request.GET.getlist('routes')
@@ -458,12 +1249,13 @@ def compare_routes(request):
         messages.error(request, "Veuillez sélectionner au moins 2 routes à comparer")
         return redirect('routes:route_history')
     
-    routes = OptimizedRoute.objects.filter(
+    routes = list(OptimizedRoute.objects.filter(
         id__in=route_ids
-    ).select_related(
-        'route_request__departure',
-        'route_request__destination'
-    )
+    ).for_listing())
+    
+    if len(routes) < 2:
+        messages.error(request, "Routes introuvables pour la comparaison")
+        return redirect('routes:route_history')
     
     # Analyse comparative
     comparison_data = {
@@ -475,6 +1267,64 @@ def compare_routes(request):
     
     return render(request, 'routes/compare_routes.html', comparison_data)
 
+@query_budget(9)
+def compare_modes(request):
+    """Comparaison de plusieurs modes de transport calculés en une seule passe"""
+    if request.method == 'POST':
+        form = RouteComparisonForm(request.POST)
+        if form.is_valid():
+            try:
+                departure = form.cleaned_data['departure']
+                destination = form.cleaned_data['destination']
+                transport_modes = form.cleaned_data['transport_modes']
+                departure_time = form.cleaned_data['departure_time']
+                user = request.user if request.user.is_authenticated else None
+                
+                # Optimisation de tous les modes ensemble (géocodage partagé)
+                optimizer = RouteOptimizer()
+                results = optimizer.optimize_routes(
+                    departure_address=departure.address,
+                    destination_address=destination.address,
+                    transport_modes=transport_modes,
+                    departure_coords=(departure.latitude, departure.longitude),
+                    destination_coords=(destination.latitude, destination.longitude),
+                    departure_time=departure_time
+                )
+                
+                # Une demande et une route optimisée par mode, créées en masse
+                route_requests = RouteRequest.objects.bulk_create([
+                    RouteRequest(
+                        user=user,
+                        departure=departure,
+                        destination=destination,
+                        transport_mode=mode,
+                        departure_time=departure_time
+                    )
+                    for mode in transport_modes
+                ])
+                optimized_routes = OptimizedRoute.objects.bulk_create_with_payload([
+                    OptimizedRoute.objects.build(route_request, results[route_request.transport_mode])
+                    for route_request in route_requests
+                ])
+                # bulk_create n'envoie pas post_save
+                bump_version('route_requests')
+                bump_version('routes')
+                
+                query = '&'.join(f"routes={route.id}" for route in optimized_routes)
+                return redirect(f"{reverse('routes:compare_routes')}?{query}")
+                
+            except Exception as e:
+                logger.error(f"Erreur lors de la comparaison des modes: {e}")
+                messages.error(request, f"Erreur lors de la comparaison des modes de transport: {str(e)}")
+        else:
+            messages.error(request, "Veuillez corriger les erreurs du formulaire")
+    else:
+        form = RouteComparisonForm()
+    
+    return render(request, 'routes/compare_modes.html', {'form': form})
+
+@query_budget(5)
+@versioned_etag('locations', 'route_requests', 'routes')
 def export_routes(request):
     """Export des routes en CSV"""
     response = HttpResponse(content_type='text/csv')
@@ -486,12 +1336,9 @@ def export_routes(request):
         'Distance (km)', 'Durée (min)', 'Coût (FCFA)'
     ])
     
-    routes = OptimizedRoute.objects.select_related(
-        'route_request__departure',
-        'route_request__destination'
-    ).order_by('-created_at')
+    routes = OptimizedRoute.objects.for_listing().order_by('-created_at')
     
-    for route in routes:
+    for route in routes.iterator(chunk_size=2000):
         writer.writerow([
             route.created_at.strftime('%Y-%m-%d %H:%M'),
             route.route_request.departure.name,
@@ -504,6 +1351,8 @@ def export_routes(request):
     
     return response
 
+@query_budget(5)
+@versioned_etag('locations')
 def export_locations(request):
     """Export des lieux en CSV"""
     response = HttpResponse(content_type='text/csv')
@@ -524,110 +1373,3 @@ def export_locations(request):
         ])
     
     return response
-
-# ============================================================================
-# FONCTIONS UTILITAIRES POUR LES CARTES
-# ============================================================================
-
-def create_main_map(locations):
-    """Crée la carte principale avec tous les lieux"""
-    # Centre par défaut: Yaoundé, Cameroun
-    center_lat, center_lon = 3.8480, 11.5021
-    
-    if locations:
-        # Centrer sur la moyenne des coordonnées
-        center_lat = sum(loc.latitude for loc in locations) / len(locations)
-        center_lon = sum(loc.longitude for loc in locations) / len(locations)
-    
-    # Création de la carte
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=10,
-        tiles='OpenStreetMap'
-    )
-    
-    # Ajout des marqueurs pour chaque lieu
-    for location in locations:
-        folium.Marker(
-            [location.latitude, location.longitude],
-            popup=f"""
-                <b>{location.name}</b><br>
-                {location.address}<br>
-                <small>Lat: {location.latitude}, Lon: {location.longitude}</small>
-            """,
-            tooltip=location.name,
-            icon=folium.Icon(color='blue', icon='info-sign')
-        ).add_to(m)
-    
-    # Ajout du contrôle de couches
-    folium.LayerControl().add_to(m)
-    
-    return m._repr_html_()
-
-def create_route_map(optimized_route):
-    """Crée une carte pour un itinéraire spécifique"""
-    departure = optimized_route.route_request.departure
-    destination = optimized_route.route_request.destination
-    
-    # Centre entre départ et destination
-    center_lat = (departure.latitude + destination.latitude) / 2
-    center_lon = (departure.longitude + destination.longitude) / 2
-    
-    # Création de la carte
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=12
-    )
-    
-    # Marqueur de départ
-    folium.Marker(
-        [departure.latitude, departure.longitude],
-        popup=f"<b>Départ:</b> {departure.name}",
-        tooltip="Point de départ",
-        icon=folium.Icon(color='green', icon='play')
-    ).add_to(m)
-    
-    # Marqueur de destination
-    folium.Marker(
-        [destination.latitude, destination.longitude],
-        popup=f"<b>Destination:</b> {destination.name}",
-        tooltip="Point d'arrivée",
-        icon=folium.Icon(color='red', icon='stop')
-    ).add_to(m)
-    
-    # Ligne entre départ et destination
-    folium.PolyLine(
-        locations=[
-            [departure.latitude, departure.longitude],
-            [destination.latitude, destination.longitude]
-        ],
-        weight=4,
-        color='blue',
-        opacity=0.8
-    ).add_to(m)
-    
-    # Ajustement du zoom pour inclure tous les points
-    m.fit_bounds([
-        [departure.latitude, departure.longitude],
-        [destination.latitude, destination.longitude]
-    ])
-    
-    return m._repr_html_()
-
-def create_default_map():
-    """Crée une carte par défaut centrée sur le Cameroun"""
-    m = folium.Map(
-        location=[3.8480, 11.5021],  # Yaoundé
-        zoom_start=7,
-        tiles='OpenStreetMap'
-    )
-    
-    # Marqueur pour Yaoundé
-    folium.Marker(
-        [3.8480, 11.5021],
-        popup="Yaoundé - Capitale du Cameroun",
-        tooltip="Yaoundé",
-        icon=folium.Icon(color='red', icon='star')
-    ).add_to(m)
-    
-    return m._repr_html_()
@@ -0,0 +1,596 @@
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .eta_model import estimate_with_model
+from .models import FleetPlan, FleetStop, OptimizedRoute, RouteRequest
+from .signals import bump_version
+from .speed_profiles import BUCKET_MINUTES, bucket_for_hour, local_hour
+from .tiered_cache import get_tiered_cache
+
+EPSILON = 1e-6
+
+
+def travel_matrices(coords: Sequence[Tuple[float, float]], transport_mode: str,
+                    hour: float = 12) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Matrices distance (km), durée (min) et coût (FCFA) entre tous les points
+
+    Une seule estimation vectorisée pour les n² couples, mise en cache (espace
+    'matrix') par quart d'heure de départ : recalculer un plan sur les mêmes
+    lieux à la même heure ne refait pas le calcul.
+    """
+    coords = np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2), 5)
+    bucket = bucket_for_hour(hour)
+    # Début du quart d'heure : toutes les heures d'une même entrée donnent la même matrice
+    hour = bucket * BUCKET_MINUTES / 60
+    key = hashlib.sha1(f"v2|{transport_mode}|{bucket}|".encode('utf-8') + coords.tobytes()).hexdigest()
+
+    def compute():
+        size = len(coords)
+        departures = np.repeat(coords, size, axis=0)
+        destinations = np.tile(coords, (size, 1))
+        result = estimate_with_model(
+            departures[:, 0], departures[:, 1], destinations[:, 0], destinations[:, 1],
+            transport_mode, hour
+        )
+        matrices = []
+        for name in ('distance_km', 'duration_min', 'cost_fcfa'):
+            matrix = np.asarray(result[name], dtype=np.float64).reshape(size, size)
+            np.fill_diagonal(matrix, 0)
+            matrices.append(matrix.tolist())
+        return matrices
+
+    return tuple(np.asarray(matrix) for matrix in get_tiered_cache().get_or_set('matrix', key, compute))
+
+
+class VrpProblem:
+    """Tournées de véhicules avec capacités et créneaux horaires
+
+    Indice 0 : dépôt, 1..n : arrêts. Les temps sont en minutes depuis le
+    début de service ; chaque véhicule part du dépôt et doit y revenir avant
+    `horizon`. Les quantités livrées partent du dépôt, les quantités
+    collectées y reviennent : la charge varie le long de la tournée.
+    Les matrices sont gardées en listes Python, plus rapides à indexer une
+    valeur à la fois que des tableaux NumPy.
+    """
+
+    def __init__(self, distance, duration, capacities: Sequence[float], delivery: Sequence[float],
+                 pickup: Sequence[float], ready: Sequence[float], due: Sequence[Optional[float]],
+                 service: Sequence[float], horizon: float):
+        self.size = len(delivery)
+        self.distance_array = np.asarray(distance, dtype=np.float64)
+        self.distance = self.distance_array.tolist()
+        self.duration = np.asarray(duration, dtype=np.float64).tolist()
+        self.capacities = [float(capacity) for capacity in capacities]
+        self.horizon = float(horizon)
+        self.delivery = [0.0] + [float(value) for value in delivery]
+        self.pickup = [0.0] + [float(value) for value in pickup]
+        self.ready = [0.0] + [float(value) for value in ready]
+        self.due = [self.horizon] + [self.horizon if value is None else min(float(value), self.horizon) for value in due]
+        self.service = [0.0] + [float(value) for value in service]
+
+    def schedule(self, route: List[int], capacity: float) -> Optional[Tuple[List[float], float]]:
+        """(heures d'arrivée, retour au dépôt) si la tournée est réalisable, sinon None"""
+        load = 0.0
+        for stop in route:
+            load += self.delivery[stop]
+        if load > capacity + EPSILON:
+            return None
+
+        duration, ready, due = self.duration, self.ready, self.due
+        clock = 0.0
+        previous = 0
+        arrivals = []
+        for stop in route:
+            clock += duration[previous][stop]
+            if clock < ready[stop]:
+                clock = ready[stop]
+            if clock > due[stop] + EPSILON:
+                return None
+            arrivals.append(clock)
+            clock += self.service[stop]
+            load += self.pickup[stop] - self.delivery[stop]
+            if load > capacity + EPSILON:
+                return None
+            previous = stop
+        clock += duration[previous][0]
+        if clock > self.horizon + EPSILON:
+            return None
+        return arrivals, clock
+
+    def feasible(self, route: List[int], capacity: float) -> bool:
+        return self.schedule(route, capacity) is not None
+
+    def route_distance(self, route: List[int]) -> float:
+        distance = self.distance
+        total = 0.0
+        previous = 0
+        for stop in route:
+            total += distance[previous][stop]
+            previous = stop
+        return total + distance[previous][0]
+
+
+class VrpSolver:
+    """Construction par économies (Clarke & Wright) puis recherche locale itérée
+
+    Recherche locale : déplacement d'un arrêt, échange de deux arrêts, échange
+    de fins de tournées (2-opt*) et inversion d'un segment (2-opt), jusqu'à
+    l'optimum local. Tant que le temps le permet, une partie des arrêts
+    (voisins d'un arrêt tiré au hasard) est retirée puis réinsérée et la
+    recherche reprend ; la meilleure solution est gardée.
+    Objectif : le moins d'arrêts non desservis, puis la distance totale.
+    """
+
+    def __init__(self, problem: VrpProblem, time_limit: float = 2.0, seed: int = 0):
+        self.problem = problem
+        self.time_limit = time_limit
+        self.random = random.Random(seed)
+        self.deadline = None
+
+    def solve(self) -> Dict:
+        started = time.monotonic()
+        self.deadline = started + self.time_limit
+        routes, unassigned = self.construct()
+        self.local_search(routes, unassigned)
+        best = ([list(route) for route in routes], list(unassigned))
+        best_key = self.objective(routes, unassigned)
+
+        iterations = 0
+        while time.monotonic() < self.deadline and self.problem.size > 1:
+            routes, unassigned = [list(route) for route in best[0]], list(best[1])
+            self.perturb(routes, unassigned)
+            self.local_search(routes, unassigned)
+            iterations += 1
+            key = self.objective(routes, unassigned)
+            if key[0] < best_key[0] or (key[0] == best_key[0] and key[1] < best_key[1] - EPSILON):
+                best, best_key = ([list(route) for route in routes], list(unassigned)), key
+
+        return self.describe(best[0], best[1], time.monotonic() - started, iterations)
+
+    def objective(self, routes, unassigned) -> Tuple[int, float]:
+        return len(unassigned), sum(self.problem.route_distance(route) for route in routes if route)
+
+    def describe(self, routes, unassigned, elapsed: float, iterations: int) -> Dict:
+        problem = self.problem
+        described = []
+        for vehicle, route in enumerate(routes):
+            if not route:
+                continue
+            arrivals, end = problem.schedule(route, problem.capacities[vehicle])
+            described.append({
+                'vehicle': vehicle,
+                'stops': list(route),
+                'arrivals': arrivals,
+                'end': end,
+                'distance': problem.route_distance(route),
+                'load': sum(problem.delivery[stop] for stop in route),
+            })
+        return {
+            'routes': described,
+            'unassigned': sorted(unassigned),
+            'distance': sum(route['distance'] for route in described),
+            'duration': sum(route['end'] for route in described),
+            'elapsed': elapsed,
+            'iterations': iterations,
+        }
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    def construct(self) -> Tuple[List[List[int]], List[int]]:
+        """Économies de Clarke & Wright (capacité maximale), puis affectation aux véhicules"""
+        problem = self.problem
+        size = problem.size
+        max_capacity = max(problem.capacities)
+        routes = {}
+        route_of = [None] * (size + 1)
+        unassigned = []
+        for stop in range(1, size + 1):
+            if problem.feasible([stop], max_capacity):
+                routes[stop] = [stop]
+                route_of[stop] = stop
+            else:
+                unassigned.append(stop)
+
+        # Économie de i suivi de j : d(i, 0) + d(0, j) - d(i, j), les plus fortes d'abord
+        distance = problem.distance_array
+        savings = distance[1:, 0][:, None] + distance[0, 1:][None, :] - distance[1:, 1:]
+        np.fill_diagonal(savings, -np.inf)
+        candidates = np.flatnonzero(savings > EPSILON)
+        for flat in candidates[np.argsort(-savings.ravel()[candidates], kind='stable')].tolist():
+            first, second = divmod(flat, size)
+            first, second = first + 1, second + 1
+            a, b = route_of[first], route_of[second]
+            if a is None or b is None or a == b:
+                continue
+            if routes[a][-1] != first or routes[b][0] != second:
+                continue
+            merged = routes[a] + routes[b]
+            if not problem.feasible(merged, max_capacity):
+                continue
+            routes[a] = merged
+            for stop in routes.pop(b):
+                route_of[stop] = a
+
+        # Plus longues tournées d'abord, sur les véhicules les plus grands
+        vehicles = sorted(range(len(problem.capacities)), key=lambda vehicle: -problem.capacities[vehicle])
+        solution = [[] for _ in problem.capacities]
+        leftover = []
+        for route in sorted(routes.values(), key=len, reverse=True):
+            for vehicle in vehicles:
+                if not solution[vehicle] and problem.feasible(route, problem.capacities[vehicle]):
+                    solution[vehicle] = route
+                    break
+            else:
+                leftover.extend(route)
+        unassigned.extend(leftover)
+        self.insert_unassigned(solution, unassigned)
+        return solution, unassigned
+
+    def best_insertion(self, routes: List[List[int]], stop: int) -> Optional[Tuple[float, int, int]]:
+        """(surcoût, véhicule, position) de la meilleure insertion réalisable de stop"""
+        problem = self.problem
+        distance = problem.distance
+        candidates = []
+        for vehicle, route in enumerate(routes):
+            previous = 0
+            for position in range(len(route) + 1):
+                following = route[position] if position < len(route) else 0
+                candidates.append((
+                    distance[previous][stop] + distance[stop][following] - distance[previous][following],
+                    vehicle, position
+                ))
+                previous = following
+        candidates.sort()
+        for delta, vehicle, position in candidates:
+            route = routes[vehicle]
+            if problem.feasible(route[:position] + [stop] + route[position:], problem.capacities[vehicle]):
+                return delta, vehicle, position
+        return None
+
+    def insert_unassigned(self, routes: List[List[int]], unassigned: List[int]) -> bool:
+        """Insère au mieux les arrêts non desservis ; True si au moins un a trouvé place"""
+        inserted = False
+        for stop in list(unassigned):
+            best = self.best_insertion(routes, stop)
+            if best is not None:
+                _, vehicle, position = best
+                routes[vehicle].insert(position, stop)
+                unassigned.remove(stop)
+                inserted = True
+        return inserted
+
+    # ------------------------------------------------------------------
+    # Recherche locale
+    # ------------------------------------------------------------------
+
+    def timed_out(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def local_search(self, routes: List[List[int]], unassigned: List[int]):
+        moves = (self.relocate, self.exchange, self.two_opt_star, self.two_opt)
+        improved = True
+        while improved and not self.timed_out():
+            improved = bool(unassigned) and self.insert_unassigned(routes, unassigned)
+            for move in moves:
+                if self.timed_out():
+                    return
+                if move(routes):
+                    improved = True
+
+    def relocate(self, routes: List[List[int]]) -> bool:
+        """Déplace un arrêt vers la meilleure position (même tournée ou une autre)"""
+        problem = self.problem
+        distance = problem.distance
+        improved = False
+        for source, route in enumerate(routes):
+            position = 0
+            while position < len(route):
+                if self.timed_out():
+                    return improved
+                stop = route[position]
+                previous = route[position - 1] if position else 0
+                following = route[position + 1] if position + 1 < len(route) else 0
+                gain = distance[previous][stop] + distance[stop][following] - distance[previous][following]
+                remaining = route[:position] + route[position + 1:]
+
+                candidates = []
+                for target, other in enumerate(routes):
+                    base = remaining if target == source else other
+                    before = 0
+                    for index in range(len(base) + 1):
+                        after = base[index] if index < len(base) else 0
+                        delta = distance[before][stop] + distance[stop][after] - distance[before][after] - gain
+                        if delta < -EPSILON:
+                            candidates.append((delta, target, index))
+                        before = after
+
+                moved = False
+                candidates.sort()
+                for delta, target, index in candidates:
+                    base = remaining if target == source else routes[target]
+                    new_target = base[:index] + [stop] + base[index:]
+                    if not problem.feasible(new_target, problem.capacities[target]):
+                        continue
+                    if target != source and not problem.feasible(remaining, problem.capacities[source]):
+                        break
+                    if target == source:
+                        route[:] = new_target
+                    else:
+                        route[:] = remaining
+                        routes[target][:] = new_target
+                    moved = improved = True
+                    break
+                if not moved:
+                    position += 1
+        return improved
+
+    def exchange(self, routes: List[List[int]]) -> bool:
+        """Échange deux arrêts de tournées différentes"""
+        problem = self.problem
+        distance = problem.distance
+        improved = False
+        for a in range(len(routes)):
+            for b in range(a + 1, len(routes)):
+                route_a, route_b = routes[a], routes[b]
+                if not route_a or not route_b:
+                    continue
+                if self.timed_out():
+                    return improved
+                for i, stop_a in enumerate(route_a):
+                    prev_a = route_a[i - 1] if i else 0
+                    next_a = route_a[i + 1] if i + 1 < len(route_a) else 0
+                    for j, stop_b in enumerate(route_b):
+                        prev_b = route_b[j - 1] if j else 0
+                        next_b = route_b[j + 1] if j + 1 < len(route_b) else 0
+                        delta = (
+                            distance[prev_a][stop_b] + distance[stop_b][next_a]
+                            - distance[prev_a][stop_a] - distance[stop_a][next_a]
+                            + distance[prev_b][stop_a] + distance[stop_a][next_b]
+                            - distance[prev_b][stop_b] - distance[stop_b][next_b]
+                        )
+                        if delta >= -EPSILON:
+                            continue
+                        new_a = route_a[:i] + [stop_b] + route_a[i + 1:]
+                        new_b = route_b[:j] + [stop_a] + route_b[j + 1:]
+                        if (problem.feasible(new_a, problem.capacities[a])
+                                and problem.feasible(new_b, problem.capacities[b])):
+                            route_a[i], route_b[j] = stop_b, stop_a
+                            stop_a = stop_b
+                            next_a = route_a[i + 1] if i + 1 < len(route_a) else 0
+                            improved = True
+        return improved
+
+    def two_opt_star(self, routes: List[List[int]]) -> bool:
+        """Échange les fins de deux tournées : a[:i] + b[j:] et b[:j] + a[i:]"""
+        problem = self.problem
+        distance = problem.distance
+        improved = False
+        for a in range(len(routes)):
+            for b in range(a + 1, len(routes)):
+                if self.timed_out():
+                    return improved
+                route_a, route_b = routes[a], routes[b]
+                if not route_a and not route_b:
+                    continue
+                found = False
+                for i in range(len(route_a) + 1):
+                    prev_a = route_a[i - 1] if i else 0
+                    head_a = route_a[i] if i < len(route_a) else 0
+                    for j in range(len(route_b) + 1):
+                        prev_b = route_b[j - 1] if j else 0
+                        head_b = route_b[j] if j < len(route_b) else 0
+                        delta = (
+                            distance[prev_a][head_b] + distance[prev_b][head_a]
+                            - distance[prev_a][head_a] - distance[prev_b][head_b]
+                        )
+                        if delta >= -EPSILON:
+                            continue
+                        new_a = route_a[:i] + route_b[j:]
+                        new_b = route_b[:j] + route_a[i:]
+                        if (problem.feasible(new_a, problem.capacities[a])
+                                and problem.feasible(new_b, problem.capacities[b])):
+                            routes[a], routes[b] = new_a, new_b
+                            found = improved = True
+                            break
+                    if found:
+                        break
+        return improved
+
+    def two_opt(self, routes: List[List[int]]) -> bool:
+        """Inverse un segment d'une tournée (distance recalculée : matrice non symétrique)"""
+        problem = self.problem
+        improved = False
+        for vehicle, route in enumerate(routes):
+            if len(route) < 3:
+                continue
+            if self.timed_out():
+                return improved
+            current = problem.route_distance(route)
+            for i in range(len(route) - 1):
+                for j in range(i + 1, len(route)):
+                    candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                    distance = problem.route_distance(candidate)
+                    if distance < current - EPSILON and problem.feasible(candidate, problem.capacities[vehicle]):
+                        route[:] = candidate
+                        current = distance
+                        improved = True
+        return improved
+
+    # ------------------------------------------------------------------
+    # Perturbation
+    # ------------------------------------------------------------------
+
+    def perturb(self, routes: List[List[int]], unassigned: List[int]):
+        """Retire un arrêt au hasard et ses plus proches voisins, puis les réinsère au mieux"""
+        assigned = [stop for route in routes for stop in route]
+        if not assigned:
+            return
+        count = max(2, min(len(assigned) // 10, 30))
+        seed = self.random.choice(assigned)
+        distance = self.problem.distance[seed]
+        removed = set(sorted(assigned, key=lambda stop: distance[stop])[:count])
+        for route in routes:
+            route[:] = [stop for stop in route if stop not in removed]
+        pending = list(removed)
+        self.random.shuffle(pending)
+        unassigned.extend(pending)
+        self.insert_unassigned(routes, unassigned)
+
+
+def _solve_with_seed(arguments) -> Dict:
+    problem, time_limit, seed = arguments
+    return VrpSolver(problem, time_limit, seed).solve()
+
+
+def solve(problem: VrpProblem, time_limit: Optional[float] = None, workers: Optional[int] = None,
+          seed: int = 0) -> Dict:
+    """Résout le problème en `time_limit` secondes
+
+    Avec workers > 1 (0 : tous les cœurs), autant de recherches indépendantes
+    (graines différentes) tournent en parallèle dans des processus séparés ;
+    la meilleure solution est gardée.
+    """
+    if time_limit is None:
+        time_limit = getattr(settings, 'FLEET_SOLVER_TIME_LIMIT', 2.0)
+    if workers is None:
+        workers = getattr(settings, 'FLEET_SOLVER_WORKERS', 1)
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return VrpSolver(problem, time_limit, seed).solve()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            _solve_with_seed, [(problem, time_limit, seed + index) for index in range(workers)]
+        ))
+    return min(results, key=lambda result: (len(result['unassigned']), result['distance']))
+
+
+def create_fleet_plan(name: str, depot, transport_mode: str, vehicle_capacities: List[float],
+                      stops: List[Dict], user=None, shift_start=None, shift_minutes: int = 480) -> FleetPlan:
+    """Crée un plan et ses arrêts ; stops : [{'location', 'delivery', 'pickup', 'ready_minutes', ...}]"""
+    with transaction.atomic():
+        plan = FleetPlan.objects.create(
+            name=name,
+            user=user,
+            depot=depot,
+            transport_mode=transport_mode,
+            vehicle_capacities=[float(capacity) for capacity in vehicle_capacities],
+            shift_start=shift_start or timezone.now(),
+            shift_minutes=shift_minutes,
+        )
+        FleetStop.objects.bulk_create([FleetStop(plan=plan, **stop) for stop in stops], batch_size=500)
+    return plan
+
+
+def solve_fleet_plan(plan, time_limit: Optional[float] = None, workers: Optional[int] = None) -> Dict:
+    """Calcule les tournées d'un FleetPlan et les enregistre (remplace un calcul précédent)"""
+    stops = list(plan.stops.select_related('location').order_by('id'))
+    depot = plan.depot
+    coords = [(depot.latitude, depot.longitude)] + [
+        (stop.location.latitude, stop.location.longitude) for stop in stops
+    ]
+    distance, duration, cost = travel_matrices(coords, plan.transport_mode, local_hour(plan.shift_start))
+    problem = VrpProblem(
+        distance, duration, plan.vehicle_capacities,
+        delivery=[stop.delivery for stop in stops],
+        pickup=[stop.pickup for stop in stops],
+        ready=[stop.ready_minutes for stop in stops],
+        due=[stop.due_minutes for stop in stops],
+        service=[stop.service_minutes for stop in stops],
+        horizon=plan.shift_minutes,
+    )
+    result = solve(problem, time_limit, workers)
+    save_solution(plan, stops, result, cost)
+    return result
+
+
+def solve_new_fleet_plan(plan, time_limit: Optional[float] = None, workers: Optional[int] = None) -> Dict:
+    """solve_fleet_plan d'un plan qui vient d'être créé : supprimé (avec ses arrêts) si le calcul échoue
+
+    Le calcul dure jusqu'à time_limit secondes : il n'est pas fait dans la
+    transaction de création, qui bloquerait les écritures pendant ce temps.
+    """
+    try:
+        return solve_fleet_plan(plan, time_limit, workers)
+    except Exception:
+        plan.delete()
+        raise
+
+
+def save_solution(plan, stops: List[FleetStop], result: Dict, cost: np.ndarray):
+    """Une RouteRequest et une OptimizedRoute (dépôt -> arrêts -> dépôt) par véhicule utilisé"""
+    depot = plan.depot
+    with transaction.atomic():
+        RouteRequest.objects.filter(optimizedroute__fleet_plan=plan).delete()
+        for stop in stops:
+            stop.vehicle = stop.sequence = stop.arrival_minutes = None
+
+        route_requests = RouteRequest.objects.bulk_create([
+            RouteRequest(user=plan.user, departure=depot, destination=depot, transport_mode=plan.transport_mode)
+            for _ in result['routes']
+        ])
+        vehicle_routes = []
+        total_cost = 0.0
+        for route_request, route in zip(route_requests, result['routes']):
+            route_stops = [stops[index - 1] for index in route['stops']]
+            for sequence, (stop, arrival) in enumerate(zip(route_stops, route['arrivals'])):
+                stop.vehicle = route['vehicle']
+                stop.sequence = sequence
+                stop.arrival_minutes = round(arrival, 1)
+
+            legs = [0] + route['stops'] + [0]
+            route_cost = float(sum(cost[a][b] for a, b in zip(legs, legs[1:])))
+            total_cost += route_cost
+            vehicle_route = OptimizedRoute(
+                route_request=route_request,
+                fleet_plan=plan,
+                vehicle=route['vehicle'],
+                distance=round(route['distance'], 1),
+                duration=round(route['end']),
+                cost_estimate=route_cost,
+            )
+            vehicle_route.route_data = {
+                'fleet_plan': plan.id,
+                'vehicle': route['vehicle'],
+                'departure': {'address': depot.address, 'coordinates': [depot.latitude, depot.longitude]},
+                'destination': {'address': depot.address, 'coordinates': [depot.latitude, depot.longitude]},
+                'ai_analysis': {
+                    'optimal_route': {
+                        'steps': [depot.name] + [stop.location.name for stop in route_stops] + [depot.name],
+                        'estimated_time': round(route['end']),
+                        'estimated_distance': round(route['distance'], 1),
+                        'cost_estimate': route_cost,
+                        'load': route['load'],
+                    },
+                },
+            }
+            vehicle_route.set_geometry(
+                [(depot.latitude, depot.longitude)]
+                + [(stop.location.latitude, stop.location.longitude) for stop in route_stops]
+                + [(depot.latitude, depot.longitude)]
+            )
+            vehicle_routes.append(vehicle_route)
+
+        OptimizedRoute.objects.bulk_create_with_payload(vehicle_routes)
+        FleetStop.objects.bulk_update(stops, ['vehicle', 'sequence', 'arrival_minutes'], batch_size=500)
+        plan.total_distance = round(result['distance'], 1)
+        plan.total_duration = round(result['duration'])
+        plan.total_cost = total_cost
+        plan.solve_seconds = round(result['elapsed'], 3)
+        plan.save(update_fields=['total_distance', 'total_duration', 'total_cost', 'solve_seconds'])
+
+    # bulk_create n'envoie pas post_save
+    bump_version('route_requests')
+    bump_version('routes')
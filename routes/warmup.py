@@ -0,0 +1,32 @@
+import importlib
+import logging
+import time
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Dépendances lourdes importées à la demande (premier appel) par l'application
+HEAVY_MODULES = (
+    'folium',
+    'google.generativeai',
+    'requests',
+)
+
+
+def preload(modules: Iterable[str] = HEAVY_MODULES) -> Dict[str, float]:
+    """Importe les modules lourds et renvoie {module: secondes}
+
+    Appelé dans le processus maître avant le fork (gunicorn.conf.py) : les
+    workers héritent des modules déjà chargés au lieu de les importer au
+    premier appel.
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Préchargement impossible de {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transport_optimizer.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importé après get_asgi_application() : Django doit être configuré
+from routes.live import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """HTTP vers Django, WebSocket (/ws/routes/<id>/) vers le suivi en direct"""
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
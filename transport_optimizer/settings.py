@@ -13,9 +13,15 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 import os
 
+import dj_database_url
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Variables d'environnement (.env à la racine du projet)
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -43,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'routes.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,18 +77,196 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'transport_optimizer.wsgi.application'
+ASGI_APPLICATION = 'transport_optimizer.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# La base est configurée via DATABASE_URL (SQLite par défaut, PostgreSQL en prod).
+# Les connexions sont persistantes (CONN_MAX_AGE) et vérifiées avant réutilisation.
+
 DATABASES = {
+    'default': dj_database_url.config(
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        conn_health_checks=True,
+    )
+}
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Attente sur verrou plutôt qu'une erreur "database is locked"
+    DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 20
+else:
+    # Derrière PgBouncer en mode transaction, les curseurs serveur sont interdits
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = (
+        os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True'
+    )
+
+# PRAGMA appliqués à chaque nouvelle connexion SQLite (voir routes.signals)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # ~20 Mo
+    'mmap_size': 134217728,  # 128 Mo
+    'busy_timeout': 20000,
+    'foreign_keys': 'ON',
+}
+
+
+# Données IA des routes (OptimizedRoutePayload) compressées au-delà de ce seuil
+ROUTE_DATA_COMPRESSION = os.environ.get('ROUTE_DATA_COMPRESSION', 'True') == 'True'
+ROUTE_DATA_COMPRESSION_MIN_SIZE = 512
+
+
+# Cache partagé entre les workers (fichiers par défaut ; base de données avec
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache et createcachetable)
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
     }
 }
 
+# Redis (ou compatible) si configuré, nécessite le paquet redis
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': 300,
+    }
+
+# Durée de vie des résultats d'optimisation en cache (secondes)
+ROUTE_CACHE_TTL = int(os.environ.get('ROUTE_CACHE_TTL', str(6 * 3600)))
+
+# Cache à deux niveaux (routes.tiered_cache) : LRU du processus devant CACHES[ALIAS]
+TIERED_CACHE = {
+    'ALIAS': 'default',
+    'L1_MAX_ENTRIES': int(os.environ.get('TIERED_CACHE_L1_MAX_ENTRIES', '2048')),
+    'L1_MAX_BYTES': 32 * 1024 * 1024,
+    'L1_TTL': 60,
+    'LOCK_TIMEOUT': 30,
+    'NAMESPACES': {
+        'route': ROUTE_CACHE_TTL,
+        'geometry': 7 * 86400,
+        'geocode': 30 * 86400,
+        'map': 24 * 3600,
+        # Matrices de distances/durées des plans de flotte (routes.vrp)
+        'matrix': 24 * 3600,
+    },
+}
+
+# Cache HTTP des résultats de route (Cache-Control max-age) et des pages anonymes
+ROUTE_RESULT_MAX_AGE = 86400
+PAGE_CACHE_TIMEOUT = 3600
+
+# Fragments de gabarits ({% cached_fragment %}) : invalidés par les tampons
+# de version, la durée n'est qu'une borne de sécurité
+FRAGMENT_CACHE_TIMEOUT = 24 * 3600
+
+# Réutilisation des trajets voisins : même cellule geohash (7 ≈ 150 m)
+# et extrémités à moins de ROUTE_REUSE_MAX_DISTANCE_M mètres
+ROUTE_REUSE_GEOHASH_PRECISION = 7
+ROUTE_REUSE_MAX_DISTANCE_M = 150
+
+# Deux lieux à moins de LOCATION_DUPLICATE_RADIUS_M mètres (ou de même adresse
+# normalisée à moins de LOCATION_DUPLICATE_ADDRESS_RADIUS_M mètres) sont le même
+# lieu : refusé à l'ajout, fusionné par merge_duplicate_locations
+LOCATION_DUPLICATE_RADIUS_M = 25
+LOCATION_DUPLICATE_ADDRESS_RADIUS_M = 1000
+
+# Estimateur local (devis instantanés et repli sans IA)
+# Au-delà de ROUTE_ESTIMATOR_INTERCITY_KM km routiers, tarifs interurbains.
+# ROUTE_ESTIMATOR_TABLE surcharge routes.estimator.DEFAULT_FARE_TABLE,
+# ex. {'taxi': {'urban': {'base_fare': 400}}}
+ROUTE_ESTIMATOR_INTERCITY_KM = float(os.getenv('ROUTE_ESTIMATOR_INTERCITY_KM', '25'))
+ROUTE_ESTIMATOR_DETOUR = {'urban': 1.35, 'intercity': 1.2}
+ROUTE_ESTIMATOR_TABLE = {}
+
+# Tracés routiers (OSRM, polyline encodée) ; vide (défaut) : segment direct.
+# À activer avec un serveur OSRM dédié : le serveur de démonstration public
+# (https://router.project-osrm.org) est limité et non destiné à la production
+OSRM_URL = os.getenv('OSRM_URL', '')
+OSRM_TIMEOUT = float(os.getenv('OSRM_TIMEOUT', '5'))
+
+# Instantanés analytiques en colonnes (manage.py snapshot_analytics)
+ANALYTICS_SNAPSHOT_DIR = Path(os.getenv('ANALYTICS_SNAPSHOT_DIR', BASE_DIR / 'analytics'))
+
+# Rétention des demandes de routes par type d'utilisateur (manage.py archive_routes)
+# days : âge (jours) au-delà duquel une demande est archivée, None : jamais
+# storage : données de l'IA dans la table d'archive ('table') ou en fichiers
+# JSONL compressés dans ROUTE_ARCHIVE_DIR ('jsonl')
+ROUTE_RETENTION = {
+    'anonymous': {'days': 30, 'storage': 'jsonl'},
+    'user': {'days': 365, 'storage': 'table'},
+    'staff': {'days': None},
+}
+ROUTE_RETENTION_BATCH_SIZE = 500
+ROUTE_ARCHIVE_DIR = Path(os.getenv('ROUTE_ARCHIVE_DIR', BASE_DIR / 'archive'))
+# Durée pendant laquelle un historique restauré n'est pas réarchivé (jours)
+ROUTE_RESTORE_RETAIN_DAYS = 30
+
+# Ré-optimisation des routes existantes (action d'administration, manage.py reoptimize_routes)
+# Routes enregistrées par lot, appels IA simultanés et par seconde, fichier de reprise
+ROUTE_REOPTIMIZE_BATCH_SIZE = 50
+ROUTE_REOPTIMIZE_CONCURRENCY = int(os.getenv('ROUTE_REOPTIMIZE_CONCURRENCY', '4'))
+ROUTE_REOPTIMIZE_RATE = 2.0
+ROUTE_REOPTIMIZE_CHECKPOINT = Path(os.getenv('ROUTE_REOPTIMIZE_CHECKPOINT', BASE_DIR / 'reoptimize_checkpoint.json'))
+
+# Budget de requêtes SQL par vue (@query_budget, routes.query_budget)
+# ACTION : 'warn' (journal) ou 'raise' (exception) en cas de dépassement ;
+# MAX_REPEATS : exécutions maximales d'une même requête (détection des N+1)
+QUERY_BUDGET = {
+    'ENABLED': DEBUG or os.getenv('QUERY_BUDGET_ENABLED') == '1',
+    'ACTION': os.getenv('QUERY_BUDGET_ACTION', 'warn'),
+    'DEFAULT_MAX_QUERIES': None,
+    'MAX_REPEATS': 2,
+    'HEADERS': DEBUG,
+}
+
+# Modèle ETA/coût appris sur l'historique (manage.py train_eta_model)
+ETA_MODEL_PATH = Path(os.getenv('ETA_MODEL_PATH', BASE_DIR / 'eta_model.npz'))
+
+# Profils de vitesse par mode, zone et quart d'heure (manage.py build_speed_profiles),
+# appliqués au tableau des tarifs selon l'heure de départ ; sans fichier : tableau seul.
+# SPEED_PROFILE_ZONES ajoute ou remplace des zones de routes.speed_profiles.DEFAULT_ZONES,
+# ex. {'bafoussam': {'center': (5.4778, 10.4176), 'radius_km': 10}}
+SPEED_PROFILES_PATH = Path(os.getenv('SPEED_PROFILES_PATH', BASE_DIR / 'speed_profiles.npz'))
+SPEED_PROFILE_ZONES = {}
+
+# Tournées de flotte (routes.vrp) : temps de calcul par plan (secondes),
+# processus de recherche en parallèle (0 : tous les cœurs), arrêts maximum
+FLEET_SOLVER_TIME_LIMIT = float(os.getenv('FLEET_SOLVER_TIME_LIMIT', '2'))
+FLEET_SOLVER_WORKERS = int(os.getenv('FLEET_SOLVER_WORKERS', '1'))
+FLEET_MAX_STOPS = 500
+
+# Suivi en direct des routes par WebSocket (routes.live, /ws/routes/<id>/, ASGI uniquement)
+# Plafonds par processus ; QUEUE_SIZE : messages en attente par abonné (les plus
+# anciens sont remplacés), MAX_DROPPED : pertes tolérées avant de fermer un client lent
+LIVE_UPDATES = {
+    'MAX_CONNECTIONS': int(os.getenv('LIVE_MAX_CONNECTIONS', '10000')),
+    'MAX_SUBSCRIBERS_PER_ROUTE': 5000,
+    'QUEUE_SIZE': 8,
+    'MAX_DROPPED': 200,
+}
+
+# Affectation groupée des demandes aux chauffeurs (routes.assignment, manage.py assign_drivers)
+# Hongrois jusqu'à HUNGARIAN_MAX_SIZE lignes ou colonnes, enchères au-delà
+DRIVER_ASSIGNMENT = {
+    'HUNGARIAN_MAX_SIZE': 200,
+    'MAX_PICKUP_MINUTES': 30,
+    'REQUEST_TTL_MINUTES': 15,
+    'WINDOW_SECONDS': 10,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -109,6 +294,10 @@ LANGUAGE_CODE = 'fr-fr'
 
 TIME_ZONE = 'Europe/Paris'
 
+# Fuseau des trajets (Cameroun, UTC+1 sans heure d'été) : quarts d'heure des
+# profils de vitesse et heure de départ du modèle ETA, appris comme prédits
+ROUTE_LOCAL_TIME_ZONE = os.getenv('ROUTE_LOCAL_TIME_ZONE', 'Africa/Douala')
+
 USE_I18N = True
 
 USE_TZ = True